@@ -23,11 +23,15 @@ from schemas_analytics import (
     RiskAnalysis,
     Predictions
 )
+from response_cache import response_cache
 
 router = APIRouter()
 
+# Analytics read rounds, their results and CAPAs per department
+ANALYTICS_CACHE_TAGS = ("rounds", "evaluation_results", "capas", "departments")
+
 @router.get("/analytics/advanced/", response_model=AnalyticsData)
-async def get_advanced_analytics(
+def get_advanced_analytics(
     prediction_period: str = Query("3m", description="Prediction period: 1m, 3m, 6m, 1y"),
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
@@ -36,15 +40,19 @@ async def get_advanced_analytics(
 ):
     """Get advanced analytics data"""
     try:
-        analytics_data = get_analytics_data(
-            db, prediction_period, department_id, start_date, end_date
+        analytics_data = response_cache.get_or_compute(
+            "analytics.advanced",
+            lambda: get_analytics_data(db, prediction_period, department_id, start_date, end_date),
+            tags=ANALYTICS_CACHE_TAGS,
+            params={"prediction_period": prediction_period, "department_id": department_id,
+                    "start_date": start_date, "end_date": end_date},
         )
         return analytics_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/performance/", response_model=PerformanceMetrics)
-async def get_performance_metrics_endpoint(
+def get_performance_metrics_endpoint(
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
     end_date: Optional[datetime] = Query(None, description="End date filter"),
@@ -52,26 +60,36 @@ async def get_performance_metrics_endpoint(
 ):
     """Get performance metrics"""
     try:
-        metrics = get_performance_metrics(db, department_id, start_date, end_date)
+        metrics = response_cache.get_or_compute(
+            "analytics.performance",
+            lambda: get_performance_metrics(db, department_id, start_date, end_date),
+            tags=ANALYTICS_CACHE_TAGS,
+            params={"department_id": department_id, "start_date": start_date, "end_date": end_date},
+        )
         return metrics
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/departments/", response_model=List[DepartmentComparison])
-async def get_department_comparison_endpoint(
+def get_department_comparison_endpoint(
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
     end_date: Optional[datetime] = Query(None, description="End date filter"),
     db: Session = Depends(get_db)
 ):
     """Get department comparison data"""
     try:
-        comparison = get_department_comparison(db, start_date, end_date)
+        comparison = response_cache.get_or_compute(
+            "analytics.departments",
+            lambda: get_department_comparison(db, start_date, end_date),
+            tags=ANALYTICS_CACHE_TAGS,
+            params={"start_date": start_date, "end_date": end_date},
+        )
         return comparison
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/risk/", response_model=List[RiskAnalysis])
-async def get_risk_analysis_endpoint(
+def get_risk_analysis_endpoint(
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     start_date: Optional[datetime] = Query(None, description="Start date filter"),
     end_date: Optional[datetime] = Query(None, description="End date filter"),
@@ -79,20 +97,30 @@ async def get_risk_analysis_endpoint(
 ):
     """Get risk analysis data"""
     try:
-        risk_analysis = get_risk_analysis(db, department_id, start_date, end_date)
+        risk_analysis = response_cache.get_or_compute(
+            "analytics.risk",
+            lambda: get_risk_analysis(db, department_id, start_date, end_date),
+            tags=ANALYTICS_CACHE_TAGS,
+            params={"department_id": department_id, "start_date": start_date, "end_date": end_date},
+        )
         return risk_analysis
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/analytics/predictions/", response_model=Predictions)
-async def get_predictions_endpoint(
+def get_predictions_endpoint(
     prediction_period: str = Query("3m", description="Prediction period: 1m, 3m, 6m, 1y"),
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     db: Session = Depends(get_db)
 ):
     """Get predictions data"""
     try:
-        predictions = get_predictions(db, prediction_period, department_id)
+        predictions = response_cache.get_or_compute(
+            "analytics.predictions",
+            lambda: get_predictions(db, prediction_period, department_id),
+            tags=ANALYTICS_CACHE_TAGS,
+            params={"prediction_period": prediction_period, "department_id": department_id},
+        )
         return predictions
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -10,7 +10,7 @@ from datetime import datetime, timedelta
 
 from database import get_db
 from auth import get_current_user
-from models_updated import User, CapaAction
+from models_updated import User, Capa, CapaAction
 from crud_capa_actions import (
     get_capa_actions,
     get_capa_action_by_id,
@@ -20,8 +20,16 @@ from crud_capa_actions import (
     get_overdue_actions,
     get_upcoming_actions,
     get_actions_by_assignee,
-    get_action_statistics
+    get_action_statistics,
+    overdue_actions_query,
+    upcoming_actions_query,
+    assignee_actions_query,
+    action_summary,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE
 )
+from response_cache import response_cache
+from workload import department_workload, suggest_assignee
 
 router = APIRouter()
 
@@ -83,7 +91,7 @@ async def list_capa_actions(
         "limit": limit
     }
 
-@router.get("/api/capa-actions/{action_id}", response_model=dict)
+@router.get("/api/capa-actions/{action_id:int}", response_model=dict)
 async def get_action(
     action_id: int,
     current_user: User = Depends(get_current_user),
@@ -121,21 +129,31 @@ async def create_action(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Create a new CAPA action"""
+    """Create a new CAPA action.
+    With "auto_assign": true and no assignee, it goes to the least-loaded
+    manager of the CAPA's department.
+    """
     
     # Check permissions
     if current_user.role not in ["quality_manager", "super_admin"]:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     
+    if action_data.get('auto_assign') and not action_data.get('assigned_to_id'):
+        capa = db.query(Capa.department_id, Capa.department).filter(Capa.id == action_data.get('capa_id')).first()
+        action_data['assigned_to_id'] = suggest_assignee(db, (capa.department_id or capa.department) if capa else None)
+        if action_data['assigned_to_id']:
+            action_data['assigned_to'] = _user_name(db, action_data['assigned_to_id'])
+    
     action = create_capa_action(db, action_data)
     
     return {
         "status": "success",
         "message": "Action created successfully",
-        "action_id": action.id
+        "action_id": action.id,
+        "assigned_to_id": action.assigned_to_id
     }
 
-@router.put("/api/capa-actions/{action_id}", response_model=dict)
+@router.put("/api/capa-actions/{action_id:int}", response_model=dict)
 async def update_action(
     action_id: int,
     action_data: dict,
@@ -158,7 +176,7 @@ async def update_action(
         "action_id": action.id
     }
 
-@router.delete("/api/capa-actions/{action_id}", response_model=dict)
+@router.delete("/api/capa-actions/{action_id:int}", response_model=dict)
 async def delete_action(
     action_id: int,
     current_user: User = Depends(get_current_user),
@@ -179,19 +197,38 @@ async def delete_action(
         "message": "Action deleted successfully"
     }
 
+def _now_like(value: datetime) -> datetime:
+    # due_date is timestamptz; compare like with like
+    return datetime.now(value.tzinfo) if value.tzinfo else datetime.now()
+
+def _queue_page(page, summary: dict, next_cursor: Optional[str], limit: int) -> dict:
+    return {
+        "status": "success",
+        "actions": page,
+        "total": summary["total"],
+        "summary": summary,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+        "limit": limit
+    }
+
 @router.get("/api/capa-actions/overdue/list", response_model=dict)
 async def list_overdue_actions(
     action_type: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get list of overdue actions"""
+    """Get list of overdue actions, a page at a time (oldest due date first)"""
     
-    actions = get_overdue_actions(db, action_type)
+    try:
+        actions, next_cursor = get_overdue_actions(db, action_type, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "status": "success",
-        "actions": [
+    return _queue_page(
+        [
             {
                 "id": action.id,
                 "capa_id": action.capa_id,
@@ -199,27 +236,33 @@ async def list_overdue_actions(
                 "task": action.task,
                 "due_date": action.due_date.isoformat() if action.due_date else None,
                 "assigned_to": action.assigned_to,
-                "days_overdue": (datetime.now() - action.due_date).days if action.due_date else 0
+                "days_overdue": (_now_like(action.due_date) - action.due_date).days if action.due_date else 0
             }
             for action in actions
         ],
-        "total": len(actions)
-    }
+        action_summary(overdue_actions_query(db, action_type)),
+        next_cursor,
+        limit
+    )
 
 @router.get("/api/capa-actions/upcoming/list", response_model=dict)
 async def list_upcoming_actions(
     days: int = Query(7),
     action_type: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get list of upcoming actions (due within next N days)"""
+    """Get list of upcoming actions (due within next N days), a page at a time"""
     
-    actions = get_upcoming_actions(db, days, action_type)
+    try:
+        actions, next_cursor = get_upcoming_actions(db, days, action_type, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "status": "success",
-        "actions": [
+    return _queue_page(
+        [
             {
                 "id": action.id,
                 "capa_id": action.capa_id,
@@ -227,26 +270,32 @@ async def list_upcoming_actions(
                 "task": action.task,
                 "due_date": action.due_date.isoformat() if action.due_date else None,
                 "assigned_to": action.assigned_to,
-                "days_until_due": (action.due_date - datetime.now()).days if action.due_date else 0
+                "days_until_due": (action.due_date - _now_like(action.due_date)).days if action.due_date else 0
             }
             for action in actions
         ],
-        "total": len(actions)
-    }
+        action_summary(upcoming_actions_query(db, days, action_type)),
+        next_cursor,
+        limit
+    )
 
 @router.get("/api/capa-actions/my-actions", response_model=dict)
 async def get_my_actions(
-    status: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, description="Open actions by default; a status, or 'all'"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get actions assigned to current user"""
+    """Get actions assigned to current user, a page at a time (due date order, undated last)"""
     
-    actions = get_actions_by_assignee(db, current_user.id, status)
+    try:
+        actions, next_cursor = get_actions_by_assignee(db, current_user.id, status, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "status": "success",
-        "actions": [
+    return _queue_page(
+        [
             {
                 "id": action.id,
                 "capa_id": action.capa_id,
@@ -258,17 +307,69 @@ async def get_my_actions(
             }
             for action in actions
         ],
-        "total": len(actions)
+        action_summary(assignee_actions_query(db, current_user.id, status)),
+        next_cursor,
+        limit
+    )
+
+def _user_name(db: Session, user_id: int) -> Optional[str]:
+    user = db.query(User.first_name, User.last_name).filter(User.id == user_id).first()
+    return f"{user.first_name} {user.last_name}" if user else None
+
+@router.get("/api/capa-actions/workload", response_model=dict)
+def get_department_workload(
+    department: str = Query(..., description="Department id or name"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Open-action load of each manager of a department, least loaded first"""
+    
+    return {
+        "status": "success",
+        **department_workload(db, int(department) if department.isdigit() else department)
+    }
+
+@router.post("/api/capa-actions/{action_id:int}/auto-assign", response_model=dict)
+def auto_assign_action(
+    action_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Assign an action to the least-loaded manager of its CAPA's department"""
+    
+    if current_user.role not in ["quality_manager", "super_admin", "department_head"]:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
+    
+    action = get_capa_action_by_id(db, action_id)
+    if not action:
+        raise HTTPException(status_code=404, detail="Action not found")
+    
+    department = (action.capa.department_id or action.capa.department) if action.capa else None
+    user_id = suggest_assignee(db, department)
+    if user_id is None:
+        raise HTTPException(status_code=409, detail="لا يوجد مدير مؤهل في القسم لإسناد الإجراء إليه")
+    
+    action = update_capa_action(db, action_id, {"assigned_to_id": user_id, "assigned_to": _user_name(db, user_id)})
+    
+    return {
+        "status": "success",
+        "message": "Action assigned successfully",
+        "action_id": action.id,
+        "assigned_to_id": action.assigned_to_id,
+        "assigned_to": action.assigned_to
     }
 
 @router.get("/api/capa-actions/statistics", response_model=dict)
-async def get_statistics(
+def get_statistics(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get statistics about CAPA actions"""
     
-    stats = get_action_statistics(db)
+    stats = response_cache.get_or_compute(
+        "capa_actions.statistics", lambda: get_action_statistics(db),
+        tags=("capa_actions",),
+    )
     
     return {
         "status": "success",
@@ -0,0 +1,178 @@
+"""
+API endpoints for evidence uploads and downloads
+واجهات برمجية لرفع ملفات الأدلة على أجزاء وتنزيلها
+
+Upload flow (see evidence_store.py):
+    POST /api/evidence/uploads                       {filename, content_type, total_size}
+    PUT  /api/evidence/uploads/{upload_id}?offset=N  raw bytes, at most max_chunk_bytes
+    GET  /api/evidence/uploads/{upload_id}           received_bytes, to resume
+    POST /api/evidence/uploads/{upload_id}/complete  -> evidence id for evidence_ids
+Downloads (GET /api/evidence/{evidence_id}) support range requests.
+"""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from database import get_db
+from auth import get_current_user
+from models_updated import User, EvidenceFile, EvaluationResult, Round
+from crud import get_department_manager_ids
+from schemas import EvidenceUploadCreate, EvidenceUploadResponse, EvidenceFileResponse
+from evidence_store import (
+    EvidenceError,
+    MAX_CHUNK_BYTES,
+    append_chunk,
+    complete_upload,
+    evidence_store,
+    get_upload,
+    has_grant,
+    start_upload,
+)
+
+router = APIRouter()
+
+
+def _http_error(e: EvidenceError) -> HTTPException:
+    # 409 answers carry received_bytes so the client knows where to resume
+    detail = {"message": e.detail, **e.extra} if e.extra else e.detail
+    return HTTPException(status_code=e.status_code, detail=detail)
+
+
+def _can_access(db: Session, evidence: EvidenceFile, user: User) -> bool:
+    """Quality staff, its uploaders, and whoever created, is assigned to or manages a round using the evidence"""
+    if user.role in ["super_admin", "quality_manager"] or has_grant(db, evidence.id, user.id):
+        return True
+    rounds = db.query(Round.created_by_id, Round.assigned_to_ids, Round.department_id, Round.department).filter(
+        Round.id.in_(
+            select(EvaluationResult.round_id).where(EvaluationResult.evidence_ids.contains([evidence.id]))
+        )
+    )
+    for created_by_id, assigned_to_ids, department_id, department in rounds:
+        if user.id == created_by_id or user.id in (assigned_to_ids or []):
+            return True
+        if user.id in get_department_manager_ids(db, department_id or department):
+            return True
+    return False
+
+
+def _get_evidence(db: Session, evidence_id: int, user: User) -> EvidenceFile:
+    evidence = db.get(EvidenceFile, evidence_id)
+    if evidence is None:
+        raise HTTPException(status_code=404, detail="الملف غير موجود")
+    if not _can_access(db, evidence, user):
+        raise HTTPException(status_code=403, detail="ليس لديك صلاحية لعرض هذا الملف")
+    return evidence
+
+
+def _upload_response(upload, received_bytes: int) -> EvidenceUploadResponse:
+    return EvidenceUploadResponse(
+        upload_id=upload.id,
+        content_type=upload.content_type,
+        total_size=upload.total_size,
+        received_bytes=received_bytes,
+        max_chunk_bytes=MAX_CHUNK_BYTES,
+    )
+
+
+def _file_response(evidence: EvidenceFile) -> EvidenceFileResponse:
+    response = EvidenceFileResponse.model_validate(evidence)
+    response.url = f"/api/evidence/{evidence.id}"
+    return response
+
+
+@router.post("/evidence/uploads", response_model=EvidenceUploadResponse)
+async def create_evidence_upload(
+    payload: EvidenceUploadCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Start a chunked upload"""
+    try:
+        upload = start_upload(db, current_user.id, payload.filename, payload.content_type, payload.total_size)
+    except EvidenceError as e:
+        raise _http_error(e)
+    return _upload_response(upload, 0)
+
+
+@router.get("/evidence/uploads/{upload_id}", response_model=EvidenceUploadResponse)
+async def get_evidence_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """How much of an upload has arrived"""
+    try:
+        upload = get_upload(db, upload_id, current_user.id)
+    except EvidenceError as e:
+        raise _http_error(e)
+    return _upload_response(upload, evidence_store.received_bytes(upload.id))
+
+
+@router.put("/evidence/uploads/{upload_id}", response_model=EvidenceUploadResponse)
+async def put_evidence_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Append the request body at ``offset``"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_CHUNK_BYTES:
+        raise HTTPException(status_code=413, detail=f"حجم الجزء يتجاوز {MAX_CHUNK_BYTES} بايت")
+    try:
+        upload = get_upload(db, upload_id, current_user.id)
+        data = await request.body()
+        received = await run_in_threadpool(append_chunk, upload, offset, data)
+    except EvidenceError as e:
+        raise _http_error(e)
+    return _upload_response(upload, received)
+
+
+@router.post("/evidence/uploads/{upload_id}/complete", response_model=EvidenceFileResponse)
+async def complete_evidence_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Store a fully received upload; the same content uploaded before returns its existing id"""
+    try:
+        upload = get_upload(db, upload_id, current_user.id)
+        evidence = await complete_upload(db, upload)
+    except EvidenceError as e:
+        raise _http_error(e)
+    return _file_response(evidence)
+
+
+@router.get("/evidence/{evidence_id}/meta", response_model=EvidenceFileResponse)
+async def get_evidence_meta(
+    evidence_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return _file_response(_get_evidence(db, evidence_id, current_user))
+
+
+@router.get("/evidence/{evidence_id}")
+async def download_evidence(
+    evidence_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """The evidence file, for users who can see a round using it; honours Range headers. Content never changes, so it is cacheable for good."""
+    evidence = _get_evidence(db, evidence_id, current_user)
+    path = evidence_store.blob_path(evidence.sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="الملف غير موجود")
+    return FileResponse(
+        path,
+        media_type=evidence.content_type,
+        filename=evidence.original_filename,
+        content_disposition_type="inline",
+        headers={"Cache-Control": "private, max-age=31536000, immutable", "ETag": f'"{evidence.sha256}"'},
+    )
@@ -0,0 +1,178 @@
+"""
+Audit Service - transactional, batched audit logging
+خدمة سجل التدقيق: تجميع السجلات وكتابتها ضمن نفس المعاملة
+
+Entries queued with ``queue_audit_log`` are buffered on the caller's session
+and written as one multi-row INSERT right before that session commits, so the
+audit trail is atomic with the business change and costs no extra commit.
+Low-priority entries can go through ``AuditLogWriter``, a background thread
+that batches them into its own short transactions.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models_updated import AuditLog
+
+logger = logging.getLogger(__name__)
+
+_PENDING_KEY = "pending_audit_logs"
+
+
+def _normalize_values(values: Any) -> Any:
+    """Turn JSON strings produced by older callers into JSON values for the JSONB columns"""
+    if values is None or not isinstance(values, str):
+        return values
+    try:
+        return json.loads(values)
+    except (json.JSONDecodeError, TypeError):
+        return values
+
+
+def build_audit_log_row(audit_log_data: dict) -> Dict[str, Any]:
+    """Build an audit_logs row dict from the payload accepted by crud.create_audit_log"""
+    return {
+        "user_id": audit_log_data["user_id"],
+        "action": audit_log_data["action"],
+        "entity_type": audit_log_data["entity_type"],
+        "entity_id": audit_log_data.get("entity_id"),
+        "old_values": _normalize_values(audit_log_data.get("old_values")),
+        "new_values": _normalize_values(audit_log_data.get("new_values")),
+        "ip_address": audit_log_data.get("ip_address"),
+        "user_agent": audit_log_data.get("user_agent"),
+    }
+
+
+def queue_audit_log(db: Session, audit_log_data: dict) -> None:
+    """Buffer an audit entry in the session; it is written with the session's next commit"""
+    if not db.in_transaction():
+        # Tie the buffer to a transaction so a rollback discards it
+        db.begin()
+    db.info.setdefault(_PENDING_KEY, []).append(build_audit_log_row(audit_log_data))
+
+
+def pending_audit_logs(db: Session) -> List[Dict[str, Any]]:
+    """Entries buffered on the session and not yet written"""
+    return list(db.info.get(_PENDING_KEY, []))
+
+
+def flush_audit_logs(db: Session) -> int:
+    """Write buffered entries as one multi-row INSERT in the current transaction"""
+    rows = db.info.pop(_PENDING_KEY, None)
+    if not rows:
+        return 0
+    db.execute(insert(AuditLog), rows)
+    return len(rows)
+
+
+@event.listens_for(Session, "before_commit")
+def _flush_audit_logs_before_commit(session: Session):
+    flush_audit_logs(session)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_audit_logs_after_rollback(session: Session, previous_transaction):
+    # The business change was rolled back, so its audit trail must go too.
+    # Savepoint rollbacks leave the outer transaction (and its entries) alive.
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
+
+
+class AuditLogWriter:
+    """Background writer for low-priority audit entries.
+
+    Entries are taken off an in-memory queue and written in batches of up to
+    ``batch_size`` rows, or whatever has accumulated after ``flush_interval``
+    seconds. The queue is bounded; when it is full the entry is dropped and
+    logged rather than blocking the request.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0, max_queue_size: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, audit_log_data: dict) -> bool:
+        """Queue an entry for asynchronous writing; returns False if it was dropped"""
+        self.start()
+        try:
+            self._queue.put_nowait(build_audit_log_row(audit_log_data))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Audit log queue is full, dropping %s entry", audit_log_data.get("action"))
+            return False
+
+    def stop(self, timeout: float = 5.0):
+        """Write whatever is queued and stop the worker thread"""
+        if self._thread and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                stopping = True
+            else:
+                batch.append(item)
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._write(batch)
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(AuditLog), rows)
+            db.commit()
+            self.written += len(rows)
+        except Exception as e:
+            db.rollback()
+            self.dropped += len(rows)
+            logger.error(f"Failed to write {len(rows)} audit log entries: {e}")
+        finally:
+            db.close()
+
+
+_audit_writer: Optional[AuditLogWriter] = None
+
+
+def get_audit_writer() -> AuditLogWriter:
+    global _audit_writer
+    if _audit_writer is None:
+        _audit_writer = AuditLogWriter()
+        atexit.register(_audit_writer.stop)
+    return _audit_writer
@@ -1,3 +1,8 @@
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -14,6 +19,11 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "your-super-secret-key-here-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
+# bcrypt work factor for new hashes; existing hashes are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Password operations run in their own bounded pool so they never block the event loop
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", "64"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
@@ -48,7 +58,8 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         # Use bcrypt directly to avoid passlib issues
         import bcrypt
-        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+        safe = _truncate_for_bcrypt(plain_password)
+        return bcrypt.checkpw(safe.encode('utf-8'), hashed_password.encode('utf-8'))
     except Exception as e:
         print(f"Password verification error: {e}")
         return False
@@ -59,7 +70,7 @@ def get_password_hash(password: str) -> str:
         import bcrypt
         safe = _truncate_for_bcrypt(password)
         # bcrypt.hashpw returns bytes, decode to string for storage
-        hashed = bcrypt.hashpw(safe.encode('utf-8'), bcrypt.gensalt())
+        hashed = bcrypt.hashpw(safe.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
         return hashed.decode('utf-8')
     except Exception as e:
         print(f"Password hashing error: {e}")
@@ -67,6 +78,90 @@ def get_password_hash(password: str) -> str:
         safe = _truncate_for_bcrypt(password)
         return pwd_context.hash(safe)
 
+_BCRYPT_COST = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True when a stored bcrypt hash was made with a different work factor than BCRYPT_ROUNDS"""
+    match = _BCRYPT_COST.match(hashed_password or "")
+    return bool(match) and int(match.group(1)) != BCRYPT_ROUNDS
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many password operations are already waiting"""
+
+class PasswordHasherPool:
+    """Bounded thread pool for bcrypt (which releases the GIL while hashing).
+
+    At most ``max_pending`` operations are admitted (running + queued); beyond
+    that callers get ``PasswordPoolBusy`` instead of piling up behind a login
+    burst. ``stats()`` reports queue depth and wait/run times.
+    """
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+        self._max_queue_depth = 0
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordPoolBusy()
+            self._pending += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._pending - self._active)
+        submitted = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, submitted, func, *args
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _timed(self, submitted: float, func, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self._active += 1
+            self._wait_seconds += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._run_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self._completed or 1
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "active": self._active,
+                "queue_depth": self._pending - self._active,
+                "max_queue_depth": self._max_queue_depth,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_seconds / completed * 1000, 2),
+                "avg_run_ms": round(self._run_seconds / completed * 1000, 2),
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+            }
+
+password_pool = PasswordHasherPool()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_pool.run(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
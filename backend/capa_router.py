@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -13,10 +13,12 @@ from schemas import (
 from auth import get_current_user
 from crud import (
     create_capa, get_capas, get_capa_by_id, update_capa, delete_capa,
-    create_audit_log, get_department_manager_ids,
+    get_department_manager_ids,
     get_non_compliant_evaluation_items, create_capas_for_round_non_compliance
 )
-from notification_service import get_notification_service
+from notification_service import get_notification_service, notify_round_capas_created
+from audit_service import queue_audit_log
+from department_directory import department_filter
 
 router = APIRouter(prefix="/api/capas", tags=["CAPA"])
 
@@ -106,15 +108,8 @@ async def create_capa_endpoint(
         "sla_days": capa.sla_days,
     }
 
-    # Create CAPA in database with audit log
+    # Create CAPA in database (create_capa writes the audit entry in the same transaction)
     db_capa = create_capa(db, capa_data, current_user.id)
-    create_audit_log(db, {
-        "user_id": current_user.id,
-        "action": "create_capa",
-        "entity_type": "capa",
-        "entity_id": db_capa.id,
-        "new_values": json.dumps({"title": db_capa.title, "department": db_capa.department})
-    })
 
     # Send notifications
     try:
@@ -193,7 +188,7 @@ async def get_capas_endpoint(
     
     # Apply filters
     if department:
-        query = query.filter(Capa.department == department)
+        query = query.filter(department_filter(db, Capa.department_id, department))
     if status:
         query = query.filter(Capa.status == status)
     if severity:
@@ -236,6 +231,7 @@ async def get_round_non_compliant_items(
 @router.post("/rounds/{round_id}/create-capas", response_model=dict)
 async def create_capas_for_round_endpoint(
     round_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -246,6 +242,11 @@ async def create_capas_for_round_endpoint(
     result = create_capas_for_round_non_compliance(db, round_id, current_user.id)
     if not result.get('success'):
         raise HTTPException(status_code=500, detail=result.get('message') or 'Failed to create CAPAs')
+    if result.get('created_capas'):
+        background_tasks.add_task(
+            notify_round_capas_created, round_id, len(result['created_capas']), current_user.id,
+            f"{current_user.first_name} {current_user.last_name}"
+        )
     return result
 
 
@@ -284,22 +285,9 @@ async def update_capa_progress_endpoint(
         update_data['verification_status'] = verification_status
 
     # apply update
-    # Pass current_user.id so an audit log will be created inside update_capa
+    # Pass current_user.id so the audit entry is written inside update_capa's transaction
     updated = update_capa(db, capa_id, update_data, performed_by_id=current_user.id)
 
-    # audit
-    try:
-        create_audit_log(db, {
-            "user_id": current_user.id,
-            "action": "update_capa",
-            "entity_type": "capa",
-            "entity_id": capa_id,
-            "old_values": json.dumps({"status": existing.status, "verification_status": existing.verification_status}, ensure_ascii=False),
-            "new_values": json.dumps({"status": updated.status, "verification_status": updated.verification_status}, ensure_ascii=False)
-        })
-    except Exception as e:
-        print(f"⚠️ Warning: failed to create audit log for progress update: {e}")
-
     return {"status": "success", "message": "CAPA progress updated", "capa": serialize_json_fields(updated)}
 
 @router.patch("/{capa_id}", response_model=dict)
@@ -341,19 +329,19 @@ async def update_capa_endpoint(
         if value is not None:
             update_data[field] = value
     
-    # Update CAPA
-    updated_capa = update_capa(db, capa_id, update_data)
-    
-    # Create audit log
-    create_audit_log(db, {
+    # Queue the audit entry so it is committed together with the update
+    queue_audit_log(db, {
         "user_id": current_user.id,
         "action": "update_capa",
         "entity_type": "capa",
         "entity_id": capa_id,
-        "old_values": json.dumps({"title": existing_capa.title, "status": existing_capa.status}),
-        "new_values": json.dumps({"title": updated_capa.title, "status": updated_capa.status})
+        "old_values": {"title": existing_capa.title, "status": existing_capa.status},
+        "new_values": {"title": update_data.get("title", existing_capa.title), "status": update_data.get("status", existing_capa.status)}
     })
     
+    # Update CAPA
+    updated_capa = update_capa(db, capa_id, update_data)
+    
     return {
         "status": "success",
         "message": "CAPA plan updated successfully",
@@ -402,17 +390,17 @@ async def verify_capa_endpoint(
         update_data["status"] = CapaStatus.VERIFIED.value
         update_data["closed_at"] = datetime.utcnow()
     
-    updated_capa = update_capa(db, capa_id, update_data)
-    
-    # Create audit log
-    create_audit_log(db, {
+    # Queue the audit entry so it is committed together with the update
+    queue_audit_log(db, {
         "user_id": current_user.id,
         "action": "verify_capa",
         "entity_type": "capa",
         "entity_id": capa_id,
-        "new_values": json.dumps({"verification_status": "verified", "verified_at": datetime.utcnow().isoformat()})
+        "new_values": {"verification_status": "verified", "verified_at": update_data["verified_at"].isoformat()}
     })
     
+    updated_capa = update_capa(db, capa_id, update_data)
+    
     return {
         "status": "success",
         "message": "CAPA plan verified successfully",
@@ -438,18 +426,18 @@ async def delete_capa_endpoint(
     if not capa:
         raise HTTPException(status_code=404, detail="CAPA plan not found")
     
-    # Delete CAPA
-    deleted_capa = delete_capa(db, capa_id)
-    
-    # Create audit log
-    create_audit_log(db, {
+    # Queue the audit entry so it is committed together with the delete
+    queue_audit_log(db, {
         "user_id": current_user.id,
         "action": "delete_capa",
         "entity_type": "capa",
         "entity_id": capa_id,
-        "old_values": json.dumps({"title": deleted_capa.title, "department": deleted_capa.department})
+        "old_values": {"title": capa.title, "department": capa.department}
     })
     
+    # Delete CAPA
+    delete_capa(db, capa_id)
+    
     return {
         "status": "success",
         "message": "CAPA plan deleted successfully"
@@ -6,29 +6,40 @@ Handles daily checks for overdue CAPAs, escalation, and notifications
 import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
 from database import SessionLocal
 from models_updated import Capa, User, VerificationStatus
-from crud import create_audit_log, get_users_with_notification_preference
+from crud import get_users_with_notification_preference
+from department_directory import department_directory
+from audit_service import queue_audit_log
 from notification_service import get_notification_service
-from email_service import send_email
+from email_service import email_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class CapaScheduler:
-    def __init__(self):
-        self.db = SessionLocal()
+    """CAPA maintenance tasks on ``db``, or on a session of its own (closed by close() / the with block)"""
+
+    def __init__(self, db: Optional[Session] = None):
+        self._owns_session = db is None
+        self.db = db if db is not None else SessionLocal()
         self.notification_service = get_notification_service(self.db)
     
-    def __del__(self):
-        if hasattr(self, 'db'):
+    def close(self):
+        if self._owns_session:
             self.db.close()
     
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def check_overdue_capas(self) -> List[Dict[str, Any]]:
         """
         Check for CAPAs that are overdue and need escalation
@@ -67,18 +78,16 @@ class CapaScheduler:
             # Increment escalation level (max 3)
             new_escalation_level = min(capa.escalation_level + 1, 3)
             
-            # Update CAPA
+            # Update CAPA; the audit entry is committed in the same transaction
             capa.escalation_level = new_escalation_level
-            self.db.commit()
-            
-            # Create audit log
-            create_audit_log(self.db, {
+            queue_audit_log(self.db, {
                 "user_id": 1,  # System user
                 "action": "escalate_capa",
                 "entity_type": "capa",
                 "entity_id": capa_id,
-                "new_values": f'{{"escalation_level": {new_escalation_level}, "days_overdue": {days_overdue}}}'
+                "new_values": {"escalation_level": new_escalation_level, "days_overdue": days_overdue}
             })
+            self.db.commit()
             
             # Send notifications
             self._send_escalation_notifications(capa, new_escalation_level, days_overdue)
@@ -97,8 +106,7 @@ class CapaScheduler:
         """
         try:
             # Get department managers
-            from crud import get_department_manager_ids
-            manager_ids = get_department_manager_ids(self.db, capa.department)
+            manager_ids = department_directory.manager_ids(self.db, capa.department_id or capa.department)
             
             # Get quality managers and super admins
             quality_managers = self.db.query(User).filter(
@@ -147,10 +155,14 @@ class CapaScheduler:
             for user in email_users:
                 if user.id in recipient_ids:
                     try:
-                        send_email(
+                        email_service.send_notification_email(
                             to_email=user.email,
-                            subject=f"تحذير تصعيد خطة التصحيح - {capa.title}",
-                            body=message
+                            to_name=f"{user.first_name} {user.last_name}",
+                            title=f"تحذير تصعيد خطة التصحيح - {capa.title}",
+                            message=message,
+                            notification_type="capa_escalation",
+                            entity_type="capa",
+                            entity_id=capa.id
                         )
                     except Exception as e:
                         logger.error(f"Failed to send email to {user.email}: {e}")
@@ -197,8 +209,7 @@ class CapaScheduler:
                         reminders_sent += 1
                     
                     # Send reminder to department managers
-                    from crud import get_department_manager_ids
-                    manager_ids = get_department_manager_ids(self.db, capa.department)
+                    manager_ids = department_directory.manager_ids(self.db, capa.department_id or capa.department)
                     
                     for manager_id in manager_ids:
                         if manager_id != capa.assigned_to_id:  # Don't duplicate
@@ -365,24 +376,22 @@ class CapaScheduler:
         except Exception as e:
             logger.error(f"Error running daily CAPA tasks: {e}")
             return {"error": str(e)}
-        finally:
-            self.db.close()
 
 # Standalone functions for external use
 def run_daily_capa_tasks():
-    """Run daily CAPA tasks - can be called from cron or scheduler"""
-    scheduler = CapaScheduler()
-    return scheduler.run_daily_tasks()
+    """Run daily CAPA tasks directly; the job scheduler runs them as the capa_daily job"""
+    with CapaScheduler() as scheduler:
+        return scheduler.run_daily_tasks()
 
 def check_and_escalate_overdue_capas():
     """Check and escalate overdue CAPAs"""
-    scheduler = CapaScheduler()
-    overdue_capas = scheduler.check_overdue_capas()
-    
-    escalated_count = 0
-    for overdue_capa in overdue_capas:
-        if scheduler.escalate_capa(overdue_capa['capa_id'], overdue_capa['days_overdue']):
-            escalated_count += 1
+    with CapaScheduler() as scheduler:
+        overdue_capas = scheduler.check_overdue_capas()
+        
+        escalated_count = 0
+        for overdue_capa in overdue_capas:
+            if scheduler.escalate_capa(overdue_capa['capa_id'], overdue_capa['days_overdue']):
+                escalated_count += 1
     
     return {
         "overdue_capas": len(overdue_capas),
@@ -391,13 +400,13 @@ def check_and_escalate_overdue_capas():
 
 def update_capa_status_history(capa_id: int, user_id: int, from_status: str, to_status: str, note: str = None):
     """Update CAPA status history"""
-    scheduler = CapaScheduler()
-    return scheduler.update_status_history(capa_id, user_id, from_status, to_status, note)
+    with CapaScheduler() as scheduler:
+        return scheduler.update_status_history(capa_id, user_id, from_status, to_status, note)
 
 def auto_create_capa_on_noncompliant(evaluation_result_id: int, risk_level: int):
     """Auto-create CAPA for non-compliant evaluation result"""
-    scheduler = CapaScheduler()
-    return scheduler.auto_create_capa_on_noncompliant(evaluation_result_id, risk_level)
+    with CapaScheduler() as scheduler:
+        return scheduler.auto_create_capa_on_noncompliant(evaluation_result_id, risk_level)
 
 if __name__ == "__main__":
     # Run daily tasks when script is executed directly
@@ -2,6 +2,10 @@
 """
 CAPA Scheduler Cron Job
 Runs daily to check for overdue CAPAs, send reminders, and handle escalations
+
+The API workers run this as the capa_daily job (job_scheduler.py); use this
+script only where ENABLE_BACKGROUND_JOBS=0. It takes the job's slot, so it
+never overlaps a run started by a worker.
 """
 
 import os
@@ -31,16 +35,15 @@ def main():
     try:
         logger.info("Starting CAPA scheduler cron job")
         
-        # Import and run the scheduler
-        from capa_scheduler import run_daily_capa_tasks
+        # Run the job through the scheduler (concurrency limit, run history)
+        from job_scheduler import job_scheduler
         
-        # Run daily tasks
-        result = run_daily_capa_tasks()
+        result = job_scheduler.run_job("capa_daily", source="cron")
         
-        logger.info(f"CAPA scheduler completed successfully: {result}")
+        logger.info(f"CAPA scheduler finished: {result}")
         
-        # Exit with success code
-        sys.exit(0)
+        # Exit with success code unless the run failed
+        sys.exit(1 if result["status"] in ("failed", "timeout") else 0)
         
     except Exception as e:
         logger.error(f"CAPA scheduler failed: {e}", exc_info=True)
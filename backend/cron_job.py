@@ -1,30 +1,21 @@
 import os
 import sys
 from datetime import datetime
-from sqlalchemy.orm import Session
-from database import get_db
 
 # Add the backend directory to the Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from reminder_service import get_reminder_service
+from job_scheduler import job_scheduler
 
 def run_reminders():
-    """Run reminder checks"""
+    """Run reminder checks (the deadline_reminders job; API workers run it daily when ENABLE_BACKGROUND_JOBS=1)"""
     print(f"Running reminders at {datetime.now()}")
     
-    # Get database session
-    db = next(get_db())
-    
-    try:
-        reminder_service = get_reminder_service(db)
-        reminder_service.check_round_deadlines()
-        reminder_service.check_capa_deadlines()
-        print("Reminders completed successfully")
-    except Exception as e:
-        print(f"Error running reminders: {str(e)}")
-    finally:
-        db.close()
+    result = job_scheduler.run_job("deadline_reminders", source="cron")
+    if result.get("error"):
+        print(f"Error running reminders: {result['error']}")
+    else:
+        print(f"Reminders {result['status']}")
 
 if __name__ == "__main__":
     run_reminders()
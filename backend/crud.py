@@ -1,12 +1,21 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, text
-from typing import List, Optional
-from datetime import datetime
-from models_updated import User, Round, Capa, Department, EvaluationResult, Notification, UserNotificationSettings, NotificationType, NotificationStatus, RoundTypeSettings, CapaStatus, VerificationStatus
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, case, or_, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from models_updated import User, Round, Capa, Department, DepartmentManager, EvaluationResult, Notification, UserNotificationSettings, NotificationType, NotificationStatus, RoundTypeSettings, CapaStatus, VerificationStatus, RoundStatus, round_code_seq
 from schemas import UserCreate, RoundCreate, CapaCreate, DepartmentCreate
+from audit_service import queue_audit_log, build_audit_log_row, get_audit_writer
+from realtime import broker
+from observability import metrics
+from department_directory import department_directory, department_filter
+from evidence_store import store_inline_evidence, usable_evidence_ids
+from partition_maintenance import retention_start
 # from auth import get_password_hash
 import json
-import uuid
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Import evaluation models if they exist
 try:
@@ -15,7 +24,7 @@ try:
 except ImportError:
     EVALUATION_MODELS_AVAILABLE = False
 except Exception as e:
-    print(f"Warning: Could not import evaluation models: {e}")
+    logger.warning("Could not import evaluation models: %s", e)
     EVALUATION_MODELS_AVAILABLE = False
 
 # User CRUD operations
@@ -54,9 +63,9 @@ def update_user_data(db: Session, user_id: int, user, hashed_password: str):
     if not db_user:
         return None
     
-    print(f"🔍 CRUD - Updating user {user_id}")
-    print(f"🔍 CRUD - User data type: {type(user)}")
-    print(f"🔍 CRUD - User data: {user}")
+    logger.debug("CRUD - Updating user %s", user_id)
+    logger.debug("CRUD - User data type: %s", type(user))
+    logger.debug("CRUD - User data: %s", user)
     
     # Update user fields only if provided
     if isinstance(user, dict):
@@ -78,10 +87,10 @@ def update_user_data(db: Session, user_id: int, user, hashed_password: str):
         if 'position' in user and user['position'] is not None:
             db_user.position = user.position
         if 'photo_url' in user and user['photo_url'] is not None:
-            print(f"🔍 CRUD - Setting photo_url to: {user['photo_url']}")
+            logger.debug("CRUD - Setting photo_url to: %s", user['photo_url'])
             db_user.photo_url = user['photo_url']
         else:
-            print(f"🔍 CRUD - No photo_url in user data or it's None")
+            logger.debug("CRUD - No photo_url in user data or it's None")
     else:
         # Handle object input
         if hasattr(user, 'username') and user.username is not None:
@@ -149,39 +158,57 @@ def delete_user_data(db: Session, user_id: int):
     return db_user
 
 # Round CRUD operations
-def create_round(db: Session, round: RoundCreate, created_by_id: int):
-    # Generate unique round code if not provided
-    if round.round_code:
-        round_code = round.round_code
-    else:
-        # Generate unique round code
-        while True:
-            round_code = f"RND-{uuid.uuid4().hex[:8].upper()}"
-            # Check if code already exists
-            existing = db.query(Round).filter(Round.round_code == round_code).first()
-            if not existing:
-                break
-    
-    # Handle assigned_to - it can be either user IDs or user names
-    if round.assigned_to:
-        if isinstance(round.assigned_to, list):
-            # Check if first item is a number (user ID) or string (user name)
-            if round.assigned_to and str(round.assigned_to[0]).isdigit():
-                # Convert user IDs to user names
-                assigned_to_names = []
-                for user_id in round.assigned_to:
-                    user = get_user_by_id(db, int(user_id))
-                    if user:
-                        assigned_to_names.append(f"{user.first_name} {user.last_name}")
-                assigned_to_json = json.dumps(assigned_to_names)
-            else:
-                # Already user names
-                assigned_to_json = json.dumps(round.assigned_to)
+def next_round_code(db: Session) -> str:
+    """Unique round code from round_code_seq (no lookup-and-retry loop)"""
+    number = db.execute(select(round_code_seq.next_value())).scalar()
+    return f"RND-{datetime.now().year}-{number:06d}"
+
+def resolve_round_assignees(db: Session, assigned_to) -> Tuple[List[int], List[str]]:
+    """Resolve assigned_to (user IDs and/or "first last" names) to user IDs and display names.
+
+    All references are resolved with a single IN query; order is preserved and
+    duplicates dropped. Unknown IDs are skipped, unknown names are kept for display.
+    """
+    if not assigned_to:
+        return [], []
+    refs = [str(ref).strip() for ref in (assigned_to if isinstance(assigned_to, list) else [assigned_to])]
+    refs = [ref for ref in refs if ref]
+    ref_ids = [int(ref) for ref in refs if ref.isdigit()]
+    ref_names = [ref for ref in refs if not ref.isdigit()]
+
+    full_name = func.concat(User.first_name, ' ', User.last_name)
+    conditions = []
+    if ref_ids:
+        conditions.append(User.id.in_(ref_ids))
+    if ref_names:
+        conditions.append(full_name.in_(ref_names))
+    rows = db.query(User.id, full_name).filter(or_(*conditions)).all() if conditions else []
+    name_by_id = {user_id: name for user_id, name in rows}
+    id_by_name = {}
+    for user_id, name in rows:
+        id_by_name.setdefault(name, user_id)
+
+    ids, names = [], []
+    for ref in refs:
+        if ref.isdigit():
+            user_id, name = int(ref), name_by_id.get(int(ref))
+            if name is None:
+                continue
         else:
-            # Single value
-            assigned_to_json = json.dumps([round.assigned_to])
-    else:
-        assigned_to_json = json.dumps([])
+            user_id, name = id_by_name.get(ref), ref
+        if name in names:
+            continue
+        names.append(name)
+        if user_id is not None and user_id not in ids:
+            ids.append(user_id)
+    return ids, names
+
+def create_round(db: Session, round: RoundCreate, created_by_id: int):
+    round_code = round.round_code or next_round_code(db)
+    
+    # assigned_to may hold user IDs or user names; keep both the IDs and the display names
+    assigned_to_ids_list, assigned_to_names = resolve_round_assignees(db, round.assigned_to)
+    assigned_to_json = json.dumps(assigned_to_names)
     
     # Convert string dates to datetime if needed
     deadline_dt = None
@@ -198,17 +225,6 @@ def create_round(db: Session, round: RoundCreate, created_by_id: int):
         else:
             end_date_dt = round.end_date
     
-    # Handle assigned_to_ids - now using JSONB, store as Python list
-    assigned_to_ids_list = []
-    if round.assigned_to and isinstance(round.assigned_to, list):
-        try:
-            # Convert to integers only if items are numeric
-            assigned_to_ids_list = [int(x) for x in round.assigned_to if str(x).isdigit()]
-            print(f"✅ Parsed assigned_to_ids: {assigned_to_ids_list}")
-        except Exception as e:
-            print(f"⚠️ Warning: Could not convert assigned_to to IDs: {e}")
-            assigned_to_ids_list = []
-    
     # Handle selected_categories - now using JSONB, store as Python list
     selected_categories_list = []
     try:
@@ -218,7 +234,7 @@ def create_round(db: Session, round: RoundCreate, created_by_id: int):
         elif isinstance(raw_selected, list):
             # Validate all items are integers
             selected_categories_list = [int(x) for x in raw_selected if isinstance(x, (int, str)) and str(x).isdigit()]
-            print(f"✅ Parsed selected_categories: {selected_categories_list}")
+            logger.debug("Parsed selected_categories: %s", selected_categories_list)
         elif isinstance(raw_selected, str):
             # if stored as JSON string like '[]' parse it
             try:
@@ -228,14 +244,14 @@ def create_round(db: Session, round: RoundCreate, created_by_id: int):
                 else:
                     selected_categories_list = []
             except json.JSONDecodeError:
-                print(f"⚠️ Warning: Could not parse selected_categories as JSON: {raw_selected}")
+                logger.warning("Could not parse selected_categories as JSON: %s", raw_selected)
                 selected_categories_list = []
         else:
             # unknown type - coerce to empty list
-            print(f"⚠️ Warning: selected_categories has unexpected type: {type(raw_selected)}")
+            logger.warning("selected_categories has unexpected type: %s", type(raw_selected))
             selected_categories_list = []
     except Exception as e:
-        print(f"⚠️ Warning parsing selected_categories: {e}")
+        logger.warning("Warning parsing selected_categories: %s", e)
         selected_categories_list = []
     
     # Handle evaluation_items - now using JSONB, store as Python list
@@ -244,12 +260,12 @@ def create_round(db: Session, round: RoundCreate, created_by_id: int):
         try:
             if isinstance(round.evaluation_items, list):
                 evaluation_items_list = [int(x) for x in round.evaluation_items if isinstance(x, (int, str)) and str(x).isdigit()]
-                print(f"✅ Parsed evaluation_items: {evaluation_items_list}")
+                logger.debug("Parsed evaluation_items: %s", evaluation_items_list)
             else:
-                print(f"⚠️ Warning: evaluation_items has unexpected type: {type(round.evaluation_items)}")
+                logger.warning("evaluation_items has unexpected type: %s", type(round.evaluation_items))
                 evaluation_items_list = []
         except Exception as e:
-            print(f"⚠️ Warning parsing evaluation_items: {e}")
+            logger.warning("Warning parsing evaluation_items: %s", e)
             evaluation_items_list = []
     
     db_round = Round(
@@ -274,20 +290,67 @@ def create_round(db: Session, round: RoundCreate, created_by_id: int):
     db.refresh(db_round)
     return db_round
 
+def create_rounds_bulk(db: Session, template: dict, departments: List[str], occurrences: List[datetime], created_by_id: int) -> Tuple[List[Tuple[int, str]], List[int]]:
+    """Create one round per (occurrence, department) from a template in a single transaction.
+
+    Assignees are resolved once, round codes are drawn from round_code_seq in one
+    query and all rows go in one multi-row INSERT ... RETURNING.
+    Returns the (id, round_code) pairs and the resolved assessor IDs.
+    """
+    plan = [(when, department) for when in occurrences for department in departments]
+    if not plan:
+        return [], []
+    
+    assigned_ids, assigned_names = resolve_round_assignees(db, template.get("assigned_to"))
+    assigned_to_json = json.dumps(assigned_names)
+    numbers = db.execute(
+        select(round_code_seq.next_value()).select_from(func.generate_series(1, len(plan)))
+    ).scalars().all()
+    deadline_days = template.get("deadline_days")
+    
+    rows = []
+    for number, (when, department) in zip(numbers, plan):
+        deadline = when + timedelta(days=deadline_days) if deadline_days else None
+        rows.append({
+            "round_code": f"RND-{when.year}-{number:06d}",
+            "title": template["title"].replace("{department}", department).replace("{date}", when.strftime("%Y-%m-%d")),
+            "description": template.get("description"),
+            "round_type": template["round_type"],
+            "department": department,
+            "assigned_to": assigned_to_json,
+            "assigned_to_ids": assigned_ids,
+            "scheduled_date": when,
+            "deadline": deadline,
+            "end_date": deadline,
+            "status": RoundStatus.SCHEDULED,
+            "priority": template.get("priority") or "medium",
+            "notes": template.get("notes"),
+            "created_by_id": created_by_id,
+            "evaluation_items": [int(x) for x in template.get("evaluation_items") or []],
+            "selected_categories": [int(x) for x in template.get("selected_categories") or []],
+        })
+    try:
+        created = db.execute(insert(Round).returning(Round.id, Round.round_code), rows).all()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return [(row.id, row.round_code) for row in created], assigned_ids
+
 def get_rounds(db: Session, skip: int = 0, limit: int = 100):
     try:
-        print(f"🔍 [CRUD] Getting rounds from database (skip={skip}, limit={limit})")
+        logger.debug("[CRUD] Getting rounds from database (skip=%s, limit=%s)", skip, limit)
         
         # Test connection first
         db.execute(text("SELECT 1"))
         
         # Get rounds
         rounds = db.query(Round).offset(skip).limit(limit).all()
-        print(f"✅ [CRUD] Retrieved {len(rounds)} rounds")
+        logger.debug("[CRUD] Retrieved %s rounds", len(rounds))
         
         return rounds
     except Exception as e:
-        print(f"❌ [CRUD] Error getting rounds: {e}")
+        logger.error("[CRUD] Error getting rounds: %s", e)
         import traceback
         traceback.print_exc()
         raise
@@ -318,9 +381,9 @@ def update_round(db: Session, round_id: int, round_data: dict):
             try:
                 numeric_ids = [int(x) for x in round_data['assigned_to'] if isinstance(x, (int, str)) and str(x).isdigit()]
                 db_round.assigned_to_ids = numeric_ids  # Store as Python list (JSONB)
-                print(f"✅ Updated assigned_to_ids: {numeric_ids}")
+                logger.debug("Updated assigned_to_ids: %s", numeric_ids)
             except Exception as e:
-                print(f"⚠️ Warning updating assigned_to_ids: {e}")
+                logger.warning("Warning updating assigned_to_ids: %s", e)
                 db_round.assigned_to_ids = []
         else:
             db_round.assigned_to = round_data['assigned_to']
@@ -336,9 +399,9 @@ def update_round(db: Session, round_id: int, round_data: dict):
         if isinstance(round_data['evaluation_items'], list):
             validated_items = [int(x) for x in round_data['evaluation_items'] if isinstance(x, (int, str)) and str(x).isdigit()]
             db_round.evaluation_items = validated_items
-            print(f"✅ Updated evaluation_items: {validated_items}")
+            logger.debug("Updated evaluation_items: %s", validated_items)
         else:
-            print(f"⚠️ Warning: evaluation_items is not a list, setting to empty")
+            logger.warning("evaluation_items is not a list, setting to empty")
             db_round.evaluation_items = []
     # Persist selected categories if provided
     if 'selected_categories' in round_data and round_data['selected_categories'] is not None:
@@ -346,9 +409,9 @@ def update_round(db: Session, round_id: int, round_data: dict):
         if isinstance(round_data['selected_categories'], list):
             validated_categories = [int(x) for x in round_data['selected_categories'] if isinstance(x, (int, str)) and str(x).isdigit()]
             db_round.selected_categories = validated_categories
-            print(f"✅ Updated selected_categories: {validated_categories}")
+            logger.debug("Updated selected_categories: %s", validated_categories)
         else:
-            print(f"⚠️ Warning: selected_categories is not a list, setting to empty")
+            logger.warning("selected_categories is not a list, setting to empty")
             db_round.selected_categories = []
     
     db.commit()
@@ -369,8 +432,8 @@ def delete_round(db: Session, round_id: int):
     db.commit()
     return db_round
 
-def get_rounds_by_department(db: Session, department: str):
-    return db.query(Round).filter(Round.department == department).all()
+def get_rounds_by_department(db: Session, department):
+    return db.query(Round).filter(department_filter(db, Round.department_id, department)).all()
 
 def get_rounds_by_status(db: Session, status: str):
     return db.query(Round).filter(Round.status == status).all()
@@ -378,16 +441,16 @@ def get_rounds_by_status(db: Session, status: str):
 def get_rounds_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Get rounds assigned to a specific user using JSONB assigned_to_ids"""
     
-    print(f"🔍 Getting rounds for user ID: {user_id}")
+    logger.debug("Getting rounds for user ID: %s", user_id)
     
     try:
         # Check if user exists
         user = get_user_by_id(db, user_id)
         if not user:
-            print(f"❌ User with ID {user_id} not found")
+            logger.warning("User with ID %s not found", user_id)
             return []
         
-        print(f"👤 User: {user.first_name} {user.last_name} (ID: {user_id})")
+        logger.debug("User: %s %s (ID: %s)", user.first_name, user.last_name, user_id)
         
         # Query rounds where assigned_to_ids JSONB array contains the user_id
         # Using PostgreSQL JSONB operators: @> checks if left JSONB contains right JSONB
@@ -395,12 +458,12 @@ def get_rounds_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 10
             text(f"assigned_to_ids @> '[{user_id}]'::jsonb")
         ).offset(skip).limit(limit).all()
         
-        print(f"🎯 Found {len(user_rounds)} rounds assigned to user ID {user_id}")
+        logger.debug("Found %s rounds assigned to user ID %s", len(user_rounds), user_id)
         
         return user_rounds
         
     except Exception as e:
-        print(f"❌ Error in get_rounds_by_user: {e}")
+        logger.error("Error in get_rounds_by_user: %s", e)
         import traceback
         traceback.print_exc()
         return []
@@ -429,69 +492,36 @@ def get_rounds_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 10
             old_status = round.status
             round.status = calculated_status
             updated_count += 1
-            print(f"  🔄 Updated round {round.id} status: {old_status} → {calculated_status}")
+            logger.debug("Updated round %s status: %s → %s", round.id, old_status, calculated_status)
         
-        print(f"  ✓ Round {round.id}: {round.title} - Status: {round.status} - assigned_to_ids: {round.assigned_to_ids}")
+        logger.debug("Round %s: %s - Status: %s - assigned_to_ids: %s", round.id, round.title, round.status, round.assigned_to_ids)
     
     # حفظ التغييرات إذا كانت هناك تحديثات
     if updated_count > 0:
         try:
             db.commit()
-            print(f"✅ Updated {updated_count} round statuses")
+            logger.debug("Updated %s round statuses", updated_count)
         except Exception as e:
             db.rollback()
-            print(f"⚠️ Error updating round statuses: {e}")
+            logger.warning("Error updating round statuses: %s", e)
     
     return user_rounds
 
 # CAPA CRUD operations
-def get_department_managers(db: Session, department_name: str):
-    """Get department managers by department name"""
+def get_department_managers(db: Session, department):
+    """Get department manager labels ("First Last (username)") by department name or id"""
     try:
-        department = db.query(Department).filter(Department.name == department_name).first()
-        if not department or not department.managers:
-            return []
-        
-        # Parse managers JSON string to get user IDs
-        import json
-        manager_ids = json.loads(department.managers) if isinstance(department.managers, str) else department.managers
-        
-        # Get user names for these IDs
-        managers = []
-        for user_id in manager_ids:
-            user = db.query(User).filter(User.id == user_id).first()
-            if user:
-                full_name = f"{user.first_name} {user.last_name}".strip()
-                managers.append(f"{full_name} ({user.username})")
-        
-        return managers
+        return department_directory.manager_labels(db, department)
     except Exception as e:
-        print(f"Error getting department managers: {e}")
+        logger.error("Error getting department managers: %s", e)
         return []
 
-def get_department_manager_ids(db: Session, department_name: str):
-    """Get department manager user IDs by department name"""
+def get_department_manager_ids(db: Session, department):
+    """Get department manager user IDs by department name or id"""
     try:
-        department = db.query(Department).filter(Department.name == department_name).first()
-        if not department or not department.managers:
-            return []
-        
-        # Parse managers JSON string to get user IDs
-        import json
-        manager_ids = json.loads(department.managers) if isinstance(department.managers, str) else department.managers
-        
-        # Validate that all manager IDs exist in the users table
-        valid_manager_ids = []
-        for manager_id in manager_ids:
-            user = db.query(User).filter(User.id == manager_id).first()
-            if user:
-                valid_manager_ids.append(manager_id)
-            else:
-                print(f"⚠️ Warning: Manager ID {manager_id} for department '{department_name}' does not exist in users table, skipping")
-        
-        return valid_manager_ids
+        return department_directory.manager_ids(db, department)
     except Exception as e:
-        print(f"Error getting department manager IDs: {e}")
+        logger.error("Error getting department manager IDs: %s", e)
         return []
 
 def create_capa(db: Session, capa_data: dict, created_by_id: int):
@@ -568,6 +598,15 @@ def create_capa(db: Session, capa_data: dict, created_by_id: int):
         escalation_level=0
     )
     db.add(db_capa)
+    db.flush()
+    # Audit entry is written in the same transaction as the CAPA itself
+    queue_audit_log(db, {
+        "user_id": created_by_id,
+        "action": "create_capa",
+        "entity_type": "capa",
+        "entity_id": db_capa.id,
+        "new_values": {"title": db_capa.title, "department": db_capa.department}
+    })
     db.commit()
     db.refresh(db_capa)
     
@@ -637,9 +676,9 @@ def create_capa(db: Session, capa_data: dict, created_by_id: int):
                 db.add(db_action)
         
         db.commit()
-        print(f"✅ Added actions to capa_actions table for CAPA {db_capa.id}")
+        logger.debug("Added actions to capa_actions table for CAPA %s", db_capa.id)
     except Exception as e:
-        print(f"⚠️ Failed to add actions to capa_actions table: {e}")
+        logger.warning("Failed to add actions to capa_actions table: %s", e)
     
     # Send notifications to department managers
     try:
@@ -651,7 +690,7 @@ def create_capa(db: Session, capa_data: dict, created_by_id: int):
         created_by_name = f"{creator.first_name} {creator.last_name}" if creator else "مستخدم غير معروف"
         
         # Get department managers user IDs for notifications
-        manager_ids = get_department_manager_ids(db, department)
+        manager_ids = get_department_manager_ids(db, db_capa.department_id or department)
         
         if manager_ids:
             # Send notification to each manager
@@ -664,25 +703,13 @@ def create_capa(db: Session, capa_data: dict, created_by_id: int):
                     assigned_user_id=manager_id,
                     created_by_name=created_by_name
                 )
-                print(f"📧 Sent CAPA notification to manager ID: {manager_id}")
+                logger.debug("Sent CAPA notification to manager ID: %s", manager_id)
         else:
-            print(f"⚠️ No managers found for department: {department}")
+            logger.warning("No managers found for department: %s", department)
         
     except Exception as e:
-        print(f"⚠️ Failed to send CAPA notifications: {e}")
+        logger.warning("Failed to send CAPA notifications: %s", e)
     
-    # Create an audit log entry for CAPA creation
-    try:
-        create_audit_log(db, {
-            "user_id": created_by_id,
-            "action": "create_capa",
-            "entity_type": "capa",
-            "entity_id": db_capa.id,
-            "new_values": json.dumps({"title": db_capa.title, "department": db_capa.department}, ensure_ascii=False)
-        })
-    except Exception as e:
-        print(f"⚠️ Warning: failed to create audit log for CAPA: {e}")
-
     return db_capa
 
 def get_capas(db: Session, skip: int = 0, limit: int = 100):
@@ -732,7 +759,7 @@ def get_capas(db: Session, skip: int = 0, limit: int = 100):
         return filtered_capas
         
     except Exception as e:
-        print(f"Error filtering CAPAs by evaluation results: {e}")
+        logger.error("Error filtering CAPAs by evaluation results: %s", e)
         # Fallback: return all CAPAs on error
         return db.query(Capa).options(
             joinedload(Capa.assigned_manager),
@@ -746,86 +773,100 @@ def get_all_capas_unfiltered(db: Session, skip: int = 0, limit: int = 100):
         joinedload(Capa.creator)
     ).offset(skip).limit(limit).all()
 
-def get_capa_by_id(db: Session, capa_id: int):
-    """Get a CAPA by ID with evaluation item details and actions from capa_actions table"""
-    capa = db.query(Capa).options(
+def _serialize_capa_action(action) -> dict:
+    """Convert a CapaAction row to the dict shape used by the CAPA detail views"""
+    action_dict = {
+        'id': action.id,
+        'task': action.task,
+        'due_date': action.due_date.isoformat() if action.due_date else None,
+        'assigned_to': action.assigned_to,
+        'assigned_to_id': action.assigned_to_id,
+        'notes': action.notes,
+        'status': action.status,
+        'completed_at': action.completed_at.isoformat() if action.completed_at else None,
+        'completed_by_id': action.completed_by_id
+    }
+    if action.action_type == 'verification':
+        action_dict['step'] = action.task  # For compatibility
+        action_dict['required'] = action.required
+        action_dict['completed'] = action.status == 'completed'
+    return action_dict
+
+def _attach_capa_details(capa: Capa):
+    """Attach evaluation item details, grouped actions and progress to an already-loaded CAPA.
+
+    Expects ``capa.evaluation_item`` and ``capa.actions`` to be eager loaded so
+    that no additional queries are issued here.
+    """
+    evaluation_item = capa.evaluation_item if capa.evaluation_item_id else None
+    capa.evaluation_item_title = evaluation_item.title if evaluation_item else None
+    capa.evaluation_item_code = evaluation_item.code if evaluation_item else None
+    capa.evaluation_item_category = evaluation_item.category_name if evaluation_item else None
+
+    # Group actions by type
+    corrective = []
+    preventive = []
+    verification = []
+    completed = 0
+    for action in capa.actions:
+        action_dict = _serialize_capa_action(action)
+        if action.action_type == 'corrective':
+            corrective.append(action_dict)
+        elif action.action_type == 'preventive':
+            preventive.append(action_dict)
+        elif action.action_type == 'verification':
+            verification.append(action_dict)
+        if action.status == 'completed':
+            completed += 1
+
+    # Override JSON fields with table data if actions found
+    if corrective or preventive or verification:
+        capa.corrective_actions_from_table = corrective
+        capa.preventive_actions_from_table = preventive
+        capa.verification_steps_from_table = verification
+
+    total = len(capa.actions)
+    capa.actions_progress = {
+        'total': total,
+        'completed': completed,
+        'percentage': round(completed / total * 100) if total > 0 else 0
+    }
+    return capa
+
+def _capa_details_query(db: Session):
+    """CAPA query that eager loads everything the detail views need.
+
+    Manager, creator and evaluation item come in through one joined SELECT and
+    the actions through a single ``IN`` SELECT, regardless of how many CAPAs
+    are loaded.
+    """
+    return db.query(Capa).options(
         joinedload(Capa.assigned_manager),
-        joinedload(Capa.creator)
-    ).filter(Capa.id == capa_id).first()
-    
+        joinedload(Capa.creator),
+        joinedload(Capa.evaluation_item),
+        selectinload(Capa.actions)
+    )
+
+def get_capa_by_id(db: Session, capa_id: int):
+    """Get a CAPA by ID with evaluation item details, actions from capa_actions table and progress"""
+    capa = _capa_details_query(db).filter(Capa.id == capa_id).first()
     if not capa:
         return None
-    
-    # Add evaluation item details if available
-    if capa.evaluation_item_id and EVALUATION_MODELS_AVAILABLE:
-        try:
-            from models_updated import EvaluationItem
-            evaluation_item = db.query(EvaluationItem).filter(EvaluationItem.id == capa.evaluation_item_id).first()
-            if evaluation_item:
-                # Add evaluation item details to the capa object
-                capa.evaluation_item_title = evaluation_item.title
-                capa.evaluation_item_code = evaluation_item.code
-                capa.evaluation_item_category = evaluation_item.category_name
-            else:
-                capa.evaluation_item_title = None
-                capa.evaluation_item_code = None
-                capa.evaluation_item_category = None
-        except Exception as e:
-            print(f"Error loading evaluation item details: {e}")
-            capa.evaluation_item_title = None
-            capa.evaluation_item_code = None
-            capa.evaluation_item_category = None
-    else:
-        capa.evaluation_item_title = None
-        capa.evaluation_item_code = None
-        capa.evaluation_item_category = None
-    
-    # Load actions from capa_actions table (preferred over JSON)
-    try:
-        from models_updated import CapaAction
-        actions = db.query(CapaAction).filter(CapaAction.capa_id == capa_id).all()
-        
-        # Group actions by type
-        corrective = []
-        preventive = []
-        verification = []
-        
-        for action in actions:
-            action_dict = {
-                'id': action.id,
-                'task': action.task,
-                'due_date': action.due_date.isoformat() if action.due_date else None,
-                'assigned_to': action.assigned_to,
-                'assigned_to_id': action.assigned_to_id,
-                'notes': action.notes,
-                'status': action.status,
-                'completed_at': action.completed_at.isoformat() if action.completed_at else None,
-                'completed_by_id': action.completed_by_id
-            }
-            
-            if action.action_type == 'corrective':
-                corrective.append(action_dict)
-            elif action.action_type == 'preventive':
-                preventive.append(action_dict)
-            elif action.action_type == 'verification':
-                action_dict['step'] = action.task  # For compatibility
-                action_dict['required'] = action.required
-                action_dict['completed'] = action.status == 'completed'
-                verification.append(action_dict)
-        
-        # Override JSON fields with table data if actions found
-        if corrective or preventive or verification:
-            capa.corrective_actions_from_table = corrective
-            capa.preventive_actions_from_table = preventive
-            capa.verification_steps_from_table = verification
-        
-    except Exception as e:
-        print(f"⚠️ Error loading actions from capa_actions table: {e}")
-    
-    return capa
+    return _attach_capa_details(capa)
+
+def get_capas_by_ids(db: Session, capa_ids: List[int]):
+    """Batch variant of get_capa_by_id for list/kanban views.
+
+    Returns the CAPAs in the order of ``capa_ids``; unknown IDs are skipped.
+    """
+    if not capa_ids:
+        return []
+    capas = _capa_details_query(db).filter(Capa.id.in_(set(capa_ids))).all()
+    by_id = {capa.id: _attach_capa_details(capa) for capa in capas}
+    return [by_id[capa_id] for capa_id in dict.fromkeys(capa_ids) if capa_id in by_id]
 
-def get_capas_by_department(db: Session, department: str):
-    return db.query(Capa).filter(Capa.department == department).all()
+def get_capas_by_department(db: Session, department):
+    return db.query(Capa).filter(department_filter(db, Capa.department_id, department)).all()
 
 def get_capas_by_status(db: Session, status: str):
     return db.query(Capa).filter(Capa.status == status).all()
@@ -883,6 +924,16 @@ def update_capa(db: Session, capa_id: int, capa_data: dict, performed_by_id: Opt
     if 'status_history' in capa_data and capa_data['status_history'] is not None:
         db_capa.status_history = capa_data['status_history']
     
+    # Audit entry is written in the same transaction as the update
+    if performed_by_id is not None:
+        queue_audit_log(db, {
+            'user_id': performed_by_id,
+            'action': 'update_capa',
+            'entity_type': 'capa',
+            'entity_id': capa_id,
+            'old_values': old_values,
+            'new_values': {'status': db_capa.status, 'verification_status': getattr(db_capa, 'verification_status', None)}
+        })
     db.commit()
     
     # Write-through: Update actions in capa_actions table
@@ -958,26 +1009,12 @@ def update_capa(db: Session, capa_id: int, capa_data: dict, performed_by_id: Opt
                     db.add(db_action)
         
         db.commit()
-        print(f"✅ Updated actions in capa_actions table for CAPA {capa_id}")
+        logger.debug("Updated actions in capa_actions table for CAPA %s", capa_id)
     except Exception as e:
-        print(f"⚠️ Failed to update actions in capa_actions table: {e}")
+        logger.warning("Failed to update actions in capa_actions table: %s", e)
     
     db.refresh(db_capa)
 
-    # Create audit log entry if caller provided a user id
-    try:
-        if performed_by_id is not None:
-            create_audit_log(db, {
-                'user_id': performed_by_id,
-                'action': 'update_capa',
-                'entity_type': 'capa',
-                'entity_id': capa_id,
-                'old_values': json.dumps(old_values, ensure_ascii=False),
-                'new_values': json.dumps({'status': db_capa.status, 'verification_status': getattr(db_capa, 'verification_status', None)}, ensure_ascii=False)
-            })
-    except Exception as e:
-        print(f"⚠️ Warning: failed to create audit log in update_capa: {e}")
-
     # Send notifications to department managers on key status changes
     try:
         # Only notify when status transitioned to IMPLEMENTED or VERIFIED
@@ -989,7 +1026,7 @@ def update_capa(db: Session, capa_id: int, capa_data: dict, performed_by_id: Opt
                 # Creator name
                 creator = get_user_by_id(db, performed_by_id) if performed_by_id else None
                 created_by_name = f"{creator.first_name} {creator.last_name}" if creator else 'نظام'
-                manager_ids = get_department_manager_ids(db, db_capa.department)
+                manager_ids = get_department_manager_ids(db, db_capa.department_id or db_capa.department)
                 if manager_ids:
                     notification_service = get_notification_service(db)
                     # Try the service helper first
@@ -1002,7 +1039,7 @@ def update_capa(db: Session, capa_id: int, capa_data: dict, performed_by_id: Opt
                             created_by_name=created_by_name
                         )
                     except Exception as ne:
-                        print(f"⚠️ Warning: notification service failed: {ne}")
+                        logger.warning("notification service failed: %s", ne)
                         sent_count = 0
 
                     # If service didn't create notifications (or returned 0), fallback to direct creation
@@ -1018,9 +1055,9 @@ def update_capa(db: Session, capa_id: int, capa_data: dict, performed_by_id: Opt
                                     'entity_id': db_capa.id
                                 })
                             except Exception as ne:
-                                print(f"⚠️ Warning: failed to create fallback notification for {manager_id}: {ne}")
+                                logger.warning("failed to create fallback notification for %s: %s", manager_id, ne)
             except Exception as ne:
-                print(f"⚠️ Warning: notification flow failed: {ne}")
+                logger.warning("notification flow failed: %s", ne)
     except Exception:
         pass
 
@@ -1083,6 +1120,18 @@ def get_dashboard_stats(db: Session):
     }
 
 # Department CRUD operations
+def _set_department_managers(db: Session, department_id: int, manager_ids):
+    """Replace the department_managers rows of a department; unknown user IDs are skipped"""
+    wanted = {int(user_id) for user_id in manager_ids or []}
+    existing = {row[0] for row in db.query(User.id).filter(User.id.in_(wanted))} if wanted else set()
+    for user_id in sorted(wanted - existing):
+        logger.warning("Manager ID %s for department %s does not exist in users table, skipping", user_id, department_id)
+    db.query(DepartmentManager).filter(DepartmentManager.department_id == department_id).delete(synchronize_session=False)
+    if existing:
+        db.execute(insert(DepartmentManager), [
+            {"department_id": department_id, "user_id": user_id} for user_id in sorted(existing)
+        ])
+
 def create_department(db: Session, department: DepartmentCreate):
     # Generate unique department code
     existing_codes = [dept.code for dept in db.query(Department).all()]
@@ -1105,6 +1154,8 @@ def create_department(db: Session, department: DepartmentCreate):
         managers=managers_json
     )
     db.add(db_department)
+    db.flush()
+    _set_department_managers(db, db_department.id, department.managers)
     db.commit()
     db.refresh(db_department)
     return convert_department_for_response(db_department)
@@ -1153,6 +1204,7 @@ def get_department_by_code(db: Session, code: str):
 def update_department(db: Session, department_id: int, department: DepartmentCreate):
     db_department = db.query(Department).filter(Department.id == department_id).first()
     if db_department:
+        renamed = db_department.name != department.name
         db_department.name = department.name
         db_department.name_en = department.name_en
         db_department.floor = department.floor
@@ -1160,6 +1212,16 @@ def update_department(db: Session, department_id: int, department: DepartmentCre
         # Convert managers list to JSON string
         managers_json = json.dumps(department.managers) if department.managers else None
         db_department.managers = managers_json
+        _set_department_managers(db, department_id, department.managers)
+        # The department_id triggers (migrations/010) resolve the new name
+        # from departments, so the renamed row must be written first
+        db.flush()
+        if renamed:
+            # Rounds and CAPAs keep the name for display; their department_id stays as is
+            for model in (Round, Capa):
+                db.query(model).filter(model.department_id == department_id).update(
+                    {model.department: department.name}, synchronize_session=False
+                )
         db.commit()
         db.refresh(db_department)
         return convert_department_for_response(db_department)
@@ -1418,49 +1480,137 @@ def get_assessors(db: Session, skip: int = 0, limit: int = 100):
     ).offset(skip).limit(limit).all()
 
 
+def lock_round(db: Session, round_id: int):
+    """Lock a round's row until the end of the transaction (no-op on SQLite)"""
+    return db.query(Round.id).filter(Round.id == round_id).with_for_update().first()
+
+
+EVALUATION_STATUS_SCORES = {'applied': 100, 'partial': 50, 'not_applied': 0}
+
+def evaluation_score(status: Optional[str]) -> Tuple[int, bool]:
+    """Score of an evaluation status and whether it counts towards compliance ('na' and unknown statuses do not)"""
+    if status in EVALUATION_STATUS_SCORES:
+        return EVALUATION_STATUS_SCORES[status], True
+    return 0, False
+
+
+def weighted_round_score(db: Session, category_scores: Dict[int, dict]) -> Tuple[float, list]:
+    """Round compliance (0-100) and its score_details from per-category weighted sums.
+
+    category_scores: {category_id: {'weighted_sum': .., 'max_weighted_sum': ..}}
+    Categories are weighted by weight_percent; weights that do not sum to 100
+    are normalized over the categories present.
+    """
+    from models_updated import EvaluationCategory
+    categories = {
+        category.id: category
+        for category in db.query(EvaluationCategory).filter(EvaluationCategory.id.in_(category_scores))
+    } if category_scores else {}
+    final_score = 0.0
+    total_cat_weight = 0.0
+    score_details = []
+
+    for cat_id, stats in category_scores.items():
+        cat = categories.get(cat_id)
+        if not cat:
+            continue
+            
+        cat_weight_percent = float(getattr(cat, 'weight_percent', 10.0))
+        
+        # Calculate category compliance (0-100)
+        if stats['max_weighted_sum'] > 0:
+            cat_compliance = (stats['weighted_sum'] / stats['max_weighted_sum']) * 100.0
+        else:
+            cat_compliance = 0.0
+
+        # Contribution to total score
+        # We accumulate (compliance * weight) then dived later by total_weight if needed
+        # Or if we assume weights sum to 100 (or we normalize them)
+        
+        score_details.append({
+            'category_id': cat_id,
+            'category_name': cat.name,
+            'category_name_en': cat.name_en,
+            'category_weight': cat_weight_percent,
+            'score': round(cat_compliance, 1),
+            'weighted_contribution': 0 # computed below
+        })
+        
+        # To handle cases where weights don't sum to 100, we do a weighted average of the available categories
+        final_score += (cat_compliance * cat_weight_percent)
+        total_cat_weight += cat_weight_percent
+
+    # Normalize final score
+    if total_cat_weight > 0:
+        # Weighted average of the category scores, 0-100
+        compliance_result = final_score / total_cat_weight
+        
+        # Adjust contribution display
+        for detail in score_details:
+             # actual contribution to the final number
+             detail['weighted_contribution'] = round((detail['score'] * detail['category_weight']) / total_cat_weight, 1)
+    else:
+        compliance_result = 0.0
+
+    return compliance_result, score_details
+
+
 # Create multiple evaluation results for a round
-def create_evaluation_results(db: Session, round_id: int, evaluations: list, evaluator_id: int, finalize: bool = False):
+def create_evaluation_results(db: Session, round_id: int, evaluations: list, evaluator_id: int, finalize: bool = False, commit: bool = True):
     """Persist evaluation results and update round compliance percentage using weighted average.
 
-    Evaluations: list of { item_id, status, comments?, evidence_files? }
+    Evaluations: list of { item_id, status, comments?, evidence_ids?, evidence_files? }
+    evidence_ids reference evidence the evaluator uploaded or the round already
+    uses (other ids are dropped, see usable_evidence_ids); data URIs
+    in the legacy evidence_files are moved to the evidence store.
     Status -> score mapping: applied=100, partial=50, not_applied=0, na -> excluded from calculation
     Weighting: uses EvaluationItem.weight for weighted average. NA entries excluded.
     Updates Round.compliance_percentage to weighted average (0-100) and sets status to IN_PROGRESS.
     Also calculates completion_percentage based on how many items have been evaluated.
+    With commit=False everything is only flushed, so the caller can add more work
+    (e.g. CAPA generation on finalize) to the same transaction.
     """
     if not EVALUATION_MODELS_AVAILABLE:
         return [], None
 
     from models_updated import EvaluationItem, EvaluationResult, Round, RoundStatus, EvaluationCategory
     created_results = []
+    # Writers of a round's results take turns, so result ids follow commit order (sync tokens rely on it)
+    lock_round(db, round_id)
 
     # Scoring breakdown data structures
     category_scores = {}  # {cat_id: {'weighted_sum': 0, 'max_weighted_sum': 0}}
-    item_cache = {}
+    item_ids = {ev.get('item_id') for ev in evaluations if ev.get('item_id') is not None}
+    item_cache = {
+        item.id: item
+        for item in db.query(EvaluationItem).filter(EvaluationItem.id.in_(item_ids))
+    } if item_ids else {}
+    # Uploaded evidence referenced by the payload, checked at once
+    referenced_ids = {
+        evidence_id for ev in evaluations for evidence_id in (ev.get('evidence_ids') or [])
+        if isinstance(evidence_id, int)
+    }
+    known_evidence_ids = usable_evidence_ids(db, evaluator_id, round_id, referenced_ids)
+    if referenced_ids - known_evidence_ids:
+        logger.warning("Evaluation of round %s by user %s: dropped evidence ids %s", round_id, evaluator_id,
+                       sorted(referenced_ids - known_evidence_ids))
 
     for ev in evaluations:
         item_id = ev.get('item_id')
         status = ev.get('status')
         comments = ev.get('comments') or (status if status else '')
+        evidence_ids = [evidence_id for evidence_id in (ev.get('evidence_ids') or []) if evidence_id in known_evidence_ids]
         evidence = ev.get('evidence_files')
+        if isinstance(evidence, list) and evidence:
+            # Inline data URIs go to the evidence store; the row keeps only their ids
+            inline_ids, evidence = store_inline_evidence(db, evidence, evaluator_id)
+            evidence_ids = list(dict.fromkeys(evidence_ids + inline_ids))
 
         # Map status to numeric score
-        if status == 'applied':
-            score = 100
-            include_in_calc = True
-        elif status == 'partial':
-            score = 50
-            include_in_calc = True
-        elif status == 'not_applied':
-            score = 0
-            include_in_calc = True
-        else:
-            # 'na' or unknown statuses -> exclude from compliance calculation
-            score = 0
-            include_in_calc = False
+        score, include_in_calc = evaluation_score(status)
 
         # Get item
-        item = db.query(EvaluationItem).filter(EvaluationItem.id == item_id).first()
+        item = item_cache.get(item_id)
         if not item:
             continue
             
@@ -1481,8 +1631,10 @@ def create_evaluation_results(db: Session, round_id: int, evaluations: list, eva
             round_id=round_id,
             item_id=item_id,
             score=int(score),
+            status=status,
             comments=comments,
             evidence_files=json.dumps(evidence) if evidence else None,
+            evidence_ids=evidence_ids or None,
             evaluated_by=evaluator_id
         )
         # If evaluator provided a flag/note for CAPA, store it on the evaluation result
@@ -1495,57 +1647,13 @@ def create_evaluation_results(db: Session, round_id: int, evaluations: list, eva
         db.add(db_result)
         created_results.append(db_result)
         
-    db.commit()
+    if commit:
+        db.commit()
+    else:
+        db.flush()
 
     # Calculate final weighted score
-    final_score = 0.0
-    total_cat_weight = 0.0
-    score_details = []
-
-    # Get all categories involved or all active categories
-    # For accuracy, we should check against active categories' weights
-    # But here we only count categories that were actually evaluated or present
-   
-    for cat_id, stats in category_scores.items():
-        cat = db.query(EvaluationCategory).filter(EvaluationCategory.id == cat_id).first()
-        if not cat: 
-            continue
-            
-        cat_weight_percent = float(getattr(cat, 'weight_percent', 10.0))
-        
-        # Calculate category compliance (0-100)
-        if stats['max_weighted_sum'] > 0:
-            cat_compliance = (stats['weighted_sum'] / stats['max_weighted_sum']) * 100.0
-        else:
-            cat_compliance = 0.0
-
-        # Contribution to total score
-        # We accumulate (compliance * weight) then dived later by total_weight if needed
-        # Or if we assume weights sum to 100 (or we normalize them)
-        
-        score_details.append({
-            'category_id': cat_id,
-            'category_name': cat.name,
-            'category_name_en': cat.name_en,
-            'category_weight': cat_weight_percent,
-            'score': round(cat_compliance, 1),
-            'weighted_contribution': 0 # computed below
-        })
-        
-        # To handle cases where weights don't sum to 100, we do a weighted average of the available categories
-        final_score += (cat_compliance * cat_weight_percent)
-        total_cat_weight += cat_weight_percent
-
-    # Normalize final score
-    if total_cat_weight > 0:
-        compliance_result = final_score / total_cat_weight * 100.0 if total_cat_weight != 100 else final_score
-        
-        # Adjust contribution display
-        for detail in score_details:
-             # actual contribution to the final number
-             detail['weighted_contribution'] = round((detail['score'] * detail['category_weight']) / total_cat_weight, 1)
-    else:
-        compliance_result = 0.0
+    compliance_result, score_details = weighted_round_score(db, category_scores)
 
     # Update round compliance percentage using weighted average
     db_round = db.query(Round).filter(Round.id == round_id).first()
@@ -1571,10 +1679,13 @@ def create_evaluation_results(db: Session, round_id: int, evaluations: list, eva
                 # If saving as draft, set to in_progress
                 db_round.status = RoundStatus.IN_PROGRESS if hasattr(RoundStatus, 'IN_PROGRESS') else 'in_progress'
 
-            db.commit()
-            db.refresh(db_round)
+            if commit:
+                db.commit()
+                db.refresh(db_round)
+            else:
+                db.flush()
         except Exception as e:
-            print(f"Error updating round compliance: {e}")
+            logger.error("Error updating round compliance: %s", e)
 
     return created_results, db_round
 
@@ -1586,7 +1697,7 @@ def get_evaluation_results_by_round(db: Session, round_id: int):
         results = db.query(EvaluationResult).filter(EvaluationResult.round_id == round_id).all()
         return results
     except Exception as e:
-        print(f"Error fetching evaluation results for round {round_id}: {e}")
+        logger.error("Error fetching evaluation results for round %s: %s", round_id, e)
         return []
 
 # Objective Option CRUD operations
@@ -1633,27 +1744,30 @@ def delete_objective_option(db: Session, objective_option_id: int):
     return db_objective_option
 
 # Audit Log CRUD operations
-def create_audit_log(db: Session, audit_log_data: dict):
+def create_audit_log(db: Session, audit_log_data: dict, priority: str = "normal"):
+    """Write an audit log entry in its own commit.
+
+    Inside a larger operation prefer ``queue_audit_log`` so the entry is written
+    with the caller's commit. ``priority="low"`` hands the entry to the
+    background writer instead and returns None.
+    """
+    if priority == "low":
+        get_audit_writer().submit(audit_log_data)
+        return None
     from models_updated import AuditLog
-    db_audit_log = AuditLog(
-        user_id=audit_log_data["user_id"],
-        action=audit_log_data["action"],
-        entity_type=audit_log_data["entity_type"],
-        entity_id=audit_log_data.get("entity_id"),
-        old_values=audit_log_data.get("old_values"),
-        new_values=audit_log_data.get("new_values"),
-        ip_address=audit_log_data.get("ip_address"),
-        user_agent=audit_log_data.get("user_agent")
-    )
+    db_audit_log = AuditLog(**build_audit_log_row(audit_log_data))
     db.add(db_audit_log)
     db.commit()
     db.refresh(db_audit_log)
     return db_audit_log
 
-def get_audit_logs(db: Session, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, entity_type: Optional[str] = None):
+def get_audit_logs(db: Session, skip: int = 0, limit: int = 100, user_id: Optional[int] = None, entity_type: Optional[str] = None, since: Optional[datetime] = None):
     from models_updated import AuditLog
-    query = db.query(AuditLog)
-    
+    # Rows past the retention window are never returned, and the created_at
+    # bound lets Postgres prune the monthly partitions it never needs to read
+    query = db.query(AuditLog).filter(AuditLog.created_at >= retention_start("audit_logs"))
+    if since:
+        query = query.filter(AuditLog.created_at >= since)
     if user_id:
         query = query.filter(AuditLog.user_id == user_id)
     if entity_type:
@@ -1741,11 +1855,13 @@ def create_notification(db: Session, notification_data: dict):
                         svc = _get_notification_service(db)
                         svc._send_email_notification(db_notification)
                     except Exception as e:
-                        print(f"⚠️ Warning: failed to send email for notification {db_notification.id}: {e}")
+                        logger.warning("failed to send email for notification %s: %s", db_notification.id, e)
 
         except Exception as e:
             # Don't fail the DB operation on email errors
-            print(f"⚠️ Warning in post-create notification email flow: {e}")
+            logger.warning("Warning in post-create notification email flow: %s", e)
+
+        publish_notification_changed(db, db_notification.user_id, db_notification)
 
         return db_notification
     except Exception:
@@ -1756,22 +1872,133 @@ def create_notification(db: Session, notification_data: dict):
             pass
         raise
 
-def get_notifications_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 50, status: Optional[NotificationStatus] = None):
+def get_notifications_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 50, status: Optional[NotificationStatus] = None, since: Optional[datetime] = None):
     """Get notifications for a specific user"""
-    query = db.query(Notification).filter(Notification.user_id == user_id)
-    
+    # Rows past the retention window are never returned, and the created_at
+    # bound lets Postgres prune the monthly partitions it never needs to read
+    query = db.query(Notification).filter(
+        Notification.user_id == user_id,
+        Notification.created_at >= retention_start("notifications"),
+    )
+    if since:
+        query = query.filter(Notification.created_at >= since)
     if status:
         query = query.filter(Notification.status == status)
     
     return query.order_by(Notification.created_at.desc()).offset(skip).limit(limit).all()
 
+_unread_counters_installed: Optional[bool] = None
+
+def _unread_counters_available(db: Session) -> bool:
+    """Whether the trigger-maintained user_notification_counters table is installed (checked once per process)"""
+    global _unread_counters_installed
+    if _unread_counters_installed is None:
+        try:
+            _unread_counters_installed = db.execute(text(
+                "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_notifications_unread_counter_insert'"
+            )).first() is not None
+        except Exception:
+            db.rollback()
+            _unread_counters_installed = False
+    return _unread_counters_installed
+
 def get_unread_notifications_count(db: Session, user_id: int):
     """Get count of unread notifications for a user"""
+    if _unread_counters_available(db):
+        # O(1) primary-key lookup instead of counting the user's notifications
+        from models_updated import UserNotificationCounter
+        count = db.query(UserNotificationCounter.unread_count).filter(
+            UserNotificationCounter.user_id == user_id
+        ).scalar()
+        return count or 0
     return db.query(Notification).filter(
         Notification.user_id == user_id,
         Notification.status == NotificationStatus.UNREAD
     ).count()
 
+def publish_notification_changed(db: Session, user_id: int, notification: Optional[Notification] = None):
+    """Push a new notification and the current unread count to the user's open event streams"""
+    try:
+        if notification is not None:
+            from schemas import NotificationResponse
+            broker.publish(
+                "notification",
+                NotificationResponse.model_validate(notification).model_dump(mode="json"),
+                user_id,
+            )
+        broker.publish("unread_count", {"unread_count": get_unread_notifications_count(db, user_id)}, user_id)
+    except Exception as e:
+        # Streams are best effort; clients resync on reconnect
+        logger.warning("failed to publish notification event for user %s: %s", user_id, e)
+
+def get_unread_notifications_counts(db: Session, user_ids: List[int]) -> Dict[int, int]:
+    """Unread counts for several users in one query"""
+    if not user_ids:
+        return {}
+    if _unread_counters_available(db):
+        from models_updated import UserNotificationCounter
+        rows = db.query(UserNotificationCounter.user_id, UserNotificationCounter.unread_count).filter(
+            UserNotificationCounter.user_id.in_(user_ids)
+        ).all()
+    else:
+        rows = db.query(Notification.user_id, func.count(Notification.id)).filter(
+            Notification.user_id.in_(user_ids),
+            Notification.status == NotificationStatus.UNREAD
+        ).group_by(Notification.user_id).all()
+    counts = {user_id: 0 for user_id in user_ids}
+    counts.update({user_id: count for user_id, count in rows})
+    return counts
+
+def create_notifications_bulk(db: Session, user_ids: List[int], notification_data: dict) -> List[dict]:
+    """Create the same notification for many users with one INSERT ... RETURNING and push them to open streams.
+
+    Returns the created notifications serialized as NotificationResponse dicts.
+    """
+    if not user_ids:
+        return []
+    from schemas import NotificationResponse
+
+    notification_type = notification_data["notification_type"]
+    rows = [{
+        "user_id": user_id,
+        "title": notification_data["title"],
+        "message": notification_data["message"],
+        "notification_type": notification_type.value if hasattr(notification_type, 'value') else notification_type,
+        "status": NotificationStatus.UNREAD.value,
+        "entity_type": notification_data.get("entity_type"),
+        "entity_id": notification_data.get("entity_id"),
+        "is_email_sent": False,
+    } for user_id in user_ids]
+    try:
+        created = db.scalars(insert(Notification).returning(Notification), rows).all()
+        # Serialize before commit expires the instances (avoids one refresh query per row)
+        payloads = [NotificationResponse.model_validate(n).model_dump(mode="json") for n in created]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    try:
+        counts = get_unread_notifications_counts(db, list(dict.fromkeys(user_ids)))
+        broker.publish_many(
+            [("notification", payload, payload["user_id"]) for payload in payloads]
+            + [("unread_count", {"unread_count": count}, user_id) for user_id, count in counts.items()]
+        )
+    except Exception as e:
+        logger.warning("failed to publish bulk notification events: %s", e)
+    return payloads
+
+def mark_notifications_email_sent(db: Session, notification_ids: List[int]) -> int:
+    """Flag several notifications as emailed with one UPDATE"""
+    if not notification_ids:
+        return 0
+    updated = db.query(Notification).filter(Notification.id.in_(notification_ids)).update(
+        {Notification.is_email_sent: True, Notification.email_sent_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    return updated
+
 def mark_notification_as_read(db: Session, notification_id: int, user_id: int):
     """Mark a notification as read"""
     from datetime import datetime
@@ -1785,6 +2012,7 @@ def mark_notification_as_read(db: Session, notification_id: int, user_id: int):
         notification.status = NotificationStatus.READ
         notification.read_at = datetime.utcnow()
         db.commit()
+        publish_notification_changed(db, user_id)
         return notification
     return None
 
@@ -1792,17 +2020,19 @@ def mark_all_notifications_as_read(db: Session, user_id: int):
     """Mark all notifications as read for a user"""
     from datetime import datetime
     
-    notifications = db.query(Notification).filter(
+    # Single set-based UPDATE ... WHERE user_id AND status = 'unread'
+    updated = db.query(Notification).filter(
         Notification.user_id == user_id,
         Notification.status == NotificationStatus.UNREAD
-    ).all()
-    
-    for notification in notifications:
-        notification.status = NotificationStatus.READ
-        notification.read_at = datetime.utcnow()
+    ).update(
+        {Notification.status: NotificationStatus.READ.value, Notification.read_at: datetime.utcnow()},
+        synchronize_session=False
+    )
     
     db.commit()
-    return len(notifications)
+    if updated:
+        publish_notification_changed(db, user_id)
+    return updated
 
 def delete_notification(db: Session, notification_id: int, user_id: int):
     """Delete a notification"""
@@ -1814,6 +2044,7 @@ def delete_notification(db: Session, notification_id: int, user_id: int):
     if notification:
         db.delete(notification)
         db.commit()
+        publish_notification_changed(db, user_id)
         return True
     return False
 
@@ -1834,6 +2065,19 @@ def get_user_notification_settings(db: Session, user_id: int):
     """Get notification settings for a user"""
     return db.query(UserNotificationSettings).filter(UserNotificationSettings.user_id == user_id).first()
 
+def get_notification_settings_for_users(db: Session, user_ids: List[int]) -> Dict[int, UserNotificationSettings]:
+    """Notification settings keyed by user id, loaded in one query (users without settings are absent)"""
+    if not user_ids:
+        return {}
+    settings = db.query(UserNotificationSettings).filter(UserNotificationSettings.user_id.in_(user_ids)).all()
+    return {s.user_id: s for s in settings}
+
+def get_users_by_ids(db: Session, user_ids: List[int]) -> Dict[int, User]:
+    """Users keyed by id, loaded in one query"""
+    if not user_ids:
+        return {}
+    return {user.id: user for user in db.query(User).filter(User.id.in_(user_ids)).all()}
+
 def create_user_notification_settings(db: Session, user_id: int, settings_data: dict):
     """Create notification settings for a user"""
     db_settings = UserNotificationSettings(
@@ -1922,6 +2166,23 @@ def delete_round_type(db: Session, round_type_id: int):
         db.commit()
     return db_round_type
 
+def _non_compliant_item(result, item, round_id: int) -> dict:
+    return {
+        'evaluation_result_id': result.id,
+        'item_id': item.id,
+        'item_code': item.code,
+        'item_title': item.title,
+        'item_description': item.description,
+        'category_name': item.category_name,
+        'category_color': item.category_color,
+        'risk_level': getattr(item, 'risk_level', 'MINOR'),
+        'score': result.score,
+        'comments': result.comments,
+        'evaluated_at': result.evaluated_at,
+        'round_id': round_id
+    }
+
+
 def get_non_compliant_evaluation_items(db: Session, round_id: int, threshold: int = 70):
     """
     Get evaluation items from a round that scored below the threshold and need CAPA plans.
@@ -1940,36 +2201,18 @@ def get_non_compliant_evaluation_items(db: Session, round_id: int, threshold: in
     try:
         from models_updated import EvaluationResult, EvaluationItem
         
-        # Get evaluation results for this round with scores below threshold
-        results = db.query(EvaluationResult).join(EvaluationItem).filter(
+        # Results and their items in one joined query
+        rows = db.query(EvaluationResult, EvaluationItem).join(
+            EvaluationItem, EvaluationItem.id == EvaluationResult.item_id
+        ).filter(
             EvaluationResult.round_id == round_id,
             EvaluationResult.score < threshold
         ).all()
         
-        non_compliant_items = []
-        for result in results:
-            # Get the evaluation item details
-            item = db.query(EvaluationItem).filter(EvaluationItem.id == result.item_id).first()
-            if item:
-                non_compliant_items.append({
-                    'evaluation_result_id': result.id,
-                    'item_id': item.id,
-                    'item_code': item.code,
-                    'item_title': item.title,
-                    'item_description': item.description,
-                    'category_name': item.category_name,
-                    'category_color': item.category_color,
-                    'risk_level': getattr(item, 'risk_level', 'MINOR'),
-                    'score': result.score,
-                    'comments': result.comments,
-                    'evaluated_at': result.evaluated_at,
-                    'round_id': round_id
-                })
-        
-        return non_compliant_items
+        return [_non_compliant_item(result, item, round_id) for result, item in rows]
         
     except Exception as e:
-        print(f"Error getting non-compliant evaluation items: {e}")
+        logger.error("Error getting non-compliant evaluation items: %s", e)
         return []
 
 
@@ -2020,10 +2263,100 @@ def get_evaluation_items_needing_capa(db: Session, round_id: int):
         return items_needing_capa
         
     except Exception as e:
-        print(f"Error getting evaluation items needing CAPA: {e}")
+        logger.error("Error getting evaluation items needing CAPA: %s", e)
         return []
 
 
+def build_capa_values_for_item(round_id: int, round_title: str, department: str, evaluation_item_data: dict, creator_id: int, now: Optional[datetime] = None, department_id: Optional[int] = None) -> dict:
+    """Column values for the CAPA generated from a non-compliant evaluation item.
+
+    Title/description are derived from the item, priority from its risk level and
+    score, and the target date from the priority (30/60/90 days).
+    """
+    # Generate CAPA title and description based on evaluation item
+    item_title = evaluation_item_data.get('item_title', 'عنصر تقييم')
+    item_code = evaluation_item_data.get('item_code', '')
+    score = evaluation_item_data.get('score', 0)
+    
+    capa_title = f"خطة تصحيحية لعنصر: {item_title}"
+    if item_code:
+        capa_title += f" ({item_code})"
+    
+    capa_description = f"""خطة تصحيحية لمعالجة عدم الامتثال في عنصر التقييم:
+
+العنصر: {item_title}
+الكود: {item_code}
+النتيجة: {score}/100
+الجولة: {round_title}
+القسم: {department}
+
+يتطلب هذا العنصر إجراءات تصحيحية لضمان الامتثال والتحسين المستمر."""
+
+    # Determine priority based on risk level and score
+    risk_level = evaluation_item_data.get('risk_level', 'MINOR')
+    if risk_level == 'CRITICAL' or score == 0:
+        priority = 'urgent'
+    elif risk_level == 'MAJOR' or score <= 25:
+        priority = 'high'
+    elif score <= 50:
+        priority = 'medium'
+    else:
+        priority = 'low'
+    
+    # Calculate target date (30 days for urgent, 60 for high, 90 for medium/low)
+    now = now or datetime.now()
+    target_days = {'urgent': 30, 'high': 60}.get(priority, 90)
+    
+    return {
+        "title": capa_title,
+        "description": capa_description,
+        "round_id": round_id,
+        "department": department,
+        "department_id": department_id,
+        "priority": priority,
+        "status": CapaStatus.PENDING.value,  # MUST be UPPERCASE to satisfy DB check constraint
+        "evaluation_item_id": evaluation_item_data.get('item_id'),
+        "target_date": now + timedelta(days=target_days),
+        "created_by_id": creator_id,
+        "risk_score": 100 - score,  # Higher risk score for lower evaluation scores
+        # Ensure defaults for enhanced fields
+        "verification_status": VerificationStatus.PENDING.value,
+        "corrective_actions": '[]',
+        "preventive_actions": '[]',
+        "verification_steps": '[]',
+        "status_history": '[]',
+        "severity": 3,
+        "sla_days": 14,
+        "escalation_level": 0,
+    }
+
+
+def _get_evaluation_capa(db: Session, round_id: int, evaluation_item_id: int):
+    return db.query(Capa).filter(
+        Capa.round_id == round_id, Capa.evaluation_item_id == evaluation_item_id
+    ).first()
+
+
+def insert_evaluation_capas(db: Session, values: List[dict]):
+    """Insert evaluation-driven CAPAs, skipping any (round_id, evaluation_item_id) that already has one.
+
+    ON CONFLICT DO NOTHING against uq_capas_round_item makes concurrent finalize
+    calls safe; the skipped rows are counted in capa_creations_skipped_total.
+    Returns the inserted (id, title, priority, target_date, evaluation_item_id) rows.
+    """
+    if not values:
+        return []
+    created = db.execute(
+        pg_insert(Capa).on_conflict_do_nothing().returning(
+            Capa.id, Capa.title, Capa.priority, Capa.target_date, Capa.evaluation_item_id
+        ),
+        values
+    ).all()
+    metrics.increment("capa_creations_total", len(created), source="evaluation")
+    metrics.increment("capa_creations_skipped_total", len(values) - len(created), reason="conflict")
+    return created
+
+
 def create_capa_from_evaluation_item(db: Session, round_id: int, evaluation_item_data: dict, creator_id: int):
     """
     Create a CAPA plan for a specific evaluation item that failed compliance.
@@ -2042,70 +2375,36 @@ def create_capa_from_evaluation_item(db: Session, round_id: int, evaluation_item
         if not round_obj:
             return None
         
-        # Generate CAPA title and description based on evaluation item
         item_title = evaluation_item_data.get('item_title', 'عنصر تقييم')
-        item_code = evaluation_item_data.get('item_code', '')
-        score = evaluation_item_data.get('score', 0)
-        
-        capa_title = f"خطة تصحيحية لعنصر: {item_title}"
-        if item_code:
-            capa_title += f" ({item_code})"
-        
-        capa_description = f"""خطة تصحيحية لمعالجة عدم الامتثال في عنصر التقييم:
-
-العنصر: {item_title}
-الكود: {item_code}
-النتيجة: {score}/100
-الجولة: {round_obj.title}
-القسم: {round_obj.department}
-
-يتطلب هذا العنصر إجراءات تصحيحية لضمان الامتثال والتحسين المستمر."""
-
-        # Determine priority based on risk level and score
-        risk_level = evaluation_item_data.get('risk_level', 'MINOR')
-        if risk_level == 'CRITICAL' or score == 0:
-            priority = 'urgent'
-        elif risk_level == 'MAJOR' or score <= 25:
-            priority = 'high'
-        elif score <= 50:
-            priority = 'medium'
-        else:
-            priority = 'low'
-        
-        # Calculate target date (30 days for urgent, 60 for high, 90 for medium/low)
-        from datetime import datetime, timedelta
-        if priority == 'urgent':
-            target_date = datetime.now() + timedelta(days=30)
-        elif priority == 'high':
-            target_date = datetime.now() + timedelta(days=60)
-        else:
-            target_date = datetime.now() + timedelta(days=90)
-        
-        # Create CAPA
-        from models_updated import CapaStatus, VerificationStatus
-        db_capa = Capa(
-            title=capa_title,
-            description=capa_description,
-            round_id=round_id,
-            department=round_obj.department,
-            priority=priority,
-            status=CapaStatus.PENDING.value,  # MUST be UPPERCASE to satisfy DB check constraint
-            evaluation_item_id=evaluation_item_data.get('item_id'),
-            target_date=target_date,
-            created_by_id=creator_id,
-            risk_score=100 - score,  # Higher risk score for lower evaluation scores
-            # Ensure defaults for enhanced fields
-            verification_status=VerificationStatus.PENDING.value,
-            corrective_actions='[]',
-            preventive_actions='[]',
-            verification_steps='[]',
-            status_history='[]',
-            severity=3,
-            sla_days=14,
-            escalation_level=0
+        values = build_capa_values_for_item(
+            round_id, round_obj.title, round_obj.department, evaluation_item_data, creator_id,
+            department_id=round_obj.department_id
         )
-        
-        db.add(db_capa)
+        item_id = values["evaluation_item_id"]
+        if item_id is None:
+            db_capa = Capa(**values)
+            db.add(db_capa)
+            db.flush()
+        else:
+            # One CAPA per (round, evaluation item): an existing plan is returned as is
+            existing = _get_evaluation_capa(db, round_id, item_id)
+            if existing is not None:
+                metrics.increment("capa_creations_skipped_total", reason="existing")
+                return existing
+            created = insert_evaluation_capas(db, [values])
+            if not created:
+                # A concurrent request inserted it first; DO NOTHING leaves the
+                # caller's transaction usable, so nothing is rolled back
+                return _get_evaluation_capa(db, round_id, item_id)
+            db_capa = db.get(Capa, created[0].id)
+        # Audit entry is written in the same transaction as the CAPA itself
+        queue_audit_log(db, {
+            "user_id": creator_id,
+            "action": "create_capa",
+            "entity_type": "capa",
+            "entity_id": db_capa.id,
+            "new_values": {"title": db_capa.title, "department": db_capa.department}
+        })
         db.commit()
         db.refresh(db_capa)
 
@@ -2138,89 +2437,125 @@ def create_capa_from_evaluation_item(db: Session, round_id: int, evaluation_item
                     created_by_name=creator_name
                 )
         except Exception as e:
-            print(f"Warning: failed to send notifications for created CAPA {getattr(db_capa, 'id', None)}: {e}")
-
-        # Audit log
-        try:
-            create_audit_log(db, {
-                "user_id": creator_id,
-                "action": "create_capa",
-                "entity_type": "capa",
-                "entity_id": db_capa.id,
-                "new_values": json.dumps({"title": db_capa.title, "department": db_capa.department}, ensure_ascii=False)
-            })
-        except Exception as e:
-            print(f"Warning: failed to create audit log for CAPA {getattr(db_capa, 'id', None)}: {e}")
+            logger.warning("failed to send notifications for created CAPA %s: %s", getattr(db_capa, 'id', None), e)
 
         return db_capa
         
     except Exception as e:
-        print(f"Error creating CAPA from evaluation item: {e}")
+        logger.error("Error creating CAPA from evaluation item: %s", e)
         db.rollback()
         return None
 
 
-def create_capas_for_round_non_compliance(db: Session, round_id: int, creator_id: int, threshold: int = 70):
+def create_capas_for_round_non_compliance(db: Session, round_id: int, creator_id: int, threshold: int = 70, commit: bool = True):
     """
     Create CAPA plans for all non-compliant evaluation items in a round.
     
+    Works in batch: one joined query finds the items whose latest result is below
+    the threshold and that have no CAPA yet, one multi-row INSERT ... RETURNING
+    creates the CAPAs and their audit entries are written with the commit.
+    It is idempotent: items that already have a CAPA (including ones inserted
+    concurrently) are skipped and counted, so a repeated finalize is a no-op.
+    No notifications are sent here; callers schedule notify_round_capas_created
+    (one digest per recipient) once the transaction has committed.
+    
     Args:
         round_id: The round ID to process
         creator_id: User ID creating the CAPAs
         threshold: Score threshold below which items need CAPA (default 70)
+        commit: False leaves the CAPAs in the caller's transaction (flushed in a
+            savepoint, so a failure here does not undo the caller's work)
     
     Returns:
         Dict with created CAPAs and any errors
     """
+    if not EVALUATION_MODELS_AVAILABLE:
+        return {
+            'success': True,
+            'message': 'لا توجد عناصر تحتاج إلى خطط تصحيحية',
+            'created_capas': [],
+            'total_items': 0
+        }
+    
     try:
-        # Get non-compliant items
-        non_compliant_items = get_non_compliant_evaluation_items(db, round_id, threshold)
-        
-        if not non_compliant_items:
-            return {
-                'success': True,
-                'message': 'لا توجد عناصر تحتاج إلى خطط تصحيحية',
-                'created_capas': [],
-                'total_items': 0
-            }
-        
-        created_capas = []
-        errors = []
-        
-        for item_data in non_compliant_items:
-            # Check if CAPA already exists for this evaluation item
-            existing_capa = db.query(Capa).filter(
-                Capa.round_id == round_id,
-                Capa.evaluation_item_id == item_data['item_id']
-            ).first()
+        # Draft saves leave older results behind; only the latest per item counts
+        latest_results = select(func.max(EvaluationResult.id)).where(
+            EvaluationResult.round_id == round_id
+        ).group_by(EvaluationResult.item_id)
+        
+        with db.begin_nested():
+            rows = db.query(EvaluationResult, EvaluationItem, Round.title, Round.department, Round.department_id, Capa.id).join(
+                EvaluationItem, EvaluationItem.id == EvaluationResult.item_id
+            ).join(
+                Round, Round.id == EvaluationResult.round_id
+            ).outerjoin(
+                Capa, and_(Capa.round_id == EvaluationResult.round_id, Capa.evaluation_item_id == EvaluationResult.item_id)
+            ).filter(
+                EvaluationResult.id.in_(latest_results),
+                EvaluationResult.score < threshold
+            ).order_by(EvaluationResult.item_id).all()
             
-            if existing_capa:
-                errors.append(f"خطة تصحيحية موجودة مسبقاً للعنصر: {item_data['item_title']}")
-                continue
+            if not rows:
+                return {
+                    'success': True,
+                    'message': 'لا توجد عناصر تحتاج إلى خطط تصحيحية',
+                    'created_capas': [],
+                    'total_items': 0
+                }
             
-            # Create CAPA for this item
-            capa = create_capa_from_evaluation_item(db, round_id, item_data, creator_id)
-            if capa:
-                created_capas.append({
-                    'capa_id': capa.id,
-                    'title': capa.title,
-                    'item_title': item_data['item_title'],
-                    'priority': capa.priority,
-                    'target_date': capa.target_date
-                })
-            else:
-                errors.append(f"فشل في إنشاء خطة تصحيحية للعنصر: {item_data['item_title']}")
+            now = datetime.now()
+            items_by_id = {}
+            values = []
+            errors = []
+            for result, item, round_title, department, department_id, existing_capa_id in rows:
+                if item.id in items_by_id:
+                    continue
+                item_data = _non_compliant_item(result, item, round_id)
+                items_by_id[item.id] = item_data
+                if existing_capa_id is not None:
+                    errors.append(f"خطة تصحيحية موجودة مسبقاً للعنصر: {item.title}")
+                    continue
+                values.append(build_capa_values_for_item(
+                    round_id, round_title, department, item_data, creator_id, now, department_id
+                ))
+            
+            created = insert_evaluation_capas(db, values)
+        
+        skipped = len(items_by_id) - len(created)
+        metrics.increment("capa_creations_skipped_total", len(items_by_id) - len(values), reason="existing")
+        
+        for row in created:
+            queue_audit_log(db, {
+                "user_id": creator_id,
+                "action": "create_capa",
+                "entity_type": "capa",
+                "entity_id": row.id,
+                "new_values": {"title": row.title, "department": values[0]["department"]}
+            })
+        if commit:
+            db.commit()
+        
+        created_capas = [{
+            'capa_id': row.id,
+            'title': row.title,
+            'item_title': items_by_id[row.evaluation_item_id]['item_title'],
+            'priority': row.priority,
+            'target_date': row.target_date
+        } for row in sorted(created, key=lambda row: row.id)]
         
         return {
             'success': True,
-            'message': f'تم إنشاء {len(created_capas)} خطة تصحيحية من أصل {len(non_compliant_items)} عنصر غير مطبق',
+            'message': f'تم إنشاء {len(created_capas)} خطة تصحيحية من أصل {len(items_by_id)} عنصر غير مطبق',
             'created_capas': created_capas,
-            'total_items': len(non_compliant_items),
+            'total_items': len(items_by_id),
+            'skipped': skipped,
             'errors': errors
         }
         
     except Exception as e:
-        print(f"Error creating CAPAs for round non-compliance: {e}")
+        logger.error("Error creating CAPAs for round non-compliance: %s", e)
+        if commit:
+            db.rollback()
         return {
             'success': False,
             'message': f'خطأ في إنشاء خطط التصحيح: {str(e)}',
@@ -2230,10 +2565,95 @@ def create_capas_for_round_non_compliance(db: Session, round_id: int, creator_id
         }
 
 
+_round_counters_installed: Optional[bool] = None
+
+def _round_counters_available(db: Session) -> bool:
+    """Whether the trigger-maintained round_capa_counters table is installed (checked once per process)"""
+    global _round_counters_installed
+    if _round_counters_installed is None:
+        try:
+            _round_counters_installed = db.execute(text(
+                "SELECT 1 FROM pg_trigger WHERE tgname = 'trg_capas_round_counters_insert'"
+            )).first() is not None
+        except Exception:
+            db.rollback()
+            _round_counters_installed = False
+    return _round_counters_installed
+
+ROUND_COUNTER_FIELDS = (
+    'evaluated_items', 'non_compliant_items', 'needs_capa_items', 'capas_needed', 'open_capas', 'closed_capas'
+)
+CLOSED_CAPA_STATUSES = ("verified", "completed", "closed")
+
+def _count_round_capa_summaries(db: Session, round_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """The counters of migrations/011 computed from evaluation_results and capas (two grouped queries)"""
+    existing = db.query(Round.id).filter(Round.id.in_(round_ids)).all()
+    counters = {round_id: dict.fromkeys(ROUND_COUNTER_FIELDS, 0) for round_id, in existing}
+    if not counters:
+        return {}
+    
+    # Draft saves leave older results behind; only the latest per item counts
+    latest_results = select(func.max(EvaluationResult.id)).where(
+        EvaluationResult.round_id.in_(counters)
+    ).group_by(EvaluationResult.round_id, EvaluationResult.item_id)
+    non_compliant = EvaluationResult.score < 70
+    flagged = func.coalesce(EvaluationResult.needs_capa, False)
+    rows = db.query(
+        EvaluationResult.round_id,
+        func.count(EvaluationResult.id),
+        func.sum(case((non_compliant, 1), else_=0)),
+        func.sum(case((flagged, 1), else_=0)),
+        func.sum(case((and_(or_(non_compliant, flagged), Capa.id.is_(None)), 1), else_=0)),
+    ).outerjoin(
+        Capa, and_(Capa.round_id == EvaluationResult.round_id, Capa.evaluation_item_id == EvaluationResult.item_id)
+    ).filter(EvaluationResult.id.in_(latest_results)).group_by(EvaluationResult.round_id).all()
+    for round_id, evaluated, non_compliant_count, flagged_count, needed in rows:
+        counters[round_id].update(
+            evaluated_items=evaluated, non_compliant_items=non_compliant_count or 0,
+            needs_capa_items=flagged_count or 0, capas_needed=needed or 0,
+        )
+    
+    closed = func.lower(Capa.status).in_(CLOSED_CAPA_STATUSES)
+    rows = db.query(
+        Capa.round_id, func.sum(case((closed, 0), else_=1)), func.sum(case((closed, 1), else_=0))
+    ).filter(Capa.round_id.in_(counters)).group_by(Capa.round_id).all()
+    for round_id, open_count, closed_count in rows:
+        counters[round_id].update(open_capas=open_count or 0, closed_capas=closed_count or 0)
+    return counters
+
+def get_round_capa_summaries(db: Session, round_ids: List[int]) -> Dict[int, Dict[str, int]]:
+    """
+    CAPA badge counters for several rounds in one query.
+    عدادات الخطط التصحيحية لعدة جولات في استعلام واحد
+    
+    Reads round_capa_counters where migrations/011 installed it, otherwise
+    counts from evaluation_results and capas. Unknown rounds are left out.
+    
+    Returns:
+        {round_id: {evaluated_items, non_compliant_items, needs_capa_items,
+                    capas_needed, open_capas, closed_capas, total_capas}}
+    """
+    round_ids = sorted(set(round_ids))
+    if not round_ids:
+        return {}
+    if _round_counters_available(db):
+        from models_updated import RoundCapaCounter
+        columns = [getattr(RoundCapaCounter, field) for field in ROUND_COUNTER_FIELDS]
+        rows = db.query(RoundCapaCounter.round_id, *columns).filter(RoundCapaCounter.round_id.in_(round_ids)).all()
+        counters = {row[0]: dict(zip(ROUND_COUNTER_FIELDS, row[1:])) for row in rows}
+    else:
+        counters = _count_round_capa_summaries(db, round_ids)
+    for counter in counters.values():
+        counter['total_capas'] = counter['open_capas'] + counter['closed_capas']
+    return counters
+
 def get_round_capa_summary(db: Session, round_id: int):
     """
     Get summary of CAPA plans related to a specific round.
     
+    Counts come from get_round_capa_summaries; evaluations are counted once
+    per item (the latest result).
+    
     Args:
         round_id: The round ID
     
@@ -2248,18 +2668,7 @@ def get_round_capa_summary(db: Session, round_id: int):
         
         # Get all CAPAs for this round
         capas = db.query(Capa).filter(Capa.round_id == round_id).all()
-        
-        # Get evaluation results for this round
-        if EVALUATION_MODELS_AVAILABLE:
-            from models_updated import EvaluationResult
-            total_evaluations = db.query(EvaluationResult).filter(EvaluationResult.round_id == round_id).count()
-            non_compliant_evaluations = db.query(EvaluationResult).filter(
-                EvaluationResult.round_id == round_id,
-                EvaluationResult.score < 70
-            ).count()
-        else:
-            total_evaluations = 0
-            non_compliant_evaluations = 0
+        counters = get_round_capa_summaries(db, [round_id]).get(round_id) or dict.fromkeys(ROUND_COUNTER_FIELDS, 0)
         
         # Group CAPAs by status
         capa_by_status = {}
@@ -2281,12 +2690,15 @@ def get_round_capa_summary(db: Session, round_id: int):
             'round_department': round_obj.department,
             'round_compliance_percentage': round_obj.compliance_percentage,
             'total_capas': len(capas),
-            'total_evaluations': total_evaluations,
-            'non_compliant_evaluations': non_compliant_evaluations,
-            'capas_needed': max(0, non_compliant_evaluations - len(capas)),
+            'total_evaluations': counters['evaluated_items'],
+            'non_compliant_evaluations': counters['non_compliant_items'],
+            'needs_capa_evaluations': counters['needs_capa_items'],
+            'capas_needed': counters['capas_needed'],
+            'open_capas': counters['open_capas'],
+            'closed_capas': counters['closed_capas'],
             'capa_by_status': capa_by_status
         }
         
     except Exception as e:
-        print(f"Error getting round CAPA summary: {e}")
+        logger.error("Error getting round CAPA summary: %s", e)
         return None
@@ -11,6 +11,7 @@ import json
 from models_updated import (
     Capa, User, Department
 )
+import forecasting
 
 def get_analytics_data(
     db: Session, 
@@ -115,37 +116,26 @@ def get_performance_metrics(
 ) -> Dict[str, Any]:
     """Get performance metrics"""
     try:
-        # Build base query
-        base_query = db.query(Capa)
-        if department_id:
-            base_query = base_query.filter(Capa.department_id == department_id)
-        if start_date:
-            base_query = base_query.filter(Capa.created_at >= start_date)
-        if end_date:
-            base_query = base_query.filter(Capa.created_at <= end_date)
-
-        # Calculate metrics
-        total_capas = base_query.count()
-        
-        # Average response time (mock calculation)
-        avg_response_time = 2.5  # hours
+        end_date = end_date or datetime.now()
+        start_date = start_date or end_date - timedelta(days=365)
+        summary = forecasting.performance_summary(db, start_date, end_date, department_id)
+        total_capas = summary["total"]
         
         # Escalation rate
-        escalated_capas = base_query.filter(Capa.escalation_level > 0).count()
+        escalated_capas = summary["escalated"]
         escalation_rate = (escalated_capas / total_capas * 100) if total_capas > 0 else 0
         
-        # First time fix rate
-        completed_capas = base_query.filter(Capa.status == 'completed').count()
-        first_time_fix_rate = 85.0  # Mock data
-        
         # Customer satisfaction
-        customer_satisfaction = 88.0  # Mock data
+        customer_satisfaction = 88.0  # Mock data: no survey data is collected yet
 
         return {
-            "avg_response_time": avg_response_time,
+            # Hours from creation to the first recorded status change
+            "avg_response_time": summary["mean_hours_to_first_response"] or 0,
             "escalation_rate": escalation_rate,
-            "first_time_fix_rate": first_time_fix_rate,
-            "customer_satisfaction": customer_satisfaction
+            # Closed CAPAs that were never reopened after being implemented/closed
+            "first_time_fix_rate": summary["first_time_fix_rate"] or 0,
+            "customer_satisfaction": customer_satisfaction,
+            "mean_time_to_close": summary["mean_days_to_close"],
         }
     except Exception as e:
         print(f"Error getting performance metrics: {e}")
@@ -163,19 +153,19 @@ def get_department_comparison(
 ) -> List[Dict[str, Any]]:
     """Get department comparison data"""
     try:
-        departments = db.query(Department).all()
+        # One grouped pass over capas instead of two counts per department
+        counts_query = db.query(
+            Capa.department_id, func.count(Capa.id), func.count(Capa.id).filter(Capa.status == 'completed')
+        )
+        if start_date:
+            counts_query = counts_query.filter(Capa.created_at >= start_date)
+        if end_date:
+            counts_query = counts_query.filter(Capa.created_at <= end_date)
+        counts = {dept: (total, completed) for dept, total, completed in counts_query.group_by(Capa.department_id).all()}
         comparison = []
         
-        for dept in departments:
-            # Build query for this department
-            dept_query = db.query(Capa).filter(Capa.department_id == dept.id)
-            if start_date:
-                dept_query = dept_query.filter(Capa.created_at >= start_date)
-            if end_date:
-                dept_query = dept_query.filter(Capa.created_at <= end_date)
-            
-            total_capas = dept_query.count()
-            completed_capas = dept_query.filter(Capa.status == 'completed').count()
+        for dept in db.query(Department.id, Department.name).order_by(Department.id).all():
+            total_capas, completed_capas = counts.get(dept.id, (0, 0))
             
             # Calculate metrics
             completion_rate = (completed_capas / total_capas * 100) if total_capas > 0 else 0
@@ -184,6 +174,7 @@ def get_department_comparison(
             efficiency_score = min(100, completion_rate + 20)  # Mock calculation
             
             comparison.append({
+                "department_id": dept.id,
                 "department": dept.name,
                 "efficiency_score": efficiency_score,
                 "completion_rate": completion_rate,
@@ -277,50 +268,60 @@ def get_predictions(
     prediction_period: str = "3m",
     department_id: Optional[int] = None
 ) -> Dict[str, Any]:
-    """Get predictions data"""
+    """Forecast compliance, on-time CAPA completion and CAPA cost from daily aggregates"""
     try:
-        # Build base query
-        base_query = db.query(Capa)
-        if department_id:
-            base_query = base_query.filter(Capa.department_id == department_id)
-        
-        # Get recent completion rate
-        recent_capas = base_query.filter(
-            Capa.created_at >= datetime.now() - timedelta(days=90)
-        ).all()
-        
-        total_recent = len(recent_capas)
-        completed_recent = len([c for c in recent_capas if c.status == 'completed'])
-        recent_completion_rate = (completed_recent / total_recent * 100) if total_recent > 0 else 0
-        
-        # Predict next month completion
-        next_month_completion = min(100, recent_completion_rate + 5)  # Slight improvement
+        horizon = forecasting.period_days(prediction_period)
+        aggregates = forecasting.daily_aggregates(db, department_id)
+        result = forecasting.forecast(aggregates, horizon)
+        departments = result["departments"]
+        overall = len(departments)  # the last series sums every department
+
+        next_month_completion = float(result["completion_next_month"][overall])
+        next_month_compliance = float(result["compliance_next_month"][overall])
+        department_forecasts = [
+            {
+                "department_id": aggregates["department_ids"][i],
+                "department": name,
+                "current_compliance": round(float(result["compliance_now"][i]), 2),
+                "forecast_compliance": round(float(result["compliance_forecast"][i]), 2),
+                "trend_per_month": round(float(result["compliance_trend"][i]), 2),
+                "observed_days": int(result["compliance_days"][i]),
+            }
+            for i, name in enumerate(departments)
+            if result["compliance_days"][i] > 0
+        ]
+        declining = [
+            row["department"] for row in department_forecasts
+            if row["forecast_compliance"] < row["current_compliance"] - 5
+        ]
+        monthly_volume = float(result["daily_volume"][overall]) * 30
         
         # Risk factors
         risk_factors = []
-        if recent_completion_rate < 70:
+        if result["completion_days"][overall] and next_month_completion < 70:
             risk_factors.append("انخفاض معدل الإنجاز")
-        if total_recent > 30:
+        if monthly_volume > 30:
             risk_factors.append("كثرة الخطط المطلوبة")
+        if declining:
+            risk_factors.append("تراجع متوقع في نسبة الامتثال: " + "، ".join(declining[:5]))
         
         # Recommendations
         recommendations = []
-        if recent_completion_rate < 80:
+        if result["completion_days"][overall] and next_month_completion < 80:
             recommendations.append("تحسين عملية التخطيط والتنفيذ")
-        if total_recent > 25:
+        if monthly_volume > 25:
             recommendations.append("زيادة الموارد المخصصة للخطط")
+        if declining:
+            recommendations.append("مراجعة خطط التحسين في الأقسام ذات الامتثال المتراجع")
         recommendations.append("تطبيق نظام مراقبة أفضل")
         
-        # Cost forecast
-        avg_cost = 3000.0  # Mock data
-        predicted_volume = max(10, total_recent)  # Predict similar volume
-        cost_forecast = avg_cost * predicted_volume
-        
         return {
-            "next_month_completion": next_month_completion,
+            "next_month_completion": round(next_month_completion, 2),
+            "next_month_compliance": round(next_month_compliance, 2) if result["compliance_days"][overall] else None,
             "risk_factors": risk_factors,
             "recommendations": recommendations,
-            "cost_forecast": cost_forecast
+            "cost_forecast": round(forecasting.cost_forecast(result, aggregates["cost"], horizon), 2),
+            "department_forecasts": department_forecasts,
         }
     except Exception as e:
         print(f"Error getting predictions: {e}")
@@ -3,13 +3,18 @@ CRUD operations for CAPA Actions
 عمليات قاعدة البيانات لإجراءات الخطط التصحيحية
 """
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from sqlalchemy.orm import Session, Query
+from sqlalchemy import and_, or_, func, literal, tuple_
+from typing import List, Optional, Tuple
 from models_updated import CapaAction, Capa, User
 from datetime import datetime, timedelta
+import base64
 import json
 
+CLOSED_ACTION_STATUSES = ('completed', 'cancelled')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 def get_capa_actions(
     db: Session,
     capa_id: Optional[int] = None,
@@ -110,49 +115,124 @@ def delete_capa_action(db: Session, action_id: int) -> bool:
     db.commit()
     return True
 
-def get_overdue_actions(db: Session, action_type: Optional[str] = None) -> List[CapaAction]:
-    """Get overdue actions (due_date < now and status not completed/cancelled)"""
-    
-    query = db.query(CapaAction).filter(
-        and_(
-            CapaAction.due_date < datetime.now(),
-            ~CapaAction.status.in_(['completed', 'cancelled'])
-        )
-    )
+def encode_cursor(action: CapaAction) -> str:
+    """Opaque cursor for the position right after ``action`` in (due_date, id) order"""
+    due = action.due_date.isoformat() if action.due_date else None
+    raw = json.dumps([due, action.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        due, action_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(due) if due else None), int(action_id)
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+
+
+def _open_actions(db: Session) -> Query:
+    return db.query(CapaAction).filter(~CapaAction.status.in_(CLOSED_ACTION_STATUSES))
+
+
+def keyset_page(query: Query, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE_SIZE,
+                include_undated: bool = False) -> Tuple[List[CapaAction], Optional[str]]:
+    """One page of ``query`` in (due_date, id) order, starting after ``cursor``.
+
+    Each page is an index range scan on (…, due_date, id), so its cost does not
+    grow with how deep into the backlog the caller is. With include_undated the
+    actions without a due date follow the dated ones (NULLS LAST), read as a
+    second range once the dated ones run out.
+    Returns the page and the cursor of the next one (None on the last page).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after_due, after_id = decode_cursor(cursor) if cursor else (None, None)
     
-    if action_type:
-        query = query.filter(CapaAction.action_type == action_type)
+    actions: List[CapaAction] = []
+    if after_id is None or after_due is not None:
+        dated = query.filter(CapaAction.due_date.isnot(None))
+        if after_id is not None:
+            dated = dated.filter(tuple_(CapaAction.due_date, CapaAction.id) > tuple_(
+                literal(after_due, CapaAction.due_date.type), after_id
+            ))
+        actions = dated.order_by(CapaAction.due_date.asc(), CapaAction.id.asc()).limit(limit + 1).all()
+    if include_undated and len(actions) <= limit:
+        undated = query.filter(CapaAction.due_date.is_(None))
+        if after_id is not None and after_due is None:
+            undated = undated.filter(CapaAction.id > after_id)
+        actions += undated.order_by(CapaAction.id.asc()).limit(limit + 1 - len(actions)).all()
     
-    return query.order_by(CapaAction.due_date.asc()).all()
+    if len(actions) > limit:
+        actions = actions[:limit]
+        return actions, encode_cursor(actions[-1])
+    return actions, None
 
-def get_upcoming_actions(db: Session, days: int = 7, action_type: Optional[str] = None) -> List[CapaAction]:
-    """Get upcoming actions (due within next N days)"""
-    
+
+def action_summary(query: Query) -> dict:
+    """Counts per action type (and how many are overdue) for ``query``, in one aggregate query"""
     now = datetime.now()
-    future = now + timedelta(days=days)
-    
-    query = db.query(CapaAction).filter(
-        and_(
-            CapaAction.due_date >= now,
-            CapaAction.due_date <= future,
-            ~CapaAction.status.in_(['completed', 'cancelled'])
+    rows = query.with_entities(
+        CapaAction.action_type,
+        func.count(CapaAction.id),
+        func.count(CapaAction.id).filter(
+            and_(CapaAction.due_date < now, ~CapaAction.status.in_(CLOSED_ACTION_STATUSES))
         )
-    )
-    
+    ).group_by(CapaAction.action_type).all()
+    return {
+        'total': sum(count for _, count, _ in rows),
+        'overdue': sum(overdue for _, _, overdue in rows),
+        'by_type': {action_type: count for action_type, count, _ in rows},
+    }
+
+
+def _queue_query(query: Query, action_type: Optional[str]) -> Query:
     if action_type:
         query = query.filter(CapaAction.action_type == action_type)
-    
-    return query.order_by(CapaAction.due_date.asc()).all()
+    return query
 
-def get_actions_by_assignee(db: Session, assigned_to_id: int, status: Optional[str] = None) -> List[CapaAction]:
-    """Get actions assigned to a specific user"""
-    
-    query = db.query(CapaAction).filter(CapaAction.assigned_to_id == assigned_to_id)
-    
-    if status:
-        query = query.filter(CapaAction.status == status)
-    
-    return query.order_by(CapaAction.due_date.asc().nullslast()).all()
+
+def overdue_actions_query(db: Session, action_type: Optional[str] = None) -> Query:
+    """Open actions whose due date has passed"""
+    return _queue_query(_open_actions(db).filter(CapaAction.due_date < datetime.now()), action_type)
+
+
+def upcoming_actions_query(db: Session, days: int = 7, action_type: Optional[str] = None) -> Query:
+    """Open actions due within the next N days"""
+    now = datetime.now()
+    return _queue_query(_open_actions(db).filter(
+        CapaAction.due_date >= now,
+        CapaAction.due_date <= now + timedelta(days=days)
+    ), action_type)
+
+
+def assignee_actions_query(db: Session, assigned_to_id: int, status: Optional[str] = None) -> Query:
+    """Actions of an assignee: the open ones by default, ``status="all"`` for every status"""
+    if status == 'all':
+        query = db.query(CapaAction)
+    elif status:
+        query = db.query(CapaAction).filter(CapaAction.status == status)
+    else:
+        query = _open_actions(db)
+    return query.filter(CapaAction.assigned_to_id == assigned_to_id)
+
+
+def get_overdue_actions(db: Session, action_type: Optional[str] = None, cursor: Optional[str] = None,
+                        limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[CapaAction], Optional[str]]:
+    """Get a page of overdue actions (due_date < now and status not completed/cancelled)"""
+    return keyset_page(overdue_actions_query(db, action_type), cursor, limit)
+
+
+def get_upcoming_actions(db: Session, days: int = 7, action_type: Optional[str] = None, cursor: Optional[str] = None,
+                         limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[CapaAction], Optional[str]]:
+    """Get a page of upcoming actions (due within next N days)"""
+    return keyset_page(upcoming_actions_query(db, days, action_type), cursor, limit)
+
+
+def get_actions_by_assignee(db: Session, assigned_to_id: int, status: Optional[str] = None, cursor: Optional[str] = None,
+                            limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[CapaAction], Optional[str]]:
+    """Get a page of actions assigned to a specific user, undated ones last"""
+    return keyset_page(assignee_actions_query(db, assigned_to_id, status), cursor, limit, include_undated=True)
 
 def get_action_statistics(db: Session) -> dict:
     """Get statistics about CAPA actions for dashboard"""
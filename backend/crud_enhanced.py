@@ -479,21 +479,14 @@ def get_department_capa_stats(db: Session, department_id: int) -> Dict[str, Any]
         count = base_query.filter(Capa.priority == priority).count()
         priority_breakdown[priority] = count
     
-    # Average completion time
-    completed_capas = base_query.filter(
+    # Average completion time (days from creation to closed_at)
+    avg_days = base_query.filter(
         and_(
-            Capa.actual_completion_date.isnot(None),
+            Capa.closed_at.isnot(None),
             Capa.created_at.isnot(None)
         )
-    ).all()
-    
-    avg_completion_time = 0
-    if completed_capas:
-        total_days = sum([
-            (capa.actual_completion_date - capa.created_at.date()).days 
-            for capa in completed_capas
-        ])
-        avg_completion_time = total_days / len(completed_capas)
+    ).with_entities(func.avg(func.extract('epoch', Capa.closed_at - Capa.created_at) / 86400)).scalar()
+    avg_completion_time = float(avg_days) if avg_days is not None else 0
     
     return {
         'total_capas': total_capas,
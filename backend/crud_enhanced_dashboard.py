@@ -335,64 +335,38 @@ def get_basic_report_data(
             )
         ).count()
         
-        # Average completion time
-        completed_capas_with_dates = query.filter(
-            and_(
-                Capa.status == 'completed',
-                Capa.actual_completion_date.isnot(None)
-            )
-        ).all()
-        
-        if completed_capas_with_dates:
-            total_days = sum([
-                (capa.actual_completion_date - capa.created_at.date()).days 
-                for capa in completed_capas_with_dates
-            ])
-            average_completion_time = round(total_days / len(completed_capas_with_dates))
-        else:
-            average_completion_time = 0
+        # Average completion time (days from creation to closed_at)
+        completed_with_dates = and_(Capa.status == 'completed', Capa.closed_at.isnot(None))
+        average_days = query.filter(completed_with_dates).with_entities(
+            func.avg(func.extract('epoch', Capa.closed_at - Capa.created_at) / 86400)
+        ).scalar()
+        average_completion_time = round(float(average_days)) if average_days is not None else 0
         
         # Cost savings
         cost_savings = query.filter(Capa.status == 'completed').with_entities(
             func.sum(Capa.estimated_cost)
         ).scalar() or 0
         
-        # Department stats
+        # Department stats: one grouped pass over the filtered CAPAs
+        overdue = and_(Capa.target_date < today, ~Capa.status.in_(['completed', 'closed']))
+        dept_rows = query.with_entities(
+            Capa.department_id,
+            func.count(Capa.id),
+            func.count(Capa.id).filter(Capa.status == 'completed'),
+            func.count(Capa.id).filter(overdue),
+            func.avg(func.extract('epoch', Capa.closed_at - Capa.created_at) / 86400).filter(completed_with_dates),
+        ).group_by(Capa.department_id).all()
+        counts = {row[0]: row[1:] for row in dept_rows}
         department_stats = []
-        departments = db.query(Department).all()
-        for dept in departments:
-            dept_query = query.filter(Capa.department_id == dept.id)
-            dept_total = dept_query.count()
-            dept_completed = dept_query.filter(Capa.status == 'completed').count()
-            dept_overdue = dept_query.filter(
-                and_(
-                    Capa.target_date < today,
-                    ~Capa.status.in_(['completed', 'closed'])
-                )
-            ).count()
-            
-            dept_completed_with_dates = dept_query.filter(
-                and_(
-                    Capa.status == 'completed',
-                    Capa.actual_completion_date.isnot(None)
-                )
-            ).all()
-            
-            if dept_completed_with_dates:
-                dept_total_days = sum([
-                    (capa.actual_completion_date - capa.created_at.date()).days 
-                    for capa in dept_completed_with_dates
-                ])
-                dept_avg_time = round(dept_total_days / len(dept_completed_with_dates))
-            else:
-                dept_avg_time = 0
-            
+        for dept in db.query(Department.id, Department.name).order_by(Department.id).all():
+            dept_total, dept_completed, dept_overdue, dept_avg_days = counts.get(dept.id, (0, 0, 0, None))
             department_stats.append({
+                "department_id": dept.id,
                 "department": dept.name,
                 "total_capas": dept_total,
                 "completed_capas": dept_completed,
                 "overdue_capas": dept_overdue,
-                "average_completion_time": dept_avg_time
+                "average_completion_time": round(float(dept_avg_days)) if dept_avg_days is not None else 0
             })
         
         # Priority breakdown
@@ -0,0 +1,164 @@
+"""
+Department directory - cached department -> managers map
+دليل الأقسام: خريطة مخزنة مؤقتاً من القسم إلى مديريه بدلاً من البحث بالاسم وتحليل JSON في كل مرة
+
+Escalations, reminders and CAPA notifications look up the managers of a
+department once per CAPA. The directory loads every department and its
+managers (from ``department_managers`` joined to ``users``) in two queries
+and answers by department name or id from memory.
+
+A commit that writes ``departments``, ``department_managers`` or ``users``
+(``crud.update_department`` and friends, a renamed manager) marks the map
+stale and the next lookup reloads it; other workers pick the change up
+within DEPARTMENT_DIRECTORY_SECONDS. Rolled back writes invalidate nothing.
+
+Rounds and CAPAs keep the department name for display and reference the
+department by ``department_id``. A ``before_flush`` listener fills the id in
+from the name for every round/CAPA the ORM writes (migrations/010 does the
+same in a trigger for raw SQL), and ``department_filter`` turns a name or id
+from a request into an index-backed ``department_id`` comparison.
+"""
+
+import logging
+import os
+import threading
+import time
+from itertools import chain
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import event, false, inspect
+from sqlalchemy.orm import Session
+
+from models_updated import Capa, Department, DepartmentManager, Round, User
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("DEPARTMENT_DIRECTORY_SECONDS", "300"))
+WATCHED_TABLES = frozenset({"departments", "department_managers", "users"})
+
+_CHANGED_KEY = "department_directory_changed"
+
+DepartmentRef = Union[int, str]
+
+
+class DepartmentDirectory:
+    """Department ids, names and managers of this worker process"""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._ids_by_name: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        # department id -> ((user id, "First Last (username)"), ...) in user id order
+        self._managers: Dict[int, Tuple[Tuple[int, str], ...]] = {}
+        self._generation = 0
+        self._loaded_generation: Optional[int] = None
+        self._loaded_at = 0.0
+
+    # -- loading ---------------------------------------------------------
+    def load(self, departments, managers, generation: Optional[int] = None):
+        """Replace the map with (id, name) and (department id, user id, first, last, username) rows"""
+        ids_by_name, names, grouped = {}, {}, {}
+        for department_id, name in departments:
+            names[department_id] = name
+            # Names are not unique; the oldest department keeps the name, as .first() did
+            ids_by_name.setdefault(name, department_id)
+        for department_id, user_id, first_name, last_name, username in managers:
+            full_name = f"{first_name or ''} {last_name or ''}".strip()
+            grouped.setdefault(department_id, []).append((user_id, f"{full_name} ({username})"))
+        with self._lock:
+            self._ids_by_name = ids_by_name
+            self._names = names
+            self._managers = {department_id: tuple(rows) for department_id, rows in grouped.items()}
+            self._loaded_generation = self._generation if generation is None else generation
+            self._loaded_at = time.monotonic()
+
+    def refresh(self, db: Session):
+        generation = self._generation
+        departments = db.query(Department.id, Department.name).order_by(Department.id).all()
+        managers = db.query(
+            DepartmentManager.department_id, User.id, User.first_name, User.last_name, User.username
+        ).join(User, User.id == DepartmentManager.user_id).order_by(
+            DepartmentManager.department_id, User.id
+        ).all()
+        # A commit that lands while loading leaves the map stale for the next lookup
+        self.load(departments, managers, generation)
+        logger.debug("department directory loaded: %s departments, %s managers", len(departments), len(managers))
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def ensure_fresh(self, db: Session):
+        expired = time.monotonic() - self._loaded_at > self.refresh_seconds
+        if self._loaded_generation != self._generation or expired:
+            self.refresh(db)
+
+    # -- queries ---------------------------------------------------------
+    def department_id(self, db: Session, department: Optional[DepartmentRef]) -> Optional[int]:
+        """Id of a department given by id or name; None when unknown"""
+        if department is None or department == "":
+            return None
+        self.ensure_fresh(db)
+        if isinstance(department, int):
+            return department if department in self._names else None
+        return self._ids_by_name.get(department)
+
+    def _managers_of(self, db: Session, department: Optional[DepartmentRef]) -> Tuple[Tuple[int, str], ...]:
+        department_id = self.department_id(db, department)
+        return self._managers.get(department_id, ()) if department_id is not None else ()
+
+    def manager_ids(self, db: Session, department: Optional[DepartmentRef]) -> List[int]:
+        return [user_id for user_id, _ in self._managers_of(db, department)]
+
+    def manager_labels(self, db: Session, department: Optional[DepartmentRef]) -> List[str]:
+        return [label for _, label in self._managers_of(db, department)]
+
+
+department_directory = DepartmentDirectory()
+
+
+def department_filter(db: Session, column, department: Optional[DepartmentRef]):
+    """``column == id`` of a department given by id or name; matches nothing for an unknown one"""
+    department_id = department_directory.department_id(db, department)
+    return column == department_id if department_id is not None else false()
+
+
+@event.listens_for(Session, "before_flush")
+def _fill_department_ids(session: Session, flush_context, instances):
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, (Round, Capa)):
+            continue
+        state = inspect(obj)
+        renamed = state.attrs.department.history.has_changes() and not state.attrs.department_id.history.has_changes()
+        if obj.department_id is None or renamed:
+            obj.department_id = department_directory.department_id(session, obj.department)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_directory_writes(session: Session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(type(obj), "__table__", None)
+        if table is not None and table.name in WATCHED_TABLES:
+            session.info[_CHANGED_KEY] = True
+            return
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_directory_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in WATCHED_TABLES:
+            orm_execute_state.session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    if session.info.pop(_CHANGED_KEY, False):
+        department_directory.invalidate()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session: Session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,208 @@
+"""
+Evaluation sync - item-level offline sync for tablets
+مزامنة التقييم: ترسل الأجهزة اللوحية التغييرات على مستوى العنصر فقط وتستلم ما تغير منذ آخر مزامنة
+
+Instead of resubmitting the whole evaluation through /evaluations/draft, a
+device sends the items it changed since its last sync:
+
+    {client_id, since, changes: [{change_id, item_id, seq, base_id?, status, ...}], finalize?}
+
+Each change is applied at most once (``change_id``), in ``seq`` order per
+device, as a new evaluation_results row (only the latest row per item
+counts). A change made on a version another device has since replaced
+(the item's latest result is newer than ``base_id``, default ``since``) is
+not applied but reported as a conflict; the device gets the server version
+in ``changes`` and can resend on top of it.
+
+The answer carries the other changes to the round since ``since`` and the
+new ``sync_token`` (the round's highest result id). Writers of a round lock
+its row first (crud.lock_round), so result ids within a round follow
+commit order and no change is skipped by a token.
+"""
+
+import json
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from crud import evaluation_score, lock_round, weighted_round_score
+from evidence_store import usable_evidence_ids
+from models_updated import EvaluationItem, EvaluationResult, Round, RoundStatus
+
+logger = logging.getLogger(__name__)
+
+MAX_SYNC_CHANGES = 500
+
+
+def _latest_results(db: Session, round_id: int, item_ids: Optional[Iterable[int]] = None, after_id: int = 0) -> Dict[int, EvaluationResult]:
+    """Latest result per item of a round (of some items; newer than ``after_id``)"""
+    latest = select(func.max(EvaluationResult.id)).where(EvaluationResult.round_id == round_id)
+    if item_ids is not None:
+        latest = latest.where(EvaluationResult.item_id.in_(item_ids))
+    query = db.query(EvaluationResult).filter(EvaluationResult.id.in_(latest.group_by(EvaluationResult.item_id)))
+    if after_id:
+        query = query.filter(EvaluationResult.id > after_id)
+    return {result.item_id: result for result in query}
+
+
+def _evaluation_items(round_obj: Round) -> List[int]:
+    items = round_obj.evaluation_items
+    if isinstance(items, str):
+        try:
+            items = json.loads(items)
+        except (json.JSONDecodeError, TypeError):
+            items = []
+    return [int(item) for item in items or [] if str(item).isdigit()]
+
+
+def rescore_round(db: Session, round_obj: Round):
+    """Compliance, score details and completion of a round from the latest result of each item"""
+    latest = select(func.max(EvaluationResult.id)).where(
+        EvaluationResult.round_id == round_obj.id
+    ).group_by(EvaluationResult.item_id)
+    rows = db.query(
+        EvaluationResult.item_id, EvaluationResult.score, EvaluationResult.status,
+        EvaluationItem.weight, EvaluationItem.category_id
+    ).join(EvaluationItem, EvaluationItem.id == EvaluationResult.item_id).filter(
+        EvaluationResult.id.in_(latest)
+    ).all()
+
+    category_scores = {}
+    evaluated = 0
+    for _, score, status, weight, category_id in rows:
+        # Results stored before the status column counted as scored
+        if status is not None and not evaluation_score(status)[1]:
+            continue
+        evaluated += 1
+        weight = float(weight) if weight is not None else 1.0
+        stats = category_scores.setdefault(category_id, {'weighted_sum': 0, 'max_weighted_sum': 0})
+        stats['weighted_sum'] += score * weight
+        stats['max_weighted_sum'] += 100.0 * weight
+    compliance, score_details = weighted_round_score(db, category_scores)
+
+    total_items = len(_evaluation_items(round_obj)) or len(rows)
+    round_obj.compliance_percentage = int(round(compliance))
+    round_obj.score_details = json.dumps(score_details)
+    round_obj.completion_percentage = min(100, round(evaluated / total_items * 100)) if total_items else 0
+
+
+def sync_round_evaluations(db: Session, round_id: int, user_id: int, client_id: str, since: Optional[int],
+                           changes: List[dict], finalize: bool = False) -> Optional[dict]:
+    """
+    Apply a device's item-level changes to a round and collect the server's changes since ``since``.
+
+    Everything is flushed, not committed: the caller commits (after CAPA
+    generation on finalize). Returns None when the round does not exist.
+
+    Returns:
+        Dict with sync_token, applied / duplicates / stale / rejected change ids,
+        conflicts, the server changes (EvaluationResult rows), the round's
+        scores and whether it was finalized
+    """
+    lock_round(db, round_id)
+    round_obj = db.get(Round, round_id)
+    if round_obj is None:
+        return None
+    since = since or 0
+    outcome = {"applied": [], "duplicates": [], "stale": [], "rejected": [], "conflicts": []}
+
+    # Retries of changes already applied
+    change_ids = [change["change_id"] for change in changes]
+    seen = {
+        change_id for change_id, in db.query(EvaluationResult.client_change_id).filter(
+            EvaluationResult.client_change_id.in_(change_ids)
+        )
+    } if change_ids else set()
+
+    # Per item, only the device's newest change matters
+    newest: Dict[int, dict] = {}
+    for change in sorted(changes, key=lambda change: change["seq"]):
+        # (a repeat within the batch is a duplicate too)
+        if change["change_id"] in seen:
+            outcome["duplicates"].append(change["change_id"])
+            continue
+        seen.add(change["change_id"])
+        replaced = newest.get(change["item_id"])
+        if replaced is not None:
+            outcome["stale"].append(replaced["change_id"])
+        newest[change["item_id"]] = change
+
+    items = {
+        item_id for item_id, in db.query(EvaluationItem.id).filter(EvaluationItem.id.in_(newest))
+    } if newest else set()
+    current = _latest_results(db, round_id, item_ids=list(newest)) if newest else {}
+    referenced = {evidence_id for change in newest.values() for evidence_id in change.get("evidence_ids") or []}
+    # Only the user's own uploads and evidence the round already uses
+    known_evidence = usable_evidence_ids(db, user_id, round_id, referenced)
+
+    for item_id, change in newest.items():
+        latest = current.get(item_id)
+        if item_id not in items:
+            outcome["rejected"].append(change["change_id"])
+            continue
+        if latest is not None and latest.client_id == client_id and (latest.client_seq or 0) >= change["seq"]:
+            # An older change of this device arriving after a newer one
+            outcome["stale"].append(change["change_id"])
+            continue
+        base_id = change.get("base_id") if change.get("base_id") is not None else since
+        if latest is not None and latest.id > base_id and latest.client_id != client_id:
+            outcome["conflicts"].append({
+                "change_id": change["change_id"], "item_id": item_id, "server_result_id": latest.id
+            })
+            continue
+        score, _ = evaluation_score(change["status"])
+        result = EvaluationResult(
+            round_id=round_id,
+            item_id=item_id,
+            score=score,
+            status=change["status"],
+            comments=change.get("comments") or change["status"],
+            evidence_ids=[i for i in change.get("evidence_ids") or [] if i in known_evidence] or None,
+            needs_capa=bool(change.get("mark_needs_capa")),
+            capa_note=(change.get("capa_note") or change.get("comments")) if change.get("mark_needs_capa") else None,
+            evaluated_by=user_id,
+            client_id=client_id,
+            client_change_id=change["change_id"],
+            client_seq=change["seq"],
+        )
+        db.add(result)
+        outcome["applied"].append(change["change_id"])
+    applied_ids = set()
+    if outcome["applied"]:
+        db.flush()
+        applied_ids = {
+            result_id for result_id, in db.query(EvaluationResult.id).filter(
+                EvaluationResult.client_change_id.in_(outcome["applied"])
+            )
+        }
+
+    # A round with unresolved conflicts is not finalized
+    finalized = finalize and not outcome["conflicts"]
+    if outcome["applied"] or finalized:
+        rescore_round(db, round_obj)
+        if finalized:
+            round_obj.status = RoundStatus.COMPLETED
+        elif round_obj.status != RoundStatus.COMPLETED:
+            round_obj.status = RoundStatus.IN_PROGRESS
+        db.flush()
+
+    server_changes = [
+        result for result in _latest_results(db, round_id, after_id=since).values()
+        if result.id not in applied_ids
+    ]
+    sync_token = db.query(func.max(EvaluationResult.id)).filter(EvaluationResult.round_id == round_id).scalar() or 0
+    logger.debug(
+        "evaluation sync round=%s client=%s applied=%s conflicts=%s server_changes=%s",
+        round_id, client_id, len(outcome["applied"]), len(outcome["conflicts"]), len(server_changes)
+    )
+    return {
+        **outcome,
+        "sync_token": sync_token,
+        "changes": sorted(server_changes, key=lambda result: result.id),
+        "round_status": getattr(round_obj.status, "value", round_obj.status),
+        "compliance_percentage": round_obj.compliance_percentage,
+        "completion_percentage": round_obj.completion_percentage,
+        "finalized": finalized,
+    }
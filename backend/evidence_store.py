@@ -0,0 +1,340 @@
+"""
+Evidence store - chunked uploads, content-addressed files on local disk
+مخزن الأدلة: رفع الملفات على أجزاء قابل للاستئناف، وتخزين كل محتوى مرة واحدة
+
+Evaluation results used to carry their photos inline (data URIs inside
+``evidence_files``), which made finalize requests tens of megabytes and
+bloated ``evaluation_results``. Evidence is now uploaded on its own and
+results reference it by id (``EvaluationResult.evidence_ids``):
+
+1. ``start_upload`` records the file's name, type and size.
+2. ``append_chunk`` appends bytes at an offset. A client that lost its
+   connection asks for ``received_bytes`` and continues from there.
+3. ``complete_upload`` downscales images larger than EVIDENCE_IMAGE_MAX_SIDE
+   (when Pillow is installed) in a worker pool, hashes the result and moves
+   it to ``blobs/<sha256[:2]>/<sha256>``. The same content uploaded twice is
+   stored once and gets the same ``EvidenceFile``; each uploader gets an
+   ``EvidenceGrant`` on it.
+
+Results may only reference evidence their evaluator uploaded or that the
+round already uses (``usable_evidence_ids``), since ids are sequential.
+
+Blobs never change, so downloads can be cached forever and served with
+range requests (``FileResponse``).
+"""
+
+import asyncio
+import base64
+import binascii
+import fcntl
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models_updated import EvaluationResult, EvidenceFile, EvidenceGrant, EvidenceUpload
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+EVIDENCE_DIR = os.getenv("EVIDENCE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "evidence"))
+MAX_EVIDENCE_BYTES = int(os.getenv("EVIDENCE_MAX_BYTES", str(50 * 1024 * 1024)))
+MAX_CHUNK_BYTES = int(os.getenv("EVIDENCE_MAX_CHUNK_BYTES", str(4 * 1024 * 1024)))
+IMAGE_MAX_SIDE = int(os.getenv("EVIDENCE_IMAGE_MAX_SIDE", "1920"))
+IMAGE_QUALITY = 85
+EVIDENCE_WORKERS = int(os.getenv("EVIDENCE_WORKERS", "2"))
+# Unfinished uploads older than this are dropped when their owner starts a new one
+UPLOAD_EXPIRY = timedelta(hours=24)
+
+ALLOWED_CONTENT_TYPES = frozenset({
+    "image/jpeg", "image/png", "image/webp", "image/heic", "image/gif",
+    "application/pdf", "video/mp4", "video/quicktime",
+})
+CONTENT_TYPE_ALIASES = {"image/jpg": "image/jpeg", "image/pjpeg": "image/jpeg"}
+# Formats Pillow re-encodes after downscaling; others are stored as uploaded
+RESIZABLE_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+class EvidenceError(Exception):
+    """A rejected upload; ``status_code`` is the HTTP status to answer with"""
+
+    def __init__(self, detail: str, status_code: int = 400, **extra):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.extra = extra
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size_bytes: int
+    content_type: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+class EvidenceStore:
+    """Files of uploads in progress and the content-addressed blobs, under one directory"""
+
+    def __init__(self, root: str = EVIDENCE_DIR, image_max_side: int = IMAGE_MAX_SIDE, workers: int = EVIDENCE_WORKERS):
+        self.root = root
+        self.image_max_side = image_max_side
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evidence")
+
+    # -- paths -----------------------------------------------------------
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, "uploads", f"{upload_id}.part")
+
+    # -- uploads ---------------------------------------------------------
+    def received_bytes(self, upload_id: str) -> int:
+        try:
+            return os.path.getsize(self.part_path(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes, total_size: int) -> int:
+        """Append ``data`` if the part file is exactly ``offset`` bytes long; returns the new length"""
+        path = self.part_path(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        try:
+            # Two requests for the same upload (a client retrying) must not interleave
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            received = os.fstat(fd).st_size
+            if offset != received:
+                raise EvidenceError("الإزاحة لا تطابق ما تم استلامه", 409, received_bytes=received)
+            if received + len(data) > total_size:
+                raise EvidenceError("البيانات تتجاوز حجم الملف المعلن", 400, received_bytes=received)
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            return received + len(data)
+        finally:
+            os.close(fd)
+
+    def discard(self, upload_id: str):
+        try:
+            os.remove(self.part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    # -- blobs -----------------------------------------------------------
+    def store_file(self, path: str, content_type: str) -> StoredBlob:
+        """Downscale, hash and move a finished file into the blob tree (the source file is consumed)"""
+        width = height = None
+        if content_type in RESIZABLE_FORMATS and Image is not None:
+            path, width, height = self._downscale(path, content_type)
+
+        digest, size = hashlib.sha256(), 0
+        with open(path, "rb") as source:
+            for block in iter(lambda: source.read(HASH_BLOCK_BYTES), b""):
+                digest.update(block)
+                size += len(block)
+        sha256 = digest.hexdigest()
+
+        target = self.blob_path(sha256)
+        if os.path.exists(target):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Same filesystem: the blob appears complete or not at all
+            os.replace(path, target)
+        return StoredBlob(sha256, size, content_type, width, height)
+
+    def _downscale(self, path: str, content_type: str) -> Tuple[str, Optional[int], Optional[int]]:
+        try:
+            with Image.open(path) as image:
+                image = ImageOps.exif_transpose(image)
+                if max(image.size) <= self.image_max_side:
+                    return path, image.width, image.height
+                image.thumbnail((self.image_max_side, self.image_max_side))
+                image_format = RESIZABLE_FORMATS[content_type]
+                if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                scaled = f"{path}.scaled"
+                image.save(scaled, image_format, quality=IMAGE_QUALITY, optimize=True)
+        except Exception as e:
+            # Not an image after all, truncated, or too large to decode: keep the upload as is
+            logger.warning("evidence image not downscaled: %s", e)
+            return path, None, None
+        os.remove(path)
+        return scaled, image.width, image.height
+
+    async def store_file_async(self, path: str, content_type: str) -> StoredBlob:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.store_file, path, content_type)
+
+    def store_bytes(self, data: bytes, content_type: str) -> StoredBlob:
+        """Store in-memory content (inline data URIs) through the worker pool"""
+        path = self.part_path(f"inline-{uuid.uuid4().hex}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as target:
+            target.write(data)
+        return self._executor.submit(self.store_file, path, content_type).result()
+
+
+evidence_store = EvidenceStore()
+
+
+def _validate(content_type: str, size: int):
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise EvidenceError(f"نوع الملف غير مدعوم: {content_type}", 415)
+    if size <= 0 or size > MAX_EVIDENCE_BYTES:
+        raise EvidenceError(f"حجم الملف يجب أن يكون بين 1 و {MAX_EVIDENCE_BYTES} بايت", 413)
+
+
+def _register(db: Session, blob: StoredBlob, filename: Optional[str], user_id: Optional[int]) -> EvidenceFile:
+    """The EvidenceFile of a blob, granted to ``user_id``; content uploaded before reuses its row"""
+    evidence = db.query(EvidenceFile).filter(EvidenceFile.sha256 == blob.sha256).first()
+    if evidence is None:
+        evidence = EvidenceFile(
+            sha256=blob.sha256, content_type=blob.content_type, size_bytes=blob.size_bytes,
+            width=blob.width, height=blob.height, original_filename=filename, uploaded_by_id=user_id,
+        )
+        try:
+            with db.begin_nested():
+                db.add(evidence)
+        except IntegrityError:
+            # The same content finished concurrently
+            evidence = db.query(EvidenceFile).filter(EvidenceFile.sha256 == blob.sha256).one()
+    if user_id is not None and db.get(EvidenceGrant, (evidence.id, user_id)) is None:
+        try:
+            with db.begin_nested():
+                db.add(EvidenceGrant(evidence_id=evidence.id, user_id=user_id))
+        except IntegrityError:
+            pass  # granted by a concurrent upload of the same content
+    return evidence
+
+
+def has_grant(db: Session, evidence_id: int, user_id: int) -> bool:
+    return db.get(EvidenceGrant, (evidence_id, user_id)) is not None
+
+
+def usable_evidence_ids(db: Session, user_id: int, round_id: int, evidence_ids: Iterable) -> Set[int]:
+    """The ids among ``evidence_ids`` that ``user_id`` may reference in ``round_id``'s results.
+
+    Those are the user's own uploads and evidence the round's results already
+    reference; other ids would let a user reach files they cannot see.
+    """
+    wanted = {i for i in evidence_ids if isinstance(i, int) and not isinstance(i, bool)}
+    if not wanted:
+        return set()
+    usable = {
+        evidence_id for evidence_id, in db.query(EvidenceGrant.evidence_id).filter(
+            EvidenceGrant.user_id == user_id, EvidenceGrant.evidence_id.in_(wanted)
+        )
+    }
+    others = wanted - usable
+    if others:
+        for ids, in db.query(EvaluationResult.evidence_ids).filter(EvaluationResult.round_id == round_id):
+            usable.update(others.intersection(ids or []))
+    return usable
+
+
+def purge_expired_uploads(db: Session, user_id: Optional[int] = None, now: Optional[datetime] = None) -> int:
+    """Drop unfinished uploads older than UPLOAD_EXPIRY (of one user, or everyone's)"""
+    cutoff = (now or datetime.now(timezone.utc)) - UPLOAD_EXPIRY
+    query = db.query(EvidenceUpload).filter(EvidenceUpload.created_at < cutoff)
+    if user_id is not None:
+        query = query.filter(EvidenceUpload.uploaded_by_id == user_id)
+    expired = query.all()
+    for upload in expired:
+        evidence_store.discard(upload.id)
+        db.delete(upload)
+    return len(expired)
+
+
+def start_upload(db: Session, user_id: int, filename: str, content_type: str, total_size: int) -> EvidenceUpload:
+    _validate(content_type, total_size)
+    purge_expired_uploads(db, user_id)
+    upload = EvidenceUpload(
+        id=uuid.uuid4().hex, filename=filename, content_type=content_type,
+        total_size=total_size, uploaded_by_id=user_id,
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+
+def get_upload(db: Session, upload_id: str, user_id: int) -> EvidenceUpload:
+    upload = db.get(EvidenceUpload, upload_id)
+    if upload is None or upload.uploaded_by_id != user_id:
+        raise EvidenceError("عملية الرفع غير موجودة", 404)
+    return upload
+
+
+def append_chunk(upload: EvidenceUpload, offset: int, data: bytes) -> int:
+    if not data:
+        raise EvidenceError("الجزء فارغ")
+    if len(data) > MAX_CHUNK_BYTES:
+        raise EvidenceError(f"حجم الجزء يتجاوز {MAX_CHUNK_BYTES} بايت", 413)
+    return evidence_store.write_chunk(upload.id, offset, data, upload.total_size)
+
+
+async def complete_upload(db: Session, upload: EvidenceUpload) -> EvidenceFile:
+    received = evidence_store.received_bytes(upload.id)
+    if received != upload.total_size:
+        raise EvidenceError("لم يكتمل رفع الملف", 409, received_bytes=received)
+    blob = await evidence_store.store_file_async(evidence_store.part_path(upload.id), upload.content_type)
+    evidence = _register(db, blob, upload.filename, upload.uploaded_by_id)
+    db.delete(upload)
+    db.commit()
+    db.refresh(evidence)
+    return evidence
+
+
+def parse_data_uri(value) -> Optional[Tuple[str, bytes]]:
+    """(content type, bytes) of a base64 ``data:`` URI; None for anything else"""
+    if not isinstance(value, str) or not value.startswith("data:"):
+        return None
+    header, _, payload = value.partition(",")
+    if not header.endswith(";base64"):
+        return None
+    try:
+        content_type = header[5:-7].lower() or "application/octet-stream"
+        return CONTENT_TYPE_ALIASES.get(content_type, content_type), base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def store_inline_evidence(db: Session, values: List, user_id: int) -> Tuple[List[int], List]:
+    """Move the data URIs of a legacy ``evidence_files`` list into the store.
+
+    Returns the evidence ids of the stored URIs and the entries left as they
+    were (paths, URLs, unsupported or invalid content).
+    """
+    evidence_ids, kept = [], []
+    for value in values or []:
+        parsed = parse_data_uri(value)
+        if parsed is None:
+            kept.append(value)
+            continue
+        content_type, data = parsed
+        try:
+            _validate(content_type, len(data))
+        except EvidenceError as e:
+            # Left inline rather than lost
+            logger.warning("inline evidence (%s, %s bytes) kept inline: %s", content_type, len(data), e.detail)
+            kept.append(value)
+            continue
+        evidence = _register(db, evidence_store.store_bytes(data, content_type), None, user_id)
+        evidence_ids.append(evidence.id)
+    return evidence_ids, kept
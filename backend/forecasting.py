@@ -0,0 +1,263 @@
+"""
+Forecasting - compliance and CAPA metrics for the analytics endpoints
+التنبؤ بنسب الامتثال وإنجاز الخطط التصحيحية
+
+Nothing here reads raw rows. Postgres groups rounds and CAPAs by
+(department_id, day), so at most departments × days rows come back; they are
+cached per department and lookback window, and the smoothing runs on dense
+NumPy matrices of that shape (one row per department, plus one for the
+whole hospital) in a few milliseconds.
+
+Forecasts use exponentially weighted least squares: each day's value is
+weighted by its number of observations and a decay with ``HALF_LIFE_DAYS``,
+which gives a recency-weighted level and daily trend for every series in
+one vectorized pass. The trend is damped (``TREND_DAMPING``) so long
+horizons flatten out instead of running off to 0 or 100 %.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import and_, func, or_, text
+from sqlalchemy.orm import Session
+
+from models_updated import Capa, Department, Round, RoundStatus
+from response_cache import response_cache
+
+PERIOD_DAYS = {"1m": 30, "3m": 90, "6m": 180, "1y": 365}
+LOOKBACK_DAYS = 365
+HALF_LIFE_DAYS = 30.0
+TREND_DAMPING = 0.97
+# Series observed on fewer days get a level but no trend
+MIN_TREND_DAYS = 5
+# Daily aggregates change slowly; writes still invalidate them through the cache tags
+AGGREGATE_TTL = 300
+
+# Lowercased CAPA statuses counted as closed (reopens are counted by migrations/018)
+CLOSED_STATUSES = ("verified", "completed", "closed")
+
+
+def period_days(prediction_period: str) -> int:
+    return PERIOD_DAYS.get(prediction_period, PERIOD_DAYS["3m"])
+
+
+# -- aggregation (SQL) ---------------------------------------------------------
+
+def _load_daily_aggregates(db: Session, start: date, days: int, department_id: Optional[int]) -> Dict[str, Any]:
+    """
+    Per (department, day) sums since ``start``, as JSON-friendly index lists
+    so every cache backend can hold them (``dept`` indexes ``departments``,
+    the names of ``department_ids``):
+
+    - ``compliance``: [dept, day, sum of compliance %, completed rounds] by scheduled day
+    - ``due``: [dept, day, CAPAs due, closed by their target date] by target day
+    - ``opened``: [dept, day, CAPAs created] by creation day
+    """
+    since = datetime.combine(start, datetime.min.time())
+    until = since + timedelta(days=days)
+
+    def scoped(query, column, department_column):
+        query = query.filter(column >= since, column < until)
+        if department_id:
+            query = query.filter(department_column == department_id)
+        return query
+
+    round_day = func.date(Round.scheduled_date)
+    compliance = scoped(
+        db.query(Round.department_id, round_day, func.sum(Round.compliance_percentage), func.count(Round.id)).filter(
+            Round.status == RoundStatus.COMPLETED,
+            Round.compliance_percentage.isnot(None),
+        ),
+        Round.scheduled_date, Round.department_id,
+    ).group_by(Round.department_id, round_day).all()
+
+    due_day = func.date(Capa.target_date)
+    on_time = and_(
+        func.lower(Capa.status).in_(CLOSED_STATUSES),
+        or_(Capa.closed_at.is_(None), Capa.closed_at < Capa.target_date + timedelta(days=1)),
+    )
+    due = scoped(
+        db.query(Capa.department_id, due_day, func.count(Capa.id), func.count(Capa.id).filter(on_time)),
+        Capa.target_date, Capa.department_id,
+    ).filter(Capa.target_date < datetime.now()).group_by(Capa.department_id, due_day).all()
+
+    created_day = func.date(Capa.created_at)
+    opened = scoped(
+        db.query(Capa.department_id, created_day, func.count(Capa.id)),
+        Capa.created_at, Capa.department_id,
+    ).group_by(Capa.department_id, created_day).all()
+
+    cost_query = db.query(Capa.department_id, func.avg(Capa.estimated_cost)).filter(Capa.estimated_cost.isnot(None))
+    if department_id:
+        cost_query = cost_query.filter(Capa.department_id == department_id)
+    costs = {
+        dept: float(avg) for dept, avg in cost_query.group_by(Capa.department_id).all()
+        if dept is not None and avg is not None
+    }
+
+    # Rows of departments that no longer resolve (department_id NULL) are left out
+    department_ids = sorted({row[0] for row in (*compliance, *due, *opened) if row[0] is not None} | set(costs))
+    names = dict(db.query(Department.id, Department.name).filter(Department.id.in_(department_ids)).all()) if department_ids else {}
+    index = {dept: position for position, dept in enumerate(department_ids)}
+
+    def indexed(rows):
+        return [
+            [index[dept], (day - start).days, *(float(value or 0) for value in values)]
+            for dept, day, *values in rows
+            if dept in index and day is not None and 0 <= (day - start).days < days
+        ]
+
+    return {
+        "start": start.isoformat(),
+        "days": days,
+        "department_ids": department_ids,
+        "departments": [names.get(dept, str(dept)) for dept in department_ids],
+        "compliance": indexed(compliance),
+        "due": indexed(due),
+        "opened": indexed(opened),
+        "cost": [costs.get(dept) for dept in department_ids],
+    }
+
+
+def daily_aggregates(db: Session, department_id: Optional[int] = None, days: int = LOOKBACK_DAYS,
+                     today: Optional[date] = None) -> Dict[str, Any]:
+    """Cached daily aggregates for the ``days`` days up to and including ``today``"""
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    return response_cache.get_or_compute(
+        "forecasting.daily_aggregates",
+        lambda: _load_daily_aggregates(db, start, days, department_id),
+        tags=("rounds", "capas", "departments"),
+        params={"department_id": department_id, "start": start.isoformat(), "days": days},
+        ttl=AGGREGATE_TTL,
+    )
+
+
+# -- smoothing (NumPy) ---------------------------------------------------------
+
+def to_matrix(entries: Sequence[Sequence[float]], series: int, days: int, columns: int) -> np.ndarray:
+    """Dense (columns, series + 1, days) array; the last series is the sum of all the others"""
+    matrix = np.zeros((columns, series + 1, days))
+    if entries:
+        data = np.asarray(entries, dtype=float)
+        rows, cols = data[:, 0].astype(int), data[:, 1].astype(int)
+        for column in range(columns):
+            np.add.at(matrix[column], (rows, cols), data[:, 2 + column])
+        matrix[:, series] = matrix[:, :series].sum(axis=1)
+    return matrix
+
+
+def smooth(values: np.ndarray, weights: np.ndarray, half_life: float = HALF_LIFE_DAYS):
+    """
+    Recency-weighted linear fit of every row of ``values`` (series × days).
+
+    Returns the fitted level at the last day, the daily slope and the number
+    of days with a non-zero weight, one entry per series.
+    """
+    days = values.shape[1]
+    x = np.arange(days, dtype=float) - (days - 1)
+    w = weights * 0.5 ** (-x / half_life)
+    total = w.sum(axis=1)
+    safe_total = np.where(total > 0, total, 1.0)
+    x_mean = (w * x).sum(axis=1) / safe_total
+    y_mean = (w * values).sum(axis=1) / safe_total
+    dx = x - x_mean[:, None]
+    sxx = (w * dx * dx).sum(axis=1)
+    sxy = (w * dx * (values - y_mean[:, None])).sum(axis=1)
+    observed = (weights > 0).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=(sxx > 1e-9) & (observed >= MIN_TREND_DAYS))
+    level = y_mean - slope * x_mean
+    return level, slope, observed
+
+
+def mean_projection(level: np.ndarray, slope: np.ndarray, horizon: int, damping: float = TREND_DAMPING) -> np.ndarray:
+    """Average of the damped-trend projection over the next ``horizon`` days"""
+    steps = np.cumsum(damping ** np.arange(1, horizon + 1))
+    return level + slope * steps.mean()
+
+
+def _rates(totals: np.ndarray, counts: np.ndarray, scale: float = 1.0):
+    """Per-day ``totals / counts``, weighted by ``counts``"""
+    values = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0) * scale
+    return values, counts
+
+
+def forecast(aggregates: Dict[str, Any], horizon: int) -> Dict[str, Any]:
+    """Compliance, on-time completion and CAPA volume forecasts per department and overall"""
+    departments = aggregates["departments"]
+    series, days = len(departments), aggregates["days"]
+
+    compliance_sum, rounds = to_matrix(aggregates["compliance"], series, days, 2)
+    compliance_values, compliance_weights = _rates(compliance_sum, rounds)
+    compliance_level, compliance_slope, compliance_days = smooth(compliance_values, compliance_weights)
+
+    due, on_time = to_matrix(aggregates["due"], series, days, 2)
+    completion_values, completion_weights = _rates(on_time, due, scale=100.0)
+    completion_level, completion_slope, completion_days = smooth(completion_values, completion_weights)
+
+    # Every day counts as an observation of the number of CAPAs opened, zero included
+    opened = to_matrix(aggregates["opened"], series, days, 1)[0]
+    volume_level, volume_slope, _ = smooth(opened, np.ones_like(opened))
+
+    return {
+        "departments": departments,
+        "compliance_now": np.clip(compliance_level, 0, 100),
+        "compliance_next_month": np.clip(mean_projection(compliance_level, compliance_slope, 30), 0, 100),
+        "compliance_forecast": np.clip(mean_projection(compliance_level, compliance_slope, horizon), 0, 100),
+        "compliance_trend": compliance_slope * 30,
+        "compliance_days": compliance_days,
+        "completion_next_month": np.clip(mean_projection(completion_level, completion_slope, 30), 0, 100),
+        "completion_days": completion_days,
+        "daily_volume": np.maximum(mean_projection(volume_level, volume_slope, horizon), 0),
+    }
+
+
+def cost_forecast(result: Dict[str, Any], costs: List[Optional[float]], horizon: int) -> float:
+    """Expected cost of the CAPAs opened over the horizon, at each department's average cost"""
+    known = [cost for cost in costs if cost is not None]
+    if not known:
+        return 0.0
+    fallback = float(np.mean(known))
+    per_capa = np.array([fallback if cost is None else cost for cost in costs])
+    return float((result["daily_volume"][:-1] * horizon * per_capa).sum())
+
+
+# -- CAPA performance (SQL) ----------------------------------------------------
+
+PERFORMANCE_SQL = """
+SELECT
+    count(*) AS total,
+    count(*) FILTER (WHERE escalation_level > 0) AS escalated,
+    avg(extract(epoch FROM closed_at - created_at)) FILTER (WHERE closed_at >= created_at) / 86400.0
+        AS mean_days_to_close,
+    avg(greatest(extract(epoch FROM first_response_at - created_at), 0)) / 3600.0
+        AS mean_hours_to_first_response,
+    count(*) FILTER (WHERE lower(status) = ANY(:closed)) AS closed,
+    count(*) FILTER (WHERE lower(status) = ANY(:closed) AND reopen_count = 0) AS fixed_first_time
+FROM capas
+WHERE created_at >= :start AND created_at <= :end
+  AND (CAST(:department_id AS integer) IS NULL OR department_id = :department_id)
+"""
+
+
+def performance_summary(db: Session, start: datetime, end: datetime, department_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Mean time to close, mean time to the first status change, escalations
+    and the first-time-fix rate (closed CAPAs never reopened after being done) of
+    the CAPAs created in ``[start, end]``, in one aggregate. The history figures
+    come from first_response_at and reopen_count, which a trigger keeps from
+    status_history (migrations/018), so no history is parsed here.
+    """
+    row = db.execute(text(PERFORMANCE_SQL), {
+        "start": start, "end": end, "department_id": department_id, "closed": list(CLOSED_STATUSES),
+    }).mappings().one()
+    closed = row["closed"] or 0
+    return {
+        "total": row["total"] or 0,
+        "escalated": row["escalated"] or 0,
+        "mean_days_to_close": round(float(row["mean_days_to_close"]), 2) if row["mean_days_to_close"] is not None else None,
+        "mean_hours_to_first_response": (
+            round(float(row["mean_hours_to_first_response"]), 2) if row["mean_hours_to_first_response"] is not None else None
+        ),
+        "first_time_fix_rate": round((row["fixed_first_time"] or 0) / closed * 100, 2) if closed else None,
+    }
@@ -0,0 +1,481 @@
+"""
+Job scheduler - periodic background work inside the API process
+جدولة المهام الدورية داخل التطبيق: تشغيل كل مهمة مرة واحدة فقط مهما كان عدد العمليات
+
+Replaces the crontab entries and the optional automation thread. Every
+worker process runs the same scheduler thread (started from main.lifespan
+when ENABLE_BACKGROUND_JOBS=1); the state shared between them lives in
+Postgres (migrations/014_scheduled_jobs.sql):
+
+* scheduled_jobs holds each job's next_run_at. A worker claims a due run by
+  moving next_run_at forward with a conditional UPDATE, so of N workers
+  polling the same job exactly one gets it.
+* A claimed run then takes one of the job's ``max_concurrency`` slots, a
+  session-level advisory lock held by the connection the job runs on. Runs
+  started by hand (run_job, the cron wrappers) take a slot too, so a job
+  never runs more often in parallel than its limit; a run that finds every
+  slot taken is recorded as skipped. A worker that dies releases its slots
+  with its connection.
+* The job's connection has statement_timeout set to the job's timeout; the
+  scheduler thread also reports runs still going past their timeout.
+* Slots and the timeout belong to the database session, so jobs need a
+  direct connection. Behind a transaction-mode pooler (PgBouncer, Neon's
+  "-pooler" host) a lock and its unlock can reach different server backends
+  and leak the slot. JOB_DATABASE_URL gives the scheduler its own direct
+  URL, and it refuses to run jobs on a URL that looks pooled.
+* Every run is recorded in job_runs and counted in the salamaty_job_*
+  metrics.
+
+Jobs take a Session and return a JSON-serializable summary (or None).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models_updated import JobRun, ScheduledJob
+from observability import metrics
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "30"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", "90"))
+# Direct (not pooled) connection for the jobs; DATABASE_URL's engine otherwise
+JOB_DATABASE_URL = os.getenv("JOB_DATABASE_URL")
+# First key of the two-key advisory locks, keeps job slots apart from other advisory locks
+ADVISORY_LOCK_NAMESPACE = 73_050
+
+RUN_SUCCEEDED = "succeeded"
+RUN_FAILED = "failed"
+RUN_TIMEOUT = "timeout"
+RUN_SKIPPED = "skipped"
+RUN_RUNNING = "running"
+
+
+def _now() -> datetime:
+    """Local wall-clock time, timezone-aware (daily jobs are set in server local time like the old crontab)"""
+    return datetime.now().astimezone()
+
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_transaction_pooled(url) -> bool:
+    """Whether ``url`` goes through a transaction-mode pooler, as far as the URL tells"""
+    url = make_url(url)
+    return "-pooler" in (url.host or "") or str(url.query.get("pgbouncer", "")).lower() == "true"
+
+
+def slot_lock_key(job_name: str, slot: int) -> int:
+    """Second advisory lock key of a job slot (signed 32-bit)"""
+    value = zlib.crc32(f"{job_name}:{slot}".encode())
+    return value - 2 ** 32 if value >= 2 ** 31 else value
+
+
+@dataclass
+class Job:
+    """A periodic job: every ``every``, or daily at ``daily_at`` ("HH:MM")"""
+    name: str
+    func: Callable[[Session], Any]
+    every: Optional[timedelta] = None
+    daily_at: Optional[str] = None
+    timeout: float = 600
+    max_concurrency: int = 1
+    description: str = ""
+
+    def __post_init__(self):
+        if (self.every is None) == (self.daily_at is None):
+            raise ValueError(f"Job {self.name} needs exactly one of every / daily_at")
+        if self.max_concurrency < 1:
+            raise ValueError(f"Job {self.name} needs max_concurrency >= 1")
+
+    def next_run_after(self, now: datetime) -> datetime:
+        if self.every is not None:
+            return now + self.every
+        hour, minute = (int(part) for part in self.daily_at.split(":"))
+        candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def first_run(self, now: datetime) -> datetime:
+        """Interval jobs start right away, daily jobs at their next time of day"""
+        return now if self.every is not None else self.next_run_after(now)
+
+
+class JobScheduler:
+    """Runs registered jobs on schedule, once per cluster (see module docstring)"""
+
+    def __init__(self, engine=None, poll_seconds: float = POLL_SECONDS, workers: int = JOB_WORKERS):
+        self._engine = engine
+        self.poll_seconds = poll_seconds
+        self.workers = workers
+        self.worker = _worker_name()
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Runs submitted by this process: future -> (job, started)
+        self._running: Dict[Future, Tuple[Job, float]] = {}
+        self._overrun_reported: Set[Future] = set()
+        # Slots held in this process when the database has no advisory locks (SQLite in tests)
+        self._local_slots: Set[Tuple[str, int]] = set()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            if JOB_DATABASE_URL:
+                self._engine = create_engine(
+                    JOB_DATABASE_URL, pool_pre_ping=True, pool_size=self.workers + 1,
+                    connect_args={"application_name": "salamaty_jobs", "options": "-c search_path=public"},
+                )
+            else:
+                from database import engine
+                self._engine = engine
+        return self._engine
+
+    def _require_direct_connection(self):
+        if is_transaction_pooled(self.engine.url):
+            raise RuntimeError(
+                f"{self.engine.url.host} is a transaction-mode pooler; set JOB_DATABASE_URL to a direct connection"
+            )
+
+    def register(self, job: Job) -> Job:
+        self.jobs[job.name] = job
+        return job
+
+    # -- persistent state ----------------------------------------------------
+
+    def ensure_jobs(self, now: Optional[datetime] = None) -> List[str]:
+        """Create the scheduled_jobs rows of new jobs and prune old run history; returns the names added"""
+        now = now or _now()
+        added = []
+        with Session(self.engine) as db:
+            existing = {name for name, in db.query(ScheduledJob.name)}
+            for job in self.jobs.values():
+                if job.name in existing:
+                    continue
+                try:
+                    with db.begin_nested():
+                        db.add(ScheduledJob(name=job.name, next_run_at=job.first_run(now), updated_at=now))
+                    added.append(job.name)
+                except IntegrityError:
+                    # Another worker registered it first
+                    pass
+            db.query(JobRun).filter(
+                JobRun.started_at < now - timedelta(days=JOB_RUN_RETENTION_DAYS)
+            ).delete(synchronize_session=False)
+            db.commit()
+        return added
+
+    def claim_due_jobs(self, now: Optional[datetime] = None) -> List[Job]:
+        """Jobs due at ``now`` that this worker claimed; their next_run_at is moved past ``now``"""
+        now = now or _now()
+        claimed = []
+        with Session(self.engine) as db:
+            for job in self.jobs.values():
+                updated = db.query(ScheduledJob).filter(
+                    ScheduledJob.name == job.name,
+                    ScheduledJob.next_run_at <= now,
+                ).update(
+                    {"next_run_at": job.next_run_after(now), "updated_at": now},
+                    synchronize_session=False,
+                )
+                db.commit()
+                if updated:
+                    claimed.append(job)
+        return claimed
+
+    def _record_start(self, job: Job, source: str, started_at: datetime, status: str = RUN_RUNNING) -> int:
+        with Session(self.engine) as db:
+            run = JobRun(job_name=job.name, source=source, worker=self.worker, started_at=started_at, status=status)
+            if status == RUN_SKIPPED:
+                run.finished_at = started_at
+                run.duration_ms = 0
+            db.add(run)
+            db.commit()
+            return run.id
+
+    def _record_finish(self, job: Job, run_id: int, started_at: datetime, status: str,
+                       duration_ms: int, result: Any, error: Optional[str]):
+        finished_at = _now()
+        with Session(self.engine) as db:
+            db.query(JobRun).filter(JobRun.id == run_id).update({
+                "status": status,
+                "finished_at": finished_at,
+                "duration_ms": duration_ms,
+                "result": result,
+                "error": error,
+            }, synchronize_session=False)
+            db.query(ScheduledJob).filter(ScheduledJob.name == job.name).update({
+                "last_started_at": started_at,
+                "last_finished_at": finished_at,
+                "last_status": status,
+                "last_error": error,
+                "last_duration_ms": duration_ms,
+                "last_worker": self.worker,
+                "run_count": ScheduledJob.run_count + 1,
+                "failure_count": ScheduledJob.failure_count + (0 if status == RUN_SUCCEEDED else 1),
+                "updated_at": finished_at,
+            }, synchronize_session=False)
+            db.commit()
+
+    # -- slots ---------------------------------------------------------------
+
+    def _acquire_slot(self, connection, job: Job) -> Optional[int]:
+        for slot in range(job.max_concurrency):
+            if connection.dialect.name == "postgresql":
+                acquired = connection.execute(
+                    text("SELECT pg_try_advisory_lock(:namespace, :key)"),
+                    {"namespace": ADVISORY_LOCK_NAMESPACE, "key": slot_lock_key(job.name, slot)},
+                ).scalar()
+            else:
+                with self._lock:
+                    acquired = (job.name, slot) not in self._local_slots
+                    self._local_slots.add((job.name, slot))
+            if acquired:
+                return slot
+        return None
+
+    def _set_statement_timeout(self, connection, job: Job):
+        if connection.dialect.name == "postgresql":
+            connection.execute(
+                text("SELECT set_config('statement_timeout', :value, false)"),
+                {"value": str(int(job.timeout * 1000))},
+            )
+
+    def _release_slot(self, connection, job: Job, slot: int):
+        if connection.dialect.name != "postgresql":
+            with self._lock:
+                self._local_slots.discard((job.name, slot))
+            return
+        try:
+            connection.rollback()
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:namespace, :key)"),
+                {"namespace": ADVISORY_LOCK_NAMESPACE, "key": slot_lock_key(job.name, slot)},
+            )
+            connection.execute(text("RESET statement_timeout"))
+            connection.commit()
+        except Exception as e:
+            # Closing the connection is what releases the lock then
+            logger.error("Could not release slot %s of job %s: %s", slot, job.name, e)
+            connection.invalidate()
+
+    # -- running -------------------------------------------------------------
+
+    def run_job(self, name: str, source: str = "manual") -> Dict[str, Any]:
+        """Run a job now in this thread, within its concurrency limit; returns the run summary"""
+        job = self.jobs[name]
+        self._require_direct_connection()
+        started_at = _now()
+        with self.engine.connect() as connection:
+            slot = self._acquire_slot(connection, job)
+            connection.commit()
+            if slot is None:
+                self._record_start(job, source, started_at, status=RUN_SKIPPED)
+                metrics.increment("job_runs_total", job=job.name, status=RUN_SKIPPED)
+                logger.info("Job %s skipped: %s run(s) already in progress", job.name, job.max_concurrency)
+                return {"job": job.name, "status": RUN_SKIPPED}
+
+            run_id = None
+            status, result, error = RUN_SUCCEEDED, None, None
+            clock = time.perf_counter()
+            try:
+                run_id = self._record_start(job, source, started_at)
+                self._set_statement_timeout(connection, job)
+                # Session-level setting, it outlives this transaction. Committing
+                # here lets the job's session own (and commit) its transactions
+                # rather than join one that _release_slot would roll back.
+                connection.commit()
+                db = Session(bind=connection)
+                try:
+                    result = job.func(db)
+                    db.commit()
+                    connection.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                finally:
+                    db.close()
+            except Exception as e:
+                status, error = RUN_FAILED, f"{type(e).__name__}: {e}"
+                logger.exception("Job %s failed", job.name)
+            finally:
+                self._release_slot(connection, job, slot)
+
+        duration = time.perf_counter() - clock
+        if status == RUN_FAILED and duration >= job.timeout:
+            status = RUN_TIMEOUT
+        duration_ms = int(duration * 1000)
+        metrics.increment("job_runs_total", job=job.name, status=status)
+        metrics.increment("job_run_seconds_total", duration, job=job.name)
+        if run_id is not None:
+            try:
+                self._record_finish(job, run_id, started_at, status, duration_ms, result, error)
+            except Exception as e:
+                logger.error("Could not record run %s of job %s: %s", run_id, job.name, e)
+        logger.info("Job %s %s in %s ms", job.name, status, duration_ms)
+        summary = {"job": job.name, "status": status, "duration_ms": duration_ms, "result": result}
+        if error:
+            summary["error"] = error
+        return summary
+
+    def tick(self, now: Optional[datetime] = None) -> List[Job]:
+        """Claim the due jobs and hand them to the run pool"""
+        self._report_overruns()
+        claimed = self.claim_due_jobs(now)
+        for job in claimed:
+            future = self._executor.submit(self.run_job, job.name, "schedule")
+            with self._lock:
+                self._running[future] = (job, time.perf_counter())
+            future.add_done_callback(self._run_done)
+        return claimed
+
+    def _run_done(self, future: Future):
+        with self._lock:
+            self._running.pop(future, None)
+            self._overrun_reported.discard(future)
+
+    def _report_overruns(self):
+        with self._lock:
+            overrun = [
+                (future, job) for future, (job, started) in self._running.items()
+                if future not in self._overrun_reported and time.perf_counter() - started > job.timeout
+            ]
+            self._overrun_reported.update(future for future, _ in overrun)
+        for _, job in overrun:
+            # A thread cannot be interrupted; it keeps its slot until it returns
+            metrics.increment("job_overruns_total", job=job.name)
+            logger.error("Job %s is still running after its %.0fs timeout", job.name, job.timeout)
+
+    def _loop(self):
+        registered = False
+        while not self._stopping.is_set():
+            try:
+                if not registered:
+                    self.ensure_jobs()
+                    registered = True
+                self.tick()
+            except Exception as e:
+                logger.error("Job scheduler tick failed: %s", e)
+            self._stopping.wait(self.poll_seconds)
+
+    def start(self):
+        try:
+            self._require_direct_connection()
+        except RuntimeError as e:
+            logger.error("Job scheduler not started: %s", e)
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+            self._thread.start()
+        logger.info("Job scheduler started on %s: %s", self.worker, ", ".join(self.jobs))
+
+    def stop(self, timeout: float = 5.0):
+        """Stop claiming runs; runs in progress finish on their own"""
+        self._stopping.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def status(self, db: Session, runs: int = 20) -> Dict[str, Any]:
+        """State of every job and its latest runs"""
+        states = {state.name: state for state in db.query(ScheduledJob)}
+        jobs = []
+        for job in self.jobs.values():
+            state = states.get(job.name)
+            recent = db.query(JobRun).filter(JobRun.job_name == job.name).order_by(
+                JobRun.started_at.desc()
+            ).limit(runs).all()
+            jobs.append({
+                "name": job.name,
+                "description": job.description,
+                "schedule": f"daily at {job.daily_at}" if job.daily_at else f"every {job.every}",
+                "timeout_seconds": job.timeout,
+                "max_concurrency": job.max_concurrency,
+                "next_run_at": state.next_run_at if state else None,
+                "last_status": state.last_status if state else None,
+                "last_finished_at": state.last_finished_at if state else None,
+                "last_duration_ms": state.last_duration_ms if state else None,
+                "last_error": state.last_error if state else None,
+                "run_count": state.run_count if state else 0,
+                "failure_count": state.failure_count if state else 0,
+                "runs": [
+                    {
+                        "id": run.id, "source": run.source, "worker": run.worker, "status": run.status,
+                        "started_at": run.started_at, "duration_ms": run.duration_ms, "error": run.error,
+                    }
+                    for run in recent
+                ],
+            })
+        return {"worker": self.worker, "running": self.thread_alive, "jobs": jobs}
+
+    @property
+    def thread_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+
+# -- jobs ----------------------------------------------------------------------
+
+def capa_daily_job(db: Session):
+    """Escalate overdue CAPAs and send verification reminders (was cron_capa_scheduler.py)"""
+    from capa_scheduler import CapaScheduler
+    with CapaScheduler(db) as scheduler:
+        result = scheduler.run_daily_tasks()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def deadline_reminders_job(db: Session):
+    """Round and CAPA deadline reminders (was cron_job.py)"""
+    from reminder_service import get_reminder_service
+    reminder_service = get_reminder_service(db)
+    reminder_service.check_round_deadlines()
+    reminder_service.check_capa_deadlines()
+
+
+def partition_maintenance_job(db: Session):
+    """Monthly partitions of audit_logs/notifications (was partition_maintenance.py in the crontab)"""
+    from partition_maintenance import run_maintenance
+    return run_maintenance(db)
+
+
+job_scheduler = JobScheduler()
+job_scheduler.register(Job(
+    "capa_daily", capa_daily_job, daily_at=os.getenv("CAPA_DAILY_AT", "09:00"), timeout=900,
+    description="CAPA escalation and verification reminders",
+))
+job_scheduler.register(Job(
+    "deadline_reminders", deadline_reminders_job, daily_at=os.getenv("DEADLINE_REMINDERS_AT", "08:00"), timeout=600,
+    description="Round and CAPA deadline reminders",
+))
+job_scheduler.register(Job(
+    "partition_maintenance", partition_maintenance_job, daily_at=os.getenv("PARTITION_MAINTENANCE_AT", "02:30"),
+    timeout=3600, description="Log retention: monthly partitions, archiving and pruning",
+))
+
+
+def get_job_scheduler() -> JobScheduler:
+    return job_scheduler
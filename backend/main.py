@@ -1,40 +1,61 @@
 from pydantic import BaseModel
-from fastapi import FastAPI, Depends, HTTPException, status, Form, Body, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Form, Body, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from sqlalchemy import func, text
 import uvicorn
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, RedirectResponse, JSONResponse
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.exception_handlers import http_exception_handler
+from contextlib import asynccontextmanager
 from typing import List, Optional
 from datetime import datetime, timedelta
+import asyncio
+import importlib
+import json
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv('env.local')
 
+from observability import RequestMetricsMiddleware, configure_logging, install_query_hooks, metrics
+configure_logging()
+logger = logging.getLogger(__name__)
+
 # Feature Flags
 FEATURE_CAPA = os.getenv('FEATURE_CAPA', 'false').lower() == 'true'
 
-from database import get_db, engine
-from models_updated import Base, UserRole, User, Round, Capa, Department
+from database import get_db, engine, SessionLocal
+install_query_hooks(engine)
+from models_updated import Base, UserRole, User, Round, Capa, Department, NotificationType
 from schemas import (
     UserCreate, UserUpdate, UserResponse, RoundCreate, RoundResponse, CapaCreate, CapaResponse, 
     DepartmentCreate, DepartmentResponse, EvaluationCategoryCreate, EvaluationCategoryResponse,
     EvaluationItemCreate, EvaluationItemResponse, ObjectiveOptionCreate, ObjectiveOptionResponse,
     ObjectiveOptionUpdate, AuditLogCreate, AuditLogResponse, EvaluationResultResponse,
+    EvaluationSyncRequest, EvaluationSyncResponse,
     NotificationCreate, NotificationResponse, NotificationUpdate,
     UserNotificationSettingsCreate, UserNotificationSettingsResponse, UserNotificationSettingsUpdate,
-    RoundTypeCreate, RoundTypeUpdate, RoundTypeResponse
+    RoundTypeCreate, RoundTypeUpdate, RoundTypeResponse,
+    BulkRoundScheduleRequest, BulkRoundScheduleResponse
+)
+from auth import (
+    get_current_user, create_access_token, verify_token,
+    verify_password_async, get_password_hash_async, password_needs_rehash, password_pool, PasswordPoolBusy
+)
+from realtime import STREAM_TICKET_SECONDS, broker, format_sse, issue_stream_ticket, redeem_stream_ticket
+from response_cache import mark_tables_changed, response_cache
+from department_directory import department_directory, department_filter
+from serializers import (
+    FastJSONResponse, ModelSerializer, RowSerializer, empty_list_if_none, json_text_to_list, model_serializer, zero_if_none,
 )
-from auth import get_current_user, create_access_token, verify_password, get_password_hash
-from notification_service import get_notification_service
 from crud import (
     create_user, get_user_by_email, get_user_by_username, get_user_by_id, get_users, update_user_data, delete_user_data,
-    create_round, get_rounds, get_rounds_by_user, get_round_by_id, update_round, delete_round, create_capa, get_capas, get_capa_by_id, update_capa, get_all_capas_unfiltered, delete_capa, delete_all_capas, create_department, get_departments, 
+    create_round, create_rounds_bulk, get_rounds, get_rounds_by_user, get_round_by_id, update_round, delete_round, create_capa, get_capas, get_capa_by_id, get_capas_by_ids, update_capa, get_all_capas_unfiltered, delete_capa, delete_all_capas, create_department, get_departments, 
     get_department_by_id, update_department, delete_department,
     create_evaluation_category, get_evaluation_categories, get_evaluation_category_by_id,
     update_evaluation_category, delete_evaluation_category,
@@ -42,7 +63,7 @@ from crud import (
     get_evaluation_items_by_category, update_evaluation_item, delete_evaluation_item,
     get_assessors, create_objective_option, get_objective_options, get_objective_option,
     update_objective_option, delete_objective_option,
-    create_audit_log, get_audit_logs, get_audit_logs_by_user, get_audit_logs_by_entity,
+    get_audit_logs, get_audit_logs_by_user, get_audit_logs_by_entity,
     create_evaluation_results, get_evaluation_results_by_round,
     create_notification, get_notifications_by_user, get_unread_notifications_count,
     mark_notification_as_read, mark_all_notifications_as_read, delete_notification,
@@ -50,35 +71,90 @@ from crud import (
     create_round_type, get_round_types, get_round_type_by_id, update_round_type, delete_round_type,
     # New CAPA-evaluation integration functions
     get_non_compliant_evaluation_items, create_capa_from_evaluation_item,
-    create_capas_for_round_non_compliance, get_round_capa_summary,
+    create_capas_for_round_non_compliance, get_round_capa_summary, get_round_capa_summaries,
     get_evaluation_items_needing_capa
 )
-from reminder_service import get_reminder_service
 
-# Create database tables (lazy, don't block startup on failure)
-try:
-    Base.metadata.create_all(bind=engine)
-except Exception as e:
-    print(f"[Startup] Skipping create_all due to error: {e}")
+def get_notification_service(db: Session):
+    # Imported on first use: pulls in the email stack, which no request needs at startup
+    from notification_service import get_notification_service as _get_notification_service
+    return _get_notification_service(db)
+
+def notify_round_capas_created(round_id: int, capa_count: int, creator_id: int, created_by_name: str = ""):
+    from notification_service import notify_round_capas_created as _notify_round_capas_created
+    return _notify_round_capas_created(round_id, capa_count, creator_id, created_by_name)
+
+# Optional routers, imported and registered during startup (see lifespan)
+OPTIONAL_ROUTERS = [
+    ("api_enhanced_dashboard", {"prefix": "/api", "tags": ["dashboard"]}),
+    ("api_capa_actions", {"tags": ["capa-actions"]}),
+    ("api_analytics", {"prefix": "/api", "tags": ["analytics"]}),
+    ("api_notifications", {"prefix": "/api", "tags": ["notifications"]}),
+    ("api_evidence", {"prefix": "/api", "tags": ["evidence"]}),
+    # Primary CAPA router path is /api/capas
+    ("capa_router", {}),
+]
+
+# Schema changes belong to the migration step (scripts/run_migrations_and_seed.sh);
+# AUTO_CREATE_TABLES=1 keeps the old create_all-on-boot behaviour for local setups.
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "0") == "1"
+ENABLE_BACKGROUND_JOBS = os.getenv("ENABLE_BACKGROUND_JOBS", "1") == "1"
+
+def _include_optional_routers(app: FastAPI):
+    """Import and register the optional routers; a router that fails to import is skipped"""
+    if getattr(app.state, "optional_routers_loaded", False):
+        return
+    app.state.optional_routers_loaded = True
+    for module_name, options in OPTIONAL_ROUTERS:
+        try:
+            module = importlib.import_module(module_name)
+            app.include_router(module.router, **options)
+        except Exception as _e:
+            logger.warning("Router %s not loaded: %s", module_name, _e)
+    # Routers are added after the SPA catch-all was declared; keep the catch-all last
+    # so it does not shadow their GET routes
+    catch_all = [route for route in app.router.routes if getattr(route, "path", None) == "/{full_path:path}"]
+    for route in catch_all:
+        app.router.routes.remove(route)
+        app.router.routes.append(route)
+
+def _start_background_jobs():
+    """Start the periodic job scheduler (CAPA escalation, reminders, partition maintenance)"""
+    try:
+        from job_scheduler import job_scheduler
+        job_scheduler.start()
+    except Exception as e:
+        logger.error("Failed to start the job scheduler: %s", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    _include_optional_routers(app)
+    if AUTO_CREATE_TABLES:
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, lambda: Base.metadata.create_all(bind=engine))
+        except Exception as e:
+            logger.error("[Startup] Skipping create_all due to error: %s", e)
+    if ENABLE_BACKGROUND_JOBS:
+        _start_background_jobs()
+    logger.info("[Startup] Ready in %.0f ms", (time.perf_counter() - started) * 1000)
+    yield
+    if ENABLE_BACKGROUND_JOBS:
+        from job_scheduler import job_scheduler
+        job_scheduler.stop()
+    broker.stop()
+    from audit_service import get_audit_writer
+    get_audit_writer().stop()
 
 app = FastAPI(
     title="نظام سلامتي",
     description="نظام إدارة جولات الجودة وسلامة المرضى",
     version="1.1.0",  # Updated to support dynamic round types
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
-# Start background automation tasks (Syncing, Reminders, etc.)
-try:
-    from automation import start_automation
-    start_automation()
-    print("🚀 Background automation started")
-except ImportError:
-    print("⚠️ automation.py not found, background tasks skipped")
-except Exception as e:
-    print(f"❌ Failed to start background automation: {e}")
-
 # CORS middleware - Must be added immediately after creating the app
 # Allow localhost origins for development AND Vercel/Render for production
 import os
@@ -101,7 +177,7 @@ if ENVIRONMENT == 'production':
         expose_headers=["*"],
         max_age=3600,
     )
-    print(f"✅ CORS enabled for production origins: {allowed_origins}")
+    logger.info("CORS enabled for production origins: %s", allowed_origins)
 else:
     # Development: Allow any localhost port
     app.add_middleware(
@@ -113,7 +189,10 @@ else:
         expose_headers=["*"],
         max_age=3600,
     )
-    print(f"✅ CORS enabled for all localhost origins (development)")
+    logger.info("CORS enabled for all localhost origins (development)")
+
+# Outermost middleware: times every request including CORS handling
+app.add_middleware(RequestMetricsMiddleware)
 
 
 # Temporary diagnostic endpoint to list registered routes (hidden from docs)
@@ -194,7 +273,7 @@ async def create_emergency_test_round():
             
             if user_row:
                 admin_user_id = user_row[0]
-                print("✅ Admin user already exists")
+                logger.info("Admin user already exists")
             else:
                 # Create admin user using raw SQL
                 from auth import get_password_hash
@@ -214,8 +293,9 @@ async def create_emergency_test_round():
                     'hashed_password': get_password_hash("test123")
                 })
                 admin_user_id = result.scalar()
+                mark_tables_changed(db, "users")
                 db.commit()
-                print("✅ Created admin user")
+                logger.info("Created admin user")
             
             # Create test round using raw SQL
             round_code = f"TEST{datetime.now().strftime('%Y%m%d%H%M%S')}"
@@ -244,6 +324,7 @@ async def create_emergency_test_round():
             })
             
             round_id = result.scalar()
+            mark_tables_changed(db, "rounds")
             db.commit()
             
             return {
@@ -257,7 +338,7 @@ async def create_emergency_test_round():
             db.close()
         
     except Exception as e:
-        print(f"❌ Error creating emergency test round: {e}")
+        logger.error("Error creating emergency test round: %s", e)
         import traceback
         traceback.print_exc()
         return {"error": str(e), "message": "فشل في إنشاء الجولة التجريبية"}
@@ -269,7 +350,7 @@ async def test_rounds_with_auth(db: Session = Depends(get_db), current_user = De
     try:
         from sqlalchemy import text
         
-        print(f"🔍 [TEST-AUTH] User: {current_user.email}")
+        logger.debug("[TEST-AUTH] User: %s", current_user.email)
         
         query = text("""
             SELECT id, round_code, title, description, round_type, 
@@ -366,6 +447,7 @@ async def create_simple_test_round():
         })
         
         round_id = result.scalar()
+        mark_tables_changed(db, "rounds")
         db.commit()
         db.close()
         
@@ -377,7 +459,7 @@ async def create_simple_test_round():
         }
         
     except Exception as e:
-        print(f"❌ Error creating simple test round: {e}")
+        logger.error("Error creating simple test round: %s", e)
         import traceback
         traceback.print_exc()
         return {"error": str(e), "message": "فشل في إنشاء الجولة التجريبية البسيطة"}
@@ -470,11 +552,11 @@ async def deployment_version_info():
 async def check_database_health(db: Session = Depends(get_db)):
     """Check database connection and table existence"""
     try:
-        print("🔍 [HEALTH] Starting database health check...")
+        logger.debug("[HEALTH] Starting database health check...")
         
         # Test basic connection
         db.execute(text("SELECT 1"))
-        print("✅ [HEALTH] Basic connection test passed")
+        logger.debug("[HEALTH] Basic connection test passed")
         
         # Check if tables exist
         tables_query = text("""
@@ -484,25 +566,25 @@ async def check_database_health(db: Session = Depends(get_db)):
         """)
         result = db.execute(tables_query)
         tables = [row[0] for row in result.fetchall()]
-        print(f"📋 [HEALTH] Found tables: {tables}")
+        logger.debug("[HEALTH] Found tables: %s", tables)
         
         # Check if rounds table has data
         rounds_count = 0
         try:
             count_result = db.execute(text("SELECT COUNT(*) FROM rounds"))
             rounds_count = count_result.scalar()
-            print(f"📊 [HEALTH] Rounds count: {rounds_count}")
+            logger.debug("[HEALTH] Rounds count: %s", rounds_count)
         except Exception as e:
-            print(f"❌ [HEALTH] Error counting rounds: {e}")
+            logger.error("[HEALTH] Error counting rounds: %s", e)
         
         # Check users table
         users_count = 0
         try:
             count_result = db.execute(text("SELECT COUNT(*) FROM users"))
             users_count = count_result.scalar()
-            print(f"👥 [HEALTH] Users count: {users_count}")
+            logger.debug("[HEALTH] Users count: %s", users_count)
         except Exception as e:
-            print(f"❌ [HEALTH] Error counting users: {e}")
+            logger.error("[HEALTH] Error counting users: %s", e)
         
         return {
             "status": "healthy",
@@ -513,7 +595,7 @@ async def check_database_health(db: Session = Depends(get_db)):
             "database_url": os.getenv("DATABASE_URL", "not_set")[:50] + "..." if os.getenv("DATABASE_URL") else "not_set"
         }
     except Exception as e:
-        print(f"❌ [HEALTH] Database health check failed: {e}")
+        logger.error("[HEALTH] Database health check failed: %s", e)
         import traceback
         traceback.print_exc()
         return {
@@ -585,7 +667,7 @@ async def create_sample_data(db: Session = Depends(get_db), current_user = Depen
         
     except Exception as e:
         db.rollback()
-        print(f"Error creating sample data: {e}")
+        logger.error("Error creating sample data: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في إنشاء البيانات التجريبية: {str(e)}")
 
 
@@ -603,6 +685,15 @@ async def spa_http_exception_handler(request: Request, exc: HTTPException):
     # Fallback to default handler
     return await http_exception_handler(request, exc)
 
+@app.exception_handler(PasswordPoolBusy)
+async def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    # Shed load during a login burst instead of queueing unboundedly
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "الخادم مشغول، يرجى المحاولة بعد لحظات"},
+        headers={"Retry-After": "1"},
+    )
+
 security = HTTPBearer()
 
 # Serve built frontend at root if available
@@ -631,6 +722,40 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/health/password-pool")
+async def password_pool_health(current_user: User = Depends(get_current_user)):
+    """Queue depth and timings of the bcrypt worker pool"""
+    if current_user.role not in ['super_admin', 'quality_manager']:
+        raise HTTPException(status_code=403, detail="غير مصرح لك بعرض حالة مجمع كلمات المرور")
+    return password_pool.stats()
+
+@app.get("/api/health/requests")
+async def request_metrics_health():
+    """Average time, SQL statements and DB time per route for this worker, slowest first"""
+    return metrics.snapshot()
+
+@app.get("/api/health/cache")
+async def response_cache_health():
+    """Hit ratio and size of the dashboard response cache of this worker"""
+    return response_cache.stats()
+
+@app.get("/api/health/jobs")
+async def background_jobs_health(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Schedule, last outcome and recent runs of every background job"""
+    if current_user.role not in ['super_admin', 'quality_manager']:
+        raise HTTPException(status_code=403, detail="غير مصرح لك بعرض حالة المهام")
+    from job_scheduler import job_scheduler
+    return job_scheduler.status(db)
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint; requires ``Authorization: Bearer $METRICS_TOKEN`` when set"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 
 # Public health endpoint for platform health checks (Railway expects `/health`)
 @app.get("/health")
@@ -654,7 +779,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = create_user(db, user, hashed_password)
     
     return db_user
@@ -666,7 +791,7 @@ async def signin(login_request: dict = Body(...), db: Session = Depends(get_db))
         username = login_request.get("username")
         email = login_request.get("email")
         password = login_request.get("password")
-        print(f"🔒 [DEBUG] Signin attempt: username={username}, email={email}, password_len={len(password) if password else 0}")
+        logger.debug("Signin attempt: username=%s, email=%s, password_len=%s", username, email, len(password) if password else 0)
 
         # Ensure search_path to public (defensive - some deployments may not set it)
         try:
@@ -681,17 +806,26 @@ async def signin(login_request: dict = Body(...), db: Session = Depends(get_db))
         elif email:
             user = get_user_by_email(db, email=email)
 
-        if not user or not verify_password(password, user.hashed_password):
+        if not user or not password or not await verify_password_async(password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="خطأ في اسم المستخدم أو كلمة المرور",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        # Upgrade the stored hash when BCRYPT_ROUNDS changed since it was created
+        if password_needs_rehash(user.hashed_password):
+            try:
+                user.hashed_password = await get_password_hash_async(password)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning("failed to rehash password for user %s: %s", user.id, e)
+
         access_token = create_access_token(data={"sub": user.email})
         return {"access_token": access_token, "token_type": "bearer", "user": user}
-    except HTTPException:
-        # Preserve intended HTTP errors like 401
+    except (HTTPException, PasswordPoolBusy):
+        # Preserve intended HTTP errors like 401 (and 503 when the password pool is saturated)
         raise
     except Exception as e:
         # Unexpected error -> 500 rather than masking as 400
@@ -743,10 +877,7 @@ async def create_new_round(round: RoundCreate, db: Session = Depends(get_db), cu
     try:
         created_round = create_round(db, round, current_user.id)
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"❌ Error creating round: {str(e)}")
-        print(f"Stack trace:\n{error_details}")
+        logger.exception("Error creating round: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"فشل في إنشاء الجولة: {str(e)}"
@@ -755,22 +886,12 @@ async def create_new_round(round: RoundCreate, db: Session = Depends(get_db), cu
     # Send notifications to assigned users
     if created_round and round.assigned_to:
         try:
-            # Get creator user from DB to ensure it's attached to session
-            creator = db.query(User).filter(User.id == current_user.id).first()
-            creator_name = f"{creator.first_name} {creator.last_name}" if creator else "المستخدم"
+            creator_name = f"{current_user.first_name} {current_user.last_name}"
             
             notification_service = get_notification_service(db)
             
-            # Convert user names to user IDs for notifications
-            assigned_user_ids = []
-            if isinstance(round.assigned_to, list):
-                for user_name in round.assigned_to:
-                    # Find user by name
-                    user = db.query(User).filter(
-                        db.func.concat(User.first_name, ' ', User.last_name) == user_name
-                    ).first()
-                    if user:
-                        assigned_user_ids.append(user.id)
+            # create_round already resolved the assignees to IDs
+            assigned_user_ids = list(created_round.assigned_to_ids or [])
             
             # Send notifications to all assigned users
             if assigned_user_ids:
@@ -783,11 +904,93 @@ async def create_new_round(round: RoundCreate, db: Session = Depends(get_db), cu
                 )
         except Exception as e:
             # Log error but don't fail the round creation
-            print(f"⚠️ Error sending round assignment notifications: {str(e)}")
+            logger.warning("Error sending round assignment notifications: %s", str(e))
     
     return created_round
 
 
+MAX_BULK_SCHEDULED_ROUNDS = int(os.getenv("MAX_BULK_SCHEDULED_ROUNDS", "5000"))
+
+def _notify_scheduled_rounds(assessor_ids: List[int], round_count: int, first_date: datetime, last_date: datetime, created_by_name: str):
+    """One consolidated notification per assessor for a bulk schedule (runs after the response)"""
+    db = SessionLocal()
+    try:
+        get_notification_service(db).send_bulk_notification(
+            user_ids=assessor_ids,
+            title="جدول جولات جديد",
+            message=(
+                f"تم جدولة {round_count} جولة لك من {first_date.strftime('%Y-%m-%d')} "
+                f"إلى {last_date.strftime('%Y-%m-%d')} من قبل {created_by_name}"
+            ),
+            notification_type=NotificationType.ROUND_ASSIGNED,
+            entity_type="ROUND"
+        )
+    except Exception as e:
+        logger.warning("Error sending bulk schedule notifications: %s", str(e))
+    finally:
+        db.close()
+
+@app.post("/api/rounds/bulk-schedule", response_model=BulkRoundScheduleResponse)
+async def bulk_schedule_rounds(
+    request: BulkRoundScheduleRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """جدولة جولات دورية لعدة أقسام دفعة واحدة"""
+    if current_user.role not in ["super_admin", "quality_manager"]:
+        raise HTTPException(
+            status_code=403,
+            detail="ليس لديك صلاحية لإنشاء جولات جديدة. هذه الصلاحية محصورة على مدير النظام ومدير الجودة فقط."
+        )
+    from utils.recurrence import expand_recurrence
+    
+    recurrence = request.recurrence
+    try:
+        occurrences = expand_recurrence(
+            recurrence.frequency, recurrence.start_date, recurrence.interval,
+            until=recurrence.until, count=recurrence.count
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    departments = list(dict.fromkeys(d.strip() for d in request.departments if d and d.strip()))
+    if not occurrences or not departments:
+        raise HTTPException(status_code=400, detail="لا توجد مواعيد أو أقسام للجدولة")
+    total = len(occurrences) * len(departments)
+    if total > MAX_BULK_SCHEDULED_ROUNDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"عدد الجولات المطلوبة ({total}) يتجاوز الحد الأقصى ({MAX_BULK_SCHEDULED_ROUNDS})"
+        )
+    
+    if request.dry_run:
+        return BulkRoundScheduleResponse(
+            created_count=0, occurrences=occurrences, departments=departments, dry_run=True
+        )
+    
+    template = request.template.model_dump()
+    try:
+        created, assessor_ids = create_rounds_bulk(db, template, departments, occurrences, current_user.id)
+    except Exception as e:
+        logger.error("Error bulk scheduling rounds: %s", str(e))
+        raise HTTPException(status_code=500, detail=f"فشل في جدولة الجولات: {str(e)}")
+    
+    if created and assessor_ids:
+        background_tasks.add_task(
+            _notify_scheduled_rounds, assessor_ids, len(created), occurrences[0], occurrences[-1],
+            f"{current_user.first_name} {current_user.last_name}"
+        )
+    
+    return BulkRoundScheduleResponse(
+        created_count=len(created),
+        round_ids=[round_id for round_id, _ in created],
+        round_codes=[code for _, code in created],
+        occurrences=occurrences,
+        departments=departments,
+        notified_user_ids=assessor_ids if created else []
+    )
+
+
 # Debug endpoint: create round without authentication (development only)
 @app.post("/api/debug/rounds-noauth", response_model=RoundResponse, include_in_schema=False)
 async def create_round_noauth(round: RoundCreate, db: Session = Depends(get_db)):
@@ -814,145 +1017,69 @@ async def create_round_noauth(round: RoundCreate, db: Session = Depends(get_db))
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [DEBUG ENDPOINT] Error creating round without auth: {e}")
+        logger.error("[DEBUG ENDPOINT] Error creating round without auth: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/rounds", response_model=List[RoundResponse])
+def _assigned_to_json(raw):
+    """Normalize the legacy assigned_to column to a JSON string"""
+    if raw is None:
+        return '[]'
+    if isinstance(raw, (list, dict)):
+        return json.dumps(raw, ensure_ascii=False)
+    try:
+        return json.dumps(json.loads(raw), ensure_ascii=False)
+    except Exception:
+        return str(raw)
+
+ROUND_LIST_SERIALIZER = RowSerializer(
+    (
+        "id", "round_code", "title", "description", "round_type",
+        "department", "department_id", "status", "priority", "scheduled_date", "created_at",
+        "assigned_to", "created_by_id", "compliance_percentage", "completion_percentage",
+        "selected_categories", "evaluation_items", "assigned_to_ids",
+        "deadline", "end_date", "notes",
+    ),
+    transforms={
+        "assigned_to": _assigned_to_json,
+        "compliance_percentage": zero_if_none,
+        "completion_percentage": zero_if_none,
+        "selected_categories": empty_list_if_none,
+        "evaluation_items": empty_list_if_none,
+        "assigned_to_ids": empty_list_if_none,
+    },
+)
+
+@app.get("/api/rounds", response_model=List[RoundResponse], response_class=FastJSONResponse)
 async def get_all_rounds(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     try:
-        print(f"🔍 [API] Fetching rounds from database for user {current_user.id}")
-        print(f"🔍 [API] Database session: {db}")
-        
-        # Test database connection first
-        try:
-            db.execute(text("SELECT 1"))
-            print("✅ [API] Database connection test successful")
-        except Exception as conn_error:
-            print(f"❌ [API] Database connection test failed: {conn_error}")
-            raise HTTPException(status_code=500, detail=f"خطأ في الاتصال بقاعدة البيانات: {str(conn_error)}")
-        
+        logger.debug("[API] Fetching rounds from database for user %s", current_user.id)
+
         # Get rounds from database using raw SQL to avoid schema issues
-        query = text("""
-            SELECT id, round_code, title, description, round_type, 
-                   department, status, priority, scheduled_date, created_at,
-                   assigned_to, created_by_id, compliance_percentage, completion_percentage,
-                   selected_categories, evaluation_items, assigned_to_ids,
-                   deadline, end_date, notes
+        query = text(f"""
+            SELECT {", ".join(ROUND_LIST_SERIALIZER.fields)}
             FROM rounds 
             ORDER BY created_at DESC 
             LIMIT :limit OFFSET :offset
         """)
         
         result = db.execute(query, {'limit': limit, 'offset': skip})
-        rounds_data = []
-        
-        import json, traceback
-        for row in result.fetchall():
-            try:
-                # Normalize assigned_to to a JSON string
-                raw_assigned = row[10]
-                if raw_assigned is None:
-                    assigned_to_str = '[]'
-                elif isinstance(raw_assigned, (list, dict)):
-                    assigned_to_str = json.dumps(raw_assigned, ensure_ascii=False)
-                else:
-                    # Try to parse if it's a JSON string already
-                    try:
-                        parsed = json.loads(raw_assigned)
-                        assigned_to_str = json.dumps(parsed, ensure_ascii=False)
-                    except Exception:
-                        assigned_to_str = str(raw_assigned)
-
-                # Safely format dates
-                try:
-                    scheduled_iso = row[8].isoformat() if row[8] else None
-                except Exception:
-                    scheduled_iso = None
-                try:
-                    created_iso = row[9].isoformat() if row[9] else None
-                except Exception:
-                    created_iso = None
-
-                # Handle JSONB fields (selected_categories, evaluation_items, assigned_to_ids)
-                selected_categories = row[14] if row[14] is not None else []
-                evaluation_items = row[15] if row[15] is not None else []
-                assigned_to_ids = row[16] if row[16] is not None else []
-                
-                # Format deadline and end_date
-                try:
-                    deadline_iso = row[17].isoformat() if row[17] else None
-                except Exception:
-                    deadline_iso = None
-                try:
-                    end_date_iso = row[18].isoformat() if row[18] else None
-                except Exception:
-                    end_date_iso = None
-
-                rounds_data.append({
-                    "id": row[0],
-                    "round_code": str(row[1]) if row[1] is not None else None,
-                    "title": str(row[2]) if row[2] is not None else None,
-                    "description": str(row[3]) if row[3] is not None else None,
-                    "round_type": str(row[4]) if row[4] is not None else None,
-                    "department": str(row[5]) if row[5] is not None else None,
-                    "status": str(row[6]) if row[6] is not None else None,
-                    "priority": str(row[7]) if row[7] is not None else None,
-                    "scheduled_date": scheduled_iso,
-                    "created_at": created_iso,
-                    "assigned_to": assigned_to_str,
-                    "created_by_id": row[11],
-                    "compliance_percentage": row[12] if row[12] is not None else 0,
-                    "completion_percentage": row[13] if row[13] is not None else 0,
-                    "selected_categories": selected_categories,
-                    "evaluation_items": evaluation_items,
-                    "assigned_to_ids": assigned_to_ids,
-                    "deadline": deadline_iso,
-                    "end_date": end_date_iso,
-                    "notes": str(row[19]) if row[19] is not None else None
-                })
-            except Exception as e:
-                # Log per-row error and continue with placeholder so the API doesn't 500
-                print(f"❌ [API] Error serializing round id={row[0] if row is not None else 'unknown'}: {e}")
-                traceback.print_exc()
-                rounds_data.append({
-                    "id": row[0] if row is not None else None,
-                    "round_code": row[1] if row is not None else None,
-                    "title": None,
-                    "description": None,
-                    "round_type": None,
-                    "department": None,
-                    "status": None,
-                    "priority": None,
-                    "scheduled_date": None,
-                    "created_at": None,
-                    "assigned_to": '[]',
-                    "created_by_id": row[11] if row is not None else None,
-                    "_error": str(e)
-                })
-        
-        print(f"✅ [API] Successfully fetched {len(rounds_data)} rounds")
+        rounds_data = ROUND_LIST_SERIALIZER.many(result)
         
-        # Log first few rounds for debugging
-        if rounds_data:
-            print(f"📋 [API] First round: ID={rounds_data[0]['id']}, Title={rounds_data[0]['title']}")
+        logger.debug("[API] Successfully fetched %s rounds", len(rounds_data))
         
-        # Return raw JSONResponse to avoid pydantic response_model validation errors
-        return JSONResponse(content=rounds_data)
+        # Return the response directly to avoid pydantic response_model validation errors
+        return FastJSONResponse(content=rounds_data)
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [API] Error fetching rounds: {str(e)}")
-        print(f"❌ [API] Error type: {type(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[API] Error fetching rounds: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في تحميل الجولات من قاعدة البيانات: {str(e)}")
 
 from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
 
 
-@app.get("/api/rounds/my")
+@app.get("/api/rounds/my", response_class=FastJSONResponse)
 async def get_my_rounds(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Get rounds assigned to the current user.
 
@@ -962,25 +1089,44 @@ async def get_my_rounds(skip: int = 0, limit: int = 100, db: Session = Depends(g
     JSON payload avoids runtime 500s while we investigate/align schemas.
     """
     try:
-        print(f"🔍 API: Getting rounds for user ID: {current_user.id}")
+        logger.debug("API: Getting rounds for user ID: %s", current_user.id)
         rounds = get_rounds_by_user(db, current_user.id, skip=skip, limit=limit)
-        print(f"📊 API: Returning {len(rounds)} rounds")
+        logger.debug("API: Returning %s rounds", len(rounds))
 
-        # Safely encode SQLAlchemy models to primitives (datetimes -> iso, lists, etc.)
-        payload = jsonable_encoder(rounds)
-        return JSONResponse(content=payload)
+        # Column values straight to JSON (datetimes, enums handled by the encoder)
+        return FastJSONResponse(content=model_serializer(Round).many(rounds))
     except Exception as e:
-        print(f"❌ Error in get_my_rounds: {e}")
+        logger.error("Error in get_my_rounds: %s", e)
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"خطأ في جلب الجولات: {str(e)}")
 
 
+MAX_CAPA_SUMMARY_ROUNDS = 200
+
+
+@app.get("/api/rounds/capa-summaries")
+async def get_round_capa_summaries_endpoint(
+    round_ids: str,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """CAPA badge counters for the rounds of a list page: ?round_ids=1,2,3 (one query)"""
+    try:
+        ids = [int(part) for part in round_ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="round_ids must be a comma-separated list of integers")
+    if len(set(ids)) > MAX_CAPA_SUMMARY_ROUNDS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_CAPA_SUMMARY_ROUNDS} rounds per request")
+    # JSON object keys are strings
+    return {str(round_id): counters for round_id, counters in get_round_capa_summaries(db, ids).items()}
+
+
 @app.get("/api/rounds/my/stats")
 async def get_my_rounds_stats(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Get comprehensive statistics for rounds assigned to the current user"""
     try:
-        print(f"📊 API: Getting stats for user ID: {current_user.id}")
+        logger.debug("API: Getting stats for user ID: %s", current_user.id)
         
         # Get all rounds for the user (without pagination to get full stats)
         rounds = get_rounds_by_user(db, current_user.id, skip=0, limit=1000)
@@ -1048,15 +1194,15 @@ async def get_my_rounds_stats(db: Session = Depends(get_db), current_user = Depe
             stats["needs_capa_count"] = int(needs_capa_count)
             stats["open_capa_count"] = int(open_capa_count)
         except Exception as e:
-            print(f"Warning calculating CAPA stats: {e}")
+            logger.warning("Warning calculating CAPA stats: %s", e)
             stats["needs_capa_count"] = 0
             stats["open_capa_count"] = 0
         
-        print(f"✅ Stats calculated: {stats}")
+        logger.debug("Stats calculated: %s", stats)
         return stats
         
     except Exception as e:
-        print(f"❌ Error calculating stats: {e}")
+        logger.error("Error calculating stats: %s", e)
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"خطأ في حساب الإحصائيات: {str(e)}")
@@ -1069,7 +1215,7 @@ async def list_round_types(skip: int = 0, limit: int = 100, db: Session = Depend
         types = get_round_types(db, skip=skip, limit=limit)
         return types
     except Exception as e:
-        print(f"❌ [API] Error fetching round types: {e}")
+        logger.error("[API] Error fetching round types: %s", e)
         raise HTTPException(status_code=500, detail="فشل في جلب أنواع الجولات")
 
 
@@ -1082,7 +1228,7 @@ async def create_round_type_endpoint(payload: dict = Body(...), db: Session = De
         rt = create_round_type(db, payload)
         return rt
     except Exception as e:
-        print(f"❌ [API] Error creating round type: {e}")
+        logger.error("[API] Error creating round type: %s", e)
         raise HTTPException(status_code=500, detail="فشل في إنشاء نوع الجولة")
 
 
@@ -1098,7 +1244,7 @@ async def update_round_type_endpoint(type_id: int, payload: dict = Body(...), db
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [API] Error updating round type: {e}")
+        logger.error("[API] Error updating round type: %s", e)
         raise HTTPException(status_code=500, detail="فشل في تحديث نوع الجولة")
 
 
@@ -1114,7 +1260,7 @@ async def delete_round_type_endpoint(type_id: int, db: Session = Depends(get_db)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [API] Error deleting round type: {e}")
+        logger.error("[API] Error deleting round type: %s", e)
         raise HTTPException(status_code=500, detail="فشل في حذف نوع الجولة")
 
 @app.get("/api/rounds/{round_id}", response_model=RoundResponse)
@@ -1164,7 +1310,7 @@ async def submit_evaluations_endpoint(round_id: int, payload: dict = Body(...),
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in submit_evaluations_endpoint: {e}")
+        logger.error("Error in submit_evaluations_endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to save partial evaluation (draft)
@@ -1182,7 +1328,7 @@ async def save_evaluation_draft_endpoint(round_id: int, payload: dict = Body(...
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in save_evaluation_draft_endpoint: {e}")
+        logger.error("Error in save_evaluation_draft_endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1193,38 +1339,85 @@ async def get_round_evaluations_endpoint(round_id: int, db: Session = Depends(ge
         results = get_evaluation_results_by_round(db, round_id)
         return results
     except Exception as e:
-        print(f"Error in get_round_evaluations_endpoint: {e}")
+        logger.error("Error in get_round_evaluations_endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to finalize evaluation (mark as completed)
 @app.post("/api/rounds/{round_id}/evaluations/finalize")
-async def finalize_evaluation_endpoint(round_id: int, payload: dict = Body(...), db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+async def finalize_evaluation_endpoint(round_id: int, background_tasks: BackgroundTasks, payload: dict = Body(...), db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     """Finalize evaluation and mark round as completed.
     Accepts payload: { evaluations: [{item_id, status, comments?, evidence_files?}], notes? }
+    Results, round status and the CAPAs for items not fully applied are committed
+    together; the CAPA digest notifications go out after the response.
     """
     try:
         evaluations = payload.get('evaluations') or []
-        created, updated_round = create_evaluation_results(db, round_id, evaluations, current_user.id, finalize=True)
+        created, updated_round = create_evaluation_results(db, round_id, evaluations, current_user.id, finalize=True, commit=False)
         if updated_round is None:
+            db.rollback()
             raise HTTPException(status_code=400, detail="Evaluation models unavailable or round not found")
         
         # Create CAPA items in DB for evaluations not fully applied
-        created_capas = []
-        try:
-            from crud import create_capas_for_round_non_compliance
-            capa_result = create_capas_for_round_non_compliance(db, round_id, current_user.id, threshold=70)
-            if capa_result and capa_result.get('created_capas'):
-                created_capas = capa_result['created_capas']
-        except Exception as e:
-            print(f"❌ Error while creating CAPAs on finalize: {e}")
-
+        capa_result = create_capas_for_round_non_compliance(db, round_id, current_user.id, threshold=70, commit=False)
+        if not capa_result.get('success'):
+            logger.error("Error while creating CAPAs on finalize: %s", capa_result.get('message'))
+        created_capas = capa_result.get('created_capas') or []
+        
         # Round status is already set to completed by create_evaluation_results
+        db.commit()
+        db.refresh(updated_round)
+        
+        if created_capas:
+            background_tasks.add_task(
+                notify_round_capas_created, round_id, len(created_capas), current_user.id,
+                f"{current_user.first_name} {current_user.last_name}"
+            )
         
         return {"created": len(created), "round_id": updated_round.id, "compliance_percentage": updated_round.compliance_percentage, "completion_percentage": updated_round.completion_percentage, "status": updated_round.status, "created_capas": created_capas}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in finalize_evaluation_endpoint: {e}")
+        logger.error("Error in finalize_evaluation_endpoint: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Offline-first sync for tablets: item-level changes instead of whole payloads
+@app.post("/api/rounds/{round_id}/evaluations/sync", response_model=EvaluationSyncResponse)
+async def sync_evaluations_endpoint(round_id: int, payload: EvaluationSyncRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    """Apply a device's changed items and return the round's other changes since payload.since.
+    Retried changes are applied once; see evaluation_sync.py for the protocol.
+    With finalize (and no conflicts) the round is completed and its CAPAs created, as in /finalize.
+    """
+    from evaluation_sync import MAX_SYNC_CHANGES, sync_round_evaluations
+    if len(payload.changes) > MAX_SYNC_CHANGES:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_SYNC_CHANGES} changes per sync")
+    try:
+        result = sync_round_evaluations(
+            db, round_id, current_user.id, payload.client_id, payload.since,
+            [change.model_dump() for change in payload.changes], finalize=payload.finalize
+        )
+        if result is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail="الجولة غير موجودة")
+        
+        created_capas = []
+        if result["finalized"]:
+            capa_result = create_capas_for_round_non_compliance(db, round_id, current_user.id, threshold=70, commit=False)
+            if not capa_result.get('success'):
+                logger.error("Error while creating CAPAs on sync finalize: %s", capa_result.get('message'))
+            created_capas = capa_result.get('created_capas') or []
+        db.commit()
+        
+        if created_capas:
+            background_tasks.add_task(
+                notify_round_capas_created, round_id, len(created_capas), current_user.id,
+                f"{current_user.first_name} {current_user.last_name}"
+            )
+        return {**result, "created_capas": len(created_capas)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error("Error in sync_evaluations_endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 # CAPA endpoints
@@ -1253,7 +1446,7 @@ if FEATURE_CAPA:
                     )
             except Exception as e:
                 # Log error but don't fail the CAPA creation
-                print(f"Error sending CAPA assignment notification: {str(e)}")
+                logger.error("Error sending CAPA assignment notification: %s", str(e))
         
         return created_capa
 
@@ -1331,7 +1524,9 @@ if FEATURE_CAPA:
         return {"message": "تم حذف خطة التحسين بنجاح", "deleted_capa_id": capa_id}
 
 # User endpoints
-@app.get("/api/users", response_model=List[UserResponse])
+USER_RESPONSE_FIELDS = tuple(UserResponse.model_fields)
+
+@app.get("/api/users", response_model=List[UserResponse], response_class=FastJSONResponse)
 async def get_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
     # Check if user has permission to view users (super_admin or quality_manager only)
     if current_user.role not in ["super_admin", "quality_manager"]:
@@ -1340,7 +1535,8 @@ async def get_all_users(skip: int = 0, limit: int = 100, db: Session = Depends(g
             detail="ليس لديك صلاحية لعرض المستخدمين. هذه الصلاحية محصورة على مدير النظام ومدير الجودة فقط."
         )
     users = get_users(db, skip=skip, limit=limit)
-    return users
+    # Only the UserResponse fields (never hashed_password), without per-row pydantic validation
+    return FastJSONResponse(content=model_serializer(User, USER_RESPONSE_FIELDS).many(users))
 
 @app.get("/api/users/assessors", response_model=List[UserResponse])
 async def get_assessors_endpoint(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
@@ -1364,7 +1560,7 @@ async def create_new_user(user: UserCreate, db: Session = Depends(get_db), curre
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = create_user(db, user, hashed_password)
     return db_user
 
@@ -1394,14 +1590,14 @@ async def update_user(user_id: int, user: dict = Body(...), db: Session = Depend
     if not db_user:
         raise HTTPException(status_code=404, detail="المستخدم غير موجود")
     
-    print(f"🔍 Backend - Updating user {user_id} with data: {user}")
-    print(f"🔍 Backend - Photo URL in request: {user.get('photo_url')}")
+    logger.debug("Backend - Updating user %s with data: %s", user_id, user)
+    logger.debug("Backend - Photo URL in request: %s", user.get('photo_url'))
     
     # Update user
-    hashed_password = get_password_hash(user.get('password')) if user.get('password') else db_user.hashed_password
+    hashed_password = await get_password_hash_async(user.get('password')) if user.get('password') else db_user.hashed_password
     updated_user = update_user_data(db, user_id, user, hashed_password)
     
-    print(f"✅ Backend - Updated user photo_url: {updated_user.photo_url}")
+    logger.debug("Backend - Updated user photo_url: %s", updated_user.photo_url)
     return updated_user
 
 @app.delete("/api/users/{user_id}")
@@ -1465,22 +1661,22 @@ async def get_department(department_id: int, db: Session = Depends(get_db), curr
 
 @app.put("/api/departments/{department_id}", response_model=DepartmentResponse)
 async def update_department_endpoint(department_id: int, department: dict = Body(...), db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    print(f"🔧 Updating department {department_id} with data: {department}")
+    logger.debug("Updating department %s with data: %s", department_id, department)
     
     # Convert dict to DepartmentCreate schema
     try:
         department_data = DepartmentCreate(**department)
-        print(f"✅ Department data validated: {department_data}")
+        logger.debug("Department data validated: %s", department_data)
     except Exception as e:
-        print(f"❌ Department validation error: {e}")
+        logger.error("Department validation error: %s", e)
         raise HTTPException(status_code=400, detail=f"Invalid department data: {str(e)}")
     
     updated_department = update_department(db, department_id, department_data)
     if not updated_department:
-        print(f"❌ Department {department_id} not found")
+        logger.error("Department %s not found", department_id)
         raise HTTPException(status_code=404, detail="القسم غير موجود")
     
-    print(f"✅ Department {department_id} updated successfully")
+    logger.info("Department %s updated successfully", department_id)
     return updated_department
 
 @app.delete("/api/departments/{department_id}")
@@ -1687,11 +1883,12 @@ async def get_audit_logs_endpoint(
     limit: int = 100, 
     user_id: Optional[int] = None,
     entity_type: Optional[str] = None,
+    since: Optional[datetime] = None,
     db: Session = Depends(get_db), 
     current_user = Depends(get_current_user)
 ):
     """الحصول على سجل الأنشطة"""
-    audit_logs = get_audit_logs(db, skip=skip, limit=limit, user_id=user_id, entity_type=entity_type)
+    audit_logs = get_audit_logs(db, skip=skip, limit=limit, user_id=user_id, entity_type=entity_type, since=since)
     return audit_logs
 
 @app.get("/api/audit-logs/user/{user_id}", response_model=List[AuditLogResponse])
@@ -1725,13 +1922,14 @@ async def get_user_notifications(
     skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
+    since: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """الحصول على إشعارات المستخدم"""
     from models_updated import NotificationStatus
     status_filter = NotificationStatus(status) if status else None
-    notifications = get_notifications_by_user(db, current_user.id, skip=skip, limit=limit, status=status_filter)
+    notifications = get_notifications_by_user(db, current_user.id, skip=skip, limit=limit, status=status_filter, since=since)
     return notifications
 
 @app.get("/api/notifications/unread-count")
@@ -1776,6 +1974,65 @@ async def delete_notification(
         raise HTTPException(status_code=404, detail="الإشعار غير موجود")
     return {"message": "تم حذف الإشعار"}
 
+# Realtime events (server-sent events)
+SSE_HEARTBEAT_SECONDS = int(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+def _resolve_stream_user(request: Request, ticket: Optional[str]) -> Optional[tuple]:
+    """(user id, unread count) for an event stream; EventSource cannot send headers so a ?ticket= from /api/events/ticket is accepted too"""
+    # Short-lived session: the stream must not hold a pooled connection while it is open
+    db = SessionLocal()
+    try:
+        auth_header = request.headers.get("authorization", "")
+        if auth_header.lower().startswith("bearer "):
+            email = verify_token(auth_header[7:])
+            user = get_user_by_email(db, email=email) if email else None
+        else:
+            user_id = redeem_stream_ticket(db, ticket) if ticket else None
+            user = get_user_by_id(db, user_id) if user_id else None
+        if not user:
+            return None
+        return user.id, get_unread_notifications_count(db, user.id)
+    finally:
+        db.close()
+
+@app.post("/api/events/ticket")
+async def create_stream_ticket(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    """تذكرة لمرة واحدة لفتح بث الأحداث دون وضع رمز الدخول في الرابط"""
+    return {"ticket": issue_stream_ticket(db, current_user.id), "expires_in": STREAM_TICKET_SECONDS}
+
+@app.get("/api/events/stream")
+async def stream_events(request: Request, ticket: Optional[str] = None):
+    """بث فوري للإشعارات وعدد غير المقروء وتنبيهات الإجراءات التصحيحية (Server-Sent Events)"""
+    resolved = await asyncio.get_running_loop().run_in_executor(None, _resolve_stream_user, request, ticket)
+    if not resolved:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    user_id, unread_count = resolved
+    queue = broker.subscribe(user_id)
+
+    async def event_generator():
+        try:
+            yield "retry: 3000\n\n"
+            # Initial state so the client needs no polling request after connecting
+            yield format_sse("unread_count", {"unread_count": unread_count})
+            while True:
+                try:
+                    envelope = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Comment frame keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(envelope["event"], envelope.get("data"))
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # User Notification Settings endpoints
 @app.get("/api/notification-settings", response_model=UserNotificationSettingsResponse)
 async def get_user_notification_settings_endpoint(
@@ -1822,7 +2079,7 @@ async def get_round_types_endpoint(
     try:
         return get_round_types(db, skip=skip, limit=limit)
     except Exception as e:
-        print(f"❌ [API] Error listing round types: {e}")
+        logger.error("[API] Error listing round types: %s", e)
         raise HTTPException(status_code=500, detail="فشل في جلب أنواع الجولات")
 
 @app.post("/api/round-types", response_model=RoundTypeResponse)
@@ -1852,7 +2109,7 @@ async def get_round_type_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [API] Error fetching round type id={round_type_id}: {e}")
+        logger.error("[API] Error fetching round type id=%s: %s", round_type_id, e)
         raise HTTPException(status_code=500, detail="فشل في جلب نوع الجولة")
 
 @app.put("/api/round-types/{round_type_id}", response_model=RoundTypeResponse)
@@ -1900,6 +2157,7 @@ async def send_reminders(
         )
     
     try:
+        from reminder_service import get_reminder_service
         reminder_service = get_reminder_service(db)
         reminder_service.check_round_deadlines()
         reminder_service.check_capa_deadlines()
@@ -1927,7 +2185,7 @@ async def get_round_non_compliant_items(
             "items": non_compliant_items
         }
     except Exception as e:
-        print(f"Error getting non-compliant items: {e}")
+        logger.error("Error getting non-compliant items: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1946,7 +2204,7 @@ async def get_round_items_needing_capa(
             "items": items_needing_capa
         }
     except Exception as e:
-        print(f"Error getting items needing CAPA: {e}")
+        logger.error("Error getting items needing CAPA: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -1983,13 +2241,14 @@ async def mark_evaluation_result_needs_capa(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error marking evaluation result as needs CAPA: {e}")
+        logger.error("Error marking evaluation result as needs CAPA: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/rounds/{round_id}/create-capas")
 async def create_capas_for_round(
     round_id: int,
+    background_tasks: BackgroundTasks,
     payload: dict = Body(...),
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -2001,9 +2260,14 @@ async def create_capas_for_round(
     try:
         threshold = payload.get('threshold', 70)
         result = create_capas_for_round_non_compliance(db, round_id, current_user.id, threshold)
+        if result.get('created_capas'):
+            background_tasks.add_task(
+                notify_round_capas_created, round_id, len(result['created_capas']), current_user.id,
+                f"{current_user.first_name} {current_user.last_name}"
+            )
         return result
     except Exception as e:
-        print(f"Error creating CAPAs for round: {e}")
+        logger.error("Error creating CAPAs for round: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2038,11 +2302,12 @@ async def create_capa_for_evaluation_item(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error creating CAPA for evaluation item: {e}")
+        logger.error("Error creating CAPA for evaluation item: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/rounds/{round_id}/capa-summary")
+@app.get("/api/rounds/{round_id}/capa-summary")
 async def get_round_capa_summary_endpoint(
     round_id: int,
     db: Session = Depends(get_db),
@@ -2058,7 +2323,7 @@ async def get_round_capa_summary_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting round CAPA summary: {e}")
+        logger.error("Error getting round CAPA summary: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2126,23 +2391,15 @@ async def create_enhanced_capa(
         if not existing_user:
             # Fallback to a safe existing user id (1) if the test supplies a fake user id
             creator_id_for_db = 1
-            print(f"[TEST-HELPER] current_user.id={current_user.id} not found, using fallback creator_id={creator_id_for_db}")
+            logger.debug("[TEST-HELPER] current_user.id=%s not found, using fallback creator_id=%s", current_user.id, creator_id_for_db)
     except Exception:
         # If any error, use fallback
         creator_id_for_db = 1
 
     # Create CAPA in database using resolved creator id to avoid FK failures in tests
+    # create_capa writes the create_capa audit entry in the same transaction
     db_capa = create_capa(db, capa_data, creator_id_for_db)
     
-    # Create audit log (use the DB-resolved creator id to avoid FK issues in tests)
-    create_audit_log(db, {
-        "user_id": creator_id_for_db,
-        "action": "create_capa",
-        "entity_type": "capa",
-        "entity_id": db_capa.id,
-        "new_values": json.dumps({"title": db_capa.title, "department": db_capa.department})
-    })
-    
     return {
         "status": "success",
         "message": "CAPA plan created successfully",
@@ -2238,24 +2495,14 @@ async def update_enhanced_capa(
             }
         }
     except Exception as e:
-        print(f"Error updating CAPA: {e}")
+        logger.error("Error updating CAPA: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to update CAPA: {str(e)}")
 
-@app.get("/api/capas/{capa_id}", response_model=dict)
-async def get_enhanced_capa(
-    capa_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get a specific enhanced CAPA plan by ID"""
-    capa = get_capa_by_id(db, capa_id)
-    if not capa:
-        raise HTTPException(status_code=404, detail="CAPA plan not found")
-    
-    # Serialize JSON fields - prefer table data over JSON if available
+def _serialize_capa_detail(capa) -> dict:
+    """Serialize a CAPA loaded through get_capa_by_id/get_capas_by_ids"""
     import json
-    
-    # Check if actions were loaded from table
+
+    # Serialize JSON fields - prefer table data over JSON if available
     corrective_actions = getattr(capa, 'corrective_actions_from_table', None)
     if corrective_actions is None:
         try:
@@ -2282,39 +2529,89 @@ async def get_enhanced_capa(
     except (json.JSONDecodeError, TypeError):
         status_history = []
     
+    return {
+        "id": capa.id,
+        "title": capa.title,
+        "description": capa.description,
+        "round_id": capa.round_id,
+        "department": capa.department,
+        "priority": capa.priority,
+        "status": capa.status,
+        "assigned_to": capa.assigned_to,
+        "assigned_to_id": capa.assigned_to_id,
+        "evaluation_item_id": capa.evaluation_item_id,
+        "evaluation_item_title": getattr(capa, 'evaluation_item_title', None),
+        "evaluation_item_code": getattr(capa, 'evaluation_item_code', None),
+        "evaluation_item_category": getattr(capa, 'evaluation_item_category', None),
+        "target_date": capa.target_date,
+        "risk_score": capa.risk_score,
+        "root_cause": capa.root_cause,
+        "corrective_actions": corrective_actions,
+        "preventive_actions": preventive_actions,
+        "verification_steps": verification_steps,
+        "actions_progress": getattr(capa, 'actions_progress', None),
+        "verification_status": capa.verification_status,
+        "severity": capa.severity,
+        "estimated_cost": float(capa.estimated_cost) if capa.estimated_cost else None,
+        "sla_days": capa.sla_days,
+        "escalation_level": capa.escalation_level,
+        "closed_at": capa.closed_at,
+        "verified_at": getattr(capa, 'verified_at', None),
+        "status_history": status_history,
+        "created_by_id": capa.created_by_id,
+        "created_at": capa.created_at,
+    }
+
+@app.get("/api/capas/batch", response_model=dict)
+async def get_enhanced_capas_batch(
+    ids: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get several CAPA plans with their actions and progress in one request (comma-separated ids)"""
+    try:
+        capa_ids = [int(part) for part in ids.split(',') if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(capa_ids) > 500:
+        raise HTTPException(status_code=400, detail="Too many ids (max 500)")
+    
+    capas = get_capas_by_ids(db, capa_ids)
     return {
         "status": "success",
-        "capa": {
-            "id": capa.id,
-            "title": capa.title,
-            "description": capa.description,
-            "round_id": capa.round_id,
-            "department": capa.department,
-            "priority": capa.priority,
-            "status": capa.status,
-            "assigned_to": capa.assigned_to,
-            "assigned_to_id": capa.assigned_to_id,
-            "evaluation_item_id": capa.evaluation_item_id,
-            "target_date": capa.target_date,
-            "risk_score": capa.risk_score,
-            "root_cause": capa.root_cause,
-            "corrective_actions": corrective_actions,
-            "preventive_actions": preventive_actions,
-            "verification_steps": verification_steps,
-            "verification_status": capa.verification_status,
-            "severity": capa.severity,
-            "estimated_cost": float(capa.estimated_cost) if capa.estimated_cost else None,
-            "sla_days": capa.sla_days,
-            "escalation_level": capa.escalation_level,
-            "closed_at": capa.closed_at,
-                "verified_at": getattr(capa, 'verified_at', None),
-            "status_history": status_history,
-            "created_by_id": capa.created_by_id,
-            "created_at": capa.created_at,
-        }
+        "capas": [_serialize_capa_detail(capa) for capa in capas]
+    }
+
+@app.get("/api/capas/{capa_id}", response_model=dict)
+async def get_enhanced_capa(
+    capa_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a specific enhanced CAPA plan by ID"""
+    capa = get_capa_by_id(db, capa_id)
+    if not capa:
+        raise HTTPException(status_code=404, detail="CAPA plan not found")
+    
+    return {
+        "status": "success",
+        "capa": _serialize_capa_detail(capa)
     }
 
-@app.get("/api/capas", response_model=dict)
+CAPA_LIST_SERIALIZER = ModelSerializer(
+    (
+        "id", "title", "description", "department", "department_id", "priority", "status",
+        "verification_status", "severity", "target_date", "escalation_level",
+        "corrective_actions", "preventive_actions", "verification_steps", "created_at",
+    ),
+    transforms={
+        "corrective_actions": json_text_to_list,
+        "preventive_actions": json_text_to_list,
+        "verification_steps": json_text_to_list,
+    },
+)
+
+@app.get("/api/capas", response_model=dict, response_class=FastJSONResponse)
 async def get_enhanced_capas(
     skip: int = 0,
     limit: int = 100,
@@ -2332,7 +2629,7 @@ async def get_enhanced_capas(
     
     # Apply filters
     if department:
-        query = query.filter(Capa.department == department)
+        query = query.filter(department_filter(db, Capa.department_id, department))
     if status:
         query = query.filter(Capa.status == status)
     if severity:
@@ -2346,58 +2643,30 @@ async def get_enhanced_capas(
     # Apply pagination
     capas = query.offset(skip).limit(limit).all()
     
-    # Serialize results
-    import json
-    serialized_capas = []
-    for capa in capas:
-        try:
-            corrective_actions = json.loads(capa.corrective_actions) if capa.corrective_actions else []
-        except (json.JSONDecodeError, TypeError):
-            corrective_actions = []
-        
-        try:
-            preventive_actions = json.loads(capa.preventive_actions) if capa.preventive_actions else []
-        except (json.JSONDecodeError, TypeError):
-            preventive_actions = []
-        
-        try:
-            verification_steps = json.loads(capa.verification_steps) if capa.verification_steps else []
-        except (json.JSONDecodeError, TypeError):
-            verification_steps = []
-        
-        serialized_capas.append({
-            "id": capa.id,
-            "title": capa.title,
-            "description": capa.description,
-            "department": capa.department,
-            "priority": capa.priority,
-            "status": capa.status,
-            "verification_status": capa.verification_status,
-            "severity": capa.severity,
-            "target_date": capa.target_date,
-            "escalation_level": capa.escalation_level,
-            "corrective_actions": corrective_actions,
-            "preventive_actions": preventive_actions,
-            "verification_steps": verification_steps,
-            "created_at": capa.created_at,
-        })
-    
-    return {
+    serialized_capas = CAPA_LIST_SERIALIZER.many(capas)
+
+    return FastJSONResponse(content={
         "status": "success",
         "capas": serialized_capas,
         "total_count": total_count,
         "skip": skip,
         "limit": limit
-    }
+    })
 
 @app.get("/api/capas/dashboard/stats", response_model=dict)
-async def get_capa_dashboard_stats(
+def get_capa_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get CAPA dashboard statistics"""
+    return response_cache.get_or_compute(
+        "capas.dashboard_stats", lambda: _capa_dashboard_stats(db),
+        tags=("capas",),
+    )
+
+def _capa_dashboard_stats(db: Session) -> dict:
     # Execute the view query
-    result = db.execute("SELECT * FROM capa_dashboard_stats").fetchone()
+    result = db.execute(text("SELECT * FROM capa_dashboard_stats")).fetchone()
     
     if not result:
         return {
@@ -2437,108 +2706,120 @@ async def get_capa_dashboard_stats(
 
 # Reports endpoints
 @app.get("/api/reports/dashboard/stats", response_model=dict)
-async def get_reports_dashboard_stats(
+def get_reports_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get comprehensive dashboard statistics for reports"""
     try:
-        # Get rounds statistics
-        total_rounds = db.query(Round).count()
-        completed_rounds = db.query(Round).filter(Round.status == "completed").count()
-        in_progress_rounds = db.query(Round).filter(Round.status == "in_progress").count()
-        pending_rounds = db.query(Round).filter(Round.status == "pending_review").count()
-        overdue_rounds = db.query(Round).filter(Round.status == "overdue").count()
-        
-        # Get CAPA statistics
-        total_capas = db.query(Capa).count()
-        pending_capas = db.query(Capa).filter(Capa.status == "pending").count()
-        in_progress_capas = db.query(Capa).filter(Capa.status == "in_progress").count()
-        implemented_capas = db.query(Capa).filter(Capa.status == "implemented").count()
-        
-        # Get departments statistics
-        total_departments = db.query(Department).count()
-        active_departments = db.query(Department).filter(Department.is_active == True).count()
-        
-        # Get users statistics
-        total_users = db.query(User).count()
-        active_users = db.query(User).filter(User.is_active == True).count()
-        
-        # Calculate compliance rate (based on completed rounds with compliance percentage)
-        completed_rounds_with_compliance = db.query(Round).filter(
-            Round.status == "completed",
-            Round.compliance_percentage.isnot(None)
-        ).all()
-        
-        if completed_rounds_with_compliance:
-            avg_compliance = sum(round.compliance_percentage for round in completed_rounds_with_compliance) / len(completed_rounds_with_compliance)
-        else:
-            avg_compliance = 0
-        
-        return {
-            "rounds": {
-                "total": total_rounds,
-                "completed": completed_rounds,
-                "in_progress": in_progress_rounds,
-                "pending": pending_rounds,
-                "overdue": overdue_rounds
-            },
-            "capas": {
-                "total": total_capas,
-                "pending": pending_capas,
-                "in_progress": in_progress_capas,
-                "implemented": implemented_capas
-            },
-            "departments": {
-                "total": total_departments,
-                "active": active_departments
-            },
-            "users": {
-                "total": total_users,
-                "active": active_users
-            },
-            "compliance_rate": round(avg_compliance, 2)
-        }
+        return response_cache.get_or_compute(
+            "reports.dashboard_stats", lambda: _reports_dashboard_stats(db),
+            tags=("rounds", "capas", "departments", "users"),
+        )
     except Exception as e:
-        print(f"Error getting reports dashboard stats: {e}")
+        logger.error("Error getting reports dashboard stats: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب إحصائيات التقارير: {str(e)}")
 
+def _reports_dashboard_stats(db: Session) -> dict:
+    # Get rounds statistics
+    total_rounds = db.query(Round).count()
+    completed_rounds = db.query(Round).filter(Round.status == "completed").count()
+    in_progress_rounds = db.query(Round).filter(Round.status == "in_progress").count()
+    pending_rounds = db.query(Round).filter(Round.status == "pending_review").count()
+    overdue_rounds = db.query(Round).filter(Round.status == "overdue").count()
+    
+    # Get CAPA statistics
+    total_capas = db.query(Capa).count()
+    pending_capas = db.query(Capa).filter(Capa.status == "pending").count()
+    in_progress_capas = db.query(Capa).filter(Capa.status == "in_progress").count()
+    implemented_capas = db.query(Capa).filter(Capa.status == "implemented").count()
+    
+    # Get departments statistics
+    total_departments = db.query(Department).count()
+    active_departments = db.query(Department).filter(Department.is_active == True).count()
+    
+    # Get users statistics
+    total_users = db.query(User).count()
+    active_users = db.query(User).filter(User.is_active == True).count()
+    
+    # Calculate compliance rate (based on completed rounds with compliance percentage)
+    completed_rounds_with_compliance = db.query(Round).filter(
+        Round.status == "completed",
+        Round.compliance_percentage.isnot(None)
+    ).all()
+    
+    if completed_rounds_with_compliance:
+        avg_compliance = sum(round.compliance_percentage for round in completed_rounds_with_compliance) / len(completed_rounds_with_compliance)
+    else:
+        avg_compliance = 0
+    
+    return {
+        "rounds": {
+            "total": total_rounds,
+            "completed": completed_rounds,
+            "in_progress": in_progress_rounds,
+            "pending": pending_rounds,
+            "overdue": overdue_rounds
+        },
+        "capas": {
+            "total": total_capas,
+            "pending": pending_capas,
+            "in_progress": in_progress_capas,
+            "implemented": implemented_capas
+        },
+        "departments": {
+            "total": total_departments,
+            "active": active_departments
+        },
+        "users": {
+            "total": total_users,
+            "active": active_users
+        },
+        "compliance_rate": round(avg_compliance, 2)
+    }
+
 # =====================================================
 # CAPA Dashboard Endpoints
 # =====================================================
 
 @app.get("/api/dashboard/stats/")
-async def get_dashboard_stats(
+def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get CAPA dashboard statistics"""
     try:
-        # Query the view for dashboard stats
-        result = db.execute(text("SELECT * FROM capa_dashboard_stats")).fetchone()
-        
-        if not result:
-            return {
-                "total_capas": 0,
-                "overdue_capas": 0,
-                "completed_this_month": 0,
-                "critical_pending": 0,
-                "average_completion_time": 0,
-                "cost_savings": 0
-            }
-        
-        return {
-            "total_capas": result[0] or 0,
-            "overdue_capas": result[1] or 0,
-            "completed_this_month": result[2] or 0,
-            "critical_pending": result[3] or 0,
-            "average_completion_time": float(result[4]) if result[4] else 0,
-            "cost_savings": result[5] or 0
-        }
+        return response_cache.get_or_compute(
+            "dashboard.stats", lambda: _dashboard_stats(db),
+            tags=("capas", "capa_actions"),
+        )
     except Exception as e:
-        print(f"Error getting dashboard stats: {e}")
+        logger.error("Error getting dashboard stats: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب إحصائيات الداشبورد: {str(e)}")
 
+def _dashboard_stats(db: Session) -> dict:
+    # Query the view for dashboard stats
+    result = db.execute(text("SELECT * FROM capa_dashboard_stats")).fetchone()
+    
+    if not result:
+        return {
+            "total_capas": 0,
+            "overdue_capas": 0,
+            "completed_this_month": 0,
+            "critical_pending": 0,
+            "average_completion_time": 0,
+            "cost_savings": 0
+        }
+    
+    return {
+        "total_capas": result[0] or 0,
+        "overdue_capas": result[1] or 0,
+        "completed_this_month": result[2] or 0,
+        "critical_pending": result[3] or 0,
+        "average_completion_time": float(result[4]) if result[4] else 0,
+        "cost_savings": result[5] or 0
+    }
+
 @app.get("/api/dashboard/overdue/")
 async def get_overdue_actions(
     current_user: User = Depends(get_current_user),
@@ -2595,7 +2876,7 @@ async def get_overdue_actions(
             "verification_steps": verification_steps
         }
     except Exception as e:
-        print(f"Error getting overdue actions: {e}")
+        logger.error("Error getting overdue actions: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب الإجراءات المتأخرة: {str(e)}")
 
 @app.get("/api/dashboard/upcoming/")
@@ -2654,7 +2935,7 @@ async def get_upcoming_deadlines(
             "verification_steps": verification_steps
         }
     except Exception as e:
-        print(f"Error getting upcoming deadlines: {e}")
+        logger.error("Error getting upcoming deadlines: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب المواعيد القادمة: {str(e)}")
 
 # =====================================================
@@ -2728,7 +3009,7 @@ async def get_actions(
         
         return actions
     except Exception as e:
-        print(f"Error getting actions: {e}")
+        logger.error("Error getting actions: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب الإجراءات: {str(e)}")
 
 @app.put("/api/actions/{action_id}")
@@ -2782,7 +3063,7 @@ async def update_action(
         raise
     except Exception as e:
         db.rollback()
-        print(f"Error updating action: {e}")
+        logger.error("Error updating action: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في تحديث الإجراء: {str(e)}")
 
 # =====================================================
@@ -2856,7 +3137,7 @@ async def get_timeline_events(
         
         return events
     except Exception as e:
-        print(f"Error getting timeline events: {e}")
+        logger.error("Error getting timeline events: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب أحداث الجدول الزمني: {str(e)}")
 
 # =====================================================
@@ -2943,7 +3224,7 @@ async def get_alerts(
         
         return alerts
     except Exception as e:
-        print(f"Error getting alerts: {e}")
+        logger.error("Error getting alerts: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب التنبيهات: {str(e)}")
 
 @app.put("/api/alerts/{alert_id}/read")
@@ -2972,7 +3253,7 @@ async def mark_alert_as_read(
         raise
     except Exception as e:
         db.rollback()
-        print(f"Error marking alert as read: {e}")
+        logger.error("Error marking alert as read: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في تحديث التنبيه: {str(e)}")
 
 # =====================================================
@@ -3011,8 +3292,10 @@ async def get_basic_reports(
         params = {"start_date": start_date, "end_date": end_date}
         
         if department_id and department_id != 'all':
-            dept_filter = "AND department = :department"
-            params['department'] = department_id
+            # An id; older clients send the department name
+            department = int(department_id) if department_id.isdigit() else department_id
+            dept_filter = "AND department_id = :department_id"
+            params['department_id'] = department_directory.department_id(db, department)
         
         # Get overall stats
         stats_query = text(f"""
@@ -3056,10 +3339,10 @@ async def get_basic_reports(
         status_results = db.execute(status_query, params).fetchall()
         status_breakdown = {row[0]: row[1] for row in status_results}
         
-        # Get department stats
+        # Get department stats (CAPAs whose department is unknown are grouped under NULL)
         dept_query = text(f"""
             SELECT 
-                department,
+                department_id,
                 COUNT(*) as total_capas,
                 COUNT(*) FILTER (WHERE status IN ('verified', 'closed')) as completed_capas,
                 COUNT(*) FILTER (WHERE target_date < NOW() AND status NOT IN ('verified', 'closed')) as overdue_capas,
@@ -3067,15 +3350,19 @@ async def get_basic_reports(
             FROM capas
             WHERE created_at BETWEEN :start_date AND :end_date
             {dept_filter}
-            GROUP BY department
+            GROUP BY department_id
             ORDER BY total_capas DESC
         """)
         
         dept_results = db.execute(dept_query, params).fetchall()
+        department_names = dict(db.query(Department.id, Department.name).filter(
+            Department.id.in_([row[0] for row in dept_results if row[0] is not None])
+        ).all())
         department_stats = []
         for row in dept_results:
             department_stats.append({
-                "department": row[0],
+                "department_id": row[0],
+                "department": department_names.get(row[0], "غير محدد"),
                 "total_capas": row[1],
                 "completed_capas": row[2],
                 "overdue_capas": row[3],
@@ -3105,279 +3392,279 @@ async def get_basic_reports(
             "monthly_trends": []
         }
     except Exception as e:
-        print(f"Error getting basic reports: {e}")
+        logger.error("Error getting basic reports: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب التقارير: {str(e)}")
 
 @app.get("/api/reports/compliance-trends", response_model=dict)
-async def get_compliance_trends(
+def get_compliance_trends(
     months: int = 6,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get compliance trends over time"""
     try:
-        from datetime import datetime, timedelta
-        from sqlalchemy import extract
-        
-        # Get data for the last N months
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=months * 30)
-        
-        # Get completed rounds with compliance data grouped by month
-        monthly_data = db.query(
-            extract('year', Round.created_at).label('year'),
-            extract('month', Round.created_at).label('month'),
-            func.avg(Round.compliance_percentage).label('avg_compliance'),
-            func.count(Round.id).label('rounds_count')
-        ).filter(
-            Round.status == "completed",
-            Round.compliance_percentage.isnot(None),
-            Round.created_at >= start_date
-        ).group_by(
-            extract('year', Round.created_at),
-            extract('month', Round.created_at)
-        ).order_by(
-            extract('year', Round.created_at),
-            extract('month', Round.created_at)
-        ).all()
-        
-        # Format data for frontend
-        trends_data = []
-        month_names = [
-            "يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو",
-            "يوليو", "أغسطس", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"
-        ]
-        
-        for data in monthly_data:
-            trends_data.append({
-                "month": month_names[int(data.month) - 1],
-                "compliance": round(float(data.avg_compliance), 2),
-                "rounds": int(data.rounds_count)
-            })
-        
-        return {"trends": trends_data}
+        return response_cache.get_or_compute(
+            "reports.compliance_trends", lambda: _compliance_trends(db, months),
+            tags=("rounds",), params={"months": months},
+        )
     except Exception as e:
-        print(f"Error getting compliance trends: {e}")
+        logger.error("Error getting compliance trends: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب اتجاهات الامتثال: {str(e)}")
 
+def _compliance_trends(db: Session, months: int) -> dict:
+    from datetime import datetime, timedelta
+    from sqlalchemy import extract
+    
+    # Get data for the last N months
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=months * 30)
+    
+    # Get completed rounds with compliance data grouped by month
+    monthly_data = db.query(
+        extract('year', Round.created_at).label('year'),
+        extract('month', Round.created_at).label('month'),
+        func.avg(Round.compliance_percentage).label('avg_compliance'),
+        func.count(Round.id).label('rounds_count')
+    ).filter(
+        Round.status == "completed",
+        Round.compliance_percentage.isnot(None),
+        Round.created_at >= start_date
+    ).group_by(
+        extract('year', Round.created_at),
+        extract('month', Round.created_at)
+    ).order_by(
+        extract('year', Round.created_at),
+        extract('month', Round.created_at)
+    ).all()
+    
+    # Format data for frontend
+    trends_data = []
+    month_names = [
+        "يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو",
+        "يوليو", "أغسطس", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"
+    ]
+    
+    for data in monthly_data:
+        trends_data.append({
+            "month": month_names[int(data.month) - 1],
+            "compliance": round(float(data.avg_compliance), 2),
+            "rounds": int(data.rounds_count)
+        })
+    
+    return {"trends": trends_data}
+
 @app.get("/api/reports/department-performance", response_model=dict)
-async def get_department_performance(
+def get_department_performance(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get department performance statistics"""
     try:
-        # Get rounds by department with compliance data
-        dept_performance = db.query(
-            Round.department,
-            func.avg(Round.compliance_percentage).label('avg_compliance'),
-            func.count(Round.id).label('rounds_count'),
-            func.count(Capa.id).label('capas_count')
-        ).outerjoin(Capa, Round.id == Capa.round_id).filter(
-            Round.status == "completed",
-            Round.compliance_percentage.isnot(None)
-        ).group_by(Round.department).all()
-        
-        # Format data for frontend
-        performance_data = []
-        for dept in dept_performance:
-            performance_data.append({
-                "name": dept.department,
-                "compliance": round(float(dept.avg_compliance), 2),
-                "rounds": int(dept.rounds_count),
-                "capa": int(dept.capas_count)
-            })
-        
-        return {"departments": performance_data}
+        return response_cache.get_or_compute(
+            "reports.department_performance", lambda: _department_performance(db),
+            tags=("rounds", "capas", "departments"),
+        )
     except Exception as e:
-        print(f"Error getting department performance: {e}")
+        logger.error("Error getting department performance: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب أداء الأقسام: {str(e)}")
 
+def _department_performance(db: Session) -> dict:
+    # Get rounds by department with compliance data
+    dept_performance = db.query(
+        Round.department_id,
+        func.avg(Round.compliance_percentage).label('avg_compliance'),
+        func.count(Round.id).label('rounds_count'),
+        func.count(Capa.id).label('capas_count')
+    ).outerjoin(Capa, Round.id == Capa.round_id).filter(
+        Round.status == "completed",
+        Round.compliance_percentage.isnot(None)
+    ).group_by(Round.department_id).all()
+    department_names = dict(db.query(Department.id, Department.name).all())
+    
+    # Format data for frontend
+    performance_data = []
+    for dept in dept_performance:
+        performance_data.append({
+            "id": dept.department_id,
+            "name": department_names.get(dept.department_id, "غير محدد"),
+            "compliance": round(float(dept.avg_compliance), 2),
+            "rounds": int(dept.rounds_count),
+            "capa": int(dept.capas_count)
+        })
+    
+    return {"departments": performance_data}
+
 @app.get("/api/reports/rounds-by-type", response_model=dict)
-async def get_rounds_by_type(
+def get_rounds_by_type(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get rounds distribution by type"""
     try:
-        # Get rounds by type
-        rounds_by_type = db.query(
-            Round.round_type,
-            func.count(Round.id).label('count')
-        ).group_by(Round.round_type).all()
-        
-        # Map round types to Arabic names
-        type_mapping = {
-            "patient_safety": "سلامة المرضى",
-            "infection_control": "مكافحة العدوى",
-            "hygiene": "النظافة",
-            "medication_safety": "سلامة الأدوية",
-            "equipment_safety": "سلامة المعدات",
-            "environmental": "البيئة",
-            "general": "عام"
-        }
-        
-        # Define colors for each type
-        colors = {
-            "patient_safety": "#3b82f6",
-            "infection_control": "#ef4444",
-            "hygiene": "#10b981",
-            "medication_safety": "#f59e0b",
-            "equipment_safety": "#8b5cf6",
-            "environmental": "#06b6d4",
-            "general": "#6b7280"
-        }
-        
-        # Format data for frontend
-        type_data = []
-        for round_type, count in rounds_by_type:
-            type_data.append({
-                "name": type_mapping.get(round_type, round_type),
-                "value": int(count),
-                "color": colors.get(round_type, "#6b7280")
-            })
-        
-        return {"round_types": type_data}
+        return response_cache.get_or_compute(
+            "reports.rounds_by_type", lambda: _rounds_by_type(db),
+            tags=("rounds",),
+        )
     except Exception as e:
-        print(f"Error getting rounds by type: {e}")
+        logger.error("Error getting rounds by type: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب توزيع الجولات: {str(e)}")
 
+def _rounds_by_type(db: Session) -> dict:
+    # Get rounds by type
+    rounds_by_type = db.query(
+        Round.round_type,
+        func.count(Round.id).label('count')
+    ).group_by(Round.round_type).all()
+    
+    # Map round types to Arabic names
+    type_mapping = {
+        "patient_safety": "سلامة المرضى",
+        "infection_control": "مكافحة العدوى",
+        "hygiene": "النظافة",
+        "medication_safety": "سلامة الأدوية",
+        "equipment_safety": "سلامة المعدات",
+        "environmental": "البيئة",
+        "general": "عام"
+    }
+    
+    # Define colors for each type
+    colors = {
+        "patient_safety": "#3b82f6",
+        "infection_control": "#ef4444",
+        "hygiene": "#10b981",
+        "medication_safety": "#f59e0b",
+        "equipment_safety": "#8b5cf6",
+        "environmental": "#06b6d4",
+        "general": "#6b7280"
+    }
+    
+    # Format data for frontend
+    type_data = []
+    for round_type, count in rounds_by_type:
+        type_data.append({
+            "name": type_mapping.get(round_type, round_type),
+            "value": int(count),
+            "color": colors.get(round_type, "#6b7280")
+        })
+    
+    return {"round_types": type_data}
+
 @app.get("/api/reports/capa-status-distribution", response_model=dict)
-async def get_capa_status_distribution(
+def get_capa_status_distribution(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get CAPA status distribution"""
     try:
-        # Get CAPAs by status
-        capa_status = db.query(
-            Capa.status,
-            func.count(Capa.id).label('count')
-        ).group_by(Capa.status).all()
-        
-        # Map status to Arabic names and colors
-        status_mapping = {
-            "pending": "معلقة",
-            "assigned": "مخصصة",
-            "in_progress": "قيد التنفيذ",
-            "implemented": "منفذة",
-            "verification": "قيد التحقق",
-            "verified": "محققة",
-            "rejected": "مرفوضة",
-            "closed": "مغلقة"
-        }
-        
-        colors = {
-            "pending": "#f59e0b",
-            "assigned": "#3b82f6",
-            "in_progress": "#3b82f6",
-            "implemented": "#10b981",
-            "verification": "#8b5cf6",
-            "verified": "#10b981",
-            "rejected": "#ef4444",
-            "closed": "#6b7280"
-        }
-        
-        # Format data for frontend
-        status_data = []
-        for status, count in capa_status:
-            status_data.append({
-                "name": status_mapping.get(status, status),
-                "value": int(count),
-                "color": colors.get(status, "#6b7280")
-            })
-        
-        return {"capa_status": status_data}
+        return response_cache.get_or_compute(
+            "reports.capa_status_distribution", lambda: _capa_status_distribution(db),
+            tags=("capas",),
+        )
     except Exception as e:
-        print(f"Error getting CAPA status distribution: {e}")
+        logger.error("Error getting CAPA status distribution: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب توزيع الخطط التصحيحية: {str(e)}")
 
+def _capa_status_distribution(db: Session) -> dict:
+    # Get CAPAs by status
+    capa_status = db.query(
+        Capa.status,
+        func.count(Capa.id).label('count')
+    ).group_by(Capa.status).all()
+    
+    # Map status to Arabic names and colors
+    status_mapping = {
+        "pending": "معلقة",
+        "assigned": "مخصصة",
+        "in_progress": "قيد التنفيذ",
+        "implemented": "منفذة",
+        "verification": "قيد التحقق",
+        "verified": "محققة",
+        "rejected": "مرفوضة",
+        "closed": "مغلقة"
+    }
+    
+    colors = {
+        "pending": "#f59e0b",
+        "assigned": "#3b82f6",
+        "in_progress": "#3b82f6",
+        "implemented": "#10b981",
+        "verification": "#8b5cf6",
+        "verified": "#10b981",
+        "rejected": "#ef4444",
+        "closed": "#6b7280"
+    }
+    
+    # Format data for frontend
+    status_data = []
+    for status, count in capa_status:
+        status_data.append({
+            "name": status_mapping.get(status, status),
+            "value": int(count),
+            "color": colors.get(status, "#6b7280")
+        })
+    
+    return {"capa_status": status_data}
+
 @app.get("/api/reports/monthly-rounds", response_model=dict)
-async def get_monthly_rounds(
+def get_monthly_rounds(
     months: int = 6,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get monthly rounds statistics"""
     try:
-        from datetime import datetime, timedelta
-        from sqlalchemy import extract, case
-        
-        # Get data for the last N months
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=months * 30)
-        
-        # Get monthly rounds data
-        monthly_data = db.query(
-            extract('year', Round.created_at).label('year'),
-            extract('month', Round.created_at).label('month'),
-            func.count(Round.id).label('scheduled'),
-            func.sum(case((Round.status == "completed", 1), else_=0)).label('completed'),
-            func.sum(case((Round.status == "overdue", 1), else_=0)).label('overdue')
-        ).filter(
-            Round.created_at >= start_date
-        ).group_by(
-            extract('year', Round.created_at),
-            extract('month', Round.created_at)
-        ).order_by(
-            extract('year', Round.created_at),
-            extract('month', Round.created_at)
-        ).all()
-        
-        # Format data for frontend
-        month_names = [
-            "يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو",
-            "يوليو", "أغسطس", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"
-        ]
-        
-        monthly_rounds = []
-        for data in monthly_data:
-            monthly_rounds.append({
-                "month": month_names[int(data.month) - 1],
-                "scheduled": int(data.scheduled),
-                "completed": int(data.completed),
-                "overdue": int(data.overdue)
-            })
-        
-        return {"monthly_rounds": monthly_rounds}
+        return response_cache.get_or_compute(
+            "reports.monthly_rounds", lambda: _monthly_rounds(db, months),
+            tags=("rounds",), params={"months": months},
+        )
     except Exception as e:
-        print(f"Error getting monthly rounds: {e}")
+        logger.error("Error getting monthly rounds: %s", e)
         raise HTTPException(status_code=500, detail=f"خطأ في جلب الجولات الشهرية: {str(e)}")
 
+def _monthly_rounds(db: Session, months: int) -> dict:
+    from datetime import datetime, timedelta
+    from sqlalchemy import extract, case
+    
+    # Get data for the last N months
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=months * 30)
+    
+    # Get monthly rounds data
+    monthly_data = db.query(
+        extract('year', Round.created_at).label('year'),
+        extract('month', Round.created_at).label('month'),
+        func.count(Round.id).label('scheduled'),
+        func.sum(case((Round.status == "completed", 1), else_=0)).label('completed'),
+        func.sum(case((Round.status == "overdue", 1), else_=0)).label('overdue')
+    ).filter(
+        Round.created_at >= start_date
+    ).group_by(
+        extract('year', Round.created_at),
+        extract('month', Round.created_at)
+    ).order_by(
+        extract('year', Round.created_at),
+        extract('month', Round.created_at)
+    ).all()
+    
+    # Format data for frontend
+    month_names = [
+        "يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو",
+        "يوليو", "أغسطس", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"
+    ]
+    
+    monthly_rounds = []
+    for data in monthly_data:
+        monthly_rounds.append({
+            "month": month_names[int(data.month) - 1],
+            "scheduled": int(data.scheduled),
+            "completed": int(data.completed),
+            "overdue": int(data.overdue)
+        })
+    
+    return {"monthly_rounds": monthly_rounds}
 
 
 
-# Optional advanced APIs - import/register if available, otherwise skip (makes tests more robust)
-try:
-    from api_enhanced_dashboard import router as dashboard_router
-    app.include_router(dashboard_router, prefix="/api", tags=["dashboard"])
-except Exception as _e:
-    print(f"[WARN] Enhanced dashboard router not loaded: {_e}")
-
-try:
-    from api_capa_actions import router as capa_actions_router
-    app.include_router(capa_actions_router, tags=["capa-actions"])
-except Exception as _e:
-    print(f"[WARN] CAPA actions router not loaded: {_e}")
-
-try:
-    from api_analytics import router as analytics_router
-    app.include_router(analytics_router, prefix="/api", tags=["analytics"])
-except Exception as _e:
-    print(f"[WARN] Analytics router not loaded: {_e}")
-
-try:
-    from api_notifications import router as notifications_router
-    app.include_router(notifications_router, prefix="/api", tags=["notifications"])
-except Exception as _e:
-    print(f"[WARN] Notifications router not loaded: {_e}")
-
-# Include CAPA router if available (primary router path is /api/capas)
-try:
-    from capa_router import router as capas_router
-    app.include_router(capas_router)
-except Exception as _e:
-    print(f"[WARN] CAPA router not loaded: {_e}")
 
 # Compatibility wrappers for older client paths (/api/capa/...)
 @app.post("/api/capa/", response_model=dict)
@@ -3387,13 +3674,6 @@ async def create_capa_compat(capa: CapaCreate, current_user: User = Depends(get_
         # Reuse the CRUD implementation to avoid duplicating business logic
         capa_data = capa.dict()
         db_capa = create_capa(db, capa_data, current_user.id)
-        create_audit_log(db, {
-            "user_id": current_user.id,
-            "action": "create_capa",
-            "entity_type": "capa",
-            "entity_id": db_capa.id,
-            "new_values": json.dumps({"title": db_capa.title, "department": db_capa.department}, ensure_ascii=False)
-        })
 
         # Send notifications (best-effort)
         try:
@@ -3419,13 +3699,13 @@ async def create_capa_compat(capa: CapaCreate, current_user: User = Depends(get_
                 created_by_name=creator_name
             )
         except Exception as _ne:
-            print(f"[WARN] failed to send notifications for compat create: {_ne}")
+            logger.warning("failed to send notifications for compat create: %s", _ne)
 
         return {"status": "success", "capa_id": db_capa.id, "capa": {
             "id": db_capa.id, "title": db_capa.title, "department": db_capa.department
         }}
     except Exception as e:
-        print(f"Error in create_capa_compat: {e}")
+        logger.error("Error in create_capa_compat: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/capa/all", response_model=dict)
@@ -3437,7 +3717,7 @@ async def get_all_capa_compat(skip: int = 0, limit: int = 100, db: Session = Dep
         serialized = [{"id": c.id, "title": c.title, "status": c.status, "department": c.department} for c in capas]
         return {"status": "success", "data": serialized, "total": len(serialized)}
     except Exception as e:
-        print(f"Error in get_all_capa_compat: {e}")
+        logger.error("Error in get_all_capa_compat: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 from fastapi.staticfiles import StaticFiles
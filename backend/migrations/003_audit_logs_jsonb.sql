@@ -0,0 +1,41 @@
+-- Migration: store audit_logs old/new values as JSONB and index entity lookups
+-- Purpose: audit entries are now written in the caller's transaction as JSON
+--          values; get_audit_logs_by_entity filters on (entity_type, entity_id)
+--          and sorts by created_at DESC.
+
+BEGIN;
+
+-- Convert TEXT columns to JSONB. Values that are not valid JSON are kept as
+-- JSON strings instead of failing the migration.
+CREATE OR REPLACE FUNCTION pg_temp.audit_text_to_jsonb(value TEXT)
+RETURNS JSONB AS $$
+BEGIN
+    IF value IS NULL OR value = '' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN to_jsonb(value);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'audit_logs' AND column_name = 'old_values' AND data_type <> 'jsonb'
+    ) THEN
+        ALTER TABLE audit_logs
+            ALTER COLUMN old_values TYPE JSONB USING pg_temp.audit_text_to_jsonb(old_values),
+            ALTER COLUMN new_values TYPE JSONB USING pg_temp.audit_text_to_jsonb(new_values);
+    END IF;
+END$$;
+
+CREATE INDEX IF NOT EXISTS ix_audit_logs_entity_created
+    ON audit_logs (entity_type, entity_id, created_at);
+
+COMMIT;
+
+-- Notes:
+--  - Safe to re-run: the type change only happens while the columns are TEXT.
+--  - Rollback: ALTER TABLE audit_logs ALTER COLUMN old_values TYPE TEXT USING old_values::text, ...
@@ -0,0 +1,80 @@
+-- Migration: per-user unread notification counters
+-- Purpose: /api/notifications/unread-count is polled by every open client.
+--          Instead of COUNT(*) over the user's notifications on each poll, keep
+--          one counter row per user, maintained by statement-level triggers on
+--          notifications, so the poll is a primary-key lookup.
+--
+-- Safe to re-run. Re-run it after migration_003_partition_logs.py if the
+-- partitioning migration is applied later (the triggers live on the table).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS user_notification_counters (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One function for all three triggers; each trigger only exposes the
+-- transition tables that exist for its event.
+CREATE OR REPLACE FUNCTION notifications_unread_counter()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_notification_counters (user_id, unread_count, updated_at)
+        SELECT user_id, count(*), now() FROM new_rows WHERE status = 'unread' GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_count = user_notification_counters.unread_count + EXCLUDED.unread_count,
+                updated_at = now();
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO user_notification_counters (user_id, unread_count, updated_at)
+        SELECT user_id, sum(delta), now() FROM (
+            SELECT user_id, 1 AS delta FROM new_rows WHERE status = 'unread'
+            UNION ALL
+            SELECT user_id, -1 AS delta FROM old_rows WHERE status = 'unread'
+        ) changes
+        GROUP BY user_id
+        HAVING sum(delta) <> 0
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_count = GREATEST(0, user_notification_counters.unread_count + EXCLUDED.unread_count),
+                updated_at = now();
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE user_notification_counters c
+        SET unread_count = GREATEST(0, c.unread_count - d.removed), updated_at = now()
+        FROM (SELECT user_id, count(*) AS removed FROM old_rows WHERE status = 'unread' GROUP BY user_id) d
+        WHERE c.user_id = d.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifications_unread_counter_insert ON notifications;
+CREATE TRIGGER trg_notifications_unread_counter_insert
+AFTER INSERT ON notifications
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_counter();
+
+DROP TRIGGER IF EXISTS trg_notifications_unread_counter_update ON notifications;
+CREATE TRIGGER trg_notifications_unread_counter_update
+AFTER UPDATE ON notifications
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_counter();
+
+DROP TRIGGER IF EXISTS trg_notifications_unread_counter_delete ON notifications;
+CREATE TRIGGER trg_notifications_unread_counter_delete
+AFTER DELETE ON notifications
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notifications_unread_counter();
+
+-- Backfill / resync from the current data. Lock out writers while recounting
+-- so no trigger update is lost between the count and the upsert.
+LOCK TABLE notifications IN SHARE MODE;
+
+UPDATE user_notification_counters SET unread_count = 0, updated_at = now();
+
+INSERT INTO user_notification_counters (user_id, unread_count, updated_at)
+SELECT user_id, count(*), now() FROM notifications WHERE status = 'unread' GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE
+    SET unread_count = EXCLUDED.unread_count, updated_at = now();
+
+COMMIT;
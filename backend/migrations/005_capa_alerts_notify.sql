@@ -0,0 +1,40 @@
+-- Migration: push new CAPA alerts to connected clients
+-- Purpose: capa_alerts rows are written by SQL functions and scripts as well
+--          as the app. A trigger sends each new alert through pg_notify on
+--          the salamaty_events channel, in the same envelope the app uses
+--          (see realtime.py), so every web worker pushes it to the open
+--          event streams instead of clients polling /api/alerts/.
+--
+-- NOTIFY is transactional: the event is only sent once the insert commits.
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION capa_alerts_notify()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('salamaty_events', json_build_object(
+        'event', 'alert',
+        'user_id', NEW.user_id,
+        'data', json_build_object(
+            'id', NEW.id,
+            'type', NEW.alert_type,
+            'title', left(NEW.title, 200),
+            'priority', NEW.priority,
+            'capa_id', NEW.capa_id,
+            'action_id', NEW.action_id,
+            'action_required', NEW.action_required,
+            'due_date', NEW.due_date,
+            'created_at', NEW.created_at
+        )
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_capa_alerts_notify ON capa_alerts;
+CREATE TRIGGER trg_capa_alerts_notify
+    AFTER INSERT ON capa_alerts
+    FOR EACH ROW EXECUTE FUNCTION capa_alerts_notify();
+
+COMMIT;
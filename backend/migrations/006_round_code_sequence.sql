@@ -0,0 +1,9 @@
+-- Migration: sequence for generated round codes
+-- Purpose: round codes used to be random RND-XXXXXXXX values checked for
+--          collisions with one SELECT per attempt. crud.next_round_code now
+--          takes the next value of round_code_seq and formats it as
+--          RND-<year>-<number>, which cannot collide with the old codes.
+--
+-- Safe to re-run.
+
+CREATE SEQUENCE IF NOT EXISTS round_code_seq START WITH 1;
@@ -0,0 +1,94 @@
+-- Migration: indexes for the hot query shapes
+-- Purpose: the round list, the reports endpoints, the CAPA dashboards and the
+--          notification inbox filtered and sorted on columns that only had
+--          primary-key/unique indexes, so every call was a sequential scan.
+--          Each index below names the queries it serves; check them against a
+--          seeded database with scripts/benchmark/explain_advisor.py.
+--
+-- Safe to re-run. No BEGIN/COMMIT: CREATE INDEX CONCURRENTLY cannot run inside
+-- a transaction block, and it keeps the tables writable while it builds.
+
+-- rounds -------------------------------------------------------------------
+-- /api/rounds: ORDER BY created_at DESC LIMIT/OFFSET; monthly-rounds report
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rounds_created_at
+    ON rounds (created_at DESC);
+
+-- compliance-trends: status = COMPLETED AND created_at >= :start; status counts.
+-- rounds.status is a native enum storing member names, so no partial index on
+-- a status literal here.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rounds_status_created_at
+    ON rounds (status, created_at);
+
+-- department-performance / department filters: department [, status]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rounds_department_status
+    ON rounds (department, status);
+
+-- get_rounds_by_user: assigned_to_ids @> '[<id>]' (also created by 001)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_rounds_assigned_to_ids
+    ON rounds USING GIN (assigned_to_ids);
+
+-- capas --------------------------------------------------------------------
+-- Dashboard/alert overdue and upcoming lists:
+--   target_date < today AND status NOT IN ('completed', 'closed')
+--   target_date BETWEEN today AND :future AND status NOT IN ('completed', 'closed')
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_open_target_date
+    ON capas (target_date)
+    WHERE status NOT IN ('completed', 'closed');
+
+-- Status counts and status-filtered lists
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_status
+    ON capas (status);
+
+-- Basic/department reports: department [AND created_at BETWEEN ...]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_department_created_at
+    ON capas (department, created_at);
+
+-- Reports over a date range without a department, timeline events
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_created_at
+    ON capas (created_at);
+
+-- Round detail / department-performance join on round_id, CAPA lookup per
+-- evaluation item when a round is finalized
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_round_item
+    ON capas (round_id, evaluation_item_id);
+
+-- evaluation_results ------------------------------------------------------
+-- Results of a round (read, re-evaluation delete, per-item lookup)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_evaluation_results_round_item
+    ON evaluation_results (round_id, item_id);
+
+-- capa_actions ------------------------------------------------------------
+-- /api/dashboard/overdue/ and /upcoming/, crud_capa_actions overdue/upcoming:
+--   due_date < NOW() AND status NOT IN ('completed', 'cancelled') ORDER BY due_date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capa_actions_open_due_date
+    ON capa_actions (due_date)
+    WHERE status NOT IN ('completed', 'cancelled');
+
+-- Actions of an assignee ordered by due date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capa_actions_assignee_due_date
+    ON capa_actions (assigned_to_id, due_date);
+
+-- notifications -----------------------------------------------------------
+-- Inbox: user_id [AND status] ORDER BY created_at DESC LIMIT n.
+-- Once migration_003_partition_logs.py has run the table is partitioned and
+-- carries the *_p versions of these indexes (PARTITION_INDEXES), and
+-- CONCURRENTLY is not supported on a partitioned parent, so only build them
+-- on a plain table.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE relname = 'notifications' AND relkind = 'r') THEN
+        CREATE INDEX IF NOT EXISTS ix_notifications_user_status_created
+            ON notifications (user_id, status, created_at);
+        CREATE INDEX IF NOT EXISTS ix_notifications_user_created
+            ON notifications (user_id, created_at DESC);
+        -- Leading column of both indexes above
+        DROP INDEX IF EXISTS idx_notifications_user_id;
+    END IF;
+END$$;
+
+-- Notes:
+--  - A CONCURRENTLY build that fails leaves an INVALID index behind, which
+--    IF NOT EXISTS then skips. Find them with
+--      SELECT indexrelid::regclass FROM pg_index WHERE NOT indisvalid;
+--    drop them and re-run this file.
+--  - Run after add_capa_dashboard_tables.sql, which recreates capa_actions.
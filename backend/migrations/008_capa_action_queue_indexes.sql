@@ -0,0 +1,23 @@
+-- Migration: keyset indexes for the CAPA action queues
+-- Purpose: /api/capa-actions/overdue/list, /upcoming/list and /my-actions page
+--          through open actions in (due_date, id) order with
+--          WHERE (due_date, id) > (:due, :id) ... LIMIT n. With id as the last
+--          key column every page is a single index range scan, however deep
+--          into the backlog it starts.
+--
+-- Safe to re-run. No BEGIN/COMMIT: CREATE INDEX CONCURRENTLY cannot run inside
+-- a transaction block.
+
+-- Overdue / upcoming queues (also the /api/dashboard overdue and upcoming
+-- lists, which order by due_date alone)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capa_actions_open_due_id
+    ON capa_actions (due_date, id)
+    WHERE status NOT IN ('completed', 'cancelled');
+
+-- An assignee's open queue ("my actions")
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capa_actions_open_assignee_due_id
+    ON capa_actions (assigned_to_id, due_date, id)
+    WHERE status NOT IN ('completed', 'cancelled');
+
+-- Superseded by ix_capa_actions_open_due_id
+DROP INDEX CONCURRENTLY IF EXISTS ix_capa_actions_open_due_date;
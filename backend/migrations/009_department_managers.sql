@@ -0,0 +1,43 @@
+-- Migration: normalized department managers
+-- Purpose: departments.managers is a JSON text array of user ids, looked up by
+--          department name and parsed on every escalation and CAPA
+--          notification. department_managers holds the same pairs as rows;
+--          the backend reads it (through department_directory) and crud keeps
+--          it in sync with departments.managers on create/update.
+--
+-- Safe to re-run: the backfill only adds missing pairs, and rows whose
+-- managers text is not a JSON array are skipped with a notice.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS department_managers (
+    department_id INTEGER NOT NULL REFERENCES departments (id) ON DELETE CASCADE,
+    user_id       INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    PRIMARY KEY (department_id, user_id)
+);
+
+-- "which departments does this user manage"; the primary key serves the other direction
+CREATE INDEX IF NOT EXISTS ix_department_managers_user_id
+    ON department_managers (user_id);
+
+DO $$
+DECLARE
+    dept RECORD;
+BEGIN
+    FOR dept IN
+        SELECT id, managers FROM departments
+        WHERE managers IS NOT NULL AND btrim(managers) NOT IN ('', 'null', '[]')
+    LOOP
+        BEGIN
+            INSERT INTO department_managers (department_id, user_id)
+            SELECT dept.id, u.id
+            FROM jsonb_array_elements_text(dept.managers::jsonb) AS m(value)
+            JOIN users u ON m.value ~ '^\s*\d+\s*$' AND u.id = btrim(m.value)::integer
+            ON CONFLICT DO NOTHING;
+        EXCEPTION WHEN others THEN
+            RAISE NOTICE 'department %: managers is not a JSON array of ids, skipped (%)', dept.id, SQLERRM;
+        END;
+    END LOOP;
+END $$;
+
+COMMIT;
@@ -0,0 +1,67 @@
+-- Migration: integer department references on rounds and CAPAs
+-- Purpose: rounds.department and capas.department hold the department name,
+--          so department filters and reports compared strings across the
+--          whole table (and the analytics filtered on a capas.department_id
+--          column that did not exist). Both tables get an indexed
+--          department_id, backfilled from the names; the name stays as the
+--          display copy.
+--
+-- The app sets department_id on the rows it writes. The BEFORE trigger fills
+-- it in for everything else (seed scripts, raw SQL) and follows a changed
+-- name. Names with no matching department are left NULL.
+--
+-- Safe to re-run. Not wrapped in BEGIN/COMMIT: CREATE INDEX CONCURRENTLY
+-- cannot run inside a transaction block.
+
+ALTER TABLE rounds ADD COLUMN IF NOT EXISTS department_id INTEGER
+    REFERENCES departments (id) ON DELETE SET NULL;
+ALTER TABLE capas ADD COLUMN IF NOT EXISTS department_id INTEGER
+    REFERENCES departments (id) ON DELETE SET NULL;
+
+-- Department names are not unique; the oldest department keeps the name
+CREATE OR REPLACE FUNCTION department_id_for(department_name TEXT)
+RETURNS INTEGER AS $$
+    SELECT id FROM departments WHERE name = department_name ORDER BY id LIMIT 1;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION sync_department_id()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.department_id IS NULL
+       OR (TG_OP = 'UPDATE' AND NEW.department IS DISTINCT FROM OLD.department
+           AND NEW.department_id IS NOT DISTINCT FROM OLD.department_id) THEN
+        NEW.department_id := department_id_for(NEW.department);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rounds_department_id ON rounds;
+CREATE TRIGGER trg_rounds_department_id
+    BEFORE INSERT OR UPDATE OF department, department_id ON rounds
+    FOR EACH ROW EXECUTE FUNCTION sync_department_id();
+
+DROP TRIGGER IF EXISTS trg_capas_department_id ON capas;
+CREATE TRIGGER trg_capas_department_id
+    BEFORE INSERT OR UPDATE OF department, department_id ON capas
+    FOR EACH ROW EXECUTE FUNCTION sync_department_id();
+
+-- Backfill: one pass per table, departments resolved once by a join
+UPDATE rounds r SET department_id = d.id
+FROM (SELECT DISTINCT ON (name) id, name FROM departments ORDER BY name, id) d
+WHERE r.department_id IS NULL AND r.department = d.name;
+
+UPDATE capas c SET department_id = d.id
+FROM (SELECT DISTINCT ON (name) id, name FROM departments ORDER BY name, id) d
+WHERE c.department_id IS NULL AND c.department = d.name;
+
+-- Department filters and reports: department_id [, status | created_at]
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_rounds_department_id_status
+    ON rounds (department_id, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_capas_department_id_created_at
+    ON capas (department_id, created_at);
+
+-- Superseded by the two indexes above
+DROP INDEX CONCURRENTLY IF EXISTS ix_rounds_department_status;
+DROP INDEX CONCURRENTLY IF EXISTS ix_capas_department_created_at;
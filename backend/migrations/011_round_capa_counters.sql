@@ -0,0 +1,174 @@
+-- Migration: per-round CAPA summary counters
+-- Purpose: the round list shows CAPA badges for every visible round. Instead
+--          of recounting evaluation_results and capas per round on each
+--          request, keep one counter row per round, maintained in the writing
+--          transaction by statement-level triggers, so a page of rounds reads
+--          its badges with one primary-key lookup (crud.get_round_capa_summaries).
+--
+-- Counters (only the latest result per item counts, as in
+-- crud.create_capas_for_round_non_compliance):
+--   evaluated_items      items with a result
+--   non_compliant_items  latest score below 70
+--   needs_capa_items     latest result flagged needs_capa
+--   capas_needed         non-compliant or flagged items without a CAPA yet
+--   open_capas / closed_capas  CAPAs of the round; closed = verified, completed, closed
+--
+-- A trigger recounts the rounds its statement touched (a round has at most a
+-- few hundred items), after locking their counter rows in round id order, so
+-- concurrent writers to one round serialize instead of losing updates.
+--
+-- Safe to re-run. Re-running recounts every round.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS round_capa_counters (
+    round_id            INTEGER PRIMARY KEY REFERENCES rounds (id) ON DELETE CASCADE,
+    evaluated_items     INTEGER NOT NULL DEFAULT 0,
+    non_compliant_items INTEGER NOT NULL DEFAULT 0,
+    needs_capa_items    INTEGER NOT NULL DEFAULT 0,
+    capas_needed        INTEGER NOT NULL DEFAULT 0,
+    open_capas          INTEGER NOT NULL DEFAULT 0,
+    closed_capas        INTEGER NOT NULL DEFAULT 0,
+    updated_at          TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION recount_round_capa_counters(round_ids INTEGER[])
+RETURNS VOID AS $$
+DECLARE
+    rid INTEGER;
+BEGIN
+    INSERT INTO round_capa_counters (round_id)
+    SELECT id FROM rounds WHERE id = ANY(round_ids)
+    ON CONFLICT (round_id) DO NOTHING;
+
+    FOR rid IN
+        SELECT round_id FROM round_capa_counters WHERE round_id = ANY(round_ids)
+        ORDER BY round_id FOR UPDATE
+    LOOP
+        -- A new statement: sees whatever other writers committed before the lock was granted
+        UPDATE round_capa_counters c SET
+            evaluated_items = r.evaluated_items,
+            non_compliant_items = r.non_compliant_items,
+            needs_capa_items = r.needs_capa_items,
+            capas_needed = r.capas_needed,
+            open_capas = k.open_capas,
+            closed_capas = k.closed_capas,
+            updated_at = now()
+        FROM (
+            SELECT
+                count(*) AS evaluated_items,
+                count(*) FILTER (WHERE latest.score < 70) AS non_compliant_items,
+                count(*) FILTER (WHERE latest.needs_capa) AS needs_capa_items,
+                count(*) FILTER (WHERE (latest.score < 70 OR latest.needs_capa) AND NOT EXISTS (
+                    SELECT 1 FROM capas WHERE capas.round_id = rid AND capas.evaluation_item_id = latest.item_id
+                )) AS capas_needed
+            FROM (
+                SELECT DISTINCT ON (item_id) item_id, score, coalesce(needs_capa, false) AS needs_capa
+                FROM evaluation_results WHERE round_id = rid
+                ORDER BY item_id, id DESC
+            ) latest
+        ) r, (
+            SELECT
+                count(*) FILTER (WHERE lower(status) NOT IN ('verified', 'completed', 'closed')) AS open_capas,
+                count(*) FILTER (WHERE lower(status) IN ('verified', 'completed', 'closed')) AS closed_capas
+            FROM capas WHERE round_id = rid
+        ) k
+        WHERE c.round_id = rid;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rounds touched by a statement on evaluation_results or capas. Updates only
+-- count when a column the counters read changed (escalations, edits of text
+-- fields and the like cost nothing).
+CREATE OR REPLACE FUNCTION round_capa_counters_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    touched INTEGER[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        touched := ARRAY(SELECT DISTINCT round_id FROM new_rows WHERE round_id IS NOT NULL);
+    ELSIF TG_OP = 'DELETE' THEN
+        touched := ARRAY(SELECT DISTINCT round_id FROM old_rows WHERE round_id IS NOT NULL);
+    ELSIF TG_TABLE_NAME = 'evaluation_results' THEN
+        touched := ARRAY(
+            SELECT DISTINCT unnest(ARRAY[n.round_id, o.round_id])
+            FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.round_id, n.item_id, n.score, n.needs_capa)
+                  IS DISTINCT FROM (o.round_id, o.item_id, o.score, o.needs_capa)
+        );
+    ELSE
+        touched := ARRAY(
+            SELECT DISTINCT unnest(ARRAY[n.round_id, o.round_id])
+            FROM new_rows n JOIN old_rows o ON o.id = n.id
+            WHERE (n.round_id, n.evaluation_item_id, lower(n.status))
+                  IS DISTINCT FROM (o.round_id, o.evaluation_item_id, lower(o.status))
+        );
+    END IF;
+    IF cardinality(touched) > 0 THEN
+        PERFORM recount_round_capa_counters(touched);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_evaluation_results_round_counters_insert ON evaluation_results;
+CREATE TRIGGER trg_evaluation_results_round_counters_insert
+AFTER INSERT ON evaluation_results
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+DROP TRIGGER IF EXISTS trg_evaluation_results_round_counters_update ON evaluation_results;
+CREATE TRIGGER trg_evaluation_results_round_counters_update
+AFTER UPDATE ON evaluation_results
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+DROP TRIGGER IF EXISTS trg_evaluation_results_round_counters_delete ON evaluation_results;
+CREATE TRIGGER trg_evaluation_results_round_counters_delete
+AFTER DELETE ON evaluation_results
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+DROP TRIGGER IF EXISTS trg_capas_round_counters_insert ON capas;
+CREATE TRIGGER trg_capas_round_counters_insert
+AFTER INSERT ON capas
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+DROP TRIGGER IF EXISTS trg_capas_round_counters_update ON capas;
+CREATE TRIGGER trg_capas_round_counters_update
+AFTER UPDATE ON capas
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+DROP TRIGGER IF EXISTS trg_capas_round_counters_delete ON capas;
+CREATE TRIGGER trg_capas_round_counters_delete
+AFTER DELETE ON capas
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_changed();
+
+-- New rounds start with a zero row, so a missing row means "not counted here"
+CREATE OR REPLACE FUNCTION round_capa_counters_init()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO round_capa_counters (round_id)
+    SELECT id FROM new_rows
+    ON CONFLICT (round_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_rounds_capa_counters_init ON rounds;
+CREATE TRIGGER trg_rounds_capa_counters_init
+AFTER INSERT ON rounds
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION round_capa_counters_init();
+
+-- Backfill / resync. Lock out writers while recounting so no trigger update
+-- is lost between the count and the write.
+LOCK TABLE evaluation_results, capas IN SHARE MODE;
+
+SELECT recount_round_capa_counters(ARRAY(SELECT id FROM rounds));
+
+COMMIT;
@@ -0,0 +1,42 @@
+-- Migration: evidence store
+-- Purpose: evaluation results carried their photos inline (data URIs in the
+--          evidence_files text column). Evidence is now uploaded in chunks,
+--          stored once per content on disk (evidence_store.py) and referenced
+--          from results by id in evaluation_results.evidence_ids.
+--
+-- evidence_files    one row per stored content (unique sha256)
+-- evidence_uploads  chunked uploads in progress
+--
+-- Safe to re-run. Inline evidence already in evaluation_results is moved by
+-- migration_005_inline_evidence.py.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS evidence_files (
+    id                SERIAL PRIMARY KEY,
+    sha256            VARCHAR(64) NOT NULL UNIQUE,
+    content_type      VARCHAR NOT NULL,
+    size_bytes        BIGINT NOT NULL,
+    width             INTEGER,
+    height            INTEGER,
+    original_filename VARCHAR,
+    uploaded_by_id    INTEGER REFERENCES users (id) ON DELETE SET NULL,
+    created_at        TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS evidence_uploads (
+    id             VARCHAR(32) PRIMARY KEY,
+    filename       VARCHAR,
+    content_type   VARCHAR NOT NULL,
+    total_size     BIGINT NOT NULL,
+    uploaded_by_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    created_at     TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Expiry of a user's unfinished uploads (evidence_store.purge_expired_uploads)
+CREATE INDEX IF NOT EXISTS ix_evidence_uploads_user_created
+    ON evidence_uploads (uploaded_by_id, created_at);
+
+ALTER TABLE evaluation_results ADD COLUMN IF NOT EXISTS evidence_ids JSONB;
+
+COMMIT;
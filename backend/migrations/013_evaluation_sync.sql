@@ -0,0 +1,21 @@
+-- Migration: offline evaluation sync
+-- Purpose: tablets send item-level changes to /api/rounds/{id}/evaluations/sync
+--          (evaluation_sync.py) instead of whole evaluation payloads. Each
+--          applied change is an evaluation_results row that remembers the
+--          device, the client's change id (for idempotent retries) and the
+--          device's sequence number (to drop out-of-order retries). status
+--          keeps the submitted status, so 'na' items can be told apart from
+--          'not_applied' when the round is rescored from stored results.
+--
+-- Safe to re-run. Not wrapped in BEGIN/COMMIT: CREATE INDEX CONCURRENTLY
+-- cannot run inside a transaction block.
+
+ALTER TABLE evaluation_results ADD COLUMN IF NOT EXISTS status VARCHAR;
+ALTER TABLE evaluation_results ADD COLUMN IF NOT EXISTS client_id VARCHAR(64);
+ALTER TABLE evaluation_results ADD COLUMN IF NOT EXISTS client_change_id VARCHAR(64);
+ALTER TABLE evaluation_results ADD COLUMN IF NOT EXISTS client_seq BIGINT;
+
+-- A retried change is recognised by its id
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_evaluation_results_client_change
+    ON evaluation_results (client_change_id)
+    WHERE client_change_id IS NOT NULL;
@@ -0,0 +1,44 @@
+-- Migration: scheduled jobs
+-- Purpose: periodic work (CAPA escalation, deadline reminders, partition
+--          maintenance) runs inside the API workers (job_scheduler.py)
+--          instead of crontab entries and per-process threads.
+--
+-- scheduled_jobs  next run and last outcome per job; a worker claims a run
+--                 by moving next_run_at forward, so one worker runs it
+-- job_runs        run history (pruned after JOB_RUN_RETENTION_DAYS)
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS scheduled_jobs (
+    name             VARCHAR(64) PRIMARY KEY,
+    next_run_at      TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_started_at  TIMESTAMP WITH TIME ZONE,
+    last_finished_at TIMESTAMP WITH TIME ZONE,
+    last_status      VARCHAR(16),
+    last_error       TEXT,
+    last_duration_ms INTEGER,
+    last_worker      VARCHAR(128),
+    run_count        INTEGER NOT NULL DEFAULT 0,
+    failure_count    INTEGER NOT NULL DEFAULT 0,
+    updated_at       TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS job_runs (
+    id          SERIAL PRIMARY KEY,
+    job_name    VARCHAR(64) NOT NULL,
+    source      VARCHAR(16) NOT NULL,
+    worker      VARCHAR(128),
+    started_at  TIMESTAMP WITH TIME ZONE NOT NULL,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    status      VARCHAR(16) NOT NULL,
+    duration_ms INTEGER,
+    result      JSONB,
+    error       TEXT
+);
+
+-- Latest runs of a job (/api/health/jobs)
+CREATE INDEX IF NOT EXISTS ix_job_runs_job_started ON job_runs (job_name, started_at DESC);
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Migration: evidence_ids lookup
+-- Purpose: evidence downloads check that the user can see a round whose
+--          evaluation results reference the file (api_evidence.py), with
+--          evidence_ids @> '[id]'.
+--
+-- Safe to re-run. Not wrapped in BEGIN/COMMIT: CREATE INDEX CONCURRENTLY
+-- cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_evaluation_results_evidence_ids
+    ON evaluation_results USING GIN (evidence_ids jsonb_path_ops);
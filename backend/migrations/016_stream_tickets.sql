@@ -0,0 +1,21 @@
+-- Migration: event stream tickets
+-- Purpose: EventSource cannot send an Authorization header. Instead of the
+--          JWT in the stream URL (where access logs keep it), clients get a
+--          single-use ticket from POST /api/events/ticket that expires after
+--          STREAM_TICKET_SECONDS (realtime.py). Only a hash is stored; a
+--          ticket is deleted when it is redeemed, expired ones when new
+--          tickets are issued.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS stream_tickets (
+    ticket_hash VARCHAR(64) PRIMARY KEY,
+    user_id     INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    expires_at  TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_stream_tickets_expires_at ON stream_tickets (expires_at);
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Migration: evidence grants
+-- Purpose: evidence_files stores identical content once, under its first
+--          uploader. Every user who uploads the content now gets a row here,
+--          so they can download their upload and attach it to evaluations
+--          (evidence_store.usable_evidence_ids); ids uploaded by someone else
+--          are no longer accepted.
+--
+-- Safe to re-run.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS evidence_grants (
+    evidence_id INTEGER NOT NULL REFERENCES evidence_files (id) ON DELETE CASCADE,
+    user_id     INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    created_at  TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (evidence_id, user_id)
+);
+
+-- Uploads made before this migration belong to their recorded uploader
+INSERT INTO evidence_grants (evidence_id, user_id)
+SELECT id, uploaded_by_id FROM evidence_files WHERE uploaded_by_id IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+COMMIT;
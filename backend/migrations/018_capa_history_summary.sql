@@ -0,0 +1,79 @@
+-- Migration: CAPA status history summary
+-- Purpose: the CAPA performance report (forecasting.performance_summary)
+--          parsed every status_history of the period on each request. The two
+--          figures it needs are now kept on the row when its history is
+--          written, and the report only aggregates columns:
+--
+--   first_response_at  earliest valid entry timestamp (the first status change)
+--   reopen_count       entries going from a done status (implemented,
+--                      verification, verified, completed, closed) back to
+--                      pending, assigned, in_progress or rejected
+--
+-- status_history is free text; a history that is not a JSON array, entries
+-- that are not objects and timestamps that do not parse are skipped, so a bad
+-- history never fails the write. Timestamps without an offset are read in the
+-- session time zone.
+--
+-- Safe to re-run. Re-running recomputes every CAPA.
+
+BEGIN;
+
+ALTER TABLE capas ADD COLUMN IF NOT EXISTS first_response_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE capas ADD COLUMN IF NOT EXISTS reopen_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION capa_history_summary(history TEXT, OUT first_change TIMESTAMP WITH TIME ZONE, OUT reopens INTEGER)
+AS $$
+DECLARE
+    parsed JSONB;
+    entry JSONB;
+    changed TIMESTAMP WITH TIME ZONE;
+BEGIN
+    reopens := 0;
+    BEGIN
+        parsed := history::jsonb;
+    EXCEPTION WHEN others THEN
+        RETURN;
+    END;
+    IF parsed IS NULL OR jsonb_typeof(parsed) <> 'array' THEN
+        RETURN;
+    END IF;
+    FOR entry IN SELECT value FROM jsonb_array_elements(parsed) LOOP
+        CONTINUE WHEN jsonb_typeof(entry) <> 'object';
+        changed := NULL;
+        IF jsonb_typeof(entry -> 'timestamp') = 'string' THEN
+            BEGIN
+                changed := (entry ->> 'timestamp')::timestamptz;
+            EXCEPTION WHEN others THEN
+                changed := NULL;
+            END;
+        END IF;
+        IF changed IS NOT NULL AND (first_change IS NULL OR changed < first_change) THEN
+            first_change := changed;
+        END IF;
+        IF lower(entry ->> 'from_status') IN ('implemented', 'verification', 'verified', 'completed', 'closed')
+           AND lower(entry ->> 'to_status') IN ('pending', 'assigned', 'in_progress', 'rejected') THEN
+            reopens := reopens + 1;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION capas_history_summary_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT s.first_change, s.reopens INTO NEW.first_response_at, NEW.reopen_count
+    FROM capa_history_summary(NEW.status_history) s;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_capas_history_summary ON capas;
+CREATE TRIGGER trg_capas_history_summary
+BEFORE INSERT OR UPDATE OF status_history ON capas
+FOR EACH ROW EXECUTE FUNCTION capas_history_summary_changed();
+
+UPDATE capas SET (first_response_at, reopen_count) = (
+    SELECT first_change, reopens FROM capa_history_summary(status_history)
+);
+
+COMMIT;
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Enum as SQLEnum, SmallInteger, Numeric, Float
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, Enum as SQLEnum, SmallInteger, Numeric, Float, Index, Sequence
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -92,10 +92,25 @@ class Department(Base):
     location = Column(String)
     floor = Column(String)
     building = Column(String)
-    managers = Column(Text)  # JSON string of user IDs for department managers
+    managers = Column(Text)  # JSON string of user IDs, as the API returns them; department_managers is the lookup copy
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class DepartmentManager(Base):
+    """One row per (department, manager); kept in sync with Department.managers by crud"""
+    __tablename__ = "department_managers"
+
+    department_id = Column(Integer, ForeignKey("departments.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        # "which departments does this user manage"
+        Index('ix_department_managers_user_id', 'user_id'),
+    )
+
+# Source of generated round codes (crud.next_round_code); created by create_all or migrations/006
+round_code_seq = Sequence("round_code_seq", metadata=Base.metadata)
+
 class Round(Base):
     __tablename__ = "rounds"
     
@@ -104,7 +119,8 @@ class Round(Base):
     title = Column(String, nullable=False)
     description = Column(Text)
     round_type = Column(String, nullable=False)
-    department = Column(String, nullable=False)
+    department = Column(String, nullable=False)  # display name; filters and reports use department_id
+    department_id = Column(Integer, ForeignKey("departments.id", ondelete="SET NULL"), nullable=True)
     assigned_to = Column(Text, default='[]')  # JSON string of user IDs (kept as Text for display)
     assigned_to_ids = Column(JSONB, default='[]', nullable=False)  # JSONB array of user IDs (numeric) for programmatic usage
     scheduled_date = Column(DateTime(timezone=True), nullable=False)
@@ -121,6 +137,13 @@ class Round(Base):
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Hot query shapes, see migrations/007_hot_query_indexes.sql
+    __table_args__ = (
+        Index('ix_rounds_created_at', created_at.desc()),
+        Index('ix_rounds_status_created_at', 'status', 'created_at'),
+        Index('ix_rounds_department_id_status', 'department_id', 'status'),
+    )
+    
     # Relationships
     creator = relationship("User", back_populates="rounds_created")
     capas = relationship("Capa", back_populates="round")
@@ -133,7 +156,8 @@ class Capa(Base):
     title = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     round_id = Column(Integer, ForeignKey("rounds.id"))
-    department = Column(String, nullable=False)
+    department = Column(String, nullable=False)  # display name; filters and reports use department_id
+    department_id = Column(Integer, ForeignKey("departments.id", ondelete="SET NULL"), nullable=True)
     priority = Column(String, default="medium")  # low, medium, high, urgent
     status = Column(String, default="pending")
     assigned_to = Column(String)  # User name or ID
@@ -156,11 +180,24 @@ class Capa(Base):
     severity = Column(SmallInteger, default=3)  # 1-5 scale
     estimated_cost = Column(Numeric, nullable=True)
     status_history = Column(Text, default='[]')  # JSONB stored as text
+    # Kept from status_history by a trigger (migrations/018_capa_history_summary.sql)
+    first_response_at = Column(DateTime(timezone=True), nullable=True)
+    reopen_count = Column(Integer, nullable=False, default=0, server_default="0")
     sla_days = Column(Integer, default=14)
     escalation_level = Column(Integer, default=0)
     closed_at = Column(DateTime(timezone=True), nullable=True)
     # verified_at = Column(DateTime(timezone=True), nullable=True)  # Column doesn't exist in DB
     
+    __table_args__ = (
+        Index('ix_capas_open_target_date', 'target_date',
+              postgresql_where=status.notin_(['completed', 'closed'])),
+        Index('ix_capas_status', 'status'),
+        Index('ix_capas_department_id_created_at', 'department_id', 'created_at'),
+        Index('ix_capas_created_at', 'created_at'),
+        # One evaluation-driven CAPA per (round, item); see migration_004_capa_dedup.py
+        Index('uq_capas_round_item', 'round_id', 'evaluation_item_id', unique=True),
+    )
+    
     # Relationships
     round = relationship("Round", back_populates="capas")
     creator = relationship("User", back_populates="capas_created", foreign_keys=[created_by_id])
@@ -193,6 +230,15 @@ class CapaAction(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        # Overdue/upcoming/my-actions queues page through open actions by (due_date, id)
+        Index('ix_capa_actions_open_due_id', 'due_date', 'id',
+              postgresql_where=status.notin_(['completed', 'cancelled'])),
+        Index('ix_capa_actions_open_assignee_due_id', 'assigned_to_id', 'due_date', 'id',
+              postgresql_where=status.notin_(['completed', 'cancelled'])),
+        Index('ix_capa_actions_assignee_due_date', 'assigned_to_id', 'due_date'),
+    )
+    
     # Relationships
     capa = relationship("Capa", back_populates="actions")
 
@@ -306,20 +352,69 @@ class EvaluationResult(Base):
     round_id = Column(Integer, ForeignKey("rounds.id"), nullable=False)
     item_id = Column(Integer, ForeignKey("evaluation_items.id"), nullable=False)
     score = Column(Integer, nullable=False)  # 0-100
+    status = Column(String, nullable=True)  # applied | partial | not_applied | na, as submitted
     comments = Column(Text)
-    evidence_files = Column(Text)  # JSON array of file paths
+    evidence_files = Column(Text)  # JSON array of file paths (legacy; new evidence goes to evidence_ids)
+    evidence_ids = Column(JSONB, nullable=True)  # JSONB array of evidence_files.id, see evidence_store.py
     # Flag indicating this evaluation item requires a CAPA
     needs_capa = Column(Boolean, default=False)
     # Short note provided by the evaluator about the needed CAPA
     capa_note = Column(Text, nullable=True)
     evaluated_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     evaluated_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Offline sync (evaluation_sync.py): the device, its change id and per-device sequence number
+    client_id = Column(String(64), nullable=True)
+    client_change_id = Column(String(64), nullable=True)
+    client_seq = Column(BigInteger, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_evaluation_results_round_item', 'round_id', 'item_id'),
+        Index('uq_evaluation_results_client_change', 'client_change_id', unique=True,
+              postgresql_where=client_change_id.isnot(None)),
+    )
     
     # Relationships
     round = relationship("Round", back_populates="evaluation_results")
     item = relationship("EvaluationItem", back_populates="evaluation_results")
     evaluator = relationship("User", back_populates="evaluation_results")
 
+class EvidenceFile(Base):
+    """Uploaded evidence, stored once per content under its SHA-256 (evidence_store.py)"""
+    __tablename__ = "evidence_files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False)
+    content_type = Column(String, nullable=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    width = Column(Integer, nullable=True)  # images only, after downscaling
+    height = Column(Integer, nullable=True)
+    original_filename = Column(String, nullable=True)  # of the first upload of this content
+    uploaded_by_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EvidenceGrant(Base):
+    """A user who uploaded an EvidenceFile; identical content from several users shares the file but not its access"""
+    __tablename__ = "evidence_grants"
+
+    evidence_id = Column(Integer, ForeignKey("evidence_files.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EvidenceUpload(Base):
+    """A chunked upload in progress; the bytes received so far are in its part file"""
+    __tablename__ = "evidence_uploads"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    filename = Column(String, nullable=True)
+    content_type = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    uploaded_by_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_evidence_uploads_user_created', 'uploaded_by_id', 'created_at'),
+    )
+
 class NotificationType(str, enum.Enum):
     ROUND_ASSIGNED = "round_assigned"
     ROUND_REMINDER = "round_reminder"
@@ -337,6 +432,8 @@ class NotificationStatus(str, enum.Enum):
     ARCHIVED = "archived"
 
 class Notification(Base):
+    # Range-partitioned by month on created_at once migration_003_partition_logs.py
+    # has run (see partition_maintenance.py); the DB primary key is (id, created_at).
     __tablename__ = "notifications"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -352,9 +449,51 @@ class Notification(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     read_at = Column(DateTime(timezone=True))
     
+    __table_args__ = (
+        Index('ix_notifications_user_status_created', 'user_id', 'status', 'created_at'),
+        Index('ix_notifications_user_created', 'user_id', created_at.desc()),
+    )
+    
     # Relationships
     user = relationship("User")
 
+class UserNotificationCounter(Base):
+    """Per-user unread notification counter.
+
+    Maintained by statement-level triggers on notifications
+    (migrations/004_notification_unread_counters.sql), never written by the app.
+    """
+    __tablename__ = "user_notification_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class StreamTicket(Base):
+    """Single-use ticket for opening an event stream (realtime.issue_stream_ticket); only its hash is stored"""
+    __tablename__ = "stream_tickets"
+
+    ticket_hash = Column(String(64), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class RoundCapaCounter(Base):
+    """Per-round CAPA summary counters (latest result per item).
+
+    Maintained by statement-level triggers on evaluation_results and capas
+    (migrations/011_round_capa_counters.sql), never written by the app.
+    """
+    __tablename__ = "round_capa_counters"
+
+    round_id = Column(Integer, ForeignKey("rounds.id", ondelete="CASCADE"), primary_key=True)
+    evaluated_items = Column(Integer, nullable=False, default=0)
+    non_compliant_items = Column(Integer, nullable=False, default=0)
+    needs_capa_items = Column(Integer, nullable=False, default=0)
+    capas_needed = Column(Integer, nullable=False, default=0)  # non-compliant or flagged items without a CAPA
+    open_capas = Column(Integer, nullable=False, default=0)
+    closed_capas = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class UserNotificationSettings(Base):
     __tablename__ = "user_notification_settings"
     
@@ -376,6 +515,8 @@ class UserNotificationSettings(Base):
     user = relationship("User")
 
 class AuditLog(Base):
+    # Range-partitioned by month on created_at once migration_003_partition_logs.py
+    # has run (see partition_maintenance.py); the DB primary key is (id, created_at).
     __tablename__ = "audit_logs"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -383,12 +524,16 @@ class AuditLog(Base):
     action = Column(String, nullable=False)  # CREATE, UPDATE, DELETE, LOGIN, LOGOUT, etc.
     entity_type = Column(String, nullable=False)  # USER, ROUND, CAPA, etc.
     entity_id = Column(Integer)  # ID of the affected entity
-    old_values = Column(Text)  # JSON string of old values
-    new_values = Column(Text)  # JSON string of new values
+    old_values = Column(JSONB)  # JSON object of old values
+    new_values = Column(JSONB)  # JSON object of new values
     ip_address = Column(String)
     user_agent = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index('ix_audit_logs_entity_created', 'entity_type', 'entity_id', 'created_at'),
+    )
+    
     # Relationships
     user = relationship("User")
 
@@ -405,3 +550,42 @@ class RoundTypeSettings(Base):
     sort_order = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ScheduledJob(Base):
+    """Schedule and last outcome of a background job (job_scheduler.py).
+
+    Workers claim a due run by moving next_run_at forward, so each run
+    happens on one worker only.
+    """
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String(64), primary_key=True)
+    next_run_at = Column(DateTime(timezone=True), nullable=False)
+    last_started_at = Column(DateTime(timezone=True))
+    last_finished_at = Column(DateTime(timezone=True))
+    last_status = Column(String(16))
+    last_error = Column(Text)
+    last_duration_ms = Column(Integer)
+    last_worker = Column(String(128))
+    run_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class JobRun(Base):
+    """One run of a background job: running, succeeded, failed, timeout or skipped"""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String(64), nullable=False)
+    source = Column(String(16), nullable=False)  # schedule, cron or manual
+    worker = Column(String(128))
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True))
+    status = Column(String(16), nullable=False)
+    duration_ms = Column(Integer)
+    result = Column(JSONB)
+    error = Column(Text)
+
+    __table_args__ = (
+        Index('ix_job_runs_job_started', 'job_name', 'started_at'),
+    )
@@ -5,8 +5,12 @@ import logging
 
 from crud import (
     create_notification,
+    create_notifications_bulk,
+    get_notification_settings_for_users,
     get_user_notification_settings,
+    get_users_by_ids,
     get_users_with_notification_preference,
+    mark_notifications_email_sent,
     update_notification_email_sent
 )
 from email_service import email_service
@@ -72,18 +76,35 @@ class NotificationService:
     ) -> int:
         """
         Send notification to multiple users
+        
+        Settings, inserts and email bookkeeping are batched: a constant number
+        of queries regardless of how many users are notified.
         """
-        success_count = 0
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return 0
+        try:
+            settings_by_user = get_notification_settings_for_users(self.db, user_ids)
+            recipients = [
+                user_id for user_id in user_ids
+                if self._type_enabled(settings_by_user.get(user_id), notification_type)
+            ]
+            created = create_notifications_bulk(self.db, recipients, {
+                "title": title,
+                "message": message,
+                "notification_type": notification_type,
+                "entity_type": entity_type,
+                "entity_id": entity_id
+            })
+        except Exception as e:
+            logger.error(f"Failed to send bulk notification to {len(user_ids)} users: {str(e)}")
+            return 0
         
-        for user_id in user_ids:
-            if self.send_notification(
-                user_id, title, message, notification_type, 
-                entity_type, entity_id, send_email
-            ):
-                success_count += 1
+        if send_email and created:
+            self._send_bulk_email_notifications(created, settings_by_user)
         
-        logger.info(f"Sent notifications to {success_count}/{len(user_ids)} users")
-        return success_count
+        logger.info(f"Sent notifications to {len(created)}/{len(user_ids)} users")
+        return len(created)
     
     def send_round_assignment_notification(
         self,
@@ -249,6 +270,33 @@ class NotificationService:
         
         return success_count
     
+    def send_capa_digest_notification(
+        self,
+        user_ids: List[int],
+        round_id: int,
+        round_title: str,
+        capa_count: int,
+        created_by_name: str = ""
+    ) -> int:
+        """
+        One notification per recipient summarising the CAPAs generated for a round,
+        instead of one per CAPA
+        """
+        if not capa_count:
+            return 0
+        message = f"تم إنشاء {capa_count} خطة تصحيحية لعناصر غير مطبقة في الجولة '{round_title}'"
+        if created_by_name:
+            message += f" من قبل {created_by_name}"
+        return self.send_bulk_notification(
+            user_ids=user_ids,
+            title="خطط تصحيحية جديدة",
+            message=message,
+            notification_type=NotificationType.CAPA_CREATED,
+            entity_type="ROUND",
+            entity_id=round_id,
+            send_email=False  # Don't spam with emails
+        )
+    
     def send_system_update_notification(
         self,
         title: str,
@@ -276,7 +324,13 @@ class NotificationService:
         Check if user has notifications enabled for this type
         """
         settings = get_user_notification_settings(self.db, user_id)
-        
+        return self._type_enabled(settings, notification_type)
+    
+    @staticmethod
+    def _type_enabled(settings, notification_type: NotificationType) -> bool:
+        """
+        Whether ``settings`` allow this notification type (no settings means enabled)
+        """
         if not settings:
             # Default to True if no settings found
             return True
@@ -335,6 +389,62 @@ class NotificationService:
             logger.error(f"Failed to send email for notification {notification.id}: {str(e)}")
             return False
 
+    def _send_bulk_email_notifications(self, notifications: List[dict], settings_by_user: dict) -> int:
+        """
+        Email already-created notifications, loading recipients in one query
+        and flagging the sent ones with one UPDATE
+        """
+        users = get_users_by_ids(self.db, [n["user_id"] for n in notifications])
+        sent_ids = []
+        for notification in notifications:
+            user = users.get(notification["user_id"])
+            settings = settings_by_user.get(notification["user_id"])
+            if not user or not user.email or (settings and not settings.email_notifications):
+                continue
+            try:
+                if email_service.send_notification_email(
+                    to_email=user.email,
+                    to_name=f"{user.first_name} {user.last_name}",
+                    title=notification["title"],
+                    message=notification["message"],
+                    notification_type=notification["notification_type"],
+                    entity_type=notification["entity_type"],
+                    entity_id=notification["entity_id"]
+                ):
+                    sent_ids.append(notification["id"])
+            except Exception as e:
+                logger.error(f"Failed to send email for notification {notification['id']}: {str(e)}")
+        
+        if sent_ids:
+            mark_notifications_email_sent(self.db, sent_ids)
+        return len(sent_ids)
+
 # Global notification service instance
 def get_notification_service(db: Session) -> NotificationService:
     return NotificationService(db)
+
+
+def notify_round_capas_created(round_id: int, capa_count: int, creator_id: int, created_by_name: str = "") -> int:
+    """Send the CAPA digest for a round to the quality managers.
+
+    Meant to run after the response (e.g. as a FastAPI background task), so it
+    opens its own session.
+    """
+    from database import SessionLocal
+    from models_updated import Round, User
+
+    db = SessionLocal()
+    try:
+        round_title = db.query(Round.title).filter(Round.id == round_id).scalar() or str(round_id)
+        quality_manager_ids = [
+            user_id for (user_id,) in db.query(User.id).filter(User.role == 'quality_manager')
+            if user_id != creator_id
+        ]
+        return get_notification_service(db).send_capa_digest_notification(
+            quality_manager_ids, round_id, round_title, capa_count, created_by_name
+        )
+    except Exception as e:
+        logger.warning(f"Failed to send CAPA digest for round {round_id}: {str(e)}")
+        return 0
+    finally:
+        db.close()
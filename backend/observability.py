@@ -0,0 +1,328 @@
+"""
+Request instrumentation: wall time, SQL statement count, DB time and response
+size per route template, exposed as Prometheus metrics and one structured log
+line per request.
+قياس زمن الطلبات وعدد استعلامات قاعدة البيانات لكل مسار
+
+Metrics live in the worker process; with several uvicorn workers each scrape
+sees the worker that answered it, which is enough to spot slow or chatty
+routes (a jump in ``salamaty_http_request_db_queries`` is an N+1 regression).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger("salamaty.requests")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+# Requests issuing more statements than this are logged at WARNING
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+REQUEST_LOG_ENABLED = os.getenv("REQUEST_LOG", "1").lower() not in ("0", "false", "no")
+# Adds X-DB-Queries / X-DB-Time-Ms to responses (load tests); off by default
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "0").lower() in ("1", "true", "yes")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Root logging for the API process. ``LOG_LEVEL`` defaults to INFO, so the
+    DEBUG diagnostics in main/crud stay silent in production; set
+    ``LOG_LEVEL=DEBUG`` locally to see them.
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    root.setLevel(level)
+
+
+class RequestStats:
+    """SQL counters of the request being served (shared with its worker threads)"""
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # Failed statements never reach after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def install_query_hooks(engine):
+    """Count statements and DB time for the current request (idempotent)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            running += count
+            yield bound, running
+
+
+class _RouteSeries:
+    __slots__ = ("duration", "queries", "db_seconds", "response_bytes")
+
+    def __init__(self):
+        self.duration = _Histogram(DURATION_BUCKETS)
+        self.queries = _Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.response_bytes = 0
+
+
+def _labels(**labels) -> str:
+    body = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+    return "{" + body + "}"
+
+
+def _bound(value) -> str:
+    return value if isinstance(value, str) else repr(float(value))
+
+
+class MetricsRegistry:
+    """Per-route request metrics of this worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], _RouteSeries] = {}
+        self._status: Dict[Tuple[str, str, int], int] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self.in_progress = 0
+
+    def observe(self, method: str, route: str, status: int, duration: float,
+                queries: int, db_seconds: float, response_bytes: int):
+        with self._lock:
+            series = self._routes.get((method, route))
+            if series is None:
+                series = self._routes[(method, route)] = _RouteSeries()
+            series.duration.observe(duration)
+            series.queries.observe(queries)
+            series.db_seconds += db_seconds
+            series.response_bytes += response_bytes
+            key = (method, route, status)
+            self._status[key] = self._status.get(key, 0) + 1
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """Add to an application counter, exported as ``salamaty_<name>``"""
+        if not amount:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter(self, name: str, **labels) -> float:
+        """Current value of a counter; without labels, the sum over all label sets"""
+        wanted = set((k, str(v)) for k, v in labels.items())
+        with self._lock:
+            return sum(
+                value for (counter_name, counter_labels), value in self._counters.items()
+                if counter_name == name and wanted <= set(counter_labels)
+            )
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._status.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Averages per ``"METHOD route"``, slowest first"""
+        with self._lock:
+            rows = {}
+            for (method, route), series in self._routes.items():
+                count = sum(series.duration.counts)
+                rows[f"{method} {route}"] = {
+                    "count": count,
+                    "avg_ms": round(series.duration.total / count * 1000, 2),
+                    "avg_queries": round(series.queries.total / count, 2),
+                    "avg_db_ms": round(series.db_seconds / count * 1000, 2),
+                    "avg_bytes": round(series.response_bytes / count),
+                }
+        return dict(sorted(rows.items(), key=lambda item: item[1]["avg_ms"], reverse=True))
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP salamaty_http_requests_total Requests served, by route template and status code.",
+                "# TYPE salamaty_http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._status.items()):
+                lines.append(f"salamaty_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+            for name, attr, help_text in (
+                ("salamaty_http_request_duration_seconds", "duration", "Wall time from request start to the last response byte."),
+                ("salamaty_http_request_db_queries", "queries", "SQL statements executed while serving the request."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (method, route), series in sorted(self._routes.items()):
+                    histogram = getattr(series, attr)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{_labels(method=method, route=route, le=_bound(bound))} {count}")
+                    labels = _labels(method=method, route=route)
+                    lines.append(f"{name}_sum{labels} {histogram.total}")
+                    lines.append(f"{name}_count{labels} {sum(histogram.counts)}")
+
+            for name, attr, help_text in (
+                ("salamaty_http_request_db_seconds_total", "db_seconds", "Time spent executing SQL statements."),
+                ("salamaty_http_response_bytes_total", "response_bytes", "Response body bytes sent."),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (method, route), series in sorted(self._routes.items()):
+                    lines.append(f"{name}{_labels(method=method, route=route)} {getattr(series, attr)}")
+
+            for name in sorted({counter_name for counter_name, _ in self._counters}):
+                lines.append(f"# TYPE salamaty_{name} counter")
+                for (counter_name, counter_labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"salamaty_{name}{_labels(**dict(counter_labels)) if counter_labels else ''} {value}")
+
+            lines += [
+                "# HELP salamaty_http_requests_in_progress Requests currently being served.",
+                "# TYPE salamaty_http_requests_in_progress gauge",
+                f"salamaty_http_requests_in_progress {self.in_progress}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def route_template(scope) -> str:
+    """Path template of the matched route (``/api/rounds/{round_id}``), never the raw path"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware recording one observation per HTTP request. The request is
+    measured up to its last response byte, so background tasks that run after
+    the response do not count against the route.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = None, exclude_paths=("/metrics",),
+                 query_count_header: bool = None):
+        self.app = app
+        self.registry = registry or metrics
+        self.exclude_paths = set(exclude_paths)
+        self.query_count_header = QUERY_COUNT_HEADER if query_count_header is None else query_count_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        state = {"status": 500, "bytes": 0, "done": False}
+
+        def finish():
+            if state["done"]:
+                return
+            state["done"] = True
+            self._record(scope, state["status"], time.perf_counter() - started, stats, state["bytes"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if self.query_count_header:
+                    # Statements issued so far: the whole handler for non-streaming responses
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"x-db-queries", str(stats.queries).encode()),
+                        (b"x-db-time-ms", f"{stats.db_seconds * 1000:.2f}".encode()),
+                    ])
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await send(message)
+                    finish()
+                    return
+            await send(message)
+
+        self.registry.in_progress += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_progress -= 1
+            finish()
+            _current_stats.reset(token)
+
+    def _record(self, scope, status, duration, stats, response_bytes):
+        method = scope["method"]
+        route = route_template(scope)
+        self.registry.observe(method, route, status, duration, stats.queries, stats.db_seconds, response_bytes)
+        if not REQUEST_LOG_ENABLED:
+            return
+        duration_ms = duration * 1000
+        level = logging.WARNING if duration_ms >= SLOW_REQUEST_MS or stats.queries > QUERY_COUNT_WARN else logging.INFO
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, json.dumps({
+                "method": method,
+                "route": route,
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(duration_ms, 2),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 2),
+                "bytes": response_bytes,
+            }, ensure_ascii=False))
@@ -0,0 +1,305 @@
+"""
+Realtime - push channel for notifications and alerts
+قناة الدفع الفوري للإشعارات والتنبيهات
+
+Clients keep one server-sent events stream open (GET /api/events/stream)
+instead of polling notifications, the unread count and /api/alerts/.
+
+``EventBroker`` fans events out to the asyncio queues of the connected
+streams of this process. With the ``postgres`` backend every event is sent
+through ``pg_notify`` on ``EVENTS_CHANNEL`` and a ``LISTEN`` thread in each
+web worker delivers it locally, so events published by another worker, the
+cron scheduler or a database trigger (migrations/005) reach every stream.
+The ``memory`` backend only delivers within the current process. Publishing
+reuses one dedicated connection per process for the NOTIFYs.
+
+EventSource cannot send an Authorization header, so a stream is opened with
+a single-use ticket (POST /api/events/ticket, issue_stream_ticket) rather
+than the JWT, which would end up in access logs.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import select
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from models_updated import StreamTicket
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "salamaty_events"
+# pg_notify payloads are limited to 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7900
+SUBSCRIBER_QUEUE_SIZE = 100
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", "30"))
+
+
+def _default_backend() -> str:
+    configured = os.getenv("REALTIME_BACKEND")
+    if configured:
+        return configured.lower()
+    return "postgres" if os.getenv("DATABASE_URL", "postgresql").startswith("postgres") else "memory"
+
+
+def build_event(event: str, data: Dict[str, Any], user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Event envelope; ``user_id`` None means every connected user"""
+    return {"event": event, "user_id": user_id, "data": data}
+
+
+def encode_notify_payload(envelope: Dict[str, Any]) -> str:
+    """JSON payload for pg_notify, reduced to the entity id when it would exceed the size limit.
+
+    Clients refetch the entity when an event arrives with ``partial`` set.
+    """
+    payload = json.dumps(envelope, default=str, ensure_ascii=False)
+    if len(payload.encode("utf-8")) <= MAX_NOTIFY_PAYLOAD:
+        return payload
+    data = envelope.get("data") or {}
+    slim = dict(envelope, data={"id": data.get("id"), "partial": True})
+    return json.dumps(slim, default=str)
+
+
+def _ticket_hash(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+def issue_stream_ticket(db: Session, user_id: int, now: Optional[datetime] = None) -> str:
+    """Single-use ticket that opens one event stream for ``user_id`` within STREAM_TICKET_SECONDS"""
+    now = now or datetime.now(timezone.utc)
+    ticket = secrets.token_urlsafe(32)
+    db.query(StreamTicket).filter(StreamTicket.expires_at < now).delete(synchronize_session=False)
+    db.add(StreamTicket(
+        ticket_hash=_ticket_hash(ticket), user_id=user_id, expires_at=now + timedelta(seconds=STREAM_TICKET_SECONDS)
+    ))
+    db.commit()
+    return ticket
+
+
+def redeem_stream_ticket(db: Session, ticket: str, now: Optional[datetime] = None) -> Optional[int]:
+    """User id of a valid ticket, used up by this call; None when it is unknown, used or expired"""
+    now = now or datetime.now(timezone.utc)
+    user_id = db.execute(
+        delete(StreamTicket).where(
+            StreamTicket.ticket_hash == _ticket_hash(ticket), StreamTicket.expires_at >= now
+        ).returning(StreamTicket.user_id)
+    ).scalar()
+    db.commit()
+    return user_id
+
+
+def format_sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    """Serialize one server-sent event frame"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    """In-process pub/sub for the SSE streams, optionally bridged over Postgres LISTEN/NOTIFY"""
+
+    def __init__(self, backend: Optional[str] = None, engine=None):
+        self.backend = backend or _default_backend()
+        self._engine = engine
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        # Dedicated autocommit connection for NOTIFY, shared by the publishing threads
+        self._notify_connection = None
+        self._notify_lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from database import engine
+            self._engine = engine
+        return self._engine
+
+    # -- subscribers ---------------------------------------------------------
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        """Register a stream for ``user_id``; must be called from the event loop that serves it"""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[user_id].add(queue)
+        if self.backend == "postgres":
+            self._start_listener()
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    # -- publishing ----------------------------------------------------------
+
+    def publish(self, event: str, data: Dict[str, Any], user_id: Optional[int] = None):
+        """Send an event to ``user_id`` (or everyone); safe to call from any thread or process.
+
+        Call it after the change is committed so clients never refetch stale data.
+        """
+        envelope = build_event(event, data, user_id)
+        self.published += 1
+        if self.backend == "postgres":
+            try:
+                self._notify([encode_notify_payload(envelope)])
+                return
+            except Exception as e:
+                logger.warning(f"pg_notify failed, delivering {event} locally only: {e}")
+        self.dispatch(envelope)
+
+    def publish_many(self, events: List[Tuple[str, Dict[str, Any], Optional[int]]]):
+        """Publish several ``(event, data, user_id)`` events with a single round trip"""
+        envelopes = [build_event(event, data, user_id) for event, data, user_id in events]
+        if not envelopes:
+            return
+        self.published += len(envelopes)
+        if self.backend == "postgres":
+            try:
+                self._notify([encode_notify_payload(e) for e in envelopes])
+                return
+            except Exception as e:
+                logger.warning(f"pg_notify failed, delivering {len(envelopes)} events locally only: {e}")
+        for envelope in envelopes:
+            self.dispatch(envelope)
+
+    def _notify(self, payloads: List[str]):
+        """pg_notify each payload on the dedicated connection; reconnects once if it was dropped"""
+        with self._notify_lock:
+            for attempt in range(2):
+                try:
+                    if self._notify_connection is None:
+                        # Outside the pool, so publishing never waits for a request's connection
+                        raw = self.engine.raw_connection()
+                        raw.detach()
+                        raw.driver_connection.autocommit = True
+                        self._notify_connection = raw
+                    cursor = self._notify_connection.driver_connection.cursor()
+                    try:
+                        cursor.execute(
+                            "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload",
+                            (EVENTS_CHANNEL, payloads),
+                        )
+                    finally:
+                        cursor.close()
+                    return
+                except Exception:
+                    self._close_notify_connection()
+                    if attempt:
+                        raise
+
+    def _close_notify_connection(self):
+        if self._notify_connection is not None:
+            try:
+                self._notify_connection.close()
+            except Exception:
+                pass
+            self._notify_connection = None
+
+    def dispatch(self, envelope: Dict[str, Any]):
+        """Hand an event to this process's event loop for delivery"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, envelope)
+        except RuntimeError:
+            # Loop shut down between the check and the call
+            pass
+
+    def _deliver(self, envelope: Dict[str, Any]):
+        user_id = envelope.get("user_id")
+        with self._lock:
+            if user_id is None:
+                queues = [queue for subscribers in self._subscribers.values() for queue in subscribers]
+            else:
+                queues = list(self._subscribers.get(user_id, ()))
+        for queue in queues:
+            try:
+                queue.put_nowait(envelope)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # A stalled client must not hold back the others; it resyncs on reconnect
+                self.dropped += 1
+
+    # -- postgres bridge -----------------------------------------------------
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            self._stopping.clear()
+            self._listener = threading.Thread(target=self._listen, name="realtime-listener", daemon=True)
+            self._listener.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        if self._listener and self._listener.is_alive():
+            self._listener.join(timeout)
+        with self._notify_lock:
+            self._close_notify_connection()
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            raw = None
+            try:
+                # Dedicated connection outside the pool, it stays in LISTEN for the process lifetime
+                raw = self.engine.raw_connection()
+                raw.detach()
+                connection = raw.driver_connection
+                connection.autocommit = True
+                cursor = connection.cursor()
+                cursor.execute(f"LISTEN {EVENTS_CHANNEL}")
+                logger.info(f"Listening for realtime events on {EVENTS_CHANNEL}")
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], 5) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            self.dispatch(json.loads(notify.payload))
+                        except ValueError:
+                            logger.warning(f"Ignoring malformed realtime payload: {notify.payload[:200]}")
+            except Exception as e:
+                logger.error(f"Realtime listener failed, reconnecting: {e}")
+                time.sleep(5)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+
+
+broker = EventBroker()
+
+
+def get_broker() -> EventBroker:
+    return broker
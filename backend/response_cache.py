@@ -0,0 +1,360 @@
+"""
+Response cache - shared, tag-invalidated payloads for read-heavy dashboards
+ذاكرة مؤقتة لنتائج لوحات المعلومات تُبطل عند تعديل البيانات
+
+Dashboard and report payloads are identical for every user and only change
+when rounds, CAPAs, ... are written. ``ResponseCache.get_or_compute`` keeps
+one copy per (name, parameters), tagged with the tables it reads::
+
+    return response_cache.get_or_compute(
+        "reports.dashboard_stats", lambda: compute(db), tags=("rounds", "capas"))
+
+Invalidation follows the writes: session listeners record the tables written
+through the ORM (flushed objects and ORM insert/update/delete statements) and
+invalidate those tags once the transaction commits, so a rolled back write
+invalidates nothing. Writes issued as raw SQL call ``mark_tables_changed``.
+
+Tags are versioned instead of scanned: an entry's key embeds the current
+version of each of its tags, so bumping a tag makes every dependent entry
+unreachable and the LRU/TTL reclaims it.
+
+Concurrent misses for one key wait for a single computation: a per-key lock
+inside the process and, with Redis, a short ``SET NX`` lock across workers.
+
+Backends (``RESPONSE_CACHE_BACKEND``):
+  - ``memory`` (default): per-process LRU with TTL. An invalidation reaches
+    the worker that committed the write; other workers may serve a payload up
+    to ``RESPONSE_CACHE_TTL`` seconds old.
+  - ``redis``: any Redis-protocol server at ``RESPONSE_CACHE_REDIS_URL``
+    (needs the ``redis`` package), shared by all workers.
+  - ``off``: always compute.
+
+Cached values are shared between requests: treat them as read-only.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from serializers import dumps
+
+try:
+    import redis
+except ImportError:  # optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+# Longest a computation may hold the fill lock; waiters give up and compute after this
+FILL_LOCK_TIMEOUT = 30.0
+WAIT_POLL_INTERVAL = 0.05
+
+_CHANGED_KEY = "changed_cache_tags"
+MISSING = object()
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry, local to this process"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._tags: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def tag_versions(self, tags: Iterable[str]) -> List[int]:
+        with self._lock:
+            return [self._tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def acquire_fill_lock(self, key: str, timeout: float) -> Optional[str]:
+        # Single process: the per-key lock in ResponseCache already serializes fills
+        return "local"
+
+    def release_fill_lock(self, key: str, token: str):
+        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Delete the lock only if we still hold it (it may have expired and been retaken)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisBackend:
+    """Entries, tag versions and fill locks in a Redis-protocol server shared by all workers"""
+
+    name = "redis"
+
+    def __init__(self, url: str, prefix: str = "salamaty:cache:"):
+        if redis is None:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the redis package")
+        self.client = redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        raw = self.client.get(self.prefix + key)
+        return MISSING if raw is None else json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float):
+        self.client.set(self.prefix + key, dumps(value), px=max(1, int(ttl * 1000)))
+
+    def tag_versions(self, tags: Iterable[str]) -> List[int]:
+        keys = [f"{self.prefix}tag:{tag}" for tag in tags]
+        return [int(version or 0) for version in self.client.mget(keys)] if keys else []
+
+    def bump_tags(self, tags: Iterable[str]):
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr(f"{self.prefix}tag:{tag}")
+        pipeline.execute()
+
+    def acquire_fill_lock(self, key: str, timeout: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = self.client.set(f"{self.prefix}lock:{key}", token, nx=True, px=int(timeout * 1000))
+        return token if acquired else None
+
+    def release_fill_lock(self, key: str, token: str):
+        self.client.eval(_RELEASE_LOCK_SCRIPT, 1, f"{self.prefix}lock:{key}", token)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+
+class ResponseCache:
+    """Tag-invalidated cache of computed payloads with one computation per key at a time"""
+
+    def __init__(self, backend=None, default_ttl: float = DEFAULT_TTL, fill_lock_timeout: float = FILL_LOCK_TIMEOUT):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.fill_lock_timeout = fill_lock_timeout
+        self._inflight: Dict[str, list] = {}
+        self._inflight_guard = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.computations = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _key(self, name: str, params: Optional[Dict[str, Any]], tags: Tuple[str, ...]) -> str:
+        versions = self.backend.tag_versions(tags)
+        key = name + ":" + ".".join(f"{tag}{version}" for tag, version in zip(tags, versions))
+        if params:
+            encoded = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+            key += ":" + hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:16]
+        return key
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        """Serialize fills of ``key`` within this process"""
+        with self._inflight_guard:
+            entry = self._inflight.get(key)
+            if entry is None:
+                entry = self._inflight[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._inflight_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[key]
+
+    def _wait_for_fill(self, key: str) -> Any:
+        """Poll for the value another worker is computing"""
+        deadline = time.monotonic() + self.fill_lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_POLL_INTERVAL)
+            value = self.backend.get(key)
+            if value is not MISSING:
+                return value
+        return MISSING
+
+    def get_or_compute(self, name: str, compute: Callable[[], Any], tags: Iterable[str] = (),
+                       params: Optional[Dict[str, Any]] = None, ttl: Optional[float] = None) -> Any:
+        """
+        Cached payload of ``name`` for ``params``, computed with ``compute()``
+        on a miss. ``tags`` are the tables the payload is derived from.
+        """
+        if self.backend is None:
+            return compute()
+        tags = tuple(sorted(set(tags)))
+        try:
+            key = self._key(name, params, tags)
+            value = self.backend.get(key)
+        except Exception as e:
+            # A cache outage must not take the dashboards down
+            self.errors += 1
+            logger.warning("Response cache unavailable, computing %s directly: %s", name, e)
+            return compute()
+        if value is not MISSING:
+            self.hits += 1
+            return value
+
+        with self._single_flight(key):
+            value = self.backend.get(key)
+            if value is not MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            token = self.backend.acquire_fill_lock(key, self.fill_lock_timeout)
+            if token is None:
+                value = self._wait_for_fill(key)
+                if value is not MISSING:
+                    self.hits += 1
+                    return value
+            try:
+                value = compute()
+                self.computations += 1
+                self.backend.set(key, value, self.default_ttl if ttl is None else ttl)
+            finally:
+                if token is not None:
+                    self.backend.release_fill_lock(key, token)
+            return value
+
+    def invalidate(self, *tags: str):
+        """Make every entry tagged with one of ``tags`` unreachable"""
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.bump_tags(sorted(set(tags)))
+            self.invalidations += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error("Response cache invalidation of %s failed: %s", ", ".join(tags), e)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "entries": len(self.backend) if isinstance(self.backend, MemoryBackend) else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "computations": self.computations,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+def build_backend(name: Optional[str] = None):
+    """Backend selected by ``RESPONSE_CACHE_BACKEND``; None when caching is off"""
+    name = (name or os.getenv("RESPONSE_CACHE_BACKEND", "memory")).lower()
+    if name in ("off", "none", "0", "false"):
+        return None
+    if name == "redis":
+        try:
+            backend = RedisBackend(os.getenv("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0"))
+            backend.client.ping()
+            return backend
+        except Exception as e:
+            logger.warning("Redis response cache unavailable, using the in-process cache: %s", e)
+    return MemoryBackend()
+
+
+response_cache = ResponseCache(build_backend())
+
+
+def get_response_cache() -> ResponseCache:
+    return response_cache
+
+
+# -- invalidation on commit ----------------------------------------------------
+
+def mark_tables_changed(db: Session, *tables: str) -> None:
+    """Record writes made with raw SQL; their tags are invalidated when ``db`` commits"""
+    db.info.setdefault(_CHANGED_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_tables(session: Session, flush_context):
+    tables = {
+        table.name
+        for table in (getattr(type(obj), "__table__", None) for obj in chain(session.new, session.dirty, session.deleted))
+        if table is not None
+    }
+    if tables:
+        mark_tables_changed(session, *tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_orm_dml(orm_execute_state):
+    # Bulk insert()/update()/delete() and Query.update()/delete() bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None):
+            mark_tables_changed(orm_execute_state.session, table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    tables = session.info.pop(_CHANGED_KEY, None)
+    if tables:
+        response_cache.invalidate(*tables)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes_after_rollback(session: Session, previous_transaction):
+    # Nothing was written; savepoint rollbacks leave the outer transaction's writes pending
+    if not previous_transaction.nested:
+        session.info.pop(_CHANGED_KEY, None)
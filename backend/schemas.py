@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, field_validator
 import json
-from typing import Optional, List, Union
+from typing import Any, Optional, List, Union
 from datetime import datetime
 from models_updated import UserRole, RoundStatus, RoundType, CapaStatus, VerificationStatus, NotificationType, NotificationStatus
 
@@ -62,9 +62,43 @@ class RoundBase(BaseModel):
 class RoundCreate(RoundBase):
     round_code: Optional[str] = None  # Auto-generated
 
+class RoundRecurrence(BaseModel):
+    frequency: str = "monthly"  # daily, weekly, monthly
+    interval: int = 1
+    start_date: datetime
+    until: Optional[datetime] = None  # inclusive; either until or count is required
+    count: Optional[int] = None
+
+class RoundScheduleTemplate(BaseModel):
+    title: str  # may use {department} and {date} placeholders
+    description: Optional[str] = None
+    round_type: str
+    assigned_to: List[int] = []  # assessor user IDs, shared by every scheduled round
+    selected_categories: List[int] = []
+    evaluation_items: List[int] = []
+    priority: str = "medium"
+    notes: Optional[str] = None
+    deadline_days: Optional[int] = None  # deadline/end_date = scheduled_date + deadline_days
+
+class BulkRoundScheduleRequest(BaseModel):
+    template: RoundScheduleTemplate
+    recurrence: RoundRecurrence
+    departments: List[str]
+    dry_run: bool = False  # only return the planned occurrences
+
+class BulkRoundScheduleResponse(BaseModel):
+    created_count: int
+    round_ids: List[int] = []
+    round_codes: List[str] = []
+    occurrences: List[datetime] = []
+    departments: List[str] = []
+    notified_user_ids: List[int] = []
+    dry_run: bool = False
+
 class RoundResponse(RoundBase):
     id: int
     round_code: str
+    department_id: Optional[int] = None
     status: RoundStatus
     compliance_percentage: int
     created_by_id: int
@@ -195,6 +229,7 @@ class CapaResponse(CapaBase):
     id: int
     round_id: Optional[int] = None
     department: str
+    department_id: Optional[int] = None
     priority: str = "medium"
     assigned_to: Optional[str] = None
     assigned_to_id: Optional[int] = None
@@ -299,7 +334,8 @@ class EvaluationResultCreate(BaseModel):
     item_id: int
     status: str  # expected: 'applied'|'not_applied'|'partial'|'na'
     comments: Optional[str] = None
-    evidence_files: Optional[List[str]] = None
+    evidence_files: Optional[List[str]] = None  # legacy; data URIs are moved to the evidence store
+    evidence_ids: Optional[List[int]] = None  # uploaded through /api/evidence/uploads
     # Mark that this item needs a CAPA (user may add a short note)
     mark_needs_capa: Optional[bool] = False
     capa_note: Optional[str] = None
@@ -315,13 +351,91 @@ class EvaluationResultResponse(BaseModel):
     round_id: int
     item_id: int
     score: int
+    status: Optional[str] = None
     comments: Optional[str] = None
     evidence_files: Optional[str] = None
+    evidence_ids: Optional[List[int]] = None
     needs_capa: Optional[bool] = False
     capa_note: Optional[str] = None
     evaluated_by: int
     evaluated_at: datetime
-    
+
+    class Config:
+        from_attributes = True
+
+# Offline evaluation sync schemas (evaluation_sync.py)
+class EvaluationChange(BaseModel):
+    change_id: str  # client-generated, unique (UUID); a retried change is applied once
+    item_id: int
+    seq: int  # increases with every change the device makes
+    base_id: Optional[int] = None  # server result the edit was made on; defaults to the request's since
+    status: str  # 'applied'|'not_applied'|'partial'|'na'
+    comments: Optional[str] = None
+    evidence_ids: Optional[List[int]] = None
+    mark_needs_capa: Optional[bool] = False
+    capa_note: Optional[str] = None
+
+    @field_validator("change_id")
+    def _check_change_id(cls, v):
+        if not v or len(v) > 64:
+            raise ValueError('change_id must be 1-64 characters')
+        return v
+
+class EvaluationSyncRequest(BaseModel):
+    client_id: str  # the device
+    since: Optional[int] = None  # sync_token of the previous sync
+    changes: List[EvaluationChange] = []
+    finalize: bool = False
+
+    @field_validator("client_id")
+    def _check_client_id(cls, v):
+        if not v or len(v) > 64:
+            raise ValueError('client_id must be 1-64 characters')
+        return v
+
+class EvaluationSyncConflict(BaseModel):
+    change_id: str
+    item_id: int
+    server_result_id: int
+
+class EvaluationSyncResponse(BaseModel):
+    sync_token: int
+    applied: List[str] = []
+    duplicates: List[str] = []
+    stale: List[str] = []
+    rejected: List[str] = []
+    conflicts: List[EvaluationSyncConflict] = []
+    changes: List[EvaluationResultResponse] = []
+    round_status: Optional[str] = None
+    compliance_percentage: Optional[int] = None
+    completion_percentage: Optional[int] = None
+    finalized: bool = False
+    created_capas: int = 0
+
+# Evidence schemas
+class EvidenceUploadCreate(BaseModel):
+    filename: Optional[str] = None
+    content_type: str
+    total_size: int
+
+class EvidenceUploadResponse(BaseModel):
+    upload_id: str
+    content_type: str
+    total_size: int
+    received_bytes: int
+    max_chunk_bytes: int
+
+class EvidenceFileResponse(BaseModel):
+    id: int
+    sha256: str
+    content_type: str
+    size_bytes: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    original_filename: Optional[str] = None
+    created_at: Optional[datetime] = None
+    url: Optional[str] = None
+
     class Config:
         from_attributes = True
 
@@ -364,8 +478,8 @@ class AuditLogBase(BaseModel):
     action: str
     entity_type: str
     entity_id: Optional[int] = None
-    old_values: Optional[str] = None
-    new_values: Optional[str] = None
+    old_values: Optional[Any] = None
+    new_values: Optional[Any] = None
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
 
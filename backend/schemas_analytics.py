@@ -13,19 +13,31 @@ class TrendData(BaseModel):
     cost_efficiency: float
     user_satisfaction: float
 
+class DepartmentForecast(BaseModel):
+    department_id: Optional[int] = None
+    department: str
+    current_compliance: float
+    forecast_compliance: float
+    trend_per_month: float
+    observed_days: int
+
 class Predictions(BaseModel):
     next_month_completion: float
+    next_month_compliance: Optional[float] = None
     risk_factors: List[str]
     recommendations: List[str]
     cost_forecast: float
+    department_forecasts: List[DepartmentForecast] = []
 
 class PerformanceMetrics(BaseModel):
     avg_response_time: float
     escalation_rate: float
     first_time_fix_rate: float
     customer_satisfaction: float
+    mean_time_to_close: Optional[float] = None  # days
 
 class DepartmentComparison(BaseModel):
+    department_id: Optional[int] = None
     department: str
     efficiency_score: float
     completion_rate: float
@@ -129,6 +129,7 @@ class Alert(BaseModel):
 
 # Report Schemas
 class DepartmentStats(BaseModel):
+    department_id: Optional[int] = None
     department: str
     total_capas: int
     completed_capas: int
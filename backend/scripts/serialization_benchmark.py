@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmark for the large list endpoints.
+
+Compares the previous response path (per-field isoformat()/str() loops,
+jsonable_encoder over ORM objects, pydantic response_model validation, stdlib
+json) with the FastJSONResponse path (prebuilt row serializers + orjson) on
+synthetic 1k and 10k row payloads. No database is needed.
+
+Run from backend/:
+    python scripts/serialization_benchmark.py
+    python scripts/serialization_benchmark.py --rows 1000 10000 50000 --repeat 7 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("ENABLE_BACKGROUND_JOBS", "0")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from main import CAPA_LIST_SERIALIZER, ROUND_LIST_SERIALIZER, USER_RESPONSE_FIELDS
+from models_updated import Capa, Round, RoundStatus, User, UserRole
+from schemas import UserResponse
+from serializers import FastJSONResponse, model_serializer, orjson
+
+BASE_DATE = datetime(2025, 1, 1, 8, 0)
+
+
+def round_rows(n):
+    """Rows as returned by the raw SQL of GET /api/rounds"""
+    return [
+        (i, f"RND-2025-{i:06d}", f"جولة سلامة المرضى {i}", "تقييم دوري لقسم العناية", "patient_safety",
+         "ICU", "scheduled", "medium", BASE_DATE + timedelta(hours=i), BASE_DATE,
+         "[1, 2, 3]", 1, 87, 40, [1, 2], [10, 11, 12, 13], [1, 2, 3],
+         BASE_DATE + timedelta(days=7), None, None)
+        for i in range(1, n + 1)
+    ]
+
+
+def round_objects(n):
+    return [
+        Round(id=i, round_code=f"RND-2025-{i:06d}", title=f"جولة سلامة المرضى {i}", description="تقييم دوري",
+              round_type="patient_safety", department="ICU", assigned_to="[1, 2, 3]", assigned_to_ids=[1, 2, 3],
+              scheduled_date=BASE_DATE + timedelta(hours=i), deadline=BASE_DATE + timedelta(days=7), end_date=None,
+              status=RoundStatus.SCHEDULED, priority="medium", compliance_percentage=87, completion_percentage=40,
+              notes=None, evaluation_items=[10, 11, 12], selected_categories=[1, 2], score_details=None,
+              created_by_id=1, created_at=BASE_DATE)
+        for i in range(1, n + 1)
+    ]
+
+
+def capa_objects(n):
+    return [
+        Capa(id=i, title=f"خطة تحسين {i}", description="إجراء تصحيحي", department="ICU", priority="high",
+             status="PENDING", verification_status="unverified", severity=3, target_date=BASE_DATE,
+             escalation_level=0, corrective_actions='[{"task": "تدريب"}]', preventive_actions="[]",
+             verification_steps=None, created_at=BASE_DATE)
+        for i in range(1, n + 1)
+    ]
+
+
+def user_objects(n):
+    return [
+        User(id=i, username=f"user{i}", email=f"user{i}@hospital.sa", hashed_password="x", first_name="سارة",
+             last_name="العتيبي", role=UserRole.ASSESSOR, department="ICU", phone=None, position=None,
+             photo_url=None, is_active=True, last_login=None, created_at=BASE_DATE)
+        for i in range(1, n + 1)
+    ]
+
+
+def legacy_rounds(rows):
+    """The per-row loop GET /api/rounds used before FastJSONResponse"""
+    data = []
+    for row in rows:
+        raw_assigned = row[10]
+        try:
+            assigned_to_str = json.dumps(json.loads(raw_assigned), ensure_ascii=False)
+        except Exception:
+            assigned_to_str = str(raw_assigned)
+        data.append({
+            "id": row[0],
+            "round_code": str(row[1]) if row[1] is not None else None,
+            "title": str(row[2]) if row[2] is not None else None,
+            "description": str(row[3]) if row[3] is not None else None,
+            "round_type": str(row[4]) if row[4] is not None else None,
+            "department": str(row[5]) if row[5] is not None else None,
+            "status": str(row[6]) if row[6] is not None else None,
+            "priority": str(row[7]) if row[7] is not None else None,
+            "scheduled_date": row[8].isoformat() if row[8] else None,
+            "created_at": row[9].isoformat() if row[9] else None,
+            "assigned_to": assigned_to_str,
+            "created_by_id": row[11],
+            "compliance_percentage": row[12] if row[12] is not None else 0,
+            "completion_percentage": row[13] if row[13] is not None else 0,
+            "selected_categories": row[14] if row[14] is not None else [],
+            "evaluation_items": row[15] if row[15] is not None else [],
+            "assigned_to_ids": row[16] if row[16] is not None else [],
+            "deadline": row[17].isoformat() if row[17] else None,
+            "end_date": row[18].isoformat() if row[18] else None,
+            "notes": str(row[19]) if row[19] is not None else None,
+        })
+    return JSONResponse(content=data).body
+
+
+def legacy_capas(capas):
+    """GET /api/capas: dict per CAPA, then FastAPI's jsonable_encoder + JSONResponse"""
+    data = []
+    for capa in capas:
+        data.append({
+            "id": capa.id, "title": capa.title, "description": capa.description,
+            "department": capa.department, "priority": capa.priority, "status": capa.status,
+            "verification_status": capa.verification_status, "severity": capa.severity,
+            "target_date": capa.target_date, "escalation_level": capa.escalation_level,
+            "corrective_actions": json.loads(capa.corrective_actions) if capa.corrective_actions else [],
+            "preventive_actions": json.loads(capa.preventive_actions) if capa.preventive_actions else [],
+            "verification_steps": json.loads(capa.verification_steps) if capa.verification_steps else [],
+            "created_at": capa.created_at,
+        })
+    return JSONResponse(content=jsonable_encoder({"status": "success", "capas": data})).body
+
+
+_users_adapter = TypeAdapter(List[UserResponse])
+
+CASES = {
+    "GET /api/rounds": (
+        round_rows,
+        legacy_rounds,
+        lambda rows: FastJSONResponse(ROUND_LIST_SERIALIZER.many(rows)).body,
+    ),
+    "GET /api/rounds/my": (
+        round_objects,
+        lambda rounds: JSONResponse(content=jsonable_encoder(rounds)).body,
+        lambda rounds: FastJSONResponse(model_serializer(Round).many(rounds)).body,
+    ),
+    "GET /api/capas": (
+        capa_objects,
+        legacy_capas,
+        lambda capas: FastJSONResponse({"status": "success", "capas": CAPA_LIST_SERIALIZER.many(capas)}).body,
+    ),
+    "GET /api/users": (
+        user_objects,
+        lambda users: _users_adapter.dump_json(_users_adapter.validate_python(users, from_attributes=True)),
+        lambda users: FastJSONResponse(model_serializer(User, USER_RESPONSE_FIELDS).many(users)).body,
+    ),
+}
+
+
+def best_of(func, payload, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(payload)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list endpoint serialization paths")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the fastest is reported")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args()
+
+    results = []
+    for endpoint, (build, legacy, fast) in CASES.items():
+        for rows in args.rows:
+            payload = build(rows)
+            legacy_ms, legacy_bytes = best_of(legacy, payload, args.repeat)
+            fast_ms, fast_bytes = best_of(fast, payload, args.repeat)
+            results.append({
+                "endpoint": endpoint, "rows": rows,
+                "legacy_ms": round(legacy_ms, 2), "fast_ms": round(fast_ms, 2),
+                "speedup": round(legacy_ms / fast_ms, 1) if fast_ms else None,
+                "legacy_bytes": legacy_bytes, "fast_bytes": fast_bytes,
+            })
+
+    if args.json:
+        print(json.dumps({"orjson": orjson is not None, "results": results}, indent=2))
+        return
+    print(f"encoder: {'orjson' if orjson is not None else 'stdlib json (orjson not installed)'}, best of {args.repeat}")
+    print(f"{'endpoint':<20} {'rows':>7} {'legacy ms':>10} {'fast ms':>9} {'speedup':>8} {'bytes':>10}")
+    for row in results:
+        print(f"{row['endpoint']:<20} {row['rows']:>7} {row['legacy_ms']:>10} {row['fast_ms']:>9} "
+              f"{row['speedup']:>7}x {row['fast_bytes']:>10}")
+
+
+if __name__ == "__main__":
+    main()
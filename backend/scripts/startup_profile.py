@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Startup profile for the API worker.
+
+Imports ``main`` in a fresh interpreter with ``python -X importtime`` and
+reports the total import time and the slowest modules (cumulative), then
+times the lifespan startup (optional routers, background jobs). Use it to
+keep cold starts under the platform health-check timeout.
+
+Run from backend/:
+    python scripts/startup_profile.py            # top 25 modules
+    python scripts/startup_profile.py --top 50 --json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Runs in the child interpreter: time the import and the lifespan startup separately
+_CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def _startup():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(_startup())
+print("STARTUP_PROFILE " + json.dumps({
+    "import_ms": round((imported - started) * 1000, 1),
+    "lifespan_ms": round((time.perf_counter() - imported) * 1000, 1),
+    "routes": len(main.app.routes),
+}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """(module, self_us, cumulative_us, depth) for every line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile API worker startup")
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest modules to list")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args()
+
+    env = dict(os.environ, ENABLE_BACKGROUND_JOBS=os.getenv("ENABLE_BACKGROUND_JOBS", "0"))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    summary = {}
+    for line in result.stdout.splitlines():
+        if line.startswith("STARTUP_PROFILE "):
+            summary = json.loads(line[len("STARTUP_PROFILE "):])
+    if result.returncode != 0 or not summary:
+        sys.stderr.write(result.stderr[-4000:])
+        sys.exit(result.returncode or 1)
+
+    rows = parse_importtime(result.stderr)
+    # Project modules are the ones whose source lives in backend/
+    project = {name[:-3] for name in os.listdir(BACKEND_DIR) if name.endswith(".py")}
+    slowest = sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]
+    report = {
+        **summary,
+        "modules_imported": len(rows),
+        "slowest_modules": [
+            {"module": module, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(own / 1000, 1)}
+            for module, own, cumulative, _ in slowest
+        ],
+        "project_modules": [
+            {"module": module, "cumulative_ms": round(cumulative / 1000, 1)}
+            for module, _, cumulative, _ in sorted(rows, key=lambda row: row[2], reverse=True)
+            if module in project
+        ],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"import main: {report['import_ms']} ms ({report['modules_imported']} modules), "
+          f"lifespan startup: {report['lifespan_ms']} ms, routes: {report['routes']}")
+    print(f"\n{'cumulative':>12} {'self':>10}  module")
+    for row in report["slowest_modules"]:
+        print(f"{row['cumulative_ms']:>10} ms {row['self_ms']:>7} ms  {row['module']}")
+    print("\nProject modules:")
+    for row in report["project_modules"]:
+        print(f"{row['cumulative_ms']:>10} ms  {row['module']}")
+
+
+if __name__ == "__main__":
+    main()
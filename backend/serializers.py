@@ -0,0 +1,135 @@
+"""
+Fast JSON path for large list endpoints
+تسريع تحويل القوائم الكبيرة إلى JSON
+
+``FastJSONResponse`` encodes with orjson (datetime, date, UUID and enums are
+handled natively, Decimal through ``_default``), so endpoints can return plain
+dicts holding those values without ``jsonable_encoder`` or per-field
+``isoformat()``/``str()`` calls. ``RowSerializer``/``model_serializer`` turn
+result rows or ORM objects of one query shape into dicts; build them once at
+import time and reuse them for every request.
+
+Without orjson installed the stdlib encoder is used with the same output.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+from uuid import UUID
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _decimal(value: Decimal):
+    # Same as jsonable_encoder: whole numbers stay ints
+    return int(value) if value == value.to_integral_value() else float(value)
+
+
+def _default(value):
+    """Types orjson does not encode natively"""
+    if isinstance(value, Decimal):
+        return _decimal(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return _default(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON (non-ASCII kept as-is, like JSONResponse)"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_stdlib_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; pass prepared dicts, not ORM objects"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RowSerializer:
+    """
+    Converts rows (tuples, SQLAlchemy ``Row``) with a fixed column order into
+    dicts. ``transforms`` maps a field to a function applied to its value, for
+    the few columns that need normalizing (NULL JSON arrays, legacy text).
+    """
+
+    def __init__(self, fields: Sequence[str], transforms: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        self.fields = tuple(fields)
+        unknown = set(transforms or {}) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Transforms for unknown fields: {sorted(unknown)}")
+        self.transforms = tuple((transforms or {}).items())
+
+    def __call__(self, row) -> dict:
+        item = dict(zip(self.fields, row))
+        for field, transform in self.transforms:
+            item[field] = transform(item[field])
+        return item
+
+    def many(self, rows: Iterable) -> List[dict]:
+        return [self(row) for row in rows]
+
+
+class ModelSerializer(RowSerializer):
+    """RowSerializer reading the fields as attributes of ORM objects"""
+
+    def __init__(self, fields: Sequence[str], transforms: Optional[Dict[str, Callable[[Any], Any]]] = None):
+        super().__init__(fields, transforms)
+        getter = attrgetter(*self.fields)
+        self._values = getter if len(self.fields) > 1 else (lambda obj: (getter(obj),))
+
+    def __call__(self, obj) -> dict:
+        return super().__call__(self._values(obj))
+
+
+@lru_cache(maxsize=None)
+def model_serializer(model, fields: Optional[Sequence[str]] = None) -> ModelSerializer:
+    """
+    Serializer for ``model`` instances. ``fields`` defaults to every mapped
+    column, which matches what ``jsonable_encoder`` produced for a loaded
+    ORM object. Cached per (model, fields).
+    """
+    if fields is None:
+        fields = tuple(attr.key for attr in inspect(model).column_attrs)
+    return ModelSerializer(tuple(fields))
+
+
+def empty_list_if_none(value):
+    return [] if value is None else value
+
+
+def zero_if_none(value):
+    return 0 if value is None else value
+
+
+def json_text_to_list(value):
+    """Decode a JSON array stored in a TEXT column; invalid or empty -> []"""
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return []
@@ -0,0 +1,32 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import Session
+
+from audit_service import build_audit_log_row, queue_audit_log, pending_audit_logs
+
+
+def test_build_audit_log_row_parses_json_strings():
+    row = build_audit_log_row({
+        "user_id": 1,
+        "action": "update_capa",
+        "entity_type": "capa",
+        "entity_id": 5,
+        "old_values": '{"status": "pending"}',
+        "new_values": {"status": "closed"},
+    })
+    assert row["old_values"] == {"status": "pending"}
+    assert row["new_values"] == {"status": "closed"}
+    assert row["ip_address"] is None
+
+
+def test_queued_entries_are_discarded_on_rollback():
+    db = Session()
+    queue_audit_log(db, {"user_id": 1, "action": "create_capa", "entity_type": "capa", "entity_id": 1})
+    queue_audit_log(db, {"user_id": 1, "action": "update_capa", "entity_type": "capa", "entity_id": 1})
+    assert [row["action"] for row in pending_audit_logs(db)] == ["create_capa", "update_capa"]
+
+    db.rollback()
+    assert pending_audit_logs(db) == []
+    db.close()
@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from crud_capa_actions import (
+    assignee_actions_query, decode_cursor, encode_cursor, get_actions_by_assignee,
+    get_overdue_actions, overdue_actions_query, action_summary
+)
+from models_updated import CapaAction
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    CapaAction.__table__.create(engine)
+    with Session(engine) as session:
+        now = datetime.now()
+        due_dates = [now - timedelta(days=d) for d in (5, 3, 3, 3, 1)] + [now + timedelta(days=2), None, None]
+        for index, due in enumerate(due_dates):
+            session.add(CapaAction(
+                capa_id=1, action_type="corrective" if index % 2 else "preventive", task=f"task {index}",
+                due_date=due, assigned_to_id=7, status="open"
+            ))
+        session.add(CapaAction(capa_id=1, action_type="corrective", task="done", due_date=now - timedelta(days=9),
+                               assigned_to_id=7, status="completed"))
+        session.commit()
+        yield session
+
+
+def _all_pages(fetch, limit):
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = fetch(cursor, limit)
+        pages += 1
+        seen += [action.id for action in page]
+        if cursor is None:
+            return seen, pages
+
+
+def test_overdue_pages_cover_every_open_action_once_in_order(db):
+    ids, pages = _all_pages(lambda cursor, limit: get_overdue_actions(db, cursor=cursor, limit=limit), 2)
+    assert ids == [1, 2, 3, 4, 5] and pages == 3
+
+    summary = action_summary(overdue_actions_query(db))
+    assert summary == {"total": 5, "overdue": 5, "by_type": {"preventive": 3, "corrective": 2}}
+
+
+def test_assignee_queue_puts_undated_actions_last(db):
+    for limit in (1, 3, 6, 50):
+        ids, _ = _all_pages(lambda cursor, limit: get_actions_by_assignee(db, 7, cursor=cursor, limit=limit), limit)
+        assert ids == [1, 2, 3, 4, 5, 6, 7, 8]
+
+    everything, _ = get_actions_by_assignee(db, 7, status="all")
+    assert everything[0].task == "done"
+    assert action_summary(assignee_actions_query(db, 7))["total"] == 8
+
+
+def test_each_page_is_one_bounded_query(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    _, cursor = get_actions_by_assignee(db, 7, limit=2)
+    page, _ = get_actions_by_assignee(db, 7, cursor=cursor, limit=2)
+    assert [action.id for action in page] == [3, 4]
+    assert len(statements) == 2 and all("LIMIT" in statement for statement in statements)
+
+
+def test_cursor_round_trip_and_rejection():
+    action = CapaAction(id=42, due_date=datetime(2024, 5, 1, 8, 30))
+    assert decode_cursor(encode_cursor(action)) == (datetime(2024, 5, 1, 8, 30), 42)
+    assert decode_cursor(encode_cursor(CapaAction(id=3, due_date=None))) == (None, 3)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
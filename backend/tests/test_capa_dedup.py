@@ -0,0 +1,37 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from datetime import datetime
+
+from migration_004_capa_dedup import choose_survivor, merge_json_lists, merge_status_history
+
+
+def _capa(capa_id, status, history=()):
+    return {"id": capa_id, "status": status, "status_history": json.dumps(list(history))}
+
+
+def test_survivor_is_furthest_along_then_oldest():
+    assert choose_survivor([_capa(1, "PENDING"), _capa(2, "IN_PROGRESS"), _capa(3, "in_progress")])["id"] == 2
+    assert choose_survivor([_capa(4, "pending"), _capa(5, None), _capa(6, "unknown")])["id"] == 4
+    assert choose_survivor([_capa(7, "ASSIGNED"), _capa(8, "closed")])["id"] == 8
+
+
+def test_json_lists_are_concatenated_without_repeats():
+    first = json.dumps([{"task": "تدريب"}, {"task": "مراجعة"}])
+    second = json.dumps([{"task": "مراجعة"}, {"task": "تدقيق"}])
+    assert merge_json_lists(first, second, None, "not json") == [
+        {"task": "تدريب"}, {"task": "مراجعة"}, {"task": "تدقيق"}
+    ]
+
+
+def test_status_history_is_merged_in_time_order_with_a_merge_entry():
+    survivor = _capa(2, "IN_PROGRESS", [{"timestamp": "2024-03-02T10:00:00", "to_status": "in_progress"}])
+    duplicate = _capa(5, "PENDING", [{"timestamp": "2024-03-01T09:00:00", "to_status": "assigned"}])
+    history = merge_status_history(survivor, [duplicate], now=datetime(2024, 4, 1))
+
+    assert [entry["timestamp"] for entry in history] == [
+        "2024-03-01T09:00:00", "2024-03-02T10:00:00", "2024-04-01T00:00:00"
+    ]
+    assert history[-1]["to_status"] == "IN_PROGRESS" and "5" in history[-1]["note"]
@@ -0,0 +1,58 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from models_updated import Capa, CapaAction
+    from crud import get_capa_by_id, get_capas_by_ids
+except ImportError:
+    from backend.models_updated import Capa, CapaAction
+    from backend.crud import get_capa_by_id, get_capas_by_ids
+
+DB_URL = os.getenv('TEST_DATABASE_URL', 'postgresql://postgres@localhost/salamaty_db')
+engine = create_engine(DB_URL)
+SessionLocal = sessionmaker(bind=engine)
+
+
+def test_capa_details_include_grouped_actions_and_progress():
+    db = SessionLocal()
+    capa_ids = []
+    try:
+        for i in range(2):
+            capa = Capa(
+                title=f'Details test CAPA {i}',
+                description='desc',
+                department='عام',
+                created_by_id=59,
+                target_date=datetime.now() + timedelta(days=30),
+                status='pending',
+                verification_status='pending'
+            )
+            capa.actions = [
+                CapaAction(action_type='corrective', task='fix', status='completed'),
+                CapaAction(action_type='preventive', task='prevent', status='open'),
+                CapaAction(action_type='verification', task='verify', status='open'),
+            ]
+            db.add(capa)
+            db.commit()
+            capa_ids.append(capa.id)
+        db.expunge_all()
+
+        capa = get_capa_by_id(db, capa_ids[0])
+        assert len(capa.corrective_actions_from_table) == 1
+        assert capa.verification_steps_from_table[0]['step'] == 'verify'
+        assert capa.actions_progress == {'total': 3, 'completed': 1, 'percentage': 33}
+
+        # Order follows the requested ids, unknown ids are skipped
+        batch = get_capas_by_ids(db, [capa_ids[1], -1, capa_ids[0]])
+        assert [c.id for c in batch] == [capa_ids[1], capa_ids[0]]
+        assert all(c.actions_progress['total'] == 3 for c in batch)
+    finally:
+        db.rollback()
+        db.query(Capa).filter(Capa.id.in_(capa_ids)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
@@ -0,0 +1,90 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from crud import build_capa_values_for_item, create_capa_from_evaluation_item
+from models_updated import Capa, Department, DepartmentManager, Round, User
+from notification_service import NotificationService
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+NOW = datetime(2024, 5, 1, 9, 0)
+
+
+def _values(score, risk_level="MINOR"):
+    item = {"item_id": 7, "item_title": "نظافة اليدين", "item_code": "IC-01", "score": score, "risk_level": risk_level}
+    return build_capa_values_for_item(3, "جولة الطوارئ", "الطوارئ", item, creator_id=1, now=NOW)
+
+
+def test_priority_and_target_date_follow_score_and_risk():
+    assert (_values(0)["priority"], _values(0)["target_date"]) == ("urgent", NOW + timedelta(days=30))
+    assert (_values(50, "CRITICAL")["priority"], _values(50, "CRITICAL")["target_date"]) == ("urgent", NOW + timedelta(days=30))
+    assert (_values(50, "MAJOR")["priority"], _values(50, "MAJOR")["target_date"]) == ("high", NOW + timedelta(days=60))
+    assert (_values(50)["priority"], _values(50)["target_date"]) == ("medium", NOW + timedelta(days=90))
+    assert _values(60)["priority"] == "low"
+
+
+def test_values_are_a_complete_capa_row():
+    values = _values(50)
+    assert values["title"] == "خطة تصحيحية لعنصر: نظافة اليدين (IC-01)"
+    assert "الجولة: جولة الطوارئ" in values["description"]
+    assert values["status"] == "PENDING" and values["risk_score"] == 50
+    assert (values["round_id"], values["evaluation_item_id"], values["department"]) == (3, 7, "الطوارئ")
+
+
+class RecordingService(NotificationService):
+    def __init__(self):
+        super().__init__(db=None)
+        self.calls = []
+
+    def send_bulk_notification(self, **kwargs):
+        self.calls.append(kwargs)
+        return len(kwargs["user_ids"])
+
+
+def test_digest_is_one_notification_per_recipient():
+    service = RecordingService()
+    assert service.send_capa_digest_notification([4, 5], 3, "جولة الطوارئ", 12, "أحمد") == 2
+    assert service.send_capa_digest_notification([4, 5], 3, "جولة الطوارئ", 0) == 0
+
+    (call,) = service.calls
+    assert call["user_ids"] == [4, 5] and call["entity_type"] == "ROUND" and call["entity_id"] == 3
+    assert "12" in call["message"] and "أحمد" in call["message"]
+
+
+def test_conflicting_insert_keeps_the_callers_work(monkeypatch):
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[
+        User.__table__, Department.__table__, DepartmentManager.__table__, Round.__table__, Capa.__table__,
+    ])
+
+    def concurrent_insert(db, values):
+        # Another request inserted the CAPA first: ON CONFLICT DO NOTHING returns no rows
+        db.add(Capa(**values[0]))
+        db.flush()
+        return []
+
+    crud_module = sys.modules[create_capa_from_evaluation_item.__module__]
+    monkeypatch.setattr(crud_module, "insert_evaluation_capas", concurrent_insert)
+    with Session(engine) as db:
+        db.add(User(id=1, username="u1", email="u1@x", hashed_password="-", first_name="U", last_name="1"))
+        db.add(Round(id=3, round_code="R-3", title="جولة", round_type="x", department="الطوارئ",
+                     scheduled_date=datetime(2024, 6, 1), created_by_id=1))
+        db.commit()
+        pending = Department(name="قسم جديد", code="NEW")
+        db.add(pending)
+
+        capa = create_capa_from_evaluation_item(db, 3, {"item_id": 7, "item_title": "نظافة اليدين", "score": 40}, 1)
+        assert (capa.round_id, capa.evaluation_item_id) == (3, 7)
+        assert pending in db and db.query(Department).filter(Department.name == "قسم جديد").count() == 1
@@ -0,0 +1,126 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from crud import (
+    create_department, get_capas_by_department, get_department_manager_ids, get_department_managers,
+    update_department,
+)
+from department_directory import DepartmentDirectory, department_directory
+from models_updated import Capa, Department, DepartmentManager, Round, User
+from schemas import DepartmentCreate
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def test_lookup_by_name_or_id():
+    directory = DepartmentDirectory()
+    directory.load(
+        [(1, "الطوارئ"), (2, "الأشعة"), (3, "الطوارئ")],
+        [(1, 5, "Sara", "Ali", "sara"), (1, 9, "Omar", "", "omar"), (3, 7, "X", "Y", "xy")],
+    )
+    assert directory.manager_ids(None, "الطوارئ") == [5, 9]
+    assert directory.manager_ids(None, 1) == [5, 9]
+    assert directory.manager_labels(None, 1) == ["Sara Ali (sara)", "Omar (omar)"]
+    assert directory.manager_ids(None, 2) == [] and directory.manager_ids(None, "غير موجود") == []
+    assert directory.department_id(None, 42) is None and directory.department_id(None, "") is None
+
+
+def _engine():
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, Department.__table__, DepartmentManager.__table__, Round.__table__, Capa.__table__]
+    User.metadata.create_all(engine, tables=tables)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as db:
+        for user_id in (1, 2, 3):
+            db.add(User(id=user_id, username=f"u{user_id}", email=f"u{user_id}@x", hashed_password="-",
+                        first_name=f"First{user_id}", last_name="Last"))
+        db.commit()
+    return engine, statements
+
+
+def test_writes_sync_rows_and_invalidate_the_directory():
+    engine, statements = _engine()
+    with Session(engine) as db:
+        department = create_department(db, DepartmentCreate(name="الطوارئ", code="-", managers=[2, 1, 99]))
+        assert get_department_manager_ids(db, "الطوارئ") == [1, 2]
+        assert get_department_managers(db, department["id"]) == ["First1 Last (u1)", "First2 Last (u2)"]
+        assert department["managers"] == [2, 1, 99]
+
+        # Repeated lookups are served from memory
+        before = len(statements)
+        for _ in range(50):
+            assert get_department_manager_ids(db, "الطوارئ") == [1, 2]
+        assert len(statements) == before
+
+        update_department(db, department["id"], DepartmentCreate(name="الطوارئ", code="-", managers=[3]))
+        assert get_department_manager_ids(db, "الطوارئ") == [3]
+        assert db.query(DepartmentManager.user_id).all() == [(3,)]
+
+        # Uncommitted changes are not picked up
+        db.query(DepartmentManager).delete()
+        db.rollback()
+        assert get_department_manager_ids(db, department["id"]) == [3]
+    department_directory.invalidate()
+
+
+def test_capas_reference_their_department_by_id():
+    engine, _ = _engine()
+    with Session(engine) as db:
+        er = create_department(db, DepartmentCreate(name="الطوارئ", code="-"))["id"]
+        db.add_all([
+            Capa(title="a", description="-", department="الطوارئ", target_date=datetime(2024, 6, 1), created_by_id=1),
+            Capa(title="b", description="-", department="قسم محذوف", target_date=datetime(2024, 6, 1), created_by_id=1),
+        ])
+        db.commit()
+        assert [(c.title, c.department_id) for c in db.query(Capa).order_by(Capa.id)] == [("a", er), ("b", None)]
+
+        update_department(db, er, DepartmentCreate(name="قسم الطوارئ", code="-"))
+        db.expire_all()
+        assert [(c.title, c.department, c.department_id) for c in get_capas_by_department(db, er)] == [
+            ("a", "قسم الطوارئ", er)
+        ]
+        assert get_capas_by_department(db, "قسم الطوارئ")[0].title == "a"
+        assert get_capas_by_department(db, "الطوارئ") == []
+    department_directory.invalidate()
+
+
+def test_rename_keeps_department_ids():
+    engine, _ = _engine()
+    with engine.begin() as connection:
+        # SQLite stand-in for sync_department_id (migrations/010_department_ids.sql)
+        for table in ("rounds", "capas"):
+            connection.execute(text(f"""
+                CREATE TRIGGER trg_{table}_department_id AFTER UPDATE OF department ON {table}
+                WHEN NEW.department_id IS OLD.department_id
+                BEGIN
+                    UPDATE {table} SET department_id = (
+                        SELECT id FROM departments WHERE name = NEW.department ORDER BY id LIMIT 1
+                    ) WHERE id = NEW.id;
+                END
+            """))
+    # As SessionLocal: nothing is flushed before the bulk updates unless asked to
+    with Session(engine, autoflush=False) as db:
+        er = create_department(db, DepartmentCreate(name="الطوارئ", code="-"))["id"]
+        db.add(Round(round_code="R-1", title="-", round_type="x", department="الطوارئ", department_id=er,
+                     created_by_id=1, scheduled_date=datetime(2024, 6, 1)))
+        db.add(Capa(title="a", description="-", department="الطوارئ", department_id=er,
+                    target_date=datetime(2024, 6, 1), created_by_id=1))
+        db.commit()
+
+        update_department(db, er, DepartmentCreate(name="قسم الطوارئ", code="-"))
+        db.expire_all()
+        assert [(r.department, r.department_id) for r in db.query(Round)] == [("قسم الطوارئ", er)]
+        assert [(c.department, c.department_id) for c in db.query(Capa)] == [("قسم الطوارئ", er)]
+    department_directory.invalidate()
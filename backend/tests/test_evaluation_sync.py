@@ -0,0 +1,92 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from department_directory import department_directory
+from evaluation_sync import sync_round_evaluations
+from models_updated import (
+    Department, DepartmentManager, EvaluationCategory, EvaluationItem, EvaluationResult, EvidenceFile, Round,
+    RoundStatus, User,
+)
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def _change(change_id, item_id, seq, status, **extra):
+    return {"change_id": change_id, "item_id": item_id, "seq": seq, "status": status, **extra}
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, Department.__table__, DepartmentManager.__table__, Round.__table__,
+              EvaluationCategory.__table__, EvaluationItem.__table__, EvaluationResult.__table__, EvidenceFile.__table__]
+    User.metadata.create_all(engine, tables=tables)
+    db = Session(engine)
+    db.add(User(id=1, username="u1", email="u1@x", hashed_password="-", first_name="U", last_name="1"))
+    db.add(EvaluationCategory(id=1, name="c", weight_percent=100))
+    for item_id in (1, 2, 3):
+        db.add(EvaluationItem(id=item_id, code=f"I{item_id}", title="-", category_id=1, category_name="c",
+                              category_color="blue"))
+    db.add(Round(id=1, round_code="R-1", title="-", round_type="x", department="-", created_by_id=1,
+                 scheduled_date=datetime(2024, 6, 1), evaluation_items=[1, 2, 3]))
+    db.commit()
+    return db
+
+
+def test_item_changes_are_applied_once_and_synced_back():
+    db = _session()
+    first_batch = [
+        _change("a1", 1, 1, "applied"),
+        _change("a2", 2, 2, "partial"),
+        _change("a3", 2, 3, "not_applied", mark_needs_capa=True),
+        _change("a4", 99, 4, "applied"),
+    ]
+    result = sync_round_evaluations(db, 1, 1, "tablet-a", None, first_batch)
+    db.commit()
+    assert (result["applied"], result["stale"], result["rejected"]) == (["a1", "a3"], ["a2"], ["a4"])
+    assert (result["compliance_percentage"], result["completion_percentage"]) == (50, 67)
+    assert result["round_status"] == RoundStatus.IN_PROGRESS.value and result["changes"] == []
+    token_a = result["sync_token"]
+
+    # A retry after a lost response writes nothing
+    retry = sync_round_evaluations(db, 1, 1, "tablet-a", None, first_batch)
+    db.commit()
+    assert (retry["applied"], retry["duplicates"], retry["stale"]) == ([], ["a1", "a3"], ["a2"])
+    assert db.query(EvaluationResult).count() == 2
+
+    # A second device pulls everything, then marks item 3
+    pulled = sync_round_evaluations(db, 1, 1, "tablet-b", None, [_change("b1", 3, 1, "na")])
+    db.commit()
+    assert [(r.item_id, r.status) for r in pulled["changes"]] == [(1, "applied"), (2, "not_applied")]
+    assert pulled["changes"][1].needs_capa and pulled["completion_percentage"] == 67
+    b_result_id = pulled["sync_token"]
+
+    # The first device edited item 3 without having seen that: conflict, server version returned
+    stale_edit = sync_round_evaluations(db, 1, 1, "tablet-a", token_a, [_change("a5", 3, 5, "partial")])
+    assert stale_edit["applied"] == [] and stale_edit["conflicts"] == [
+        {"change_id": "a5", "item_id": 3, "server_result_id": b_result_id}
+    ]
+    assert [r.id for r in stale_edit["changes"]] == [b_result_id]
+
+    # Resent on top of the server version, with finalize
+    done = sync_round_evaluations(
+        db, 1, 1, "tablet-a", stale_edit["sync_token"], [_change("a6", 3, 6, "partial", base_id=b_result_id)],
+        finalize=True
+    )
+    db.commit()
+    assert done["applied"] == ["a6"] and done["finalized"] and done["changes"] == []
+    assert (done["compliance_percentage"], done["completion_percentage"]) == (50, 100)
+    assert db.get(Round, 1).status == RoundStatus.COMPLETED
+    assert sync_round_evaluations(db, 404, 1, "tablet-a", None, []) is None
+    db.close()
+    department_directory.invalidate()
@@ -0,0 +1,110 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import base64
+import hashlib
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+import evidence_store
+from evidence_store import (
+    EvidenceError, EvidenceStore, append_chunk, complete_upload, get_upload, has_grant, start_upload,
+    store_inline_evidence, usable_evidence_ids,
+)
+from models_updated import EvaluationResult, EvidenceFile, EvidenceGrant, EvidenceUpload, User
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(evidence_store, "evidence_store", EvidenceStore(root=str(tmp_path)))
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[
+        User.__table__, EvidenceFile.__table__, EvidenceGrant.__table__, EvidenceUpload.__table__,
+        EvaluationResult.__table__,
+    ])
+    with Session(engine) as session:
+        for user_id in (1, 2):
+            session.add(User(id=user_id, username=f"u{user_id}", email=f"u{user_id}@x", hashed_password="-",
+                             first_name="U", last_name=str(user_id)))
+        session.commit()
+        yield session
+
+
+def test_resumable_upload_is_stored_once_per_content(db):
+    content = b"%PDF-1.4 " + bytes(range(256)) * 40
+    upload = start_upload(db, 1, "report.pdf", "application/pdf", len(content))
+    assert append_chunk(upload, 0, content[:4000]) == 4000
+
+    # A retried chunk and a gap are both rejected with the offset to resume from
+    for offset in (0, 5000):
+        with pytest.raises(EvidenceError) as error:
+            append_chunk(upload, offset, content[offset:offset + 100])
+        assert error.value.status_code == 409 and error.value.extra == {"received_bytes": 4000}
+    with pytest.raises(EvidenceError):
+        asyncio.run(complete_upload(db, upload))
+    with pytest.raises(EvidenceError):
+        get_upload(db, upload.id, 2)
+
+    assert append_chunk(get_upload(db, upload.id, 1), 4000, content[4000:]) == len(content)
+    first = asyncio.run(complete_upload(db, upload))
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert (first.sha256, first.size_bytes, first.original_filename) == (sha256, len(content), "report.pdf")
+    with open(evidence_store.evidence_store.blob_path(sha256), "rb") as blob:
+        assert blob.read() == content
+    assert db.query(EvidenceUpload).count() == 0
+
+    # The same content from another user and from an inline data URI reuses the file
+    again = start_upload(db, 2, "copy.pdf", "application/pdf", len(content))
+    append_chunk(again, 0, content)
+    assert asyncio.run(complete_upload(db, again)).id == first.id
+    # ... and both uploaders may use it
+    assert has_grant(db, first.id, 1) and has_grant(db, first.id, 2)
+    data_uri = "data:application/pdf;base64," + base64.b64encode(content).decode()
+    # Content the store does not accept stays inline instead of being lost
+    unsupported = "data:application/x-msdownload;base64," + base64.b64encode(b"MZ").decode()
+    assert store_inline_evidence(db, [data_uri, "/uploads/old.jpg", "data:,x", unsupported], 1) == (
+        [first.id], ["/uploads/old.jpg", "data:,x", unsupported]
+    )
+    assert db.query(EvidenceFile).count() == 1
+    assert os.listdir(os.path.dirname(evidence_store.evidence_store.blob_path(sha256))) == [sha256]
+
+
+def test_upload_limits(db):
+    with pytest.raises(EvidenceError) as error:
+        start_upload(db, 1, "x.exe", "application/x-msdownload", 10)
+    assert error.value.status_code == 415
+    with pytest.raises(EvidenceError) as error:
+        start_upload(db, 1, "huge.mp4", "video/mp4", evidence_store.MAX_EVIDENCE_BYTES + 1)
+    assert error.value.status_code == 413
+    upload = start_upload(db, 1, "a.png", "image/png", 10)
+    with pytest.raises(EvidenceError):
+        append_chunk(upload, 0, b"x" * 11)
+
+
+def _upload(db, user_id, content):
+    upload = start_upload(db, user_id, "photo.pdf", "application/pdf", len(content))
+    append_chunk(upload, 0, content)
+    return asyncio.run(complete_upload(db, upload))
+
+
+def test_only_own_or_round_evidence_is_usable(db):
+    mine, theirs = _upload(db, 1, b"%PDF mine"), _upload(db, 2, b"%PDF theirs")
+    assert usable_evidence_ids(db, 1, 10, [mine.id, theirs.id, 999, True]) == {mine.id}
+    assert not has_grant(db, theirs.id, 1)
+
+    # Evidence another evaluator already attached to the round may be kept by the next one
+    db.add(EvaluationResult(round_id=10, item_id=1, score=100, evidence_ids=[theirs.id], evaluated_by=2))
+    db.commit()
+    assert usable_evidence_ids(db, 1, 10, [mine.id, theirs.id]) == {mine.id, theirs.id}
+    assert usable_evidence_ids(db, 1, 11, [theirs.id]) == set()
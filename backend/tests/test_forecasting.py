@@ -0,0 +1,99 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+from datetime import datetime
+
+import numpy as np
+
+from forecasting import cost_forecast, forecast, performance_summary, smooth, to_matrix
+
+
+def _aggregates(days=120):
+    """Two departments: one improving 0.1 point a day, one flat at 60 %; A opens 2 CAPAs a day"""
+    compliance, due, opened = [], [], []
+    for day in range(days):
+        compliance.append([0, day, 2 * (70 + 0.1 * day), 2])
+        if day % 2 == 0:
+            compliance.append([1, day, 60, 1])
+        due.append([0, day, 4, 3])
+        opened.append([0, day, 2])
+    return {
+        "start": "2024-01-01", "days": days, "departments": ["A", "B"],
+        "compliance": compliance, "due": due, "opened": opened, "cost": [1000.0, None],
+    }
+
+
+def test_smooth_recovers_level_and_trend():
+    days = 90
+    values = np.vstack([50 + 0.2 * np.arange(days), np.full(days, 80.0)])
+    weights = np.ones_like(values)
+    weights[1, ::3] = 0  # missing days do not bias the fit
+    level, slope, observed = smooth(values, weights)
+    assert np.allclose(level, [50 + 0.2 * (days - 1), 80.0])
+    assert np.allclose(slope, [0.2, 0.0], atol=1e-9)
+    assert list(observed) == [90, 60]
+
+
+def test_forecast_per_department_and_overall():
+    aggregates = _aggregates()
+    result = forecast(aggregates, horizon=90)
+
+    improving, flat, overall = 0, 1, 2
+    assert abs(result["compliance_now"][improving] - (70 + 0.1 * 119)) < 1e-6
+    assert result["compliance_forecast"][improving] > result["compliance_now"][improving]
+    assert abs(result["compliance_forecast"][flat] - 60) < 1e-6
+    assert abs(result["compliance_trend"][improving] - 3.0) < 1e-6
+    assert 60 < result["compliance_now"][overall] < result["compliance_now"][improving]
+    assert abs(result["completion_next_month"][overall] - 75.0) < 1e-6
+    assert abs(result["daily_volume"][improving] - 2.0) < 1e-6
+
+    # B has no cost data: priced at the average of the departments that do
+    assert abs(cost_forecast(result, aggregates["cost"], 90) - 2.0 * 90 * 1000.0) < 1e-3
+
+
+def test_forecast_is_fast_on_a_years_aggregates():
+    rng = np.random.default_rng(7)
+    departments, days = 40, 365
+    entries = [[d, t, float(rng.integers(50, 100)), 1.0] for d in range(departments) for t in range(days)]
+    aggregates = {
+        "start": "2024-01-01", "days": days, "departments": [f"D{d}" for d in range(departments)],
+        "compliance": entries, "due": entries, "opened": [row[:3] for row in entries],
+        "cost": [None] * departments,
+    }
+    assert to_matrix(aggregates["compliance"], departments, days, 2).shape == (2, departments + 1, days)
+    started = time.perf_counter()
+    forecast(aggregates, horizon=180)
+    assert time.perf_counter() - started < 0.25
+
+
+class _AggregateSession:
+    """Answers the one performance aggregate; anything else (db.query, ...) fails the test"""
+
+    def __init__(self, row):
+        self.row = row
+        self.statements = []
+
+    def execute(self, statement, params):
+        self.statements.append(str(statement))
+        return self
+
+    def mappings(self):
+        return self
+
+    def one(self):
+        return self.row
+
+
+def test_performance_summary_reads_one_aggregate():
+    db = _AggregateSession({
+        "total": 6, "escalated": 1, "mean_days_to_close": 2.345, "mean_hours_to_first_response": 4.0,
+        "closed": 3, "fixed_first_time": 2,
+    })
+    assert performance_summary(db, datetime(2024, 6, 1), datetime(2024, 7, 1)) == {
+        "total": 6, "escalated": 1, "mean_days_to_close": 2.35, "mean_hours_to_first_response": 4.0,
+        "first_time_fix_rate": 66.67,
+    }
+    # Histories are summarized when written (migrations/018), never parsed per request
+    assert len(db.statements) == 1 and "status_history" not in db.statements[0]
@@ -0,0 +1,122 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+from job_scheduler import Job, JobScheduler, is_transaction_pooled, slot_lock_key
+from models_updated import JobRun, ScheduledJob
+from observability import metrics
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    ScheduledJob.metadata.create_all(engine, tables=[ScheduledJob.__table__, JobRun.__table__])
+    return JobScheduler(engine=engine)
+
+
+def test_schedule_times():
+    now = datetime(2024, 6, 1, 10, 15)
+    daily = Job("daily", lambda db: None, daily_at="09:00")
+    assert daily.next_run_after(now) == datetime(2024, 6, 2, 9, 0)
+    assert daily.next_run_after(datetime(2024, 6, 1, 8, 59)) == datetime(2024, 6, 1, 9, 0)
+    assert daily.first_run(now) == datetime(2024, 6, 2, 9, 0)
+    interval = Job("interval", lambda db: None, every=timedelta(minutes=5))
+    assert (interval.first_run(now), interval.next_run_after(now)) == (now, datetime(2024, 6, 1, 10, 20))
+    with pytest.raises(ValueError):
+        Job("both", lambda db: None, every=timedelta(minutes=5), daily_at="09:00")
+    assert -2 ** 31 <= slot_lock_key("capa_daily", 0) < 2 ** 31
+    assert slot_lock_key("capa_daily", 0) != slot_lock_key("capa_daily", 1)
+
+
+def test_due_run_is_claimed_by_one_worker(scheduler):
+    now = datetime(2024, 6, 1, 10, 0)
+    job = Job("sweep", lambda db: None, every=timedelta(minutes=5))
+    other_worker = JobScheduler(engine=scheduler.engine)
+    for worker in (scheduler, other_worker):
+        worker.register(job)
+    assert scheduler.ensure_jobs(now) == ["sweep"] and other_worker.ensure_jobs(now) == []
+
+    assert [claimed.name for claimed in scheduler.claim_due_jobs(now)] == ["sweep"]
+    assert other_worker.claim_due_jobs(now) == []
+    assert other_worker.claim_due_jobs(now + timedelta(minutes=4)) == []
+    assert [claimed.name for claimed in other_worker.claim_due_jobs(now + timedelta(minutes=5))] == ["sweep"]
+
+
+def test_runs_are_recorded_and_limited(scheduler):
+    metrics.reset()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(db):
+        started.set()
+        release.wait(5)
+        return {"swept": 3}
+
+    def broken(db):
+        raise RuntimeError("boom")
+
+    scheduler.register(Job("slow", slow, every=timedelta(minutes=5)))
+    scheduler.register(Job("broken", broken, daily_at="09:00"))
+    scheduler.ensure_jobs()
+
+    # A second run while the only slot is taken is skipped, not queued
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(scheduler.run_job("slow")))
+    thread.start()
+    assert started.wait(5)
+    assert scheduler.run_job("slow")["status"] == "skipped"
+    release.set()
+    thread.join(5)
+    assert (first["status"], first["result"]) == ("succeeded", {"swept": 3})
+    assert scheduler.run_job("broken", source="cron")["error"] == "RuntimeError: boom"
+
+    with scheduler.engine.connect() as connection:
+        runs = connection.execute(JobRun.__table__.select().order_by(JobRun.id)).fetchall()
+        states = {row.name: row for row in connection.execute(ScheduledJob.__table__.select())}
+    assert [(run.job_name, run.source, run.status) for run in runs] == [
+        ("slow", "manual", "succeeded"), ("slow", "manual", "skipped"), ("broken", "cron", "failed")
+    ]
+    assert (states["slow"].run_count, states["slow"].failure_count, states["slow"].last_status) == (1, 0, "succeeded")
+    assert (states["broken"].failure_count, states["broken"].last_error) == (1, "RuntimeError: boom")
+    assert metrics.counter("job_runs_total", job="slow") == 2
+    assert metrics.counter("job_runs_total", status="failed") == 1
+    metrics.reset()
+
+
+def test_job_writes_are_committed(scheduler):
+    class PostgresLikeScheduler(JobScheduler):
+        def _set_statement_timeout(self, connection, job):
+            # Like set_config on Postgres, leaves the run's connection inside a transaction
+            connection.execute(text("SELECT 1"))
+
+    scheduler = PostgresLikeScheduler(engine=scheduler.engine)
+    scheduler.register(Job("writer", lambda db: db.add(ScheduledJob(name="written", next_run_at=datetime(2024, 6, 1))),
+                           every=timedelta(minutes=5)))
+    assert scheduler.run_job("writer")["status"] == "succeeded"
+    with scheduler.engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM scheduled_jobs WHERE name = 'written'")).scalar() == 1
+
+
+def test_pooled_connections_are_refused():
+    assert is_transaction_pooled("postgresql://u:p@ep-x-pooler.us-east-1.aws.neon.tech/db?sslmode=require")
+    assert is_transaction_pooled("postgresql://u:p@db:6432/app?pgbouncer=true")
+    assert not is_transaction_pooled("postgresql://u:p@ep-x.us-east-1.aws.neon.tech/db?sslmode=require")
+    # Slots are session-level advisory locks, which a transaction pooler would leak
+    scheduler = JobScheduler(engine=create_engine("postgresql+psycopg2://u:p@ep-x-pooler.neon.tech/db"))
+    scheduler.register(Job("sweep", lambda db: None, every=timedelta(minutes=5)))
+    with pytest.raises(RuntimeError):
+        scheduler.run_job("sweep")
+    scheduler.start()
+    assert not scheduler.thread_alive
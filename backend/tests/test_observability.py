@@ -0,0 +1,100 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+
+from fastapi import FastAPI
+from sqlalchemy import create_engine, text
+
+from observability import MetricsRegistry, RequestMetricsMiddleware, install_query_hooks
+
+
+def _build_app(registry, **middleware_options):
+    engine = create_engine("sqlite://")
+    install_query_hooks(engine)
+    install_query_hooks(engine)  # second call must not double count
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        # Sync endpoint: runs in the threadpool, statements still count for this request
+        with engine.connect() as connection:
+            for _ in range(item_id):
+                connection.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    app.add_middleware(RequestMetricsMiddleware, registry=registry, **middleware_options)
+    return app
+
+
+def _get(app, path):
+    messages = []
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [], "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+def test_queries_are_counted_per_route_template(caplog):
+    registry = MetricsRegistry()
+    app = _build_app(registry)
+    with caplog.at_level("INFO", logger="salamaty.requests"):
+        _get(app, "/items/3")
+        _get(app, "/items/1")
+
+    snapshot = registry.snapshot()
+    assert list(snapshot) == ["GET /items/{item_id}"]
+    row = snapshot["GET /items/{item_id}"]
+    assert row["count"] == 2 and row["avg_queries"] == 2.0
+    assert row["avg_bytes"] == len(b'{"id":3}')
+
+    logged = json.loads(caplog.records[0].getMessage())
+    assert logged["route"] == "/items/{item_id}" and logged["queries"] == 3 and logged["status"] == 200
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    app = _build_app(registry)
+    _get(app, "/items/2")
+    _get(app, "/missing")
+
+    body = registry.render_prometheus()
+    assert 'salamaty_http_requests_total{method="GET",route="/items/{item_id}",status="200"} 1' in body
+    assert 'salamaty_http_requests_total{method="GET",route="unmatched",status="404"} 1' in body
+    assert 'salamaty_http_request_db_queries_bucket{method="GET",route="/items/{item_id}",le="1.0"} 0' in body
+    assert 'salamaty_http_request_db_queries_bucket{method="GET",route="/items/{item_id}",le="2.0"} 1' in body
+    assert 'salamaty_http_request_duration_seconds_count{method="GET",route="/items/{item_id}"} 1' in body
+    assert "salamaty_http_requests_in_progress 0" in body
+
+
+def test_application_counters():
+    registry = MetricsRegistry()
+    registry.increment("capa_creations_skipped_total", 3, reason="existing")
+    registry.increment("capa_creations_skipped_total", reason="conflict")
+    registry.increment("capa_creations_skipped_total", 0, reason="conflict")
+
+    assert registry.counter("capa_creations_skipped_total") == 4
+    assert registry.counter("capa_creations_skipped_total", reason="conflict") == 1
+    body = registry.render_prometheus()
+    assert "# TYPE salamaty_capa_creations_skipped_total counter" in body
+    assert 'salamaty_capa_creations_skipped_total{reason="existing"} 3' in body
+
+
+def test_query_count_header_for_load_tests():
+    app = _build_app(MetricsRegistry(), query_count_header=True)
+    start = _get(app, "/items/4")[0]
+    assert (b"x-db-queries", b"4") in start["headers"]
+    start = _get(_build_app(MetricsRegistry()), "/items/4")[0]
+    assert all(name != b"x-db-queries" for name, _ in start["headers"])
@@ -0,0 +1,67 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import csv
+import gzip
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+import partition_maintenance
+from crud import get_audit_logs
+from models_updated import AuditLog, User
+from partition_maintenance import (
+    add_months, month_start, partition_name, parse_partition_month, prune_expired_rows, retention_start,
+)
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def test_add_months_wraps_years():
+    assert add_months(date(2025, 11, 1), 3) == date(2026, 2, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert month_start(datetime(2025, 7, 19, 13, 5)) == date(2025, 7, 1)
+
+
+def test_partition_names_round_trip():
+    name = partition_name("audit_logs", date(2025, 3, 1))
+    assert name == "audit_logs_p202503"
+    assert parse_partition_month("audit_logs", name) == date(2025, 3, 1)
+    # Default partition and other tables' partitions are never archived
+    assert parse_partition_month("audit_logs", "audit_logs_pdefault") is None
+    assert parse_partition_month("notifications", name) is None
+
+
+def test_expired_rows_are_hidden_and_pruned(monkeypatch, tmp_path):
+    monkeypatch.setitem(partition_maintenance.PARTITIONED_TABLES, "audit_logs", 2)
+    assert retention_start("audit_logs", datetime(2025, 3, 19, 13, 5)) == datetime(2025, 1, 1)
+
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[User.__table__, AuditLog.__table__])
+    cutoff = retention_start("audit_logs")
+    with Session(engine) as db:
+        db.add(User(id=1, username="u1", email="u1@x", hashed_password="-", first_name="U", last_name="1"))
+        for days in (-40, -1, 1, 5):
+            db.add(AuditLog(user_id=1, action="x", entity_type="round", created_at=cutoff + timedelta(days=days),
+                            new_values={"days": days}))
+        db.commit()
+        # Without since, reads stop at the retention window
+        assert len(get_audit_logs(db)) == 2
+
+    # Tables that are not partitioned are archived and pruned in batches
+    with Session(engine) as db:
+        pruned, path = prune_expired_rows(db, "audit_logs", batch_size=1, archive_dir=tmp_path)
+    assert pruned == 2
+    with gzip.open(path, "rt", newline="") as archive:
+        rows = list(csv.DictReader(archive))
+    assert [(row["id"], row["new_values"]) for row in rows] == [("1", '{"days": -40}'), ("2", '{"days": -1}')]
+    with Session(engine) as db:
+        assert db.query(AuditLog).count() == 2
+        assert prune_expired_rows(db, "audit_logs", archive_dir=tmp_path) == (0, None)
@@ -0,0 +1,57 @@
+import os
+import sys
+# Insert first: the repository root has an older auth.py that would shadow backend/auth.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+
+import bcrypt
+import pytest
+
+import auth
+from auth import PasswordHasherPool, PasswordPoolBusy, password_needs_rehash
+
+
+def test_rehash_only_when_work_factor_changed(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    hashed = auth.get_password_hash("secret")
+    assert hashed.startswith("$2b$04$")
+    assert not password_needs_rehash(hashed)
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 5)
+    assert password_needs_rehash(hashed)
+    assert not password_needs_rehash("not-a-bcrypt-hash")
+
+
+def test_pool_runs_off_the_event_loop_and_verifies(monkeypatch):
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    hashed = bcrypt.hashpw(b"secret", bcrypt.gensalt(rounds=4)).decode()
+    pool = PasswordHasherPool(workers=2, max_pending=8)
+    loop_thread = threading.get_ident()
+
+    def check(password):
+        assert threading.get_ident() != loop_thread
+        return auth.verify_password(password, hashed)
+
+    async def scenario():
+        return await asyncio.gather(pool.run(check, "secret"), pool.run(check, "wrong"))
+
+    assert asyncio.run(scenario()) == [True, False]
+    stats = pool.stats()
+    assert stats["completed"] == 2 and stats["queue_depth"] == 0
+
+
+def test_pool_rejects_beyond_max_pending():
+    pool = PasswordHasherPool(workers=1, max_pending=1)
+    release = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run(release.wait, 5))
+        await asyncio.sleep(0)
+        with pytest.raises(PasswordPoolBusy):
+            await pool.run(lambda: None)
+        release.set()
+        await first
+
+    asyncio.run(scenario())
+    assert pool.stats()["rejected"] == 1
@@ -0,0 +1,142 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from models_updated import StreamTicket, User
+from realtime import (
+    EventBroker, MAX_NOTIFY_PAYLOAD, STREAM_TICKET_SECONDS, build_event, encode_notify_payload, format_sse,
+    issue_stream_ticket, redeem_stream_ticket,
+)
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def test_events_reach_only_the_target_user():
+    async def scenario():
+        broker = EventBroker(backend="memory")
+        mine = broker.subscribe(1)
+        other = broker.subscribe(2)
+        # Publishers run in worker threads (sync endpoints, services)
+        thread = threading.Thread(target=broker.publish, args=("unread_count", {"unread_count": 3}, 1))
+        thread.start()
+        thread.join()
+        envelope = await asyncio.wait_for(mine.get(), timeout=1)
+        assert envelope == build_event("unread_count", {"unread_count": 3}, 1)
+        assert other.empty()
+
+        broker.publish("alert", {"id": 9})
+        assert (await asyncio.wait_for(mine.get(), timeout=1))["data"] == {"id": 9}
+        assert (await asyncio.wait_for(other.get(), timeout=1))["data"] == {"id": 9}
+
+        broker.unsubscribe(1, mine)
+        broker.unsubscribe(2, other)
+        assert broker.connection_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_large_payloads_are_reduced_to_the_entity_id():
+    envelope = build_event("notification", {"id": 5, "message": "م" * MAX_NOTIFY_PAYLOAD}, 1)
+    payload = json.loads(encode_notify_payload(envelope))
+    assert payload["data"] == {"id": 5, "partial": True}
+    assert payload["user_id"] == 1
+
+
+def test_format_sse_frame():
+    assert format_sse("unread_count", {"unread_count": 2}) == 'event: unread_count\ndata: {"unread_count": 2}\n\n'
+
+
+def test_publish_many_delivers_each_event():
+    async def scenario():
+        broker = EventBroker(backend="memory")
+        queue = broker.subscribe(7)
+        broker.publish_many([("notification", {"id": 1}, 7), ("unread_count", {"unread_count": 1}, 7)])
+        first = await asyncio.wait_for(queue.get(), timeout=1)
+        second = await asyncio.wait_for(queue.get(), timeout=1)
+        assert [first["event"], second["event"]] == ["notification", "unread_count"]
+
+    asyncio.run(scenario())
+
+
+def test_stream_ticket_is_single_use_and_expires():
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[User.__table__, StreamTicket.__table__])
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    with Session(engine) as db:
+        db.add(User(id=1, username="u1", email="u1@x", hashed_password="-", first_name="First", last_name="Last"))
+        db.commit()
+        ticket = issue_stream_ticket(db, 1, now=now)
+        assert ticket not in {row.ticket_hash for row in db.query(StreamTicket)}
+        assert redeem_stream_ticket(db, ticket, now=now) == 1
+        assert redeem_stream_ticket(db, ticket, now=now) is None
+
+        stale = issue_stream_ticket(db, 1, now=now)
+        assert redeem_stream_ticket(db, stale, now=now + timedelta(seconds=STREAM_TICKET_SECONDS + 1)) is None
+        assert redeem_stream_ticket(db, "unknown", now=now) is None
+        # Issuing a ticket clears the expired ones
+        issue_stream_ticket(db, 1, now=now + timedelta(hours=1))
+        assert db.query(StreamTicket).count() == 1
+
+
+class _FakeCursor:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def execute(self, sql, params):
+        self.calls.append(params)
+
+    def close(self):
+        pass
+
+
+class _FakeRawConnection:
+    def __init__(self, calls):
+        self.driver_connection = self
+        self.autocommit = False
+        self.closed = False
+        self.calls = calls
+
+    def detach(self):
+        pass
+
+    def cursor(self):
+        return _FakeCursor(self.calls)
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.connections = []
+        self.calls = []
+
+    def raw_connection(self):
+        connection = _FakeRawConnection(self.calls)
+        self.connections.append(connection)
+        return connection
+
+
+def test_publish_reuses_one_notify_connection():
+    engine = _FakeEngine()
+    broker = EventBroker(backend="postgres", engine=engine)
+    broker.publish("alert", {"id": 1})
+    broker.publish("alert", {"id": 2}, 3)
+    broker.publish_many([("notification", {"id": 4}, 3), ("unread_count", {"unread_count": 1}, 3)])
+    assert len(engine.connections) == 1 and engine.connections[0].autocommit
+    assert [len(payloads) for _, payloads in engine.calls] == [1, 1, 2]
+    broker.stop()
+    assert engine.connections[0].closed
@@ -0,0 +1,36 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.recurrence import MAX_OCCURRENCES, expand_recurrence
+
+
+def test_monthly_clamps_to_month_end_and_keeps_day():
+    dates = expand_recurrence("monthly", datetime(2026, 1, 31, 9, 0), count=4)
+    assert dates == [datetime(2026, 1, 31, 9, 0), datetime(2026, 2, 28, 9, 0),
+                     datetime(2026, 3, 31, 9, 0), datetime(2026, 4, 30, 9, 0)]
+
+
+def test_weekly_interval_until_is_inclusive():
+    dates = expand_recurrence("weekly", datetime(2026, 3, 2), interval=2, until=datetime(2026, 3, 30))
+    assert dates == [datetime(2026, 3, 2), datetime(2026, 3, 16), datetime(2026, 3, 30)]
+
+
+def test_invalid_rules_are_rejected():
+    with pytest.raises(ValueError):
+        expand_recurrence("yearly", datetime(2026, 1, 1), count=1)
+    with pytest.raises(ValueError):
+        expand_recurrence("daily", datetime(2026, 1, 1))
+    # Too many occurrences is an error rather than a silently shorter schedule
+    with pytest.raises(ValueError):
+        expand_recurrence("daily", datetime(2026, 1, 1), count=MAX_OCCURRENCES + 1)
+    with pytest.raises(ValueError):
+        expand_recurrence("daily", datetime(2026, 1, 1), until=datetime(2028, 1, 1))
+    assert len(expand_recurrence("daily", datetime(2026, 1, 1), count=MAX_OCCURRENCES)) == MAX_OCCURRENCES
+    # Aware and naive datetimes cannot be compared
+    with pytest.raises(ValueError):
+        expand_recurrence("daily", datetime(2026, 1, 1, tzinfo=timezone.utc), until=datetime(2026, 1, 5))
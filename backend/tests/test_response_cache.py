@@ -0,0 +1,107 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+import time
+
+from sqlalchemy import Column, Integer, String, create_engine, update
+from sqlalchemy.orm import Session, declarative_base
+
+from response_cache import MISSING, MemoryBackend, ResponseCache, response_cache
+
+
+def test_entries_are_keyed_by_params_and_invalidated_by_tag():
+    cache = ResponseCache(MemoryBackend())
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return {"value": value}
+
+    assert cache.get_or_compute("stats", lambda: compute(1), tags=("rounds",), params={"months": 6}) == {"value": 1}
+    assert cache.get_or_compute("stats", lambda: compute(2), tags=("rounds",), params={"months": 6}) == {"value": 1}
+    assert cache.get_or_compute("stats", lambda: compute(3), tags=("rounds",), params={"months": 3}) == {"value": 3}
+
+    cache.invalidate("capas")
+    assert cache.get_or_compute("stats", lambda: compute(4), tags=("rounds",), params={"months": 6}) == {"value": 1}
+    cache.invalidate("rounds")
+    assert cache.get_or_compute("stats", lambda: compute(5), tags=("rounds",), params={"months": 6}) == {"value": 5}
+    assert calls == [1, 3, 5]
+    assert cache.stats()["hits"] == 2
+
+
+def test_memory_backend_expires_and_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1, ttl=60)
+    backend.set("b", 2, ttl=60)
+    backend.get("a")
+    backend.set("c", 3, ttl=60)
+    assert backend.get("a") == 1 and backend.get("c") == 3
+    assert backend.get("b") is MISSING and len(backend) == 2
+
+    backend.set("short", 4, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get("short") is MISSING
+
+
+def test_concurrent_misses_compute_once():
+    cache = ResponseCache(MemoryBackend())
+    computations = []
+    start = threading.Barrier(20)
+    results = []
+
+    def compute():
+        computations.append(1)
+        time.sleep(0.05)
+        return {"total": 42}
+
+    def request():
+        start.wait()
+        results.append(cache.get_or_compute("dashboard", compute, tags=("capas",)))
+
+    threads = [threading.Thread(target=request) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(computations) == 1
+    assert results == [{"total": 42}] * 20
+
+
+Base = declarative_base()
+
+
+class Widget(Base):
+    __tablename__ = "widgets"
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+def test_committed_writes_invalidate_their_tables():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    backend = response_cache.backend
+    assert backend is not None
+
+    def version():
+        return backend.tag_versions(["widgets"])[0]
+
+    before = version()
+    with Session(engine) as db:
+        db.add(Widget(name="a"))
+        db.flush()
+        db.rollback()
+    assert version() == before
+
+    with Session(engine) as db:
+        db.add(Widget(name="b"))
+        db.commit()
+    assert version() == before + 1
+
+    # Bulk statements bypass the flush
+    with Session(engine) as db:
+        db.execute(update(Widget).values(name="c"))
+        db.commit()
+    assert version() == before + 2
@@ -0,0 +1,99 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+try:
+    from models_updated import Round, User
+    from crud import create_round, create_rounds_bulk, resolve_round_assignees
+    from schemas import RoundCreate
+except ImportError:
+    from backend.models_updated import Round, User
+    from backend.crud import create_round, create_rounds_bulk, resolve_round_assignees
+    from backend.schemas import RoundCreate
+
+DB_URL = os.getenv('TEST_DATABASE_URL', 'postgresql://postgres@localhost/salamaty_db')
+engine = create_engine(DB_URL)
+SessionLocal = sessionmaker(bind=engine)
+
+
+def _count_queries(statements):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    return before_cursor_execute
+
+
+def test_round_with_many_assessors_resolves_assignees_in_one_query():
+    db = SessionLocal()
+    round_id = None
+    users = db.query(User).order_by(User.id).limit(15).all()
+    try:
+        ids = [u.id for u in users]
+        names = [f"{u.first_name} {u.last_name}" for u in users]
+
+        # IDs and names resolve to the same users; unknown IDs are dropped
+        assert resolve_round_assignees(db, [str(i) for i in ids] + ['-1']) == (ids, names)
+        assert resolve_round_assignees(db, names[:2])[0] == ids[:2]
+
+        statements = []
+        listener = _count_queries(statements)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            created = create_round(db, RoundCreate(
+                title='Assignee resolution test',
+                round_type='patient_safety',
+                department='عام',
+                assigned_to=[str(i) for i in ids],
+                scheduled_date=datetime.now() + timedelta(days=1),
+            ), users[0].id)
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+        round_id = created.id
+
+        assert created.assigned_to_ids == ids
+        assert created.round_code.startswith('RND-')
+        # users IN (...), nextval, INSERT, refresh - independent of the number of assessors
+        assert len(statements) <= 5
+    finally:
+        db.rollback()
+        if round_id:
+            db.query(Round).filter(Round.id == round_id).delete(synchronize_session=False)
+            db.commit()
+        db.close()
+
+
+def test_bulk_schedule_inserts_every_department_and_date_in_one_statement():
+    db = SessionLocal()
+    created = []
+    users = db.query(User).order_by(User.id).limit(3).all()
+    try:
+        occurrences = [datetime(2030, month, 1, 8, 0) for month in (1, 2, 3)]
+        statements = []
+        listener = _count_queries(statements)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            created, assessor_ids = create_rounds_bulk(db, {
+                'title': 'جولة {department} {date}',
+                'round_type': 'patient_safety',
+                'assigned_to': [u.id for u in users],
+                'deadline_days': 7,
+            }, ['ICU', 'ER'], occurrences, users[0].id)
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        assert len(created) == 6 and len({code for _, code in created}) == 6
+        assert assessor_ids == [u.id for u in users]
+        # assignees, round codes, one multi-row INSERT
+        assert len([s for s in statements if s.lstrip().upper().startswith('INSERT')]) == 1
+        first = db.query(Round).filter(Round.id == created[0][0]).one()
+        assert first.title == 'جولة ICU 2030-01-01'
+        assert first.deadline.day == 8
+    finally:
+        db.rollback()
+        if created:
+            db.query(Round).filter(Round.id.in_([round_id for round_id, _ in created])).delete(synchronize_session=False)
+            db.commit()
+        db.close()
@@ -0,0 +1,71 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+
+from crud import get_round_capa_summaries, get_round_capa_summary
+from department_directory import department_directory
+from models_updated import Capa, Department, DepartmentManager, EvaluationResult, Round, User
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+def _round(round_id):
+    return Round(id=round_id, round_code=f"R-{round_id}", title=f"round {round_id}", round_type="x",
+                 department="-", scheduled_date=datetime(2024, 6, 1), created_by_id=1)
+
+
+def _result(round_id, item_id, score, needs_capa=False):
+    return EvaluationResult(round_id=round_id, item_id=item_id, score=score, needs_capa=needs_capa, evaluated_by=1)
+
+
+def _capa(round_id, item_id, status):
+    return Capa(title="-", description="-", department="-", round_id=round_id, evaluation_item_id=item_id,
+                status=status, target_date=datetime(2024, 7, 1), created_by_id=1)
+
+
+def test_summaries_for_many_rounds_in_constant_queries(monkeypatch):
+    # No migration 011 on SQLite: the grouped fallback computes the same counters
+    # (patched where the function lives: "crud" may be the repo-root re-export shim)
+    monkeypatch.setattr(sys.modules[get_round_capa_summaries.__module__], "_round_counters_installed", False)
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, Department.__table__, DepartmentManager.__table__, Round.__table__,
+              Capa.__table__, EvaluationResult.__table__]
+    User.metadata.create_all(engine, tables=tables)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    with Session(engine) as db:
+        db.add(User(id=1, username="u1", email="u1@x", hashed_password="-", first_name="U", last_name="1"))
+        db.add_all([_round(1), _round(2), _round(3)])
+        db.add_all([
+            # Item 10 was re-scored: only the latest result counts
+            _result(1, 10, 40), _result(1, 10, 90), _result(1, 11, 50), _result(1, 12, 80, needs_capa=True),
+            _result(1, 13, 20), _result(2, 10, 95),
+        ])
+        db.add_all([_capa(1, 11, "IN_PROGRESS"), _capa(1, 13, "VERIFIED"), _capa(2, None, "pending")])
+        db.commit()
+
+        before = len(statements)
+        summaries = get_round_capa_summaries(db, [3, 1, 2, 1, 404])
+        assert len(statements) - before <= 3
+        assert summaries[1] == {
+            "evaluated_items": 4, "non_compliant_items": 2, "needs_capa_items": 1, "capas_needed": 1,
+            "open_capas": 1, "closed_capas": 1, "total_capas": 2,
+        }
+        assert summaries[2]["evaluated_items"] == 1 and summaries[2]["open_capas"] == 1
+        assert summaries[3] == dict.fromkeys(summaries[3], 0)
+        assert 404 not in summaries and get_round_capa_summaries(db, []) == {}
+
+        summary = get_round_capa_summary(db, 1)
+        assert (summary["total_evaluations"], summary["non_compliant_evaluations"], summary["capas_needed"]) == (4, 2, 1)
+        assert sorted(summary["capa_by_status"]) == ["IN_PROGRESS", "VERIFIED"]
+    department_directory.invalidate()
@@ -0,0 +1,55 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+import serializers
+from models_updated import Capa, Round, RoundStatus, User
+from serializers import FastJSONResponse, RowSerializer, dumps, json_text_to_list, model_serializer
+
+
+def _round(i):
+    return Round(
+        id=i, round_code=f"RND-2025-{i:06d}", title="جولة سلامة", round_type="patient_safety",
+        department="ICU", department_id=None, assigned_to="[1, 2]", assigned_to_ids=[1, 2], status=RoundStatus.SCHEDULED,
+        scheduled_date=datetime(2025, 1, 2, 8, 30), created_at=datetime(2025, 1, 1, 9, 0, 0, 125000),
+        evaluation_items=[3], selected_categories=[], compliance_percentage=0, completion_percentage=0,
+        # Loaded rows carry every column; transient objects only what was set
+        description=None, deadline=None, end_date=None, priority="medium", notes=None,
+        score_details=None, created_by_id=1,
+    )
+
+
+def test_model_serializer_matches_jsonable_encoder():
+    rounds = [_round(i) for i in range(1, 4)]
+    fast = json.loads(FastJSONResponse(model_serializer(Round).many(rounds)).body)
+    assert fast == jsonable_encoder(rounds)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_native_types_encode_like_the_default_path(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serializers, "orjson", None)
+    capa = Capa(id=1, title="t", estimated_cost=Decimal("1500"), target_date=datetime(2025, 3, 1))
+    payload = model_serializer(Capa, ("id", "estimated_cost", "target_date")).many([capa])
+    assert json.loads(dumps(payload)) == jsonable_encoder(payload)
+    assert json.loads(dumps({"cost": Decimal("12.5")})) == {"cost": 12.5}
+    assert dumps({"name": "سلامتي"}) == '{"name":"سلامتي"}'.encode()
+
+
+def test_row_serializer_transforms_and_field_subset():
+    serializer = RowSerializer(("id", "steps"), transforms={"steps": json_text_to_list})
+    assert serializer.many([(1, '["a"]'), (2, None), (3, "not json")]) == [
+        {"id": 1, "steps": ["a"]}, {"id": 2, "steps": []}, {"id": 3, "steps": []},
+    ]
+    with pytest.raises(ValueError):
+        RowSerializer(("id",), transforms={"missing": str})
+
+    user = User(id=1, username="u", email="u@x", hashed_password="secret", first_name="a", last_name="b")
+    assert "hashed_password" not in model_serializer(User, ("id", "username", "email"))(user)
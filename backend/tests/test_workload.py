@@ -0,0 +1,97 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import Session
+
+from models_updated import Capa, CapaAction, Department, DepartmentManager, User
+from workload import WorkloadIndex, due_weight, workload_index
+
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def test_due_and_severity_weights_rank_users():
+    assert due_weight(NOW - timedelta(days=1), NOW) == 2.0
+    assert due_weight(NOW + timedelta(days=3), NOW) == 1.5
+    assert due_weight(NOW + timedelta(days=30), NOW) == 1.0 == due_weight(None, NOW)
+
+    index = WorkloadIndex()
+    far = datetime.now(timezone.utc) + timedelta(days=60)
+    index.load([
+        (1, 10, far, 1, 3), (2, 10, far, 1, 3),  # two ordinary actions: score 2
+        (3, 11, far, 2, 6),                       # one severe action: score 2, fewer open
+        (4, 12, far, 1, 3), (5, 12, far, 1, 3), (6, 12, far, 1, 3),
+    ])
+    assert index.least_loaded("ICU", [10, 11, 12]) == 11
+    assert index.least_loaded("ICU", [10, 12, 13]) == 13  # no open actions at all
+    assert index.snapshot([12, 10])[0]["user_id"] == 10
+
+
+def test_least_loaded_matches_brute_force_under_updates():
+    rng = random.Random(3)
+    index = WorkloadIndex()
+    index.load([])
+    users = list(range(1, 21))
+    assigned = {}
+    for step in range(2000):
+        action_id = rng.randint(1, 300)
+        if rng.random() < 0.3:
+            row = None
+        else:
+            row = (rng.choice(users), "open", None, 1, rng.randint(1, 5))
+        index.apply({action_id: row})
+        assigned[action_id] = row
+        if step % 50 == 0:
+            department = "D%d" % (step % 3)
+            eligible = users[step % 3::3]
+            scores = {u: 0.0 for u in eligible}
+            counts = {u: 0 for u in eligible}
+            for row in assigned.values():
+                if row and row[0] in scores:
+                    scores[row[0]] += row[4] / 3
+                    counts[row[0]] += 1
+            expected = min(eligible, key=lambda u: (round(scores[u], 6), counts[u], u))
+            assert index.least_loaded(department, eligible) == expected
+    assert all(len(pool.heap) <= 4 * len(pool.members) + 16 for pool in index._pools.values())
+
+
+def test_committed_action_writes_update_the_index():
+    engine = create_engine("sqlite://")
+    # Flushing a CAPA resolves its department_id through the department directory
+    for model in (User, Department, DepartmentManager, Capa, CapaAction):
+        model.__table__.create(engine)
+    with Session(engine) as db:
+        db.add(Capa(id=1, title="t", description="d", department="ICU", target_date=NOW, created_by_id=1, severity=3))
+        db.commit()
+        workload_index.refresh(db)
+        loaded_at = workload_index._loaded_at
+
+        action = CapaAction(capa_id=1, action_type="corrective", task="a", assigned_to_id=5, status="open")
+        db.add(action)
+        db.flush()
+        db.rollback()
+        assert workload_index.load_of(5)["open_actions"] == 0
+
+        action = CapaAction(capa_id=1, action_type="corrective", task="a", assigned_to_id=5, status="open")
+        db.add(action)
+        db.commit()
+        assert workload_index.load_of(5)["open_actions"] == 1
+
+        action.assigned_to_id = 6
+        db.commit()
+        assert workload_index.load_of(5)["open_actions"] == 0
+        assert workload_index.load_of(6)["open_actions"] == 1
+
+        action.status = "completed"
+        db.commit()
+        assert workload_index.load_of(6)["open_actions"] == 0
+        assert workload_index._loaded_at == loaded_at and not workload_index.stale
+
+        db.execute(delete(CapaAction))
+        db.commit()
+        assert workload_index.stale
@@ -0,0 +1,65 @@
+"""
+Recurrence rules for scheduled rounds
+توليد مواعيد الجولات الدورية (يومي / أسبوعي / شهري)
+"""
+import calendar
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+FREQUENCIES = ("daily", "weekly", "monthly")
+
+# Upper bound on occurrences generated from a single rule
+MAX_OCCURRENCES = 366
+
+
+def _add_months(value: datetime, months: int, day: int) -> datetime:
+    """Shift by whole months keeping ``day`` (clamped to the month's last day, e.g. 31 -> 30/28)"""
+    index = value.year * 12 + (value.month - 1) + months
+    year, month = index // 12, index % 12 + 1
+    return value.replace(year=year, month=month, day=min(day, calendar.monthrange(year, month)[1]))
+
+
+def expand_recurrence(
+    frequency: str,
+    start_date: datetime,
+    interval: int = 1,
+    until: Optional[datetime] = None,
+    count: Optional[int] = None,
+) -> List[datetime]:
+    """
+    حساب مواعيد التكرار
+
+    Returns the occurrence datetimes from ``start_date`` (inclusive) every
+    ``interval`` days/weeks/months, stopping at ``until`` (inclusive) or after
+    ``count`` occurrences. One of ``until``/``count`` is required.
+    Rules yielding more than MAX_OCCURRENCES dates are rejected, not truncated.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unsupported frequency '{frequency}', expected one of {FREQUENCIES}")
+    if interval < 1:
+        raise ValueError("interval must be at least 1")
+    if until is None and count is None:
+        raise ValueError("Either until or count is required")
+    if count is not None and count > MAX_OCCURRENCES:
+        raise ValueError(f"count must be at most {MAX_OCCURRENCES}")
+    if until is not None and (start_date.tzinfo is None) != (until.tzinfo is None):
+        raise ValueError("start_date and until must both have a timezone or both have none")
+    limit = count if count is not None else MAX_OCCURRENCES
+
+    occurrences = []
+    step = 0
+    while True:
+        if frequency == "monthly":
+            occurrence = _add_months(start_date, step * interval, start_date.day)
+        else:
+            days = interval * (7 if frequency == "weekly" else 1)
+            occurrence = start_date + timedelta(days=step * days)
+        if until is not None and occurrence > until:
+            break
+        if len(occurrences) == limit:
+            if count is None:
+                raise ValueError(f"The rule yields more than {MAX_OCCURRENCES} occurrences before until")
+            break
+        occurrences.append(occurrence)
+        step += 1
+    return occurrences
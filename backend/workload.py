@@ -0,0 +1,309 @@
+"""
+Workload index - open CAPA action load per user, for balanced assignment
+مؤشر عبء العمل: عدد الإجراءات المفتوحة لكل مستخدم لاختيار الأقل عبئاً عند الإسناد
+
+Every open, assigned row of capa_actions contributes to its assignee's load:
+
+* ``open_actions``  - one per action
+* ``severity_load`` - the parent CAPA's severity (1-5, default 3) / 3
+* ``due_load``      - 2.0 overdue, 1.5 due within DUE_SOON_DAYS, else 1.0
+* ``score``         - severity weight x due weight, what assignment ranks on
+
+The index is loaded from the database once and then kept current from the
+ORM writes to capa_actions: changes recorded in ``after_flush`` are applied
+when the session commits and dropped on rollback, so uncommitted work never
+counts. Bulk statements on the table (``query.delete()``, ``update()``)
+cannot be replayed and mark the index stale instead. The due weight depends
+on the clock, and other workers write too, so the whole index is rebuilt
+every WORKLOAD_REFRESH_SECONDS.
+
+Each department (by id) keeps a heap of its eligible users, its managers
+in the department directory; load changes push a new entry and the
+superseded one is skipped when it reaches the top, so picking the least
+loaded user is O(log n).
+"""
+
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import chain
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from department_directory import DepartmentRef, department_directory
+from models_updated import Capa, CapaAction
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("WORKLOAD_REFRESH_SECONDS", "300"))
+DUE_SOON_DAYS = 7
+DEFAULT_SEVERITY = 3
+CLOSED_STATUSES = ("completed", "cancelled")
+
+_PENDING_KEY = "pending_workload_changes"
+_STALE_KEY = "workload_index_stale"
+
+
+def severity_weight(severity: Optional[int]) -> float:
+    return (severity or DEFAULT_SEVERITY) / DEFAULT_SEVERITY
+
+
+def due_weight(due_date: Optional[datetime], now: Optional[datetime] = None) -> float:
+    if due_date is None:
+        return 1.0
+    if now is None:
+        now = datetime.now(timezone.utc)
+    if due_date.tzinfo is None:
+        due_date = due_date.replace(tzinfo=now.tzinfo)
+    if due_date < now:
+        return 2.0
+    if due_date <= now + timedelta(days=DUE_SOON_DAYS):
+        return 1.5
+    return 1.0
+
+
+class UserLoad:
+    __slots__ = ("open_actions", "severity_load", "due_load", "score")
+
+    def __init__(self):
+        self.open_actions = 0
+        self.severity_load = 0.0
+        self.due_load = 0.0
+        self.score = 0.0
+
+    def add(self, severity: float, due: float, sign: int = 1):
+        self.open_actions += sign
+        self.severity_load += sign * severity
+        self.due_load += sign * due
+        self.score += sign * severity * due
+
+    def as_dict(self) -> dict:
+        return {
+            "open_actions": self.open_actions,
+            "severity_load": round(self.severity_load, 2),
+            "due_load": round(self.due_load, 2),
+            "score": round(self.score, 2),
+        }
+
+
+class _Pool:
+    """Lazy-deletion min-heap of one department's eligible users"""
+    __slots__ = ("members", "heap")
+
+    def __init__(self, members: FrozenSet[int]):
+        self.members = members
+        self.heap: List[Tuple[float, int, int, int]] = []
+
+
+class WorkloadIndex:
+    """Per-user open-load counters of this worker process"""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._loads: Dict[int, UserLoad] = {}
+        self._versions: Dict[int, int] = {}
+        # action id -> (user id, severity weight, due weight) currently counted
+        self._actions: Dict[int, Tuple[int, float, float]] = {}
+        self._capa_severity: Dict[int, int] = {}
+        self._pools: Dict[int, _Pool] = {}
+        self._user_pools: Dict[int, set] = {}
+        self._loaded_at: Optional[float] = None
+        self.stale = True
+
+    # -- loading ---------------------------------------------------------
+    def load(self, rows: Iterable[Tuple[int, Optional[int], Optional[datetime], Optional[int], Optional[int]]]):
+        """Replace the index with (action id, assignee id, due date, capa id, capa severity) rows"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._loads.clear()
+            self._actions.clear()
+            self._capa_severity.clear()
+            self._pools.clear()
+            self._user_pools.clear()
+            for action_id, user_id, due_date, capa_id, severity in rows:
+                if capa_id is not None and severity is not None:
+                    self._capa_severity[capa_id] = severity
+                if user_id is not None:
+                    self._count(action_id, user_id, severity_weight(severity), due_weight(due_date, now))
+            self._versions = {user_id: self._versions.get(user_id, 0) + 1 for user_id in self._loads}
+            self._loaded_at = time.monotonic()
+            self.stale = False
+
+    def refresh(self, db: Session):
+        rows = db.query(
+            CapaAction.id, CapaAction.assigned_to_id, CapaAction.due_date, Capa.id, Capa.severity
+        ).join(Capa, Capa.id == CapaAction.capa_id).filter(
+            ~CapaAction.status.in_(CLOSED_STATUSES),
+            CapaAction.assigned_to_id.isnot(None)
+        ).all()
+        self.load(rows)
+        logger.debug("workload index loaded: %s open actions, %s users", len(self._actions), len(self._loads))
+
+    def ensure_fresh(self, db: Session):
+        expired = self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+        if self.stale or expired:
+            self.refresh(db)
+
+    # -- incremental updates ---------------------------------------------
+    def _count(self, action_id: int, user_id: int, severity: float, due: float):
+        self._actions[action_id] = (user_id, severity, due)
+        self._loads.setdefault(user_id, UserLoad()).add(severity, due)
+
+    def _uncount(self, action_id: int) -> Optional[int]:
+        previous = self._actions.pop(action_id, None)
+        if previous is None:
+            return None
+        user_id, severity, due = previous
+        self._loads[user_id].add(severity, due, sign=-1)
+        return user_id
+
+    def apply(self, changes: Dict[int, Optional[tuple]]):
+        """Apply committed rows: action id -> (assignee id, status, due date, capa id, severity) or None if deleted"""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            touched = set()
+            for action_id, row in changes.items():
+                touched.add(self._uncount(action_id))
+                if row is None:
+                    continue
+                user_id, status, due_date, capa_id, severity = row
+                if severity is None:
+                    severity = self._capa_severity.get(capa_id)
+                elif capa_id is not None:
+                    self._capa_severity[capa_id] = severity
+                if user_id is not None and status not in CLOSED_STATUSES:
+                    self._count(action_id, user_id, severity_weight(severity), due_weight(due_date, now))
+                    touched.add(user_id)
+            touched.discard(None)
+            for user_id in touched:
+                self._reprioritize(user_id)
+
+    def _reprioritize(self, user_id: int):
+        version = self._versions.get(user_id, 0) + 1
+        self._versions[user_id] = version
+        load = self._loads.get(user_id)
+        for department in self._user_pools.get(user_id, ()):
+            pool = self._pools[department]
+            heapq.heappush(pool.heap, self._entry(user_id, load, version))
+            if len(pool.heap) > 4 * len(pool.members) + 16:
+                self._rebuild_pool(pool)
+
+    # -- queries ---------------------------------------------------------
+    def _entry(self, user_id: int, load: Optional[UserLoad], version: int):
+        # Rounded so float drift from +/- updates cannot break ties
+        return (round(load.score, 6) if load else 0.0, load.open_actions if load else 0, user_id, version)
+
+    def _rebuild_pool(self, pool: _Pool):
+        pool.heap = [self._entry(u, self._loads.get(u), self._versions.get(u, 0)) for u in pool.members]
+        heapq.heapify(pool.heap)
+
+    def _pool(self, department: int, members: FrozenSet[int]) -> _Pool:
+        pool = self._pools.get(department)
+        if pool is None or pool.members != members:
+            if pool is not None:
+                for user_id in pool.members - members:
+                    self._user_pools.get(user_id, set()).discard(department)
+            pool = self._pools[department] = _Pool(members)
+            for user_id in members:
+                self._user_pools.setdefault(user_id, set()).add(department)
+            self._rebuild_pool(pool)
+        return pool
+
+    def least_loaded(self, department: int, eligible_ids: Iterable[int]) -> Optional[int]:
+        """Eligible user with the lowest score (fewest open actions, then lowest id, on ties)"""
+        members = frozenset(eligible_ids)
+        if not members:
+            return None
+        with self._lock:
+            pool = self._pool(department, members)
+            while pool.heap:
+                _, _, user_id, version = pool.heap[0]
+                if version == self._versions.get(user_id, 0):
+                    return user_id
+                heapq.heappop(pool.heap)
+            self._rebuild_pool(pool)
+            return pool.heap[0][2]
+
+    def load_of(self, user_id: int) -> dict:
+        with self._lock:
+            load = self._loads.get(user_id)
+            return load.as_dict() if load else UserLoad().as_dict()
+
+    def snapshot(self, user_ids: Iterable[int]) -> List[dict]:
+        rows = [{"user_id": user_id, **self.load_of(user_id)} for user_id in user_ids]
+        return sorted(rows, key=lambda row: (row["score"], row["open_actions"], row["user_id"]))
+
+
+workload_index = WorkloadIndex()
+
+
+def eligible_user_ids(db: Session, department: Optional[DepartmentRef]) -> List[int]:
+    return department_directory.manager_ids(db, department)
+
+
+def suggest_assignee(db: Session, department: Optional[DepartmentRef]) -> Optional[int]:
+    """Least-loaded manager of ``department`` (id or name), or None when it has none"""
+    department_id = department_directory.department_id(db, department)
+    eligible = eligible_user_ids(db, department_id)
+    if not eligible:
+        return None
+    workload_index.ensure_fresh(db)
+    return workload_index.least_loaded(department_id, eligible)
+
+
+def department_workload(db: Session, department: DepartmentRef) -> dict:
+    department_id = department_directory.department_id(db, department)
+    eligible = eligible_user_ids(db, department_id)
+    workload_index.ensure_fresh(db)
+    return {
+        "department": department,
+        "department_id": department_id,
+        "users": workload_index.snapshot(eligible),
+        "suggested_user_id": workload_index.least_loaded(department_id, eligible) if eligible else None,
+    }
+
+
+def _action_row(session: Session, action: CapaAction) -> tuple:
+    capa = action.__dict__.get("capa")
+    severity = capa.severity if capa is not None else None
+    return (action.assigned_to_id, action.status, action.due_date, action.capa_id, severity)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_action_changes(session: Session, flush_context):
+    changes = None
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, CapaAction) and obj.id is not None:
+            if changes is None:
+                changes = session.info.setdefault(_PENDING_KEY, {})
+            changes[obj.id] = None if obj in session.deleted else _action_row(session, obj)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk_action_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) == CapaAction.__tablename__:
+            orm_execute_state.session.info[_STALE_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session: Session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if session.info.pop(_STALE_KEY, False):
+        workload_index.stale = True
+    elif changes and not workload_index.stale:
+        workload_index.apply(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_rollback(session: Session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
+        session.info.pop(_STALE_KEY, None)
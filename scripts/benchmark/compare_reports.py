@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare two load_test.py reports (e.g. main vs. a branch).
+
+A scenario regresses when its p95 latency grows by more than --threshold
+percent, when its mean SQL queries per request grows (a new N+1), or when it
+starts returning errors. Exits 1 if anything regressed, so it can gate CI.
+
+Run:
+  python3 scripts/benchmark/compare_reports.py benchmark-results/baseline.json benchmark-results/load-abc123.json
+"""
+import argparse
+import json
+import sys
+
+# Ignore sub-millisecond p95 movements on very fast endpoints
+MIN_P95_DELTA_MS = 2.0
+
+
+def compare(baseline, candidate, threshold=10.0):
+    """List of (scenario, reason) for every regression of candidate against baseline"""
+    regressions = []
+    for name, row in candidate["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before["requests"] or not row["requests"]:
+            continue
+        old_p95, new_p95 = before["latency_ms"]["p95"], row["latency_ms"]["p95"]
+        if new_p95 - old_p95 > MIN_P95_DELTA_MS and new_p95 > old_p95 * (1 + threshold / 100):
+            regressions.append((name, f"p95 {old_p95:.1f} -> {new_p95:.1f} ms"))
+        old_queries, new_queries = before.get("queries_per_request"), row.get("queries_per_request")
+        if old_queries and new_queries and new_queries["mean"] > old_queries["mean"] + 0.5:
+            regressions.append((name, f"queries/request {old_queries['mean']} -> {new_queries['mean']}"))
+        if row["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append((name, f"error rate {before['error_rate']:.2%} -> {row['error_rate']:.2%}"))
+    return regressions
+
+
+def _delta(old, new):
+    if not old:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def print_comparison(baseline, candidate, regressions):
+    old_commit = (baseline.get("meta", {}).get("git_commit") or "?")[:10]
+    new_commit = (candidate.get("meta", {}).get("git_commit") or "?")[:10]
+    if baseline.get("dataset") and candidate.get("dataset") and baseline["dataset"].get("counts") != candidate["dataset"].get("counts"):
+        print("WARNING: the reports were produced on different datasets")
+    print(f"\n{old_commit} -> {new_commit}")
+    print(f"{'scenario':<24} {'p95 before':>11} {'p95 after':>10} {'change':>8} {'q/req before':>13} {'q/req after':>12}")
+    for name, row in candidate["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        old_q = (before.get("queries_per_request") or {}).get("mean", "-")
+        new_q = (row.get("queries_per_request") or {}).get("mean", "-")
+        print(f"{name:<24} {before['latency_ms']['p95']:>11} {row['latency_ms']['p95']:>10} "
+              f"{_delta(before['latency_ms']['p95'], row['latency_ms']['p95']):>8} {old_q:>13} {new_q:>12}")
+    if regressions:
+        print("\nRegressions:")
+        for name, reason in regressions:
+            print(f"  {name}: {reason}")
+    else:
+        print("\nNo regressions.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two load test reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 increase in percent")
+    args = parser.parse_args()
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.candidate, encoding="utf-8") as handle:
+        candidate = json.load(handle)
+    regressions = compare(baseline, candidate, args.threshold)
+    print_comparison(baseline, candidate, regressions)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Run EXPLAIN (ANALYZE, BUFFERS) over the hot query shapes of the API and flag
+sequential scans on large tables.
+
+CATALOG mirrors the SQL issued by crud.py, crud_enhanced_dashboard.py,
+crud_capa_actions.py and the reports endpoints in main.py; keep it in sync
+when one of those queries changes shape. Every statement runs inside a
+transaction that is rolled back. A plan is flagged when it reads a table of
+more than --min-rows rows with a Seq Scan; the filter it applied is printed,
+which is usually the index to add (see backend/migrations/007_hot_query_indexes.sql).
+
+Requires a seeded database (seed_benchmark_data.py) with the migrations applied.
+
+Run:
+  BENCH_DATABASE_URL=postgresql://postgres@localhost/salamaty_bench \\
+    python3 scripts/benchmark/explain_advisor.py
+  python3 scripts/benchmark/explain_advisor.py --only rounds_list,capa_overdue --json benchmark-results/explain.json
+  python3 scripts/benchmark/explain_advisor.py --fail-on-seqscan   # exit 1 when a plan is flagged (CI)
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from seed_benchmark_data import enum_label  # noqa: E402
+
+# (name, where the query comes from, SQL with %(param)s placeholders)
+CATALOG = (
+    ("rounds_list", "GET /api/rounds",
+     "SELECT * FROM rounds ORDER BY created_at DESC LIMIT 100 OFFSET 0"),
+    ("rounds_by_user", "crud.get_rounds_by_user",
+     "SELECT * FROM rounds WHERE assigned_to_ids @> %(assigned)s::jsonb"),
+    ("rounds_completed_count", "GET /api/reports/dashboard/stats",
+     "SELECT count(*) FROM rounds WHERE status = %(round_completed)s"),
+    ("compliance_trends", "GET /api/reports/compliance-trends",
+     "SELECT extract(year FROM created_at), extract(month FROM created_at), avg(compliance_percentage), count(id) "
+     "FROM rounds WHERE status = %(round_completed)s AND compliance_percentage IS NOT NULL AND created_at >= %(six_months_ago)s "
+     "GROUP BY 1, 2 ORDER BY 1, 2"),
+    ("monthly_rounds", "GET /api/reports/monthly-rounds",
+     "SELECT extract(year FROM created_at), extract(month FROM created_at), count(id) "
+     "FROM rounds WHERE created_at >= %(six_months_ago)s GROUP BY 1, 2 ORDER BY 1, 2"),
+    ("department_performance", "GET /api/reports/department-performance",
+     "SELECT r.department_id, avg(r.compliance_percentage), count(r.id), count(c.id) "
+     "FROM rounds r LEFT OUTER JOIN capas c ON r.id = c.round_id "
+     "WHERE r.status = %(round_completed)s AND r.compliance_percentage IS NOT NULL GROUP BY r.department_id"),
+    ("department_rounds", "GET /api/rounds?department=",
+     "SELECT * FROM rounds WHERE department_id = %(department_id)s AND status = %(round_completed)s"),
+    ("round_results", "crud.get_evaluation_results_by_round",
+     "SELECT * FROM evaluation_results WHERE round_id = %(round_id)s"),
+    ("round_capas", "crud.get_round_capa_summary",
+     "SELECT * FROM capas WHERE round_id = %(round_id)s"),
+    ("capa_status_distribution", "GET /api/reports/capa-status-distribution",
+     "SELECT status, count(id) FROM capas GROUP BY status"),
+    ("capa_pending_count", "GET /api/reports/dashboard/stats",
+     "SELECT count(*) FROM capas WHERE status = 'pending'"),
+    ("capa_overdue", "crud_enhanced_dashboard.get_overdue_actions",
+     "SELECT * FROM capas WHERE target_date < %(today)s AND status NOT IN ('completed', 'closed')"),
+    ("capa_upcoming", "crud_enhanced_dashboard.get_upcoming_deadlines",
+     "SELECT * FROM capas WHERE target_date >= %(today)s AND target_date <= %(in_a_week)s "
+     "AND status NOT IN ('completed', 'closed')"),
+    ("capa_basic_report", "crud_enhanced_dashboard.get_basic_report_data",
+     "SELECT priority, status, count(*) FROM capas WHERE created_at >= %(six_months_ago)s AND created_at <= %(now)s "
+     "GROUP BY priority, status"),
+    ("capa_department_report", "GET /api/reports/basic/?department=",
+     "SELECT status, count(*) FROM capas WHERE department_id = %(department_id)s AND created_at >= %(six_months_ago)s "
+     "GROUP BY status"),
+    ("capa_actions_overdue", "GET /api/dashboard/overdue/",
+     "SELECT ca.id, ca.task, ca.due_date, ca.status, ca.capa_id, c.title FROM capa_actions ca "
+     "JOIN capas c ON c.id = ca.capa_id WHERE ca.due_date < NOW() AND ca.status NOT IN ('completed', 'cancelled') "
+     "ORDER BY ca.due_date ASC"),
+    ("capa_actions_upcoming", "GET /api/dashboard/upcoming/",
+     "SELECT ca.id, ca.task, ca.due_date, ca.status, ca.capa_id, c.title FROM capa_actions ca "
+     "JOIN capas c ON c.id = ca.capa_id WHERE ca.due_date BETWEEN NOW() AND NOW() + INTERVAL '7 days' "
+     "AND ca.status NOT IN ('completed', 'cancelled') ORDER BY ca.due_date ASC"),
+    ("capa_actions_overdue_page", "GET /api/capa-actions/overdue/list?cursor=",
+     "SELECT * FROM capa_actions WHERE status NOT IN ('completed', 'cancelled') AND due_date < NOW() "
+     "AND due_date IS NOT NULL AND (due_date, id) > (%(now)s - INTERVAL '30 days', 0) "
+     "ORDER BY due_date ASC, id ASC LIMIT 51"),
+    ("capa_actions_my_actions_page", "GET /api/capa-actions/my-actions",
+     "SELECT * FROM capa_actions WHERE status NOT IN ('completed', 'cancelled') AND assigned_to_id = %(user_id)s "
+     "AND due_date IS NOT NULL ORDER BY due_date ASC, id ASC LIMIT 51"),
+    ("capa_actions_queue_summary", "crud_capa_actions.action_summary",
+     "SELECT action_type, count(id), count(id) FILTER (WHERE due_date < NOW()) FROM capa_actions "
+     "WHERE status NOT IN ('completed', 'cancelled') AND assigned_to_id = %(user_id)s GROUP BY action_type"),
+    ("notifications_inbox", "GET /api/notifications",
+     "SELECT * FROM notifications WHERE user_id = %(user_id)s ORDER BY created_at DESC LIMIT 50"),
+    ("notifications_unread", "GET /api/notifications?status=unread",
+     "SELECT * FROM notifications WHERE user_id = %(user_id)s AND status = 'unread' ORDER BY created_at DESC LIMIT 50"),
+)
+
+# Node types that read a whole relation
+SEQ_SCAN_NODES = ("Seq Scan", "Parallel Seq Scan")
+
+
+def sample_parameters(cursor):
+    """Realistic parameter values: the busiest user, department and round of the seeded data"""
+    now = datetime.now()
+
+    def scalar(sql):
+        cursor.execute(sql)
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    user_id = scalar("SELECT user_id FROM notifications GROUP BY user_id ORDER BY count(*) DESC LIMIT 1") \
+        or scalar("SELECT min(id) FROM users")
+    return {
+        "round_completed": enum_label(cursor, "rounds", "status", "completed"),
+        "user_id": user_id,
+        "assigned": json.dumps([user_id]),
+        "department_id": scalar(
+            "SELECT department_id FROM rounds WHERE department_id IS NOT NULL "
+            "GROUP BY department_id ORDER BY count(*) DESC LIMIT 1"
+        ),
+        "round_id": scalar("SELECT round_id FROM evaluation_results ORDER BY round_id DESC LIMIT 1"),
+        "now": now,
+        "today": now.date(),
+        "in_a_week": now.date() + timedelta(days=7),
+        "six_months_ago": now - timedelta(days=180),
+    }
+
+
+def table_rows(cursor):
+    """
+    Estimated row count per table (pg_class.reltuples). Partitions are listed
+    on their own, since plans scan them by name, and summed into their parent.
+    """
+    cursor.execute("""
+        SELECT c.relname, parent.relname, greatest(c.reltuples, 0)::bigint
+        FROM pg_class c
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        LEFT JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE c.relkind = 'r' AND c.relnamespace = 'public'::regnamespace
+    """)
+    rows = {}
+    for relation, parent, count in cursor.fetchall():
+        rows[relation] = count
+        if parent:
+            rows[parent] = rows.get(parent, 0) + count
+    return rows
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    document = cursor.fetchone()[0]
+    if isinstance(document, str):
+        document = json.loads(document)
+    return document[0]
+
+
+def analyze_plan(plan, rows_by_table, min_rows):
+    """Summary of one EXPLAIN document: timing, buffers, indexes used and flagged scans"""
+    root = plan["Plan"]
+    nodes = list(walk(root))
+    seq_scans = []
+    for node in nodes:
+        if node["Node Type"] not in SEQ_SCAN_NODES:
+            continue
+        relation = node.get("Relation Name")
+        table_rows_estimate = rows_by_table.get(relation, 0)
+        seq_scans.append({
+            "relation": relation,
+            "table_rows": table_rows_estimate,
+            "rows_returned": node.get("Actual Rows"),
+            "rows_removed": node.get("Rows Removed by Filter", 0),
+            "filter": node.get("Filter"),
+            "flagged": table_rows_estimate >= min_rows,
+        })
+    return {
+        "execution_ms": round(plan.get("Execution Time", 0.0), 3),
+        "planning_ms": round(plan.get("Planning Time", 0.0), 3),
+        "shared_hit_blocks": root.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": root.get("Shared Read Blocks", 0),
+        "indexes": sorted({node["Index Name"] for node in nodes if node.get("Index Name")}),
+        "seq_scans": seq_scans,
+        "flagged": any(scan["flagged"] for scan in seq_scans),
+    }
+
+
+def run(conn, names, min_rows):
+    results = {}
+    with conn.cursor() as cursor:
+        params = sample_parameters(cursor)
+        rows_by_table = table_rows(cursor)
+        conn.rollback()
+        for name, source, sql in CATALOG:
+            if names and name not in names:
+                continue
+            try:
+                plan = explain(cursor, sql, params)
+                results[name] = dict(source=source, **analyze_plan(plan, rows_by_table, min_rows))
+            except psycopg2.Error as exc:
+                # A table this tree has not created yet (e.g. capa_actions) must not hide the others
+                results[name] = {"source": source, "error": str(exc).strip(), "flagged": False}
+            finally:
+                # ANALYZE executes the statement: never keep its effects
+                conn.rollback()
+    return results
+
+
+def print_results(results, min_rows):
+    print(f"{'query':<28} {'ms':>9} {'hit':>8} {'read':>8}  indexes / sequential scans")
+    for name, row in results.items():
+        if "error" in row:
+            print(f"{name:<28} ERROR {row['error'].splitlines()[0]}")
+            continue
+        marker = "  <-- SEQ SCAN" if row["flagged"] else ""
+        print(f"{name:<28} {row['execution_ms']:>9.2f} {row['shared_hit_blocks']:>8} {row['shared_read_blocks']:>8}  "
+              f"{', '.join(row['indexes']) or '-'}{marker}")
+        for scan in row["seq_scans"]:
+            if scan["flagged"]:
+                print(f"{'':<28} seq scan on {scan['relation']} (~{scan['table_rows']} rows, "
+                      f"{scan['rows_removed']} removed by filter) filter: {scan['filter'] or '-'}")
+    flagged = [name for name, row in results.items() if row.get("flagged")]
+    print(f"\n{len(flagged)} of {len(results)} queries scan a table over {min_rows} rows sequentially"
+          + (f": {', '.join(flagged)}" if flagged else "."))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN the hot query shapes and flag sequential scans")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL") or os.environ.get("DATABASE_URL"))
+    parser.add_argument("--only", default="", help="Comma-separated catalog names (default: all)")
+    parser.add_argument("--min-rows", type=int, default=10_000,
+                        help="Only flag sequential scans of tables with at least this many rows")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    parser.add_argument("--fail-on-seqscan", action="store_true", help="Exit 1 when a query is flagged")
+    parser.add_argument("--list", action="store_true", help="Print the catalog and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, source, sql in CATALOG:
+            print(f"{name:<28} {source}\n    {sql}")
+        return
+    if not args.database_url:
+        parser.error("Set BENCH_DATABASE_URL or pass --database-url")
+    names = {name.strip() for name in args.only.split(",") if name.strip()}
+    unknown = names - {name for name, _, _ in CATALOG}
+    if unknown:
+        parser.error(f"Unknown catalog entries: {', '.join(sorted(unknown))}")
+
+    conn = psycopg2.connect(args.database_url.replace("postgresql+psycopg2://", "postgresql://"))
+    try:
+        results = run(conn, names, args.min_rows)
+    finally:
+        conn.close()
+
+    print_results(results, args.min_rows)
+    if args.json_path:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json_path)), exist_ok=True)
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump({"generated_at": datetime.now().isoformat(), "min_rows": args.min_rows, "queries": results},
+                      handle, ensure_ascii=False, indent=2, default=str)
+    if args.fail_on_seqscan and any(row.get("flagged") for row in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Load generator for the key API endpoints.
+
+Signs in as the seeded benchmark users (see seed_benchmark_data.py), then
+runs --users virtual users against a running backend for --duration seconds,
+each picking a weighted scenario per request: rounds list, my rounds, my
+round stats, finalize evaluation, dashboards, reports and the CAPA list. The
+JSON report has p50/p95/p99 latency, throughput, error rate and SQL
+queries-per-request per scenario, plus the git commit and the seed manifest,
+so reports from two commits can be diffed with compare_reports.py.
+
+Queries per request come from the X-DB-Queries response header: start the
+backend with QUERY_COUNT_HEADER=1 (run_benchmark.sh does).
+
+Run:
+  python3 scripts/benchmark/load_test.py --users 20 --duration 60
+  python3 scripts/benchmark/load_test.py --scenarios rounds_list,capa_list --compare benchmark-results/baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from compare_reports import compare, print_comparison  # noqa: E402
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:8000")
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class VirtualUser:
+    """One simulated client: an assessor session plus a quality manager session for admin pages"""
+
+    def __init__(self, index, base_url, password, assessors, managers, rng):
+        self.base_url = base_url
+        self.rng = rng
+        self.session = requests.Session()
+        self.assessor = self._sign_in(f"bench_assessor_{index % assessors + 1}", password)
+        self.manager = self._sign_in(f"bench_qm_{index % managers + 1}", password)
+        self.open_rounds = []
+
+    def _sign_in(self, username, password):
+        response = self.session.post(f"{self.base_url}/api/auth/signin",
+                                     json={"username": username, "password": password}, timeout=60)
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    def load_open_rounds(self):
+        """Rounds this assessor can still finalize (consumed by the finalize scenario)"""
+        response = self.session.get(f"{self.base_url}/api/rounds/my", params={"limit": 500},
+                                    headers=self.assessor, timeout=60)
+        response.raise_for_status()
+        self.open_rounds = [
+            (row["id"], row.get("evaluation_items") or [])
+            for row in response.json()
+            if str(row.get("status", "")).lower() in ("scheduled", "in_progress", "overdue") and row.get("evaluation_items")
+        ]
+        self.rng.shuffle(self.open_rounds)
+
+    def get(self, path, headers, params=None):
+        return self.session.get(f"{self.base_url}{path}", params=params, headers=headers, timeout=60)
+
+    def finalize(self):
+        if not self.open_rounds:
+            return None
+        round_id, items = self.open_rounds.pop()
+        evaluations = [
+            {"item_id": item, "status": self.rng.choices(("applied", "partial", "not_applied"), (75, 15, 10))[0]}
+            for item in items
+        ]
+        return self.session.post(f"{self.base_url}/api/rounds/{round_id}/evaluations/finalize",
+                                 json={"evaluations": evaluations}, headers=self.assessor, timeout=60)
+
+
+# name -> (weight, method, path template, request)
+SCENARIOS = {
+    "rounds_list": (20, "GET", "/api/rounds", lambda vu: vu.get("/api/rounds", vu.manager, {"limit": 100})),
+    "my_rounds": (25, "GET", "/api/rounds/my", lambda vu: vu.get("/api/rounds/my", vu.assessor)),
+    "my_rounds_stats": (10, "GET", "/api/rounds/my/stats", lambda vu: vu.get("/api/rounds/my/stats", vu.assessor)),
+    "finalize_evaluation": (5, "POST", "/api/rounds/{round_id}/evaluations/finalize", lambda vu: vu.finalize()),
+    "dashboard_stats": (10, "GET", "/api/reports/dashboard/stats",
+                        lambda vu: vu.get("/api/reports/dashboard/stats", vu.manager)),
+    "compliance_trends": (5, "GET", "/api/reports/compliance-trends",
+                          lambda vu: vu.get("/api/reports/compliance-trends", vu.manager)),
+    "department_performance": (5, "GET", "/api/reports/department-performance",
+                               lambda vu: vu.get("/api/reports/department-performance", vu.manager)),
+    "capa_list": (20, "GET", "/api/capas", lambda vu: vu.get("/api/capas", vu.manager, {"limit": 100})),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {name: {"latency": [], "queries": [], "errors": 0, "skipped": 0} for name in SCENARIOS}
+        self.recording = False
+
+    def add(self, name, latency_ms, response):
+        if not self.recording:
+            return
+        with self.lock:
+            bucket = self.samples[name]
+            if response is None:
+                bucket["skipped"] += 1
+                return
+            bucket["latency"].append(latency_ms)
+            if response.status_code >= 400:
+                bucket["errors"] += 1
+            queries = response.headers.get("X-DB-Queries")
+            if queries is not None:
+                bucket["queries"].append(int(queries))
+
+    def add_error(self, name, latency_ms):
+        if self.recording:
+            with self.lock:
+                self.samples[name]["latency"].append(latency_ms)
+                self.samples[name]["errors"] += 1
+
+
+def run_virtual_user(vu, names, weights, recorder, stop):
+    while not stop.is_set():
+        name = vu.rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = SCENARIOS[name][3](vu)
+        except requests.RequestException:
+            recorder.add_error(name, (time.perf_counter() - started) * 1000)
+            continue
+        recorder.add(name, (time.perf_counter() - started) * 1000, response)
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def build_report(recorder, args, seconds, names):
+    commit, dirty = git_revision()
+    manifest = None
+    if args.seed_manifest and os.path.exists(args.seed_manifest):
+        with open(args.seed_manifest, encoding="utf-8") as handle:
+            manifest = json.load(handle)
+
+    scenarios = {}
+    for name in names:
+        bucket = recorder.samples[name]
+        latency, queries = bucket["latency"], bucket["queries"]
+        _, method, path, _ = SCENARIOS[name]
+        scenarios[name] = {
+            "method": method,
+            "path": path,
+            "requests": len(latency),
+            "errors": bucket["errors"],
+            "skipped": bucket["skipped"],
+            "error_rate": round(bucket["errors"] / len(latency), 4) if latency else 0.0,
+            "throughput_rps": round(len(latency) / seconds, 2),
+            "latency_ms": {
+                "p50": round(percentile(latency, 50), 2),
+                "p95": round(percentile(latency, 95), 2),
+                "p99": round(percentile(latency, 99), 2),
+                "mean": round(statistics.fmean(latency), 2) if latency else 0.0,
+                "max": round(max(latency), 2) if latency else 0.0,
+            },
+            "queries_per_request": {
+                "mean": round(statistics.fmean(queries), 2),
+                "p95": percentile(queries, 95),
+                "max": max(queries),
+            } if queries else None,
+        }
+
+    all_latency = [value for name in names for value in recorder.samples[name]["latency"]]
+    return {
+        "meta": {
+            "git_commit": commit,
+            "git_dirty": dirty,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "base_url": args.base_url,
+            "virtual_users": args.users,
+            "duration_seconds": round(seconds, 1),
+            "warmup_seconds": args.warmup,
+            "seed": args.seed,
+        },
+        "dataset": manifest,
+        "totals": {
+            "requests": len(all_latency),
+            "errors": sum(recorder.samples[name]["errors"] for name in names),
+            "throughput_rps": round(len(all_latency) / seconds, 2),
+            "latency_ms": {
+                "p50": round(percentile(all_latency, 50), 2),
+                "p95": round(percentile(all_latency, 95), 2),
+                "p99": round(percentile(all_latency, 99), 2),
+            },
+        },
+        "scenarios": scenarios,
+    }
+
+
+def print_report(report):
+    totals = report["totals"]
+    print(f"\n{'scenario':<24} {'reqs':>6} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}")
+    for name, row in report["scenarios"].items():
+        queries = row["queries_per_request"]["mean"] if row["queries_per_request"] else "-"
+        print(f"{name:<24} {row['requests']:>6} {row['errors']:>4} {row['throughput_rps']:>7} "
+              f"{row['latency_ms']['p50']:>8} {row['latency_ms']['p95']:>8} {row['latency_ms']['p99']:>8} {queries:>6}")
+    print(f"{'total':<24} {totals['requests']:>6} {totals['errors']:>4} {totals['throughput_rps']:>7} "
+          f"{totals['latency_ms']['p50']:>8} {totals['latency_ms']['p95']:>8} {totals['latency_ms']['p99']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the key endpoints and write a JSON performance report")
+    parser.add_argument("--base-url", default=BACKEND_URL)
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="Unmeasured seconds before measuring")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--assessors", type=int, default=50, help="Distinct seeded assessors to sign in as")
+    parser.add_argument("--managers", type=int, default=2, help="Distinct seeded quality managers to sign in as")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the scenario mix")
+    parser.add_argument("--seed-manifest", default=os.path.join(ROOT_DIR, "benchmark-results", "seed-manifest.json"))
+    parser.add_argument("--output", help="Report path (default: benchmark-results/load-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Baseline report to compare against; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed p95 increase in percent for --compare")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    weights = [SCENARIOS[name][0] for name in names]
+
+    print(f"Signing in {args.users} virtual users at {args.base_url} ...")
+    virtual_users = []
+    for index in range(args.users):
+        vu = VirtualUser(index, args.base_url, args.password, args.assessors, args.managers,
+                         random.Random(args.seed * 1000 + index))
+        if "finalize_evaluation" in names:
+            vu.load_open_rounds()
+        virtual_users.append(vu)
+
+    recorder, stop = Recorder(), threading.Event()
+    threads = [threading.Thread(target=run_virtual_user, args=(vu, names, weights, recorder, stop), daemon=True)
+               for vu in virtual_users]
+    for thread in threads:
+        thread.start()
+    print(f"Warming up for {args.warmup:.0f}s, then measuring for {args.duration:.0f}s ...")
+    time.sleep(args.warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.recording = False
+    measured = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+
+    report = build_report(recorder, args, measured, names)
+    print_report(report)
+
+    output = args.output or os.path.join(
+        ROOT_DIR, "benchmark-results",
+        f"load-{(report['meta']['git_commit'] or 'unknown')[:10]}-{datetime.now():%Y%m%d-%H%M%S}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, ensure_ascii=False)
+    print(f"\nReport: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        regressions = compare(baseline, report, args.threshold)
+        print_comparison(baseline, report, regressions)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env bash
+# Seed the benchmark database, start the backend against it and run the load test.
+# Usage:
+#   BENCH_DATABASE_URL=postgresql://postgres@localhost/salamaty_bench ./scripts/benchmark/run_benchmark.sh [load_test.py args]
+# Environment:
+#   BENCH_SCALE=small|medium|large (default small), SKIP_SEED=true to reuse the seeded data,
+#   BENCH_PORT (default 8099), BENCH_WORKERS (uvicorn workers, default 1)
+
+set -euo pipefail
+
+if [ -z "${BENCH_DATABASE_URL:-}" ]; then
+  echo "ERROR: Please set BENCH_DATABASE_URL, e.g. postgresql://postgres@localhost:5432/salamaty_bench"
+  exit 2
+fi
+
+ROOT_DIR="$(cd "$(dirname "$0")/../.." && pwd)"
+PORT="${BENCH_PORT:-8099}"
+mkdir -p "$ROOT_DIR/benchmark-results"
+
+if [ "${SKIP_SEED:-false}" != "true" ]; then
+  echo "Seeding ${BENCH_SCALE:-small} dataset..."
+  python3 "$ROOT_DIR/scripts/benchmark/seed_benchmark_data.py" --scale "${BENCH_SCALE:-small}"
+fi
+
+echo "Starting backend on port $PORT..."
+(
+  cd "$ROOT_DIR/backend"
+  DATABASE_URL="$BENCH_DATABASE_URL" QUERY_COUNT_HEADER=1 REQUEST_LOG=0 ENABLE_BACKGROUND_JOBS=0 \
+    exec uvicorn main:app --host 127.0.0.1 --port "$PORT" --workers "${BENCH_WORKERS:-1}" --log-level warning
+) &
+SERVER_PID=$!
+trap 'kill $SERVER_PID 2>/dev/null || true' EXIT
+
+for _ in $(seq 1 60); do
+  if curl -sf "http://127.0.0.1:$PORT/api/health" >/dev/null; then
+    break
+  fi
+  sleep 1
+done
+
+python3 "$ROOT_DIR/scripts/benchmark/load_test.py" --base-url "http://127.0.0.1:$PORT" "$@"
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Seed a benchmark database with synthetic hospital data.
+
+Generates departments, users, evaluation categories/items, rounds, evaluation
+results, CAPAs and notifications at a configurable scale and loads them with
+COPY, so 100k rounds and millions of evaluation results load in minutes. The
+same --seed always produces the same data (dates relative to
+--reference-date), which keeps load-test reports comparable between commits.
+
+The target database is TRUNCATED first. The script refuses to run unless the
+database name contains "bench" (override with --allow-any-database).
+
+Requires:
+  - A Postgres database, e.g. createdb salamaty_bench
+  - The schema: tables are created here (backend/scripts/init_db.py); for
+    production-like triggers/indexes run scripts/run_migrations_and_seed.sh
+    against the same DATABASE_URL first
+
+Run:
+  BENCH_DATABASE_URL=postgresql://postgres@localhost/salamaty_bench \\
+    python3 scripts/benchmark/seed_benchmark_data.py --scale medium
+  python3 scripts/benchmark/seed_benchmark_data.py --scale small --rounds 20000 --manifest /tmp/seed.json
+
+All benchmark users share the password given by --password (default
+bench-password): bench_admin, bench_qm_<n>, bench_head_<n>, bench_assessor_<n>.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from urllib.parse import urlparse
+
+import bcrypt
+import psycopg2
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    # departments, users, categories, items, rounds, results per round, capas, notifications
+    "small": dict(departments=10, users=200, categories=6, items=60, rounds=5_000,
+                  results_per_round=20, capas=2_000, notifications=20_000),
+    "medium": dict(departments=25, users=1_000, categories=8, items=120, rounds=100_000,
+                   results_per_round=30, capas=20_000, notifications=500_000),
+    "large": dict(departments=40, users=3_000, categories=10, items=200, rounds=300_000,
+                  results_per_round=40, capas=100_000, notifications=2_000_000),
+}
+
+TABLES = (
+    "notifications", "capas", "evaluation_results", "rounds",
+    "evaluation_items", "evaluation_categories", "users", "departments",
+)
+
+ROUND_TYPES = ("patient_safety", "infection_control", "hygiene", "medication_safety",
+               "equipment_safety", "environmental", "general")
+# Past rounds: status weights; future rounds are scheduled
+PAST_ROUND_STATUSES = (("completed", 70), ("in_progress", 8), ("pending_review", 6),
+                       ("overdue", 12), ("cancelled", 4))
+EVALUATION_SCORES = ((100, 70), (50, 18), (0, 12))
+CAPA_STATUSES = (("PENDING", 30), ("ASSIGNED", 15), ("IN_PROGRESS", 25), ("IMPLEMENTED", 10),
+                 ("VERIFIED", 10), ("CLOSED", 10))
+NOTIFICATION_TYPES = ("round_assigned", "round_reminder", "round_deadline", "capa_assigned",
+                      "capa_created", "capa_deadline", "evaluation_needs_capa")
+DEPARTMENT_NAMES = ("العناية المركزة", "الطوارئ", "الباطنية", "الجراحة", "الأطفال", "النساء والولادة",
+                    "الأشعة", "المختبر", "الصيدلية", "العمليات", "القلب", "الأورام", "العظام",
+                    "الكلى", "الأعصاب", "التأهيل", "العيادات الخارجية", "التعقيم", "التغذية", "الحروق")
+
+COPY_BATCH_ROWS = 100_000
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows into table in batches; returns the number of rows loaded"""
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    total = 0
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == COPY_BATCH_ROWS:
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+            total += pending
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            pending = 0
+    if pending:
+        buffer.seek(0)
+        cursor.copy_expert(sql, buffer)
+        total += pending
+    return total
+
+
+def enum_label(cursor, table, column, value):
+    """
+    The stored label for ``value`` when the column is a native Postgres enum
+    (SQLAlchemy stores member names, e.g. ASSESSOR), otherwise ``value``.
+    """
+    cursor.execute(
+        "SELECT udt_name FROM information_schema.columns WHERE table_name = %s AND column_name = %s AND data_type = 'USER-DEFINED'",
+        (table, column),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return value
+    cursor.execute(
+        "SELECT e.enumlabel FROM pg_enum e JOIN pg_type t ON t.oid = e.enumtypid WHERE t.typname = %s",
+        (row[0],),
+    )
+    for (label,) in cursor.fetchall():
+        if label.lower() == value.lower():
+            return label
+    raise ValueError(f"{table}.{column} has no enum label for {value!r}")
+
+
+def fetch_ids(cursor, sql):
+    cursor.execute(sql)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def seed(conn, scale, rng, password, bcrypt_rounds, now):
+    counts = {}
+    cursor = conn.cursor()
+    cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+
+    # Departments
+    departments = [
+        (DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)] + (f" {i // len(DEPARTMENT_NAMES) + 1}" if i >= len(DEPARTMENT_NAMES) else ""),
+         f"DEP{i + 1:03d}")
+        for i in range(scale["departments"])
+    ]
+    counts["departments"] = copy_rows(
+        cursor, "departments", ("name", "code", "is_active", "created_at"),
+        ((name, code, True, now.isoformat()) for name, code in departments),
+    )
+    department_names = [name for name, _ in departments]
+
+    # Users: one admin, ~2% quality managers, one head per department, the rest assessors
+    hashed = bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=bcrypt_rounds)).decode()
+    labels = {role: enum_label(cursor, "users", "role", role)
+              for role in ("super_admin", "quality_manager", "department_head", "assessor")}
+    quality_managers = max(2, scale["users"] // 50)
+    heads = len(department_names)
+    assessors = max(1, scale["users"] - 1 - quality_managers - heads)
+
+    def users():
+        yield ("bench_admin", "super_admin", None)
+        for i in range(1, quality_managers + 1):
+            yield (f"bench_qm_{i}", "quality_manager", None)
+        for i, department in enumerate(department_names, start=1):
+            yield (f"bench_head_{i}", "department_head", department)
+        for i in range(1, assessors + 1):
+            yield (f"bench_assessor_{i}", "assessor", rng.choice(department_names))
+
+    counts["users"] = copy_rows(
+        cursor, "users",
+        ("username", "email", "hashed_password", "first_name", "last_name", "role", "department", "is_active", "created_at"),
+        ((username, f"{username}@bench.salamaty.local", hashed, "مستخدم", username, labels[role], department, True, now.isoformat())
+         for username, role, department in users()),
+    )
+    cursor.execute("SELECT id, username FROM users")
+    user_ids = dict((username, user_id) for user_id, username in cursor.fetchall())
+    assessor_ids = [user_ids[f"bench_assessor_{i}"] for i in range(1, assessors + 1)]
+    head_by_department = {department: user_ids[f"bench_head_{i}"] for i, department in enumerate(department_names, start=1)}
+    all_user_ids = list(user_ids.values())
+    creator_ids = [user_ids["bench_admin"]] + [user_ids[f"bench_qm_{i}"] for i in range(1, quality_managers + 1)]
+
+    # Evaluation categories and items
+    counts["evaluation_categories"] = copy_rows(
+        cursor, "evaluation_categories", ("name", "name_en", "color", "weight_percent", "is_active"),
+        ((f"فئة تقييم {i}", f"Category {i}", "#3B82F6", round(100 / scale["categories"], 2), True)
+         for i in range(1, scale["categories"] + 1)),
+    )
+    category_ids = fetch_ids(cursor, "SELECT id FROM evaluation_categories ORDER BY id")
+    risk_labels = [enum_label(cursor, "evaluation_items", "risk_level", level) for level in ("MINOR", "MAJOR", "CRITICAL")]
+    counts["evaluation_items"] = copy_rows(
+        cursor, "evaluation_items",
+        ("code", "title", "category_id", "category_name", "category_color", "is_active", "is_required", "weight", "risk_level"),
+        ((f"ITEM-{i:04d}", f"بند تقييم {i}", category_ids[i % len(category_ids)], f"فئة تقييم {i % len(category_ids) + 1}",
+          "#3B82F6", True, True, rng.randint(1, 3), rng.choice(risk_labels))
+         for i in range(1, scale["items"] + 1)),
+    )
+    item_ids = fetch_ids(cursor, "SELECT id FROM evaluation_items ORDER BY id")
+    per_round = min(scale["results_per_round"], len(item_ids))
+
+    # Rounds over the past two years plus the coming month; the plan for each
+    # round (items, assessors, status) is kept to derive results and CAPAs
+    status_labels = {status: enum_label(cursor, "rounds", "status", status)
+                     for status in ("scheduled",) + tuple(status for status, _ in PAST_ROUND_STATUSES)}
+    plans = []
+
+    def rounds():
+        for i in range(1, scale["rounds"] + 1):
+            scheduled = now - timedelta(days=730) + timedelta(minutes=rng.randrange(0, 760 * 24 * 60))
+            status = "scheduled" if scheduled > now else weighted(rng, PAST_ROUND_STATUSES)
+            items = rng.sample(item_ids, per_round)
+            assigned = rng.sample(assessor_ids, min(len(assessor_ids), rng.randint(1, 3)))
+            compliance = rng.randint(40, 100) if status in ("completed", "pending_review") else 0
+            plans.append((status, items, assigned[0]))
+            yield (
+                f"BENCH-{i:07d}", f"جولة {ROUND_TYPES[i % len(ROUND_TYPES)]} {i}", rng.choice(ROUND_TYPES),
+                rng.choice(department_names), json.dumps(assigned), json.dumps(assigned),
+                scheduled.isoformat(), (scheduled + timedelta(days=7)).isoformat(), status_labels[status],
+                rng.choice(("low", "medium", "high", "urgent")), compliance,
+                100 if status in ("completed", "pending_review") else 0,
+                json.dumps(items), json.dumps(sorted({category_ids[item % len(category_ids)] for item in items})),
+                rng.choice(creator_ids), (scheduled - timedelta(days=3)).isoformat(),
+            )
+
+    counts["rounds"] = copy_rows(
+        cursor, "rounds",
+        ("round_code", "title", "round_type", "department", "assigned_to", "assigned_to_ids", "scheduled_date",
+         "deadline", "status", "priority", "compliance_percentage", "completion_percentage", "evaluation_items",
+         "selected_categories", "created_by_id", "created_at"),
+        rounds(),
+    )
+    round_ids = fetch_ids(cursor, "SELECT id FROM rounds ORDER BY round_code")
+
+    # Evaluation results for every round that has been evaluated
+    evaluated = ("completed", "in_progress", "pending_review")
+    non_compliant = []
+
+    def results():
+        for round_id, (status, items, assessor) in zip(round_ids, plans):
+            if status not in evaluated:
+                continue
+            for item in items:
+                score = weighted(rng, EVALUATION_SCORES)
+                if score < 100 and status == "completed":
+                    non_compliant.append((round_id, item))
+                yield (round_id, item, score, "ملاحظة" if score < 100 else None, score == 0, assessor, now.isoformat())
+
+    counts["evaluation_results"] = copy_rows(
+        cursor, "evaluation_results",
+        ("round_id", "item_id", "score", "comments", "needs_capa", "evaluated_by", "evaluated_at"),
+        results(),
+    )
+
+    # CAPAs for a sample of distinct non-compliant (round, item) pairs
+    round_department = {}
+    cursor.execute("SELECT id, department FROM rounds")
+    round_department.update(cursor.fetchall())
+    capa_pairs = rng.sample(non_compliant, min(scale["capas"], len(non_compliant)))
+
+    def capas():
+        for round_id, item in capa_pairs:
+            department = round_department[round_id]
+            created = now - timedelta(days=rng.randint(0, 365))
+            status = weighted(rng, CAPA_STATUSES)
+            head = head_by_department[department]
+            yield (
+                f"خطة تحسين للبند {item}", "إجراء تصحيحي لعدم المطابقة", round_id, department,
+                rng.choice(("low", "medium", "high")), status, str(head), head, item,
+                (created + timedelta(days=30)).isoformat(), rng.choice(creator_ids), created.isoformat(),
+                rng.randint(1, 25), '[{"task": "تدريب الطاقم", "status": "open"}]', "[]", "[]",
+                "verified" if status in ("VERIFIED", "CLOSED") else "pending", rng.randint(1, 5), 30, 0,
+                created.isoformat() if status == "CLOSED" else None,
+            )
+
+    counts["capas"] = copy_rows(
+        cursor, "capas",
+        ("title", "description", "round_id", "department", "priority", "status", "assigned_to", "assigned_to_id",
+         "evaluation_item_id", "target_date", "created_by_id", "created_at", "risk_score", "corrective_actions",
+         "preventive_actions", "verification_steps", "verification_status", "severity", "sla_days",
+         "escalation_level", "closed_at"),
+        capas(),
+    )
+
+    # Notifications over the last 90 days, ~70% already read
+    def notifications():
+        for i in range(scale["notifications"]):
+            created = now - timedelta(minutes=rng.randrange(0, 90 * 24 * 60))
+            unread = rng.random() < 0.3
+            yield (
+                rng.choice(all_user_ids), "إشعار جديد", f"إشعار تجريبي رقم {i}", rng.choice(NOTIFICATION_TYPES),
+                "unread" if unread else "read", "ROUND", rng.choice(round_ids), False, created.isoformat(),
+                None if unread else (created + timedelta(hours=1)).isoformat(),
+            )
+
+    counts["notifications"] = copy_rows(
+        cursor, "notifications",
+        ("user_id", "title", "message", "notification_type", "status", "entity_type", "entity_id",
+         "is_email_sent", "created_at", "read_at"),
+        notifications(),
+    )
+    conn.commit()
+
+    # Fresh planner statistics, as after autovacuum on a live database
+    conn.autocommit = True
+    for table in TABLES:
+        cursor.execute(f"ANALYZE {table}")
+    conn.autocommit = False
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with synthetic hospital data")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL") or os.environ.get("DATABASE_URL"))
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name, help=f"Override the scale's {name}")
+    parser.add_argument("--seed", type=int, default=20240101, help="Random seed (same seed, same data)")
+    parser.add_argument("--reference-date", type=date.fromisoformat,
+                        help="'Today' for the generated data (YYYY-MM-DD, default: today); dates are relative to it")
+    parser.add_argument("--password", default="bench-password", help="Password of every benchmark user")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--manifest", default=os.path.join(ROOT_DIR, "benchmark-results", "seed-manifest.json"),
+                        help="Where to write the seed manifest read by load_test.py")
+    parser.add_argument("--skip-schema", action="store_true", help="Do not run backend/scripts/init_db.py first")
+    parser.add_argument("--allow-any-database", action="store_true")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("Set BENCH_DATABASE_URL or pass --database-url")
+    database_name = urlparse(args.database_url).path.lstrip("/")
+    if "bench" not in database_name and not args.allow_any_database:
+        parser.error(f"Refusing to truncate '{database_name}': use a database whose name contains 'bench'")
+
+    scale = dict(SCALES[args.scale])
+    scale.update({name: getattr(args, name) for name in scale if getattr(args, name) is not None})
+
+    if not args.skip_schema:
+        subprocess.run([sys.executable, os.path.join(ROOT_DIR, "backend", "scripts", "init_db.py")],
+                       env=dict(os.environ, DATABASE_URL=args.database_url), check=True)
+
+    started = time.perf_counter()
+    now = datetime.combine(args.reference_date or date.today(), dt_time(8, 0))
+    conn = psycopg2.connect(args.database_url.replace("postgresql+psycopg2://", "postgresql://"))
+    try:
+        counts = seed(conn, scale, random.Random(args.seed), args.password, args.bcrypt_rounds, now)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+
+    manifest = {
+        "scale": args.scale, "parameters": scale, "seed": args.seed, "reference_time": now.isoformat(),
+        "counts": counts, "seconds": round(elapsed, 1), "database": database_name,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.manifest)), exist_ok=True)
+    with open(args.manifest, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2, ensure_ascii=False)
+
+    for table, count in counts.items():
+        print(f"{table:<24} {count:>10,}")
+    print(f"Seeded in {elapsed:.1f}s, manifest: {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
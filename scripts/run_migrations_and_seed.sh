@@ -9,10 +9,7 @@ if [ -z "${DATABASE_URL:-}" ]; then
   exit 2
 fi
 
-echo "Running migrations..."
-# Apply migration files in order
-psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f backend/migrations/0002_add_updated_at_to_capas.sql
-psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f backend/migrations/add_capa_dashboard_tables.sql || true
+bash "$(dirname "$0")/run_migrations.sh"
 
 echo "Seeding sample CAPA data (may fail if already applied)..."
 psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f backend/migrations/insert_sample_capa_data.sql || {
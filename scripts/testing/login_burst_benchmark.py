@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Login burst benchmark.
+
+Fires a burst of concurrent sign-ins (a shift change) at a running backend
+while probing an unrelated endpoint, and reports the probe latency
+percentiles before and during the burst. With bcrypt on the event loop the
+probe p99 climbs to seconds; with the password pool it should stay close to
+the idle baseline.
+
+Requires:
+  - A running backend at BACKEND_URL (default http://127.0.0.1:8000)
+  - An existing user (--username / --password)
+
+Run:
+  python3 scripts/testing/login_burst_benchmark.py --username admin --password admin123 --logins 100
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_URL = os.environ.get('BACKEND_URL', 'http://127.0.0.1:8000')
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def probe(url, stop, samples, interval):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            session.get(url, timeout=30)
+        except requests.RequestException:
+            pass
+        samples.append((time.perf_counter() - started) * 1000)
+        time.sleep(interval)
+
+
+def sign_in(username, password):
+    started = time.perf_counter()
+    response = requests.post(f'{BACKEND_URL}/api/auth/signin', json={'username': username, 'password': password}, timeout=60)
+    return response.status_code, (time.perf_counter() - started) * 1000
+
+
+def summarize(label, samples):
+    print(f'{label:<22} n={len(samples):<5} p50={percentile(samples, 50):8.1f}ms '
+          f'p95={percentile(samples, 95):8.1f}ms p99={percentile(samples, 99):8.1f}ms '
+          f'max={max(samples or [0]):8.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure unrelated endpoint latency during a login burst')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--probe', default='/api/health', help='Unrelated endpoint to probe')
+    parser.add_argument('--probe-interval', type=float, default=0.02)
+    parser.add_argument('--baseline-seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    probe_url = f'{BACKEND_URL}{args.probe}'
+
+    # Idle baseline
+    baseline, stop = [], threading.Event()
+    thread = threading.Thread(target=probe, args=(probe_url, stop, baseline, args.probe_interval))
+    thread.start()
+    time.sleep(args.baseline_seconds)
+    stop.set()
+    thread.join()
+
+    # Burst
+    during, stop = [], threading.Event()
+    thread = threading.Thread(target=probe, args=(probe_url, stop, during, args.probe_interval))
+    thread.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.logins) as executor:
+        results = list(executor.map(lambda _: sign_in(args.username, args.password), range(args.logins)))
+    burst_seconds = time.perf_counter() - started
+    stop.set()
+    thread.join()
+
+    login_latencies = [elapsed for _, elapsed in results]
+    statuses = {}
+    for code, _ in results:
+        statuses[code] = statuses.get(code, 0) + 1
+
+    print(f'Backend: {BACKEND_URL}  logins: {args.logins}  burst: {burst_seconds:.2f}s  statuses: {statuses}')
+    summarize(f'{args.probe} idle', baseline)
+    summarize(f'{args.probe} burst', during)
+    summarize('signin', login_latencies)
+    if baseline and during:
+        print(f'probe p99 slowdown: x{percentile(during, 99) / max(percentile(baseline, 99), 0.001):.1f} '
+              f'(mean {statistics.mean(during):.1f}ms vs {statistics.mean(baseline):.1f}ms idle)')
+
+    # Admin-only endpoint, so it needs a token (the user must be super_admin or quality_manager)
+    try:
+        token = requests.post(f'{BACKEND_URL}/api/auth/signin', json={'username': args.username, 'password': args.password},
+                              timeout=60).json().get('access_token')
+        response = requests.get(f'{BACKEND_URL}/api/health/password-pool', headers={'Authorization': f'Bearer {token}'}, timeout=5)
+        print('password pool:', response.json())
+    except (requests.RequestException, ValueError):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,7 @@ import {
   Calendar
 } from 'lucide-react'
 import { apiClient } from '@/lib/api'
+import { useEventStream } from '@/hooks/useEventStream'
 import { formatDDMMYYYY } from '@/lib/date'
 
 interface Alert {
@@ -76,13 +77,17 @@ const AlertSystem: React.FC<AlertSystemProps> = ({
     }
   }
 
+  // New alerts are pushed over the event stream; the filters are applied server-side so refetch
+  const streamConnected = useEventStream({ alert: () => fetchAlerts() })
+
   useEffect(() => {
     fetchAlerts()
-    
-    // Set up polling for new alerts every 30 seconds
+
+    // Poll only while the event stream is unavailable
+    if (streamConnected) return
     const interval = setInterval(fetchAlerts, 30000)
     return () => clearInterval(interval)
-  }, [userId, filter, priorityFilter])
+  }, [userId, filter, priorityFilter, streamConnected])
 
   const markAsRead = async (alertId: number) => {
     try {
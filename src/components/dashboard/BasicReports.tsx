@@ -27,6 +27,7 @@ interface ReportData {
   average_completion_time: number
   cost_savings: number
   department_stats: Array<{
+    department_id: number | null
     department: string
     total_capas: number
     completed_capas: number
@@ -258,8 +259,8 @@ const BasicReports: React.FC<BasicReportsProps> = ({
                 className="px-3 py-1 border border-gray-300 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
               >
                 <option value="all">جميع الأقسام</option>
-                {reportData.department_stats.map((dept, index) => (
-                  <option key={index} value={dept.department}>
+                {reportData.department_stats.filter((dept) => dept.department_id !== null).map((dept) => (
+                  <option key={dept.department_id} value={String(dept.department_id)}>
                     {dept.department}
                   </option>
                 ))}
@@ -1,5 +1,6 @@
 import React, { createContext, useContext, useState, useCallback, useEffect } from 'react'
 import { apiClient } from '@/lib/api'
+import { useEventStream } from '@/hooks/useEventStream'
 
 export interface Notification {
   id: number
@@ -47,7 +48,19 @@ export const NotificationsProvider: React.FC<NotificationsProviderProps> = ({ ch
   const [notifications, setNotifications] = useState<Notification[]>([])
   const [isLoading, setIsLoading] = useState(false)
 
-  const unreadCount = notifications.filter(n => n.unread).length
+  // Pushed by the server over the event stream; falls back to counting the loaded list
+  const [serverUnreadCount, setServerUnreadCount] = useState<number | null>(null)
+
+  const unreadCount = serverUnreadCount ?? notifications.filter(n => n.unread).length
+
+  const toNotification = (notification: any): Notification => ({
+    ...notification,
+    unread: notification.status === 'unread',
+    createdAt: new Date(notification.created_at),
+    email_sent_at: notification.email_sent_at ? new Date(notification.email_sent_at) : undefined,
+    read_at: notification.read_at ? new Date(notification.read_at) : undefined,
+    time: getTimeAgo(new Date(notification.created_at))
+  })
 
   // Load notifications from API
   const loadNotifications = useCallback(async () => {
@@ -60,14 +73,7 @@ export const NotificationsProvider: React.FC<NotificationsProviderProps> = ({ ch
       // use apiClient.get which returns { data } wrapper
       const response = await apiClient.get('/api/notifications')
       const raw = response?.data || response || []
-      const apiNotifications = (raw || []).map((notification: any) => ({
-        ...notification,
-        unread: notification.status === 'unread',
-        createdAt: new Date(notification.created_at),
-        email_sent_at: notification.email_sent_at ? new Date(notification.email_sent_at) : undefined,
-        read_at: notification.read_at ? new Date(notification.read_at) : undefined,
-        time: getTimeAgo(new Date(notification.created_at))
-      }))
+      const apiNotifications = (raw || []).map(toNotification)
       setNotifications(apiNotifications)
     } catch (error) {
       console.error('Failed to load notifications:', error)
@@ -86,6 +92,18 @@ export const NotificationsProvider: React.FC<NotificationsProviderProps> = ({ ch
     loadNotifications()
   }, [loadNotifications])
 
+  // New notifications and unread-count changes are pushed instead of polled
+  useEventStream({
+    notification: (data) => {
+      if (data.partial) {
+        loadNotifications()
+        return
+      }
+      setNotifications(prev => [toNotification(data), ...prev.filter(n => n.id !== data.id)])
+    },
+    unread_count: (data) => setServerUnreadCount(data.unread_count)
+  }, apiClient.isAuthenticated())
+
   // Helper function to get time ago string
   const getTimeAgo = (date: Date): string => {
     const now = new Date()
@@ -0,0 +1,128 @@
+import { useEffect, useRef, useState } from 'react'
+import { apiClient } from '@/lib/api'
+
+type EventHandlers = Record<string, (data: any) => void>
+type Listener = (data: any) => void
+
+const RECONNECT_MS = 3000
+
+// One EventSource per tab, shared by every useEventStream caller
+let source: EventSource | null = null
+let opening = false
+let reconnectTimer: ReturnType<typeof setTimeout> | null = null
+let subscribers = 0
+const listeners = new Map<string, Set<Listener>>()
+const statusListeners = new Set<(connected: boolean) => void>()
+
+const setStatus = (connected: boolean) => statusListeners.forEach(listener => listener(connected))
+
+function attach(target: EventSource, name: string) {
+  target.addEventListener(name, ((event: MessageEvent) => {
+    let data: any
+    try {
+      data = JSON.parse(event.data)
+    } catch (error) {
+      console.error(`Failed to parse ${name} event:`, error)
+      return
+    }
+    listeners.get(name)?.forEach(listener => {
+      try {
+        listener(data)
+      } catch (error) {
+        console.error(`Failed to handle ${name} event:`, error)
+      }
+    })
+  }) as EventListener)
+}
+
+async function connect() {
+  if (source || opening || subscribers === 0) return
+  opening = true
+  let opened: EventSource | null = null
+  try {
+    opened = await apiClient.openEventStream()
+  } catch (error) {
+    console.error('Failed to open event stream:', error)
+  } finally {
+    opening = false
+  }
+  if (!opened) {
+    scheduleReconnect()
+    return
+  }
+  if (subscribers === 0) {
+    opened.close()
+    return
+  }
+  source = opened
+  listeners.forEach((_, name) => attach(opened!, name))
+  opened.onopen = () => setStatus(true)
+  // A ticket is single-use, so the browser's own retry would be rejected; reconnect with a new one
+  opened.onerror = () => {
+    opened!.close()
+    if (source === opened) source = null
+    setStatus(false)
+    scheduleReconnect()
+  }
+}
+
+function scheduleReconnect() {
+  if (reconnectTimer || subscribers === 0) return
+  reconnectTimer = setTimeout(() => {
+    reconnectTimer = null
+    connect()
+  }, RECONNECT_MS)
+}
+
+function disconnect() {
+  if (reconnectTimer) {
+    clearTimeout(reconnectTimer)
+    reconnectTimer = null
+  }
+  source?.close()
+  source = null
+  setStatus(false)
+}
+
+function addListener(name: string, listener: Listener) {
+  let set = listeners.get(name)
+  if (!set) {
+    set = new Set()
+    listeners.set(name, set)
+    if (source) attach(source, name)
+  }
+  set.add(listener)
+}
+
+// Subscribe to the backend push channel (/api/events/stream).
+// Returns whether the stream is currently open so callers can fall back to polling.
+export function useEventStream(handlers: EventHandlers, enabled: boolean = true) {
+  const handlersRef = useRef(handlers)
+  const [connected, setConnected] = useState(false)
+  handlersRef.current = handlers
+
+  const eventNames = Object.keys(handlers).sort().join(',')
+
+  useEffect(() => {
+    if (!enabled) return
+    const registered = eventNames.split(',').filter(Boolean).map(name => {
+      const listener: Listener = data => handlersRef.current[name]?.(data)
+      addListener(name, listener)
+      return [name, listener] as const
+    })
+    statusListeners.add(setConnected)
+    subscribers += 1
+    if (source?.readyState === EventSource.OPEN) setConnected(true)
+    connect()
+
+    return () => {
+      registered.forEach(([name, listener]) => listeners.get(name)?.delete(listener))
+      statusListeners.delete(setConnected)
+      subscribers -= 1
+      if (subscribers === 0) disconnect()
+      setConnected(false)
+    }
+  }, [enabled, eventNames])
+
+  return connected
+}
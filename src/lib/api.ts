@@ -72,6 +72,16 @@ class ApiClient {
     localStorage.removeItem('access_token')
   }
 
+  // Server-sent events stream; EventSource cannot send headers, so it is opened with a
+  // single-use ticket instead of the token, which would end up in access logs
+  async openEventStream(endpoint: string = '/api/events/stream'): Promise<EventSource | null> {
+    this.refreshToken()
+    if (!this.token || typeof EventSource === 'undefined') return null
+    const { ticket } = await this.post<{ ticket: string; expires_in: number }>('/api/events/ticket')
+    const baseURL = this.baseURL.replace('localhost:8000', '127.0.0.1:8000')
+    return new EventSource(`${baseURL}${endpoint}?ticket=${encodeURIComponent(ticket)}`)
+  }
+
   private async request<T>(
     endpoint: string,
     options: RequestInit = {}
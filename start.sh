@@ -24,6 +24,13 @@ if [ "$INIT_DATABASE" = "true" ]; then
     cd ..
 fi
 
+# Create missing tables once per deploy, before any worker starts
+# (workers no longer run create_all at import time)
+if [ "${SKIP_SCHEMA_SYNC:-false}" != "true" ]; then
+    echo "Syncing database schema..."
+    python3 backend/scripts/init_db.py || echo "Schema sync failed, continuing with existing schema"
+fi
+
 # Start backend directly (frontend is already built in Docker)
 echo "Starting backend server..."
 cd backend